@@ -5,6 +5,11 @@ scopus_combined.csv から DOI / Abstract を md_folder の Markdown へ追記
 """
 import os, unicodedata, pandas as pd
 
+from utils.output_writer import OutputWriter
+from utils.shard_layout import resolve
+from utils.run_report import metrics, profile_option, stage_report
+from utils.status_index import changes, completed_papers, paper_key
+
 CSV_IN="scopus_combined.csv"; MD_DIR="md_folder"
 SAFE_CHARS="-_.() "+''.join(chr(c) for c in range(0x30,0x3A))+''.join(chr(c) for c in range(0x41,0x5B))+''.join(chr(c) for c in range(0x61,0x7B))
 
@@ -13,18 +18,30 @@ def safe_filename(t:str,maxlen:int=120)->str:
 
 def main():
     base=os.path.dirname(os.path.abspath(__file__))
+    with stage_report("add_abst_scopus", base):
+        run(base)
+
+def run(base:str):
     df=pd.read_csv(os.path.join(base,CSV_IN),dtype=str).fillna("")
-    for _, r in df.iterrows():
-        ttl=r.get('Title', r.get('タイトル','')).strip()
-        if not ttl: continue
-        md_p=os.path.join(base,MD_DIR, safe_filename(ttl)+'.md')
-        if not os.path.exists(md_p): continue
-        txt=open(md_p,encoding='utf-8').read()
-        if '## DOI' in txt and '## Abstract' in txt: continue
-        with open(md_p,'a',encoding='utf-8') as f:
-            f.write("\n\n## DOI\n"+r.get('DOI','Unknown'))
-            f.write("\n\n## Abstract\n"+r.get('Abstract', r.get('抄録','')))
+    metrics.count("papers", len(df))
+    # CSVから引くので論文は JSON 名ではなく Markdown 名で記録する（状況索引で済んだものは開かない）
+    done=completed_papers(base,"add_abst_scopus")
+    # 追記も一時ファイル経由の置き換えにする（途中で落ちても半端な追記が残らない）
+    with OutputWriter() as writer:
+        for _, r in df.iterrows():
+            ttl=r.get('Title', r.get('タイトル','')).strip()
+            if not ttl: continue
+            md_p=resolve(os.path.join(base,MD_DIR), safe_filename(ttl)+'.md')
+            if paper_key(md_p) in done or writer.submitted(md_p) or not os.path.exists(md_p): continue
+            txt=open(md_p,encoding='utf-8').read()
+            if '## DOI' in txt and '## Abstract' in txt:
+                changes.completed(md_p); continue
+            txt+="\n\n## DOI\n"+r.get('DOI','Unknown')
+            txt+="\n\n## Abstract\n"+r.get('Abstract', r.get('抄録',''))
+            writer.write_text(md_p, txt, completes=md_p)
+            metrics.count("md_updated")
     print("Abstract 追記完了")
 
 if __name__=='__main__':
+    profile_option()
     main()
@@ -10,6 +10,14 @@ import re
 import unicodedata
 from datetime import datetime
 
+from utils.keyword_tokenizer import extract_title_keywords
+from utils.output_writer import OutputWriter
+from utils.shard_layout import list_names, resolve
+from utils.run_report import metrics, profile_option, stage_report
+from utils.status_index import changes, completed_papers, paper_key
+
+TITLE_STOP_WORDS = frozenset({'the', 'and', 'for', 'with', 'from', 'using', 'based', 'study', 'analysis', 'review'})
+
 def safe_filename(title: str, maxlen: int = 120) -> str:
     """安全なファイル名生成"""
     SAFE_CHARS = "-_.() " + "".join(chr(c) for c in range(0x30, 0x7B) if chr(c).isalnum())
@@ -20,31 +28,8 @@ def safe_filename(title: str, maxlen: int = 120) -> str:
     return s or "untitled"
 
 def extract_title_keywords_comprehensive(title: str) -> list:
-    """タイトルから包括的にキーワードを抽出"""
-    if not title:
-        return []
-    
-    keywords = []
-    stop_words = {'the', 'and', 'for', 'with', 'from', 'using', 'based', 'study', 'analysis', 'review'}
-    
-    # 基本的な単語抽出（3文字以上）
-    basic_words = re.findall(r'\b[a-zA-Z]{3,}\b', title.lower())
-    filtered_words = [w for w in basic_words if w not in stop_words]
-    keywords.extend(filtered_words)
-    
-    # 技術用語・複合語の抽出（ハイフンやアンダースコアで繋がった語）
-    compound_words = re.findall(r'\b[a-zA-Z]+[_-][a-zA-Z]+(?:[_-][a-zA-Z]+)*\b', title.lower())
-    keywords.extend(compound_words)
-    
-    # 数値を含む専門用語（例：5G, CO2, IEEE802など）
-    tech_terms = re.findall(r'\b[a-zA-Z]*\d+[a-zA-Z]*\b', title)
-    keywords.extend([t.lower() for t in tech_terms if len(t) >= 2])
-    
-    # 大文字の略語（例：AI, ML, IoTなど）
-    acronyms = re.findall(r'\b[A-Z]{2,}\b', title)
-    keywords.extend([a.lower() for a in acronyms])
-    
-    return list(set(keywords))  # 重複削除
+    """タイトルから包括的にキーワードを抽出（英単語・複合語・専門用語・略語を1パスで）"""
+    return extract_title_keywords(title, TITLE_STOP_WORDS)
 
 def extract_main_keywords(json_data: dict) -> list:
     """メイン論文のキーワードを抽出"""
@@ -164,24 +149,31 @@ def create_hashtag_section(keywords: list) -> str:
     # ハッシュタグを適切に整形
     return " ".join(hashtags)
 
-def update_markdown_with_yaml(json_path: str, md_dir: str) -> None:
-    """MarkdownファイルにYAMLメタデータと論文情報を追加"""
-    with open(json_path, 'r', encoding='utf-8') as f:
+def update_markdown_with_yaml(json_path: str, md_dir: str, writer: OutputWriter) -> None:
+    """MarkdownファイルにYAMLメタデータと論文情報を追加（保存は writer に任せる）"""
+    with metrics.timer("json_read"), open(json_path, 'r', encoding='utf-8') as f:
         data = json.load(f)
     
     title = data.get('title', 'untitled')
     md_filename = safe_filename(title) + ".md"
-    md_path = os.path.join(md_dir, md_filename)
+    md_path = resolve(md_dir, md_filename)
     
     if not os.path.exists(md_path):
         return
+    if writer.submitted(md_path):
+        # 同じタイトルの論文がこの実行で追加済み
+        metrics.count("already_done")
+        changes.completed(json_path)
+        return
     
     # 既存のMarkdownファイル読み込み
-    with open(md_path, 'r', encoding='utf-8') as f:
+    with metrics.timer("md_read"), open(md_path, 'r', encoding='utf-8') as f:
         content = f.read()
     
     # 既にYAMLフロントマターがあるかチェック
     if content.startswith('---'):
+        metrics.count("already_done")
+        changes.completed(json_path)
         return  # 既に追加済み
     
     # YAMLフロントマター生成
@@ -222,33 +214,49 @@ def update_markdown_with_yaml(json_path: str, md_dir: str) -> None:
     # YAMLフロントマター + 更新されたコンテンツ
     final_content = yaml_frontmatter + updated_content
     
-    # ファイル保存
-    with open(md_path, 'w', encoding='utf-8') as f:
-        f.write(final_content)
+    # ファイル保存（一時ファイル経由で置き換える）
+    writer.write_text(md_path, final_content, completes=json_path)
+    metrics.count("md_updated")
     
     print(f"Updated: {md_filename} - YAML frontmatter, hashtags, and DOI info added")
 
 def main():
     """メイン処理"""
+    base = os.path.dirname(os.path.abspath(__file__))
+    with stage_report("add_yaml_metadata", base):
+        run(base)
+
+def run(base: str) -> None:
     print("YAML メタデータ追加開始...")
     
-    base = os.path.dirname(os.path.abspath(__file__))
     json_dir = os.path.join(base, "JSON_folder")
     md_dir = os.path.join(base, "md_folder")
     
     # 全JSONファイルを処理
-    json_files = [f for f in os.listdir(json_dir) if f.endswith('.json')]
+    json_files = list_names(json_dir, '.json')
     updated_count = 0
-    
-    for json_file in json_files:
-        json_path = os.path.join(json_dir, json_file)
-        try:
-            update_markdown_with_yaml(json_path, md_dir)
-            updated_count += 1
-        except Exception as e:
-            print(f"Error processing {json_file}: {e}")
+    metrics.count("papers", len(json_files))
+    
+    # 状況索引で済んでいる論文は Markdown を開かずに飛ばす
+    done = completed_papers(base, "add_yaml_metadata")
+    if done:
+        remaining = [f for f in json_files if paper_key(f) not in done]
+        metrics.count("already_done", len(json_files) - len(remaining))
+        print(f"追加済み: {len(json_files) - len(remaining)} ファイル（状況索引）")
+        json_files = remaining
+    
+    with OutputWriter() as writer:
+        for json_file in json_files:
+            json_path = resolve(json_dir, json_file)
+            try:
+                update_markdown_with_yaml(json_path, md_dir, writer)
+                updated_count += 1
+            except Exception as e:
+                metrics.count("errors")
+                print(f"Error processing {json_file}: {e}")
     
     print(f"YAML メタデータ追加完了: {updated_count} ファイル処理")
 
 if __name__ == "__main__":
+    profile_option()
     main()
\ No newline at end of file
@@ -15,9 +15,16 @@ combine_scopus_csv.py
 
 import os, glob, pandas as pd
 
+from utils.run_report import metrics, profile_option, stage_report
+
 OUT_NAME = "scopus_combined.csv"
 
 def main() -> None:
+    # 実行レポートは他の段と同じくスクリプトのディレクトリに書く
+    with stage_report("combine_scopus_csv", os.path.dirname(os.path.abspath(__file__))):
+        run()
+
+def run() -> None:
     # 実行ディレクトリ（ユーザーの作業フォルダ）でCSVファイルを検索
     work_dir = os.getcwd()
     print(f"📁 作業ディレクトリ: {work_dir}")
@@ -37,15 +44,21 @@ def main() -> None:
         return
 
     print(f"📊 CSVファイルを結合中...")
-    df = pd.concat([pd.read_csv(f, dtype=str) for f in csvs],
-                   ignore_index=True).fillna("")
+    with metrics.timer("csv_read"):
+        df = pd.concat([pd.read_csv(f, dtype=str) for f in csvs],
+                       ignore_index=True).fillna("")
+    metrics.count("csv_files", len(csvs))
+    metrics.count("bytes_read", sum(os.path.getsize(f) for f in csvs))
     
     original_count = len(df)
-    df.drop_duplicates(inplace=True)   # 完全一致を削除
+    with metrics.timer("dedupe"):
+        df.drop_duplicates(inplace=True)   # 完全一致を削除
     deduplicated_count = len(df)
+    metrics.count("papers", deduplicated_count)
     
     output_path = os.path.join(work_dir, OUT_NAME)
-    df.to_csv(output_path, index=False)
+    with metrics.timer("file_write"):
+        df.to_csv(output_path, index=False)
 
     print(f"✅ 結合完了:")
     print(f"  📁 入力: {len(csvs)}ファイル")
@@ -57,4 +70,5 @@ def main() -> None:
         print(f"  ⚠️  {original_count - deduplicated_count:,}行の重複を除去")
 
 if __name__ == "__main__":
+    profile_option()
     main()
\ No newline at end of file
@@ -10,6 +10,12 @@ import sys
 import time
 import importlib.util
 
+# ルートディレクトリをパスに追加（utils パッケージ用）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.run_report import (RUN_REPORT, finish_run, profile_lines, profile_option, record_stage,
+                               start_run, summarize)
+from utils.shard_layout import count
+
 def 依存関係チェック():
     """必須パッケージの確認とインストール"""
     必須パッケージ = ['pandas', 'requests', 'requests_cache', 'tqdm']
@@ -63,6 +69,7 @@ def スクリプト実行(スクリプト名: str, 説明: str, 基準ディレ
                                   cwd=基準ディレクトリ)
             実行時間 = time.time() - 開始時間
             
+            実行記録(スクリプト名, 実行時間, 結果.returncode, 基準ディレクトリ)
             if 結果.returncode == 0:
                 print(f"✅ {説明} 完了 ({実行時間:.1f}秒)")
                 return True
@@ -77,6 +84,7 @@ def スクリプト実行(スクリプト名: str, 説明: str, 基準ディレ
                                   cwd=基準ディレクトリ)
             
             実行時間 = time.time() - 開始時間
+            実行記録(スクリプト名, 実行時間, 結果.returncode, 基準ディレクトリ)
             
             if 結果.returncode == 0:
                 print(f"✅ {説明} 完了 ({実行時間:.1f}秒)")
@@ -98,11 +106,18 @@ def スクリプト実行(スクリプト名: str, 説明: str, 基準ディレ
         print(f"❌ スクリプト実行エラー: {e}")
         return False
 
+def 実行記録(スクリプト名: str, 実行時間: float, 終了コード: int, 基準ディレクトリ: str) -> None:
+    """段の外から測った所要時間・終了コードを実行レポートに追記（段の中の計測と同じ項目に入る）"""
+    段 = os.path.splitext(os.path.basename(スクリプト名))[0]
+    try:
+        record_stage(基準ディレクトリ, 段, {"wall_seconds": round(実行時間, 3), "returncode": 終了コード})
+    except OSError as e:
+        print(f"⚠️ 実行レポートを書けませんでした: {e}")
+
 def ファイル数確認(ディレクトリ: str, 拡張子: str) -> int:
     """指定ディレクトリ内の指定拡張子ファイル数を取得"""
-    if os.path.exists(ディレクトリ):
-        return len([f for f in os.listdir(ディレクトリ) if f.endswith(拡張子)])
-    return 0
+    # JSON_folder / md_folder がシャード配置ならシャードの中も数える
+    return count(ディレクトリ, 拡張子)
 
 def main():
     """メイン処理"""
@@ -148,6 +163,7 @@ def main():
                 break
             
             全開始時間 = time.time()
+            start_run(基準ディレクトリ)  # 各段の計測を run_report.json にまとめる
             
             パイプライン = [
                 ("combine_scopus_csv.py", "CSVファイル結合"),
@@ -169,6 +185,7 @@ def main():
                 print("-" * 30)
             
             全実行時間 = time.time() - 全開始時間
+            レポート = finish_run(基準ディレクトリ, 全実行時間)
             
             # 最終結果
             最終json数 = ファイル数確認(os.path.join(基準ディレクトリ, "JSON_folder"), '.json')
@@ -178,6 +195,12 @@ def main():
             print(f"📊 実行成功: {成功数}/{len(パイプライン)} ステップ")
             print(f"⏱️ 総実行時間: {全実行時間:.1f}秒")
             print(f"📁 生成ファイル数: JSON {最終json数}件, Markdown {最終md数}件")
+            if レポート.get("stages"):
+                print(f"\n⏱️ 段ごとの計測（詳細は {RUN_REPORT}）:")
+                for 行 in summarize(レポート):
+                    print(f"   {行}")
+                for 行 in profile_lines(レポート):
+                    print(f"   {行}")
             print(f"\n📋 次は PDF取得コマンド で論文PDFを取得できます")
             break
         
@@ -206,4 +229,5 @@ def main():
             print("❌ 無効な選択です。0-5を入力してください。")
 
 if __name__ == "__main__":
+    profile_option()  # --profile[=cpu|mem|all]: 各段を cProfile / tracemalloc の下で実行
     main()
\ No newline at end of file
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+キーワード共起ベンチマーク.py - キーワード共起ネットワーク作成の速度測定
+
+合成コーパス（既定10万論文 × 語彙5万。キーワードはべき分布で選ぶ）で、
+utils/keyword_network.py の 行列作成・Xᵀ·X による共起集計・PMI計算の時間を測る。
+先頭の一部の論文について、組ごとの二重ループで数えた共起数と一致するか、
+速度がどれだけ違うかも確認する。
+
+使い方:
+    python3 dev_tools/キーワード共起ベンチマーク.py [論文数] [語彙数]
+"""
+
+import os
+import sys
+import time
+import itertools
+from collections import Counter
+
+import numpy as np
+
+# ルートディレクトリをパスに追加（utils パッケージ用）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import keyword_network as network
+
+既定論文数 = 100_000
+既定語彙数 = 50_000
+比較論文数 = 10_000       # 二重ループと比べる論文数
+平均キーワード数 = 20
+人気の偏り = 0.9         # 順位 r のキーワードが選ばれる確率 ∝ r^-人気の偏り
+最小共起数 = 3
+
+def 合成キーワード(論文数: int, 語彙数: int, seed: int = 0):
+    """各論文のキーワード一覧（文字列）を作る"""
+    rng = np.random.default_rng(seed)
+    語彙 = [f"keyword {i}" for i in range(語彙数)]
+    重み = np.arange(1, 語彙数 + 1, dtype=np.float64) ** -人気の偏り
+    件数 = rng.poisson(平均キーワード数, 論文数)
+    選択 = rng.choice(語彙数, size=int(件数.sum()), p=重み / 重み.sum())
+    境界 = np.concatenate([[0], np.cumsum(件数)])
+    return [[語彙[i] for i in 選択[境界[d]:境界[d + 1]].tolist()] for d in range(論文数)]
+
+def 二重ループ集計(論文キーワード) -> dict:
+    """論文ごとにキーワード対を列挙して数える（比較用の素朴な実装）"""
+    件数 = Counter()
+    for keywords in 論文キーワード:
+        for a, b in itertools.combinations(sorted(set(keywords)), 2):
+            件数[a, b] += 1
+    return {組: n for 組, n in 件数.items() if n >= 最小共起数}
+
+def main():
+    if not network.SCIPY_AVAILABLE:
+        print("❌ scipy がインストールされていません（pip install scipy）")
+        return
+    論文数 = int(sys.argv[1]) if len(sys.argv) > 1 else 既定論文数
+    語彙数 = int(sys.argv[2]) if len(sys.argv) > 2 else 既定語彙数
+    論文キーワード = 合成キーワード(論文数, 語彙数)
+
+    開始 = time.perf_counter()
+    X, 語彙 = network.doc_keyword_matrix(論文キーワード)
+    行列時間 = time.perf_counter() - 開始
+    開始 = time.perf_counter()
+    辺 = network.cooccurrence_edges(X, 最小共起数)
+    共起時間 = time.perf_counter() - 開始
+    開始 = time.perf_counter()
+    上位 = network.top_edges(辺)
+    上位時間 = time.perf_counter() - 開始
+    print(f"📄 論文 {X.shape[0]:,} / キーワード {len(語彙):,}種類 / 出現 {X.nnz:,}件")
+    print(f"   行列作成: {行列時間:.2f}秒 / 共起・PMI: {共起時間:.2f}秒（{len(辺):,}組） / "
+          f"上位{len(上位):,}辺: {上位時間:.2f}秒")
+
+    n = min(比較論文数, 論文数)
+    開始 = time.perf_counter()
+    期待 = 二重ループ集計(論文キーワード[:n])
+    素朴時間 = time.perf_counter() - 開始
+    開始 = time.perf_counter()
+    X, 語彙 = network.doc_keyword_matrix(論文キーワード[:n])
+    辺 = network.cooccurrence_edges(X, 最小共起数)
+    疎行列時間 = time.perf_counter() - 開始
+    結果 = {tuple(sorted((語彙[s], 語彙[t]))): c
+            for s, t, c in zip(辺.source.tolist(), 辺.target.tolist(), 辺.count.tolist())}
+    print(f"\n⚖️ 先頭{n:,}論文の共起集計（共起{最小共起数}以上 {len(期待):,}組）")
+    print(f"   二重ループ: {素朴時間:.2f}秒 / 疎行列: {疎行列時間:.2f}秒 "
+          f"({素朴時間 / max(疎行列時間, 1e-9):.1f}倍)")
+    print(f"   結果の一致: {'✅' if 結果 == 期待 else '❌'}")
+
+if __name__ == "__main__":
+    main()
@@ -48,7 +48,8 @@ def main():
     for フォルダ in 出力フォルダ:
         パス = os.path.join(基準ディレクトリ, フォルダ)
         if os.path.exists(パス):
-            ファイル数 = len(os.listdir(パス))
+            # シャード配置のサブフォルダの中も数える
+            ファイル数 = sum(len(ファイル) for _, _, ファイル in os.walk(パス))
             print(f"  📁 {フォルダ}/ ({ファイル数}件)")
         else:
             print(f"  📁 {フォルダ}/ (未作成)")
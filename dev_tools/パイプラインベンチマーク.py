@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+パイプラインベンチマーク.py - 合成コーパスでのパイプライン全段の速度・メモリ測定
+
+一時ディレクトリにパイプラインのスクリプトを複製し、utils/synthetic_corpus.py で
+Scopus CSV（1k / 10k / 100k 件など）・Crossref キャッシュ・DOIタイトルキャッシュ・
+一部の論文のPDFを作ってから、各段を本番と同じくサブプロセスで順に実行する。
+Crossref・DOI解決はキャッシュから返るのでネットワークには接続しない。
+OA PDF取得（download 段）と ResearchGate 取得（researchgate 段）は --stages で指定した
+ときだけ実行し、utils/mock_api.py の模擬サーバーを起動して、その段だけ接続先を
+環境変数で向ける（researchgate 段は1件ごとに待機が入るので 100 件程度で測る）。
+
+段ごとに 所要時間・スループット（論文/秒）・ピークRSS（その段で最大のプロセス）を測り
+（段の中の区間ごとの内訳は各段が書く run_report.json から表示する）
+（ログに1件ごとの失敗が出た段は ⚠️ を付けて基準値と比べない。--save-baseline のときは
+失敗・⚠️ の段が1つでもあれば基準値を保存せずに終了コード 1 で終わる）、
+dev_tools/ベンチマーク基準値.json の同じ件数の記録と比べて遅くなった・メモリが
+増えた段を報告する（回帰があれば終了コード 1）。
+
+使い方:
+    python3 dev_tools/パイプラインベンチマーク.py [1k|10k|100k|件数] [オプション]
+      --stages combine,fetch   実行する段（既定は download・researchgate 以外の全段）
+      --save-baseline          今回の結果を基準値として保存
+      --keep                   作業ディレクトリを残す（出力・ログの確認用）
+      --profile[=cpu|mem|all]  各段を cProfile / tracemalloc の下で実行（基準値とは比べない）
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+# ルートディレクトリをパスに追加（utils パッケージ用）
+基準ディレクトリ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(基準ディレクトリ)
+from utils.synthetic_corpus import SyntheticCorpus, parse_size
+from utils.http_cache import ResponseCache
+from utils.mock_api import MockAPIServer
+from utils.run_report import finish_run, profile_lines, profile_option, start_run, summarize
+from utils.shard_layout import count
+
+基準値ファイル = os.path.join(基準ディレクトリ, "dev_tools", "ベンチマーク基準値.json")
+既定件数 = "1k"
+PDF割合 = 0.1
+時間の許容率 = 0.25        # 基準値よりこの割合以上遅ければ回帰
+メモリの許容率 = 0.25
+時間の最小差 = 1.0         # 秒（これ未満の差は誤差として扱う）
+メモリの最小差 = 32.0      # MB
+
+# (段の名前, 説明, スクリプト) - 全自動実行.py と同じ順（PDF本文はキーワード分析の前に抽出）
+段一覧 = [
+    ("combine", "CSV結合", "combine_scopus_csv.py"),
+    ("fetch", "DOI→JSON（Crossref はキャッシュ済み）", "scopus_doi_to_json.py"),
+    ("markdown", "Markdown生成・参考文献解決", "json2tag_ref_scopus_async.py"),
+    ("download", "OA PDF取得（模擬APIサーバー）", os.path.join("pdf_tools", "download_open_access_pdfs_async.py")),
+    ("researchgate", "ResearchGate PDF取得（模擬APIサーバー）",
+     os.path.join("pdf_tools", "download_researchgate_pdfs.py")),
+    ("pdf", "PDF本文抽出", os.path.join("pdf_tools", "extract_pdf_text.py")),
+    ("keywords", "キーワード分析・検索索引", "enhance_keywords.py"),
+    ("yaml", "YAMLメタデータ追加", "add_yaml_metadata.py"),
+]
+既定で実行しない段 = {"download", "researchgate"}   # PDFが増えて pdf 段の基準値が変わるので明示したときだけ
+模擬サーバーを使う段 = {"download", "researchgate"}
+複製するディレクトリ = ("utils", "pdf_tools")
+# 各スクリプトが1件ごとの失敗を出力する行（終了コードは 0 のまま続行するもの）
+エラー行の目印 = ("Error processing", "エラー発生", "Error loading")
+
+def 作業ディレクトリ準備(作業: str) -> None:
+    """パイプラインのスクリプト（.py のみ）を作業ディレクトリに複製"""
+    for 名前 in os.listdir(基準ディレクトリ):
+        if 名前.endswith(".py"):
+            shutil.copy2(os.path.join(基準ディレクトリ, 名前), 作業)
+    def py以外(ディレクトリ: str, 名前一覧: List[str]) -> List[str]:
+        return [名前 for 名前 in 名前一覧 if not 名前.endswith(".py")
+                and not os.path.isdir(os.path.join(ディレクトリ, 名前)) or 名前 == "__pycache__"]
+    for ディレクトリ in 複製するディレクトリ:
+        shutil.copytree(os.path.join(基準ディレクトリ, ディレクトリ), os.path.join(作業, ディレクトリ), ignore=py以外)
+
+def 合成データ作成(作業: str, コーパス: SyntheticCorpus) -> None:
+    # 各スクリプトの定数（scopus_doi_to_json.CACHE_DB など）と同じ名前で置く
+    手順 = [
+        ("Scopus CSV", lambda: f"{len(コーパス.write_scopus_csv(作業))}ファイル"),
+        ("Crossref キャッシュ", lambda: f"{コーパス.seed_crossref_cache(os.path.join(作業, 'crossref_cache.sqlite')):,}件"),
+        ("DOIタイトルキャッシュ", lambda: f"{コーパス.write_doi_title_cache(os.path.join(作業, 'doi_title_cache.json')):,}件"),
+        ("PDF", lambda: f"{コーパス.write_pdfs(os.path.join(作業, 'PDF'), PDF割合):,}件"),
+    ]
+    for 名前, 作成 in 手順:
+        開始 = time.perf_counter()
+        結果 = 作成()
+        print(f"   {名前}: {結果} ({time.perf_counter() - 開始:.1f}秒)")
+
+def ピークRSS_MB(使用量) -> float:
+    """ru_maxrss を MB に（Linux は KB、macOS はバイト単位）"""
+    return 使用量.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+def 段実行(作業: str, スクリプト: str, ログパス: str,
+           追加環境: Optional[Dict[str, str]] = None) -> Tuple[int, float, Optional[float]]:
+    """スクリプトをサブプロセスで実行し (終了コード, 秒, ピークRSS MB) を返す
+
+    ピークRSSは wait4 の資源使用量（その段の子孫プロセスを含めた最大のプロセス）。
+    wait4 の無い環境（Windows）では None。
+    """
+    環境 = dict(os.environ, PYTHONIOENCODING="utf-8", **(追加環境 or {}))
+    with open(ログパス, "w", encoding="utf-8") as ログ:
+        開始 = time.perf_counter()
+        プロセス = subprocess.Popen([sys.executable, スクリプト], cwd=作業, stdout=ログ,
+                                   stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, env=環境)
+        if hasattr(os, "wait4"):
+            _, 状態, 使用量 = os.wait4(プロセス.pid, 0)
+            経過 = time.perf_counter() - 開始
+            プロセス.returncode = os.waitstatus_to_exitcode(状態) if hasattr(os, "waitstatus_to_exitcode") \
+                else os.WEXITSTATUS(状態)
+            return プロセス.returncode, 経過, ピークRSS_MB(使用量)
+        プロセス.wait()
+        return プロセス.returncode, time.perf_counter() - 開始, None
+
+def エラー行数(ログパス: str) -> int:
+    with open(ログパス, "r", encoding="utf-8", errors="replace") as f:
+        return sum(1 for 行 in f if any(目印 in 行 for 目印 in エラー行の目印))
+
+def 出力件数(作業: str) -> Dict[str, int]:
+    return {"json": count(os.path.join(作業, "JSON_folder"), ".json"),
+            "markdown": count(os.path.join(作業, "md_folder"), ".md")}
+
+def 基準値読み込み() -> dict:
+    if os.path.exists(基準値ファイル):
+        with open(基準値ファイル, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+def 回帰判定(結果: Dict[str, dict], 基準: Dict[str, dict]) -> List[str]:
+    """基準値より遅い・メモリが多い段の説明"""
+    回帰 = []
+    for 段, 今回 in 結果.items():
+        前回 = 基準.get(段)
+        if not 前回 or 今回["returncode"] != 0 or 今回["errors"]:
+            continue
+        差 = 今回["seconds"] - 前回["seconds"]
+        if 差 > 時間の最小差 and 今回["seconds"] > 前回["seconds"] * (1 + 時間の許容率):
+            回帰.append(f"{段}: {前回['seconds']:.1f}秒 → {今回['seconds']:.1f}秒 (+{差 / 前回['seconds']:.0%})")
+        if 今回.get("peak_rss_mb") and 前回.get("peak_rss_mb"):
+            差 = 今回["peak_rss_mb"] - 前回["peak_rss_mb"]
+            if 差 > メモリの最小差 and 今回["peak_rss_mb"] > 前回["peak_rss_mb"] * (1 + メモリの許容率):
+                回帰.append(f"{段}: ピークRSS {前回['peak_rss_mb']:.0f}MB → {今回['peak_rss_mb']:.0f}MB")
+    return 回帰
+
+def main():
+    # プロファイラの負荷で遅くなるので、プロファイル中は基準値と比較・保存しない
+    プロファイル = profile_option()
+    引数 = sys.argv[1:]
+    基準値保存 = "--save-baseline" in 引数
+    残す = "--keep" in 引数
+    対象段 = [段 for 段, _, _ in 段一覧 if 段 not in 既定で実行しない段]
+    if "--stages" in 引数:
+        位置 = 引数.index("--stages")
+        対象段 = 引数[位置 + 1].split(",") if 位置 + 1 < len(引数) else []
+        不明 = [段 for 段 in 対象段 if 段 not in {名前 for 名前, _, _ in 段一覧}]
+        if 不明 or not 対象段:
+            print(f"❌ 不明な段: {','.join(不明) or '(なし)'}（{', '.join(名前 for 名前, _, _ in 段一覧)}）")
+            sys.exit(2)
+        del 引数[位置:位置 + 2]
+    位置引数 = [a for a in 引数 if not a.startswith("--")]
+    件数名 = 位置引数[0] if 位置引数 else 既定件数
+    件数 = parse_size(件数名)
+
+    作業 = tempfile.mkdtemp(prefix="scopus_bench_")
+    模擬サーバー: Optional[MockAPIServer] = None
+    try:
+        print(f"🧪 合成コーパス {件数:,}件を作成中... ({作業})")
+        作業ディレクトリ準備(作業)
+        コーパス = SyntheticCorpus(件数)
+        合成データ作成(作業, コーパス)
+        if 模擬サーバーを使う段 & set(対象段):
+            模擬サーバー = MockAPIServer(コーパス, port=0).start()
+            print(f"   模擬APIサーバー: {模擬サーバー.base_url}")
+        os.makedirs(os.path.join(作業, "logs"))
+        start_run(作業)  # 各段の run_report.json への記録を1つの実行にまとめる
+        全体開始 = time.perf_counter()
+
+        print(f"\n⏱️ パイプライン実行（{len(対象段)}段）")
+        結果: Dict[str, dict] = {}
+        for 段, 説明, スクリプト in 段一覧:
+            if 段 not in 対象段:
+                continue
+            ログパス = os.path.join(作業, "logs", f"{段}.log")
+            追加環境 = 模擬サーバー.environment() if 段 in 模擬サーバーを使う段 and 模擬サーバー else None
+            終了コード, 秒, rss = 段実行(作業, スクリプト, ログパス, 追加環境)
+            エラー = エラー行数(ログパス)
+            結果[段] = {"seconds": round(秒, 3), "papers_per_sec": round(件数 / 秒, 1) if 秒 else 0.0,
+                       "peak_rss_mb": round(rss, 1) if rss is not None else None,
+                       "returncode": 終了コード, "errors": エラー}
+            印 = "❌" if 終了コード != 0 else "⚠️" if エラー else "✅"
+            メモリ = f"{rss:7.0f}MB" if rss is not None else "      -"
+            print(f"   {印} {段:9s} {秒:8.1f}秒 {件数 / 秒 if 秒 else 0:9.1f}件/秒 {メモリ}  {説明}"
+                  + (f"（ログにエラー {エラー:,}行）" if エラー else ""))
+            if 終了コード != 0 or エラー:
+                with open(ログパス, "r", encoding="utf-8", errors="replace") as f:
+                    for 行 in f.read().strip().splitlines()[-5:]:
+                        print(f"        {行}")
+
+        レポート = finish_run(作業, time.perf_counter() - 全体開始)
+        if レポート.get("stages"):
+            print("\n🔬 段の中の内訳（run_report.json・区間の秒は並列分を足した累積）:")
+            for 行 in summarize(レポート):
+                print(f"   {行}")
+            for 行 in profile_lines(レポート):
+                print(f"   {行}")
+
+        件数表 = 出力件数(作業)
+        print(f"\n📊 出力: JSON {件数表['json']:,}件 / Markdown {件数表['markdown']:,}件")
+        if os.path.exists(os.path.join(作業, "crossref_cache.sqlite")):
+            with ResponseCache(os.path.join(作業, "crossref_cache.sqlite"), readonly=True) as キャッシュ:
+                統計 = キャッシュ.stats()
+            print(f"   Crossref キャッシュ: ヒット {統計.get('hits', 0):,}件")
+        if 模擬サーバー:
+            リクエスト = 模擬サーバー.stats()["requests"]
+            print("   模擬APIサーバー: " + " / ".join(
+                f"{名前} {sum(数.values()):,}件" for 名前, 数 in リクエスト.items() if 数))
+
+        基準値 = 基準値読み込み()
+        前回 = 基準値.get(str(件数), {}).get("stages", {}) if not プロファイル else {}
+        回帰 = 回帰判定(結果, 前回)
+        if プロファイル:
+            print(f"\nℹ️  プロファイル中（{プロファイル}）のため基準値とは比較しません"
+                  + ("" if 残す else "（profiles/ を見るには --keep）"))
+        elif not 前回:
+            print("\nℹ️  この件数の基準値はまだありません（--save-baseline で保存）")
+        elif 回帰:
+            print(f"\n⚠️ 基準値（{基準値[str(件数)].get('recorded_at', '')}）からの回帰:")
+            for 行 in 回帰:
+                print(f"   {行}")
+        else:
+            print(f"\n✅ 基準値（{基準値[str(件数)].get('recorded_at', '')}）からの回帰なし")
+
+        保存失敗 = False
+        if 基準値保存 and not プロファイル:
+            # 失敗・エラーのあった段を黙って外すと基準値が欠けるので、保存自体をやめる
+            保存できない段 = [段 for 段, 値 in 結果.items() if 値["returncode"] != 0 or 値["errors"]]
+            if 保存できない段:
+                print(f"\n❌ 失敗・エラーのあった段があるので基準値を保存しません: {', '.join(保存できない段)}"
+                      "（ログを確認し、NLTK データなどの不足を解消してから再実行）")
+                保存失敗 = True
+            else:
+                記録 = 基準値.get(str(件数), {"stages": {}})
+                記録["stages"].update(結果)
+                記録.update({"recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                            "platform": platform.platform(), "cpu_count": os.cpu_count()})
+                基準値[str(件数)] = 記録
+                with open(基準値ファイル, "w", encoding="utf-8") as f:
+                    json.dump(基準値, f, ensure_ascii=False, indent=2)
+                print(f"💾 基準値を保存: {os.path.relpath(基準値ファイル, 基準ディレクトリ)}")
+    finally:
+        if 模擬サーバー:
+            模擬サーバー.stop()
+        if 残す:
+            print(f"📁 作業ディレクトリ: {作業}")
+        else:
+            shutil.rmtree(作業, ignore_errors=True)
+    if 回帰 or 保存失敗:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全文検索ベンチマーク.py - 全文検索索引の構築・増分更新・検索の速度測定
+
+一時ディレクトリに合成JSON（既定10万件。単語はべき分布）を作り、
+utils/search_index.py で索引の新規構築・数件だけ変更したときの増分更新・
+いくつかのクエリ（単語・フレーズ・発行年）の応答時間を測る。
+
+使い方:
+    python3 dev_tools/全文検索ベンチマーク.py [件数]
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+
+import numpy as np
+
+# ルートディレクトリをパスに追加（utils パッケージ用）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.search_index import SearchIndex
+
+既定件数 = 100_000
+語彙数 = 30_000
+単語数 = {"title": 10, "abstract": 150, "reference": 8, "keyword": 2}
+参考文献数 = 15
+キーワード数 = 8
+クエリ = [
+    "w5",                                   # ほぼ全文書に出る単語
+    "w100 w2000",                           # 中頻度の単語の AND
+    '"deep learning"',                      # フレーズ
+    '"deep learning" year:2000-2005',       # フレーズ + 発行年
+    '"w100 w7" w5',                         # 中頻度フレーズ + 高頻度単語
+]
+
+def 合成JSON作成(出力先: str, 件数: int, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    語彙 = np.array([f"w{i}" for i in range(語彙数)])
+    重み = 1.0 / np.arange(1, 語彙数 + 1)
+    一件の単語数 = (単語数["title"] + 単語数["abstract"] + 参考文献数 * 単語数["reference"]
+               + キーワード数 * 単語数["keyword"])
+    単語列 = 語彙[rng.choice(語彙数, size=件数 * 一件の単語数, p=重み / 重み.sum())].tolist()
+    位置 = 0
+
+    def 文(n: int) -> str:
+        nonlocal 位置
+        位置 += n
+        return " ".join(単語列[位置 - n:位置])
+
+    for i in range(件数):
+        data = {
+            "title": 文(単語数["title"]) + (" deep learning" if i % 50 == 0 else ""),
+            "year": 1990 + i % 35,
+            "doi": f"10.0000/bench.{i}",
+            "abstract": 文(単語数["abstract"]),
+            "references": [{"article-title": 文(単語数["reference"])} for _ in range(参考文献数)],
+            "keywords": {"combined_keywords": [文(単語数["keyword"]) for _ in range(キーワード数)]},
+        }
+        with open(os.path.join(出力先, f"paper{i}.json"), 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+def main():
+    件数 = int(sys.argv[1]) if len(sys.argv) > 1 else 既定件数
+    with tempfile.TemporaryDirectory() as 作業:
+        json_dir = os.path.join(作業, "JSON_folder")
+        os.makedirs(json_dir)
+        開始 = time.perf_counter()
+        合成JSON作成(json_dir, 件数)
+        print(f"📄 合成JSON {件数:,}件 ({time.perf_counter() - 開始:.1f}秒)")
+
+        索引パス = os.path.join(作業, "search_index.sqlite")
+        開始 = time.perf_counter()
+        with SearchIndex(索引パス) as 索引:
+            索引.update(json_dir)
+        print(f"🔎 新規構築: {time.perf_counter() - 開始:.1f}秒 "
+              f"(索引 {os.path.getsize(索引パス) / 1024 / 1024:.0f}MB)")
+
+        # 10件だけ書き換えて増分更新
+        for i in range(10):
+            path = os.path.join(json_dir, f"paper{i * 997 % 件数}.json")
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            data["title"] = f"updated title {i}"
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+        開始 = time.perf_counter()
+        with SearchIndex(索引パス) as 索引:
+            結果 = 索引.update(json_dir)
+        print(f"♻️ 増分更新（{結果['parsed']}件変更）: {time.perf_counter() - 開始:.2f}秒")
+
+        print("\n⏱️ 検索（上位10件。2回目以降の中央値）")
+        with SearchIndex(索引パス, readonly=True) as 索引:
+            for q in クエリ:
+                索引.search(q)
+                時間 = []
+                for _ in range(5):
+                    開始 = time.perf_counter()
+                    一致 = 索引.search(q)
+                    時間.append((time.perf_counter() - 開始) * 1000)
+                print(f"   {q:34s} {np.median(時間):7.2f}ms ({len(一致)}件表示)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+引用類似度ベンチマーク.py - 書誌結合・共引用計算の速度測定
+
+合成コーパス（既定10万論文。参考文献はべき分布で人気文献に偏らせる）の
+引用グラフを作り、utils/citation_similarity.py の疎行列版（A·Aᵀ / Aᵀ·A）の
+計算時間を測る。先頭の一部の論文について、辞書とループによる素朴な
+集計と結果が一致するか、速度がどれだけ違うかも確認する。
+
+使い方:
+    python3 dev_tools/引用類似度ベンチマーク.py [論文数]
+"""
+
+import os
+import sys
+import time
+import itertools
+from collections import Counter, defaultdict
+
+import numpy as np
+
+# ルートディレクトリをパスに追加（utils パッケージ用）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.citation_graph import CitationGraph, build_csr
+from utils import citation_similarity as similarity
+
+既定論文数 = 100_000
+比較論文数 = 5_000       # 素朴な実装と比べる論文数（組数が論文数の2乗で増えるため小さめ）
+平均参考文献数 = 30
+人気の偏り = 0.6        # 順位 r の文献が選ばれる確率 ∝ r^-人気の偏り
+閾値 = 2
+上位k = 20
+
+def 合成グラフ(論文数: int, seed: int = 0) -> CitationGraph:
+    """論文数 × 5 個のノード（うち先頭 論文数 個がコーパス内）を持つ合成引用グラフ"""
+    rng = np.random.default_rng(seed)
+    ノード数 = 論文数 * 5
+    件数 = rng.poisson(平均参考文献数, 論文数)
+    src = np.repeat(np.arange(論文数), 件数)
+    # べき分布で選んだ順位をランダムなノードIDへ写す（人気文献がID順に並ばないように）
+    重み = np.arange(1, ノード数 + 1, dtype=np.float64) ** -人気の偏り
+    順位 = rng.choice(ノード数, size=len(src), p=重み / 重み.sum())
+    dst = rng.permutation(ノード数)[順位]
+    packed = np.unique(src.astype(np.int64) << 32 | dst)
+    src, dst = packed >> 32, packed & 0xFFFFFFFF
+    corpus = np.zeros(ノード数, dtype=bool)
+    corpus[:論文数] = True
+    return CitationGraph([str(i) for i in range(ノード数)], corpus,
+                         *build_csr(src, dst, ノード数), *build_csr(dst, src, ノード数))
+
+def 素朴な書誌結合(グラフ: CitationGraph, 論文) -> dict:
+    """参考文献 → 引用論文 の辞書を作り、同じ文献を引いた論文の組を数える"""
+    引用元 = defaultdict(list)
+    for p in 論文:
+        for r in グラフ.cites(p).tolist():
+            引用元[r].append(p)
+    件数 = Counter()
+    for 論文群 in 引用元.values():
+        for a, b in itertools.combinations(論文群, 2):
+            件数[a, b] += 1
+    return {組: n for 組, n in 件数.items() if n >= 閾値}
+
+def 部分グラフ(グラフ: CitationGraph, 論文数: int) -> CitationGraph:
+    """先頭 論文数 本だけをコーパス内とした同じグラフ（引用元も絞る）"""
+    終端 = int(グラフ.cites_indptr[論文数])
+    src = np.repeat(np.arange(論文数), np.diff(グラフ.cites_indptr[:論文数 + 1]))
+    dst = np.asarray(グラフ.cites_indices[:終端])
+    corpus = np.zeros(グラフ.num_nodes, dtype=bool)
+    corpus[:論文数] = True
+    return CitationGraph(グラフ.nodes, corpus, *build_csr(src, dst, グラフ.num_nodes),
+                         *build_csr(dst, src, グラフ.num_nodes))
+
+def main():
+    if not similarity.SCIPY_AVAILABLE:
+        print("❌ scipy がインストールされていません（pip install scipy）")
+        return
+    論文数 = int(sys.argv[1]) if len(sys.argv) > 1 else 既定論文数
+
+    開始 = time.perf_counter()
+    グラフ = 合成グラフ(論文数)
+    print(f"🕸️ 合成グラフ: 論文 {論文数:,} / ノード {グラフ.num_nodes:,} / 辺 {グラフ.num_edges:,} "
+          f"({time.perf_counter() - 開始:.1f}秒)")
+
+    開始 = time.perf_counter()
+    結合 = similarity.bibliographic_coupling(グラフ, 閾値, 上位k)
+    print(f"📚 書誌結合 A·Aᵀ: {len(結合):,}辺 ({time.perf_counter() - 開始:.2f}秒)")
+    開始 = time.perf_counter()
+    共引用 = similarity.co_citation(グラフ, 閾値, 上位k)
+    print(f"🔗 共引用   Aᵀ·A: {len(共引用):,}辺 ({time.perf_counter() - 開始:.2f}秒)")
+
+    # 素朴な実装との比較（上位k で切らない全組）
+    n = min(比較論文数, 論文数)
+    部分 = 部分グラフ(グラフ, n)
+    開始 = time.perf_counter()
+    期待 = 素朴な書誌結合(部分, range(n))
+    素朴時間 = time.perf_counter() - 開始
+    開始 = time.perf_counter()
+    辺 = similarity.undirected(similarity.bibliographic_coupling(部分, 閾値, None))
+    疎行列時間 = time.perf_counter() - 開始
+    結果 = {(a, b): int(w) for a, b, w in zip(辺.source.tolist(), 辺.target.tolist(), 辺.weight.tolist())}
+    print(f"\n⚖️ 先頭{n:,}論文の書誌結合（全 {len(期待):,}組）")
+    print(f"   辞書＋ループ: {素朴時間:.2f}秒 / 疎行列: {疎行列時間:.2f}秒 "
+          f"({素朴時間 / max(疎行列時間, 1e-9):.1f}倍)")
+    print(f"   結果の一致: {'✅' if 結果 == 期待 else '❌'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模擬APIサーバー.py - Crossref・doi.org・Unpaywall・ResearchGate の模擬サーバー（オフラインの負荷試験用）
+
+utils/mock_api.py のサーバーを合成コーパス（utils/synthetic_corpus.py）で起動し、
+取得処理をこのサーバーに向ける環境変数を表示する。遅延・エラー率・レート制限（429）・
+PDFの転送速度・途中切断を指定できるので、並列数やバックオフ・サーキットブレーカーの
+変更をネットワークなしで同じ条件で比べられる。Ctrl+C で終了し、リクエスト数を表示する。
+
+使い方:
+    python3 dev_tools/模擬APIサーバー.py [1k|10k|100k|件数] [オプション]
+      --port 8765          待ち受けるポート
+      --latency 0.05       応答の遅延（秒）
+      --jitter 0.02        遅延のばらつき（± 秒）
+      --error-rate 0.05    500/503 を返す割合
+      --rate-limit 50      サービスごとの毎秒の上限（超えると 429）
+      --pdf-rate 500000    PDFの転送速度（バイト/秒）
+      --truncate-rate 0.1  PDFを途中で切る割合
+      --oa-rate 0.3        Unpaywall で OA とする割合
+      --rg-rate 0.5        ResearchGate の論文ページに PDF リンクを載せる割合
+      --seed 0             合成コーパス・障害の乱数シード
+
+    別の端末で表示された export を実行してから、各スクリプトを普段どおり実行する:
+    python3 pdf_tools/download_open_access_pdfs_async.py
+    python3 pdf_tools/download_researchgate_pdfs.py
+"""
+
+import os
+import sys
+import json
+import time
+from typing import List
+
+# ルートディレクトリをパスに追加（utils パッケージ用）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.mock_api import DEFAULT_PORT, MockAPIServer, MockSettings
+from utils.synthetic_corpus import SyntheticCorpus, parse_size
+
+既定件数 = "1k"
+# (オプション, MockSettings の項目, 型)
+オプション一覧 = [
+    ("--latency", "latency", float),
+    ("--jitter", "jitter", float),
+    ("--error-rate", "error_rate", float),
+    ("--rate-limit", "rate_limit", int),
+    ("--pdf-rate", "pdf_rate", int),
+    ("--truncate-rate", "truncate_rate", float),
+    ("--oa-rate", "oa_rate", float),
+    ("--rg-rate", "rg_rate", float),
+    ("--seed", "seed", int),
+]
+
+def オプション値取り出し(引数: List[str], 名前: str):
+    """引数から「名前 値」を取り除いて値を返す（無ければ None）"""
+    if 名前 not in 引数:
+        return None
+    位置 = 引数.index(名前)
+    if 位置 + 1 >= len(引数):
+        print(f"❌ {名前} の値がありません")
+        sys.exit(2)
+    値 = 引数[位置 + 1]
+    del 引数[位置:位置 + 2]
+    return 値
+
+def main():
+    引数 = sys.argv[1:]
+    設定値 = {}
+    try:
+        for オプション, 項目, 型 in オプション一覧:
+            値 = オプション値取り出し(引数, オプション)
+            if 値 is not None:
+                設定値[項目] = 型(値)
+        ポート = int(オプション値取り出し(引数, "--port") or DEFAULT_PORT)
+    except ValueError as e:
+        print(f"❌ オプションの値が不正です: {e}")
+        sys.exit(2)
+    設定 = MockSettings(**設定値)
+    件数 = parse_size(引数[0] if 引数 else 既定件数)
+
+    サーバー = MockAPIServer(SyntheticCorpus(件数, 設定.seed), 設定, port=ポート)
+    print(f"🧪 模擬APIサーバー: {サーバー.base_url}（合成コーパス {件数:,}件）")
+    print(f"   遅延 {設定.latency}±{設定.jitter}秒 / エラー率 {設定.error_rate:.0%} / "
+          f"レート制限 {設定.rate_limit or '無制限'}/秒 / PDF {設定.pdf_rate or '無制限'}バイト/秒 / "
+          f"途中切断 {設定.truncate_rate:.0%} / OA {設定.oa_rate:.0%} / ResearchGate PDF {設定.rg_rate:.0%}")
+    print("\n取得処理をこのサーバーに向けるには:")
+    for 名前, 値 in サーバー.environment().items():
+        print(f"   export {名前}={値}")
+    print(f"   （DOI は {サーバー.corpus.doi(0)} の形式。統計は {サーバー.base_url}/__stats）")
+    print("\nCtrl+C で終了")
+
+    サーバー.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        サーバー.stop()
+    print("\n📊 リクエスト数:")
+    print(json.dumps(サーバー.stats(), ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
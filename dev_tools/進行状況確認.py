@@ -2,46 +2,88 @@
 # -*- coding: utf-8 -*-
 """
 進行状況確認.py - プロジェクト作業状況の確認と記録
+
+ファイル数・フォルダサイズ・段の完了状況（論文ごと）は、各段が更新する
+status_index.sqlite（utils/status_index.py）から読む。索引の後にフォルダが変わって
+いれば、そのフォルダだけ os.scandir で数え直す。--rescan で全フォルダを数え直す。
 """
 
 import os
+import sys
 import json
 import time
+import sqlite3
 from datetime import datetime
 
+# ルートディレクトリをパスに追加（utils パッケージ用）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.status_index import StatusIndex, TRACKED_FOLDERS, scan_folder
+
+# 処理段階 → 完了を記録する段（stage_report の段名。複数ならどれかが済んでいれば完了）
+段の対応 = {
+    "CSV結合": ("combine_scopus_csv",),
+    "DOI取得": ("scopus_doi_to_json",),
+    "Markdown生成": ("json2tag_ref_scopus_async",),
+    "キーワード分析": ("enhance_keywords",),
+    "Markdownキーワード更新": ("update_markdown_keywords",),
+    "YAML追加": ("add_yaml_metadata",),
+    "PDF取得": ("download_open_access_pdfs", "download_open_access_pdfs_fast_stdlib",
+                "download_open_access_pdfs_async", "download_researchgate_pdfs"),
+}
+# 論文ごとに記録しない段（CSV全体で1回）と、全論文が済まなくても完了とする段（OAでない論文はPDFが無い）
+段全体で判定 = {"CSV結合"}
+一部で完了 = {"PDF取得"}
+
 def ファイル数取得(ディレクトリ: str, 拡張子: str) -> int:
-    """指定ディレクトリ内の指定拡張子ファイル数を取得"""
-    if os.path.exists(ディレクトリ):
-        return len([f for f in os.listdir(ディレクトリ) if f.endswith(拡張子)])
-    return 0
+    """指定ディレクトリ以下の指定拡張子ファイル数を取得（索引を使わない全走査）"""
+    return sum(1 for 名前, _ in scan_folder(ディレクトリ) if 名前.endswith(拡張子))
 
 def フォルダサイズ取得(ディレクトリ: str) -> float:
-    """フォルダサイズをMB単位で取得"""
-    if not os.path.exists(ディレクトリ):
-        return 0.0
-    
-    総サイズ = 0
-    for dirpath, dirnames, filenames in os.walk(ディレクトリ):
-        for filename in filenames:
-            filepath = os.path.join(dirpath, filename)
-            if os.path.exists(filepath):
-                総サイズ += os.path.getsize(filepath)
-    
-    return 総サイズ / (1024 * 1024)  # MB変換
+    """フォルダサイズをMB単位で取得（索引を使わない全走査）"""
+    return sum(サイズ for _, サイズ in scan_folder(ディレクトリ)) / (1024 * 1024)  # MB変換
+
+def フォルダ状況取得(基準ディレクトリ: str, 再走査: bool = False) -> dict:
+    """フォルダごとの {files, bytes, source}（状況索引から。使えなければ全走査）"""
+    try:
+        with StatusIndex(基準ディレクトリ) as 索引:
+            return 索引.folder_stats(rescan=再走査)
+    except (OSError, sqlite3.Error) as e:
+        print(f"⚠️ 状況索引を使えないため全走査します: {e}")
+    状況 = {}
+    for フォルダ, 拡張子 in TRACKED_FOLDERS.items():
+        一覧 = list(scan_folder(os.path.join(基準ディレクトリ, フォルダ)))
+        状況[フォルダ] = {"files": sum(1 for 名前, _ in 一覧 if 名前.endswith(拡張子)),
+                          "bytes": sum(サイズ for _, サイズ in 一覧), "source": "scan"}
+    return 状況
 
-def 進行状況記録作成():
+def 段の記録取得(基準ディレクトリ: str) -> tuple:
+    """(段ごとの最後の実行記録, 処理段階ごとの済んだ論文数) （状況索引が無ければ空）
+
+    論文数は段の記録が1件も無ければ None（未実行か、状況索引の導入前に実行した）。
+    """
+    if not os.path.exists(os.path.join(基準ディレクトリ, "status_index.sqlite")):
+        return {}, {}
+    try:
+        with StatusIndex(基準ディレクトリ) as 索引:
+            return 索引.stages(), {段階: 索引.completed_count(*段) for 段階, 段 in 段の対応.items()
+                                   if 段階 not in 段全体で判定}
+    except (OSError, sqlite3.Error):
+        return {}, {}
+
+def 進行状況記録作成(再走査: bool = False):
     """現在の進行状況を記録"""
     基準ディレクトリ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     
-    # ファイル数確認
-    json数 = ファイル数取得(os.path.join(基準ディレクトリ, "JSON_folder"), '.json')
-    md数 = ファイル数取得(os.path.join(基準ディレクトリ, "md_folder"), '.md')
-    pdf数 = ファイル数取得(os.path.join(基準ディレクトリ, "PDF"), '.pdf')
+    # ファイル数・フォルダサイズ確認（状況索引から）
+    フォルダ状況 = フォルダ状況取得(基準ディレクトリ, 再走査)
+    段の記録, 済んだ論文数 = 段の記録取得(基準ディレクトリ)
+    json数 = フォルダ状況["JSON_folder"]["files"]
+    md数 = フォルダ状況["md_folder"]["files"]
+    pdf数 = フォルダ状況["PDF"]["files"]
     
-    # フォルダサイズ確認
-    jsonサイズ = フォルダサイズ取得(os.path.join(基準ディレクトリ, "JSON_folder"))
-    mdサイズ = フォルダサイズ取得(os.path.join(基準ディレクトリ, "md_folder"))
-    pdfサイズ = フォルダサイズ取得(os.path.join(基準ディレクトリ, "PDF"))
+    jsonサイズ = フォルダ状況["JSON_folder"]["bytes"] / (1024 * 1024)
+    mdサイズ = フォルダ状況["md_folder"]["bytes"] / (1024 * 1024)
+    pdfサイズ = フォルダ状況["PDF"]["bytes"] / (1024 * 1024)
     
     # キャッシュファイル確認
     キャッシュファイル = {
@@ -63,17 +105,35 @@ def 進行状況記録作成():
             "md_folder": round(mdサイズ, 2),
             "PDF": round(pdfサイズ, 2)
         },
+        "集計元": {フォルダ: 値["source"] for フォルダ, 値 in フォルダ状況.items()},
         "キャッシュファイル": キャッシュファイル,
         "処理段階": {
             "CSV結合": os.path.exists(os.path.join(基準ディレクトリ, "scopus_combined.csv")),
             "DOI取得": json数 > 0,
             "Markdown生成": md数 > 0,
-            "キーワード分析": "実行確認が必要",
-            "YAML追加": "実行確認が必要",
+            "キーワード分析": "記録なし",
+            "Markdownキーワード更新": "記録なし",
+            "YAML追加": "記録なし",
             "PDF取得": pdf数 > 0
-        }
+        },
+        "論文ごとの完了": {},
+        "段の実行記録": {}
     }
     
+    # 段の記録があればそれで判定（CSV結合は段の成否、他は済んだ論文数 / JSON数）
+    for 段階, 段 in 段の対応.items():
+        記録 = max((段の記録[名前] for 名前 in 段 if 名前 in 段の記録),
+                   key=lambda 記録: 記録["finished_at"], default=None)
+        if 記録:
+            進行状況["段の実行記録"][段階] = 記録
+        済 = 済んだ論文数.get(段階)
+        if 段階 in 段全体で判定:
+            if 記録:
+                進行状況["処理段階"][段階] = 記録["status"] == "ok"
+        elif 済 is not None:
+            進行状況["論文ごとの完了"][段階] = {"済": 済, "全体": json数}
+            進行状況["処理段階"][段階] = 済 > 0 if 段階 in 一部で完了 else 0 < json数 <= 済
+    
     return 進行状況
 
 def 作業再開ガイド表示():
@@ -142,7 +202,7 @@ def main():
     print("=" * 55)
     
     # 現在の進行状況を取得
-    進行状況 = 進行状況記録作成()
+    進行状況 = 進行状況記録作成(再走査="--rescan" in sys.argv[1:])
     
     # 進行状況表示
     print(f"🕒 記録日時: {進行状況['記録日時']}")
@@ -155,16 +215,21 @@ def main():
     print()
     print("💾 フォルダサイズ:")
     for フォルダ, サイズ in 進行状況['フォルダサイズ_MB'].items():
-        print(f"   {フォルダ}: {サイズ} MB")
+        集計元 = "（数え直し）" if 進行状況['集計元'].get(フォルダ) != "index" else ""
+        print(f"   {フォルダ}: {サイズ} MB{集計元}")
     
     print()
     print("⚙️ 処理段階:")
     for 段階, 状況 in 進行状況['処理段階'].items():
+        記録 = 進行状況['段の実行記録'].get(段階)
+        論文 = 進行状況['論文ごとの完了'].get(段階)
+        件数 = f" {論文['済']}/{論文['全体']}件" if 論文 else ""
+        詳細 = f" （最終実行 {記録['finished_at']}{'・失敗' if 記録['status'] != 'ok' else ''}）" if 記録 else ""
         if isinstance(状況, bool):
             マーク = "✅" if 状況 else "⏳"
-            print(f"   {マーク} {段階}")
+            print(f"   {マーク} {段階}{件数}{詳細}")
         else:
-            print(f"   ❓ {段階}: {状況}")
+            print(f"   ❓ {段階}: {状況}（状況索引の導入後に一度実行すると論文ごとに記録されます）")
     
     print()
     print("📦 キャッシュファイル:")
@@ -192,6 +257,10 @@ def main():
         print("   → まずは core/scopus解析.py でDOI取得から始めてください")
     elif 進行状況['ファイル数']['Markdown'] == 0:
         print("   → JSON生成済み。Markdown生成を実行してください")
+    elif 進行状況['処理段階']['キーワード分析'] is False:
+        print("   → Markdown生成済み。キーワード分析（enhance_keywords.py）を実行してください")
+    elif 進行状況['処理段階']['YAML追加'] is False:
+        print("   → キーワード分析済み。YAMLメタデータ追加（add_yaml_metadata.py）を実行してください")
     elif 進行状況['ファイル数']['PDF'] == 0:
         print("   → Markdown生成済み。PDF取得を実行してください")
     else:
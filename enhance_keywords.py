@@ -9,12 +9,19 @@ import json
 import re
 import unicodedata
 from collections import Counter
-from typing import Dict, List, Set
+from typing import Dict, Iterable, List, Optional, Set
 import nltk
 from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 
+from utils.search_index import SearchIndex, SEARCH_INDEX_DB
+from utils.pdf_text import FullTextSource, PDF_TEXT_CACHE_DB
+from utils.run_report import metrics, profile_option, stage_report
+from utils.output_writer import OutputWriter
+from utils.shard_layout import list_names, resolve
+from utils.status_index import changes
+
 def ensure_nltk_data():
     """必要なNLTKデータをダウンロード"""
     required_data = [
@@ -46,8 +53,8 @@ def extract_crossref_keywords(crossref_data: dict) -> List[str]:
     
     return [kw.lower().strip() for kw in keywords if kw]
 
-def extract_text_keywords(text: str, min_freq: int = 2, top_n: int = 20) -> List[str]:
-    """テキストからキーワードを抽出"""
+def keyword_tokens(text: str) -> List[str]:
+    """テキストをキーワード候補の単語（ストップワード除去・見出し語化済み）に分ける"""
     if not text:
         return []
     
@@ -70,9 +77,12 @@ def extract_text_keywords(text: str, min_freq: int = 2, top_n: int = 20) -> List
             token not in stop_words and
             not token.isdigit()):
             filtered_tokens.append(lemmatizer.lemmatize(token))
-    
+    return filtered_tokens
+
+def extract_text_keywords(text: str, min_freq: int = 2, top_n: int = 20) -> List[str]:
+    """テキストからキーワードを抽出"""
     # 頻度カウント
-    freq_counter = Counter(filtered_tokens)
+    freq_counter = Counter(keyword_tokens(text))
     
     # 最小頻度以上のキーワードを抽出
     keywords = [word for word, freq in freq_counter.most_common(top_n) 
@@ -80,6 +90,17 @@ def extract_text_keywords(text: str, min_freq: int = 2, top_n: int = 20) -> List
     
     return keywords
 
+def extract_fulltext_keywords(pages: Iterable[str], min_freq: int = 3, top_n: int = 10) -> List[str]:
+    """PDF本文（ページのテキストを順に返すもの）からキーワードを抽出
+    
+    ページごとに数えて足していくので、本文全体を一度にメモリに持たない。
+    """
+    freq_counter = Counter()
+    for page in pages:
+        freq_counter.update(keyword_tokens(page))
+    return [word for word, freq in freq_counter.most_common(top_n) 
+            if freq >= min_freq]
+
 def analyze_references_keywords(references: List[dict], doi_cache: Dict[str, str]) -> List[str]:
     """参考文献から共通キーワードを分析"""
     all_text = []
@@ -105,9 +126,14 @@ def analyze_references_keywords(references: List[dict], doi_cache: Dict[str, str
     combined_text = ' '.join(all_text)
     return extract_text_keywords(combined_text, min_freq=2, top_n=15)
 
-def enhance_json_with_keywords(json_path: str, doi_cache: Dict[str, str]) -> None:
-    """JSONファイルにキーワード情報を追加"""
-    with open(json_path, 'r', encoding='utf-8') as f:
+def enhance_json_with_keywords(json_path: str, doi_cache: Dict[str, str],
+                               fulltext: Optional[FullTextSource] = None,
+                               writer: Optional[OutputWriter] = None) -> None:
+    """JSONファイルにキーワード情報を追加（fulltext があれば抽出済みのPDF本文も使う）
+
+    writer を渡すと保存はその OutputWriter に任せる（まとめて fsync・別スレッドで書き込み）。
+    """
+    with metrics.timer("json_read"), open(json_path, 'r', encoding='utf-8') as f:
         data = json.load(f)
     
     # 既存のキーワード情報
@@ -120,35 +146,62 @@ def enhance_json_with_keywords(json_path: str, doi_cache: Dict[str, str]) -> Non
     
     # 2. タイトル・アブストラクトからキーワード抽出
     title_abstract = f"{data.get('title', '')} {data.get('abstract', '')}"
-    content_keywords = extract_text_keywords(title_abstract, min_freq=1, top_n=10)
+    with metrics.timer("nltk"):
+        content_keywords = extract_text_keywords(title_abstract, min_freq=1, top_n=10)
+    content_source = 'abstract'
+    
+    # 2'. 抽出済みのPDF本文があれば本文からもキーワード抽出
+    fulltext_key = fulltext.key(data.get('doi', ''), os.path.basename(json_path)) if fulltext else ""
+    if fulltext_key:
+        with metrics.timer("nltk_fulltext"):
+            fulltext_keywords = extract_fulltext_keywords(fulltext.pages(fulltext_key))
+        metrics.count("fulltext_papers")
+        content_keywords = list(dict.fromkeys(content_keywords + fulltext_keywords))
+        content_source = 'fulltext'
     
     # 3. 参考文献からキーワード推薦
     references = data.get('references', [])
-    ref_keywords = analyze_references_keywords(references, doi_cache)
+    with metrics.timer("nltk"):
+        ref_keywords = analyze_references_keywords(references, doi_cache)
     
     # 4. 全キーワードを統合
     all_keywords = {
         'crossref_keywords': crossref_keywords,
         'content_keywords': content_keywords,
+        'content_source': content_source,
         'reference_keywords': ref_keywords,
-        'combined_keywords': list(set(crossref_keywords + content_keywords + ref_keywords))
+        # 重複は順序を保って除く（毎回同じ並びになり、変化が無ければ書き直さずに済む）
+        'combined_keywords': list(dict.fromkeys(crossref_keywords + content_keywords + ref_keywords))
     }
     
+    # キーワードが前回と同じなら書き直さない（更新時刻が変わらず検索索引も読み直さない）
+    if data.get('keywords') == all_keywords:
+        metrics.count("keywords_unchanged")
+        changes.completed(json_path)
+        return
+    
     # JSONに追加
     data['keywords'] = all_keywords
     
-    # ファイル保存
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    # ファイル保存（一時ファイル経由で置き換える）
+    if writer is not None:
+        writer.write_json(json_path, data, completes=json_path)
+    else:
+        with OutputWriter() as own:
+            own.write_json(json_path, data, completes=json_path)
     
     print(f"Enhanced: {os.path.basename(json_path)} - {len(all_keywords['combined_keywords'])} keywords")
 
 def main():
     """メイン処理"""
+    base = os.path.dirname(os.path.abspath(__file__))
+    with stage_report("enhance_keywords", base):
+        run(base)
+
+def run(base: str) -> None:
     print("キーワード拡張処理開始...")
     ensure_nltk_data()
     
-    base = os.path.dirname(os.path.abspath(__file__))
     json_dir = os.path.join(base, "JSON_folder")
     
     # DOIキャッシュを読み込み
@@ -158,17 +211,36 @@ def main():
         with open(doi_cache_path, 'r', encoding='utf-8') as f:
             doi_cache = json.load(f)
     
-    # 全JSONファイルを処理
-    json_files = [f for f in os.listdir(json_dir) if f.endswith('.json')]
+    # 抽出済みのPDF本文（pdf_tools/extract_pdf_text.py を実行していれば）
+    fulltext = FullTextSource(os.path.join(base, "PDF"), os.path.join(base, PDF_TEXT_CACHE_DB))
+    if fulltext.ready:
+        print(f"PDF本文: {len(fulltext.ready)} 件を使用")
     
-    for json_file in json_files:
-        json_path = os.path.join(json_dir, json_file)
+    # 全JSONファイルを処理
+    json_files = list_names(json_dir, '.json')
+    metrics.count("papers", len(json_files))
+    
+    with fulltext:
+        # 索引の更新は書き終えたJSONを読むので、その前に書き込みを確定させる
+        with OutputWriter(background=True) as writer:
+            for json_file in json_files:
+                json_path = resolve(json_dir, json_file)
+                try:
+                    enhance_json_with_keywords(json_path, doi_cache, fulltext, writer)
+                except Exception as e:
+                    metrics.count("errors")
+                    print(f"Error processing {json_file}: {e}")
+        
+        print(f"キーワード拡張完了: {len(json_files)} ファイル処理")
+
+        # 全文検索の索引を増分更新（変更されたJSONと本文の変わった論文だけ読み直す）
         try:
-            enhance_json_with_keywords(json_path, doi_cache)
+            with metrics.timer("search_index"), SearchIndex(os.path.join(base, SEARCH_INDEX_DB)) as index:
+                stats = index.update(json_dir, fulltext=fulltext)
+            print(f"検索索引更新: {stats['docs']} 件（読み込み {stats['parsed']} 件）")
         except Exception as e:
-            print(f"Error processing {json_file}: {e}")
-    
-    print(f"キーワード拡張完了: {len(json_files)} ファイル処理")
+            print(f"検索索引更新エラー: {e}")
 
 if __name__ == "__main__":
+    profile_option()
     main()
\ No newline at end of file
@@ -6,7 +6,6 @@ json2tag_ref_scopus_async.py ― 改良版 (DOI解決500件ずつ分割処理)
 
 import os, json, re, unicodedata, asyncio
 import time, random, hashlib, logging, traceback
-from urllib.parse import quote_plus
 from typing import Dict, List, Set
 
 # オプションライブラリのインポート（エラーハンドリング付き）
@@ -29,7 +28,6 @@ except ImportError:
 
 try:
     import nltk
-    from nltk.tokenize import word_tokenize
     NLTK_AVAILABLE = True
     print("OK NLTK available - advanced keyword analysis")
 except ImportError:
@@ -38,6 +36,13 @@ except ImportError:
 
 from tqdm import tqdm
 
+from utils.keyword_tokenizer import extract_title_keywords as tokenize_title
+from utils.pos_cache import POSTagCache, POS_CACHE_DB, TAG_BATCH
+from utils.endpoints import crossref_work_url, doi_url
+from utils.run_report import metrics, profile_option, stage_report
+from utils.output_writer import OutputWriter, write_atomic
+from utils.shard_layout import count, list_names, resolve
+
 # ---------- パラメータ ----------
 SAFE_ASC = "-_.() " + "".join(chr(c) for c in range(0x30, 0x7B) if chr(c).isalnum())
 STOP_POS = {"IN", "CC", "DT", "PRP", "WDT", "WP", "WP$", "VBZ", "VBP", "VBD", "VB", "VBG", "VBN", "RB"}
@@ -62,30 +67,8 @@ def safe_fn(title: str, maxlen: int = 120) -> str:
     return s or hashlib.md5(title.encode()).hexdigest()[:maxlen]
 
 def extract_title_keywords(title: str) -> List[str]:
-    """タイトルから包括的にキーワードを抽出"""
-    if not title:
-        return []
-    
-    keywords = []
-    
-    # 基本的な単語抽出（3文字以上）
-    basic_words = re.findall(r'\b[a-zA-Z]{3,}\b', title.lower())
-    filtered_words = [w for w in basic_words if w not in STOP_TOK]
-    keywords.extend(filtered_words)
-    
-    # 技術用語・複合語の抽出（ハイフンやアンダースコアで繋がった語）
-    compound_words = re.findall(r'\b[a-zA-Z]+[_-][a-zA-Z]+(?:[_-][a-zA-Z]+)*\b', title.lower())
-    keywords.extend(compound_words)
-    
-    # 数値を含む専門用語（例：5G, CO2, IEEE802など）
-    tech_terms = re.findall(r'\b[a-zA-Z]*\d+[a-zA-Z]*\b', title)
-    keywords.extend([t.lower() for t in tech_terms if len(t) >= 2])
-    
-    # 大文字の略語（例：AI, ML, IoTなど）
-    acronyms = re.findall(r'\b[A-Z]{2,}\b', title)
-    keywords.extend([a.lower() for a in acronyms])
-    
-    return list(set(keywords))  # 重複削除
+    """タイトルから包括的にキーワードを抽出（英単語・複合語・専門用語・略語を1パスで）"""
+    return tokenize_title(title, STOP_TOK)
 
 def create_hashtag_content(tags: List[str]) -> str:
     """ハッシュタグコンテンツを生成"""
@@ -132,19 +115,25 @@ async def fetch_doi_titles_async(dois: Set[str]) -> Dict[str, str]:
         async def fetch_one(doi):
             try:
                 async with sem, async_timeout.timeout(TIMEOUT):
-                    r = await sess.get(f"https://api.crossref.org/works/{quote_plus(doi)}", headers=HEAD_X)
+                    metrics.count("requests")
+                    with metrics.timer("http"):
+                        r = await sess.get(crossref_work_url(doi), headers=HEAD_X)
+                        if r.status == 200:
+                            js = await r.json()
                     if r.status == 200:
-                        js = await r.json()
                         out[doi] = js["message"].get("title", ["Unknown"])[0]
                         return
             except:
                 pass
             try:
                 async with sem, async_timeout.timeout(TIMEOUT):
-                    r = await sess.get(f"https://doi.org/{quote_plus(doi)}",
-                                       headers={"Accept": "application/vnd.citationstyles.csl+json", **HEAD_X})
+                    metrics.count("requests")
+                    with metrics.timer("http"):
+                        r = await sess.get(doi_url(doi, quote=True),
+                                           headers={"Accept": "application/vnd.citationstyles.csl+json", **HEAD_X})
+                        if r.status == 200:
+                            js = await r.json()
                     if r.status == 200:
-                        js = await r.json()
                         out[doi] = js.get("title", "Unknown")
             except:
                 pass
@@ -165,10 +154,11 @@ def fetch_doi_titles_sync(dois: Set[str]) -> Dict[str, str]:
         try:
             # Crossref API試行
             req = urllib.request.Request(
-                f"https://api.crossref.org/works/{quote_plus(doi)}", 
+                crossref_work_url(doi), 
                 headers=HEAD_X
             )
-            with urllib.request.urlopen(req, timeout=TIMEOUT) as response:
+            metrics.count("requests")
+            with metrics.timer("http"), urllib.request.urlopen(req, timeout=TIMEOUT) as response:
                 if response.status == 200:
                     js = json.loads(response.read().decode())
                     out[doi] = js["message"].get("title", ["Unknown"])[0]
@@ -180,10 +170,11 @@ def fetch_doi_titles_sync(dois: Set[str]) -> Dict[str, str]:
         try:
             # DOI.org API試行
             req = urllib.request.Request(
-                f"https://doi.org/{quote_plus(doi)}",
+                doi_url(doi, quote=True),
                 headers={"Accept": "application/vnd.citationstyles.csl+json", **HEAD_X}
             )
-            with urllib.request.urlopen(req, timeout=TIMEOUT) as response:
+            metrics.count("requests")
+            with metrics.timer("http"), urllib.request.urlopen(req, timeout=TIMEOUT) as response:
                 if response.status == 200:
                     js = json.loads(response.read().decode())
                     out[doi] = js.get("title", "Unknown")
@@ -204,17 +195,22 @@ def fetch_doi_titles(dois: Set[str]) -> Dict[str, str]:
 
 # ---------- メイン ----------
 def main():
+    base = os.path.dirname(os.path.abspath(__file__))
+    with stage_report("json2tag_ref_scopus_async", base):
+        run(base)
+
+def run(base: str) -> None:
     try:
         print("🚀 json2tag_ref_scopus_async.py の実行開始")
         print("=" * 60)
         
         ensure_nltk()
-        base = os.path.dirname(os.path.abspath(__file__))
         jdir = os.path.join(base, "JSON_folder")
         mdir = os.path.join(base, "md_folder")
         os.makedirs(mdir, exist_ok=True)
 
-        files = [f for f in os.listdir(jdir) if f.endswith(".json")]
+        files = list_names(jdir, ".json")
+        metrics.count("papers", len(files))
         print(f"📁 {len(files)} 件の JSON ファイルを処理します")
         
         if not files:
@@ -224,7 +220,7 @@ def main():
         ref_dois: Set[str] = set()
         for jf in files:
             try:
-                with open(os.path.join(jdir, jf), encoding="utf-8") as fp:
+                with metrics.timer("json_read"), open(resolve(jdir, jf), encoding="utf-8") as fp:
                     data = json.load(fp)
                 for r in data.get("references", []):
                     if isinstance(r, dict) and r.get("DOI"):
@@ -238,6 +234,8 @@ def main():
                 doi2title.update(json.load(fp))
 
         need = list(ref_dois - doi2title.keys())
+        metrics.count("referenced_dois", len(ref_dois))
+        metrics.count("doi_cache_hits", len(ref_dois) - len(need))
         print(f"解決必要 DOI 数: {len(need)}")
 
         total_chunks = ((len(need)-1)//CHUNK_SIZE)+1 if need else 0
@@ -246,7 +244,8 @@ def main():
         for i, chunk in enumerate(chunk_list(need, CHUNK_SIZE), 1):
             print(f"\n🔍 === DOI チャンク {i}/{total_chunks} 処理中 ({len(chunk)}件) ===")
             chunk_start = time.time()
-            res = fetch_doi_titles(set(chunk))
+            with metrics.timer("doi_resolve"):
+                res = fetch_doi_titles(set(chunk))
             chunk_time = time.time() - chunk_start
             
             # 成功/失敗統計
@@ -254,8 +253,9 @@ def main():
             失敗数 = len(res) - 成功数
             
             doi2title.update(res)
-            with open("doi_title_cache.json", "w", encoding="utf-8") as fp:
-                json.dump(doi2title, fp, ensure_ascii=False, indent=0)
+            metrics.count("dois_resolved", 成功数)
+            with metrics.timer("doi_cache_write"):
+                write_atomic("doi_title_cache.json", json.dumps(doi2title, ensure_ascii=False, indent=0))
             
             print(f"✅ チャンク{i}完了: 成功{成功数}件, 失敗{失敗数}件, 時間{chunk_time:.1f}秒")
             print(f"📁 累計解決DOI数: {len([v for v in doi2title.values() if v != 'Unknown'])}")
@@ -264,73 +264,94 @@ def main():
                 print(f"⏳ 次のチャンクまで1秒待機...")
                 time.sleep(1)
 
+        # 品詞タグはタイトルのハッシュで永続メモ化（再生成時は変わったタイトルだけタグ付け）
+        pos_cache = POSTagCache(os.path.join(base, POS_CACHE_DB)) if NLTK_AVAILABLE else None
         bar = tqdm(total=len(files), desc="MD 生成")
-        for jf in files:
-            try:
-                with open(os.path.join(jdir, jf), encoding="utf-8") as f:
-                    data = json.load(f)
-                ttl = data.get("title", "")
-                year = data.get("year", "Unknown")
-                if not ttl:
-                    bar.update(1)
-                    continue
+        with OutputWriter(background=True) as writer:
+            for file_chunk in chunk_list(files, TAG_BATCH):
+                # チャンク内のJSONを読み込み、タイトルをまとめて pos_tag_sents にかける
+                loaded = []
+                for jf in file_chunk:
+                    try:
+                        with metrics.timer("json_read"), open(resolve(jdir, jf), encoding="utf-8") as f:
+                            data = json.load(f)
+                    except Exception as e:
+                        logging.error(f"MD_ERR\t{jf}\t{e}")
+                        bar.update(1)
+                        continue
+                    # 論文以外（配列など）はタグ付けに回さない（1件で全チャンクが落ちないように）
+                    if isinstance(data, dict):
+                        loaded.append((jf, data))
+                    else:
+                        logging.error(f"MD_ERR\t{jf}\tJSON の最上位がオブジェクトではありません")
+                        bar.update(1)
+                with metrics.timer("nltk"):
+                    pos_tags = pos_cache.tag(data.get("title", "") for _, data in loaded) if pos_cache else {}
 
-                # キーワード抽出（包括的な分析）
-                title_keywords = extract_title_keywords(ttl)
-                
-                # NLTK利用可能時は高度な品詞分析も追加
-                nltk_keywords = []
-                if NLTK_AVAILABLE:
+                for jf, data in loaded:
                     try:
-                        nltk_keywords = [t.lower() for t, p in nltk.pos_tag(word_tokenize(ttl))
-                                        if p not in STOP_POS and t.lower() not in STOP_TOK]
-                    except:
-                        pass  # NLTKエラー時は基本分析のみ使用
+                        ttl = data.get("title", "")
+                        year = data.get("year", "Unknown")
+                        if not ttl:
+                            bar.update(1)
+                            continue
+
+                        # キーワード抽出（包括的な分析）
+                        title_keywords = extract_title_keywords(ttl)
+                
+                        # NLTK利用可能時は高度な品詞分析も追加
+                        # （タグはチャンク単位で一括付与済み・タグ付けに失敗したタイトルは空）
+                        nltk_keywords = [t.lower() for t, p in pos_tags.get(ttl, [])
+                                         if p not in STOP_POS and t.lower() not in STOP_TOK]
                 
-                # キーワードを統合（重複削除）
-                all_keywords = list(set(title_keywords + nltk_keywords))
-                all_keywords.append(f"year_{year}")
+                        # キーワードを統合（重複削除）
+                        all_keywords = list(set(title_keywords + nltk_keywords))
+                        all_keywords.append(f"year_{year}")
                 
-                # タグ用とハッシュタグ用でキーワードを分ける
-                tags = all_keywords[:15]  # ファイル名用は最初の15個まで
-                hashtag_keywords = all_keywords  # ハッシュタグは全て使用
-                md_p = os.path.join(mdir, safe_fn(ttl) + ".md")
-                with open(md_p, "w", encoding="utf-8") as fp:
-                    # タイトル行（ファイル名用の基本タグ）
-                    fp.write("#" + " #".join(tags))
-                    
-                    # キーワードセクション（ハッシュタグ形式）
-                    hashtag_content = create_hashtag_content(hashtag_keywords)
-                    if hashtag_content:
-                        fp.write("\n\n## Keywords\n\n" + hashtag_content)
-                    
-                    # Abstract セクション
-                    fp.write("\n\n## Abstract\n\n" + data.get("abstract", ""))
-
-                refs = data.get("references", [])
-                with open(md_p, "a", encoding="utf-8") as fp:
-                    if refs:
-                        fp.write("\n\n## 参考文献\n\n")
-                        for r in refs:
-                            if isinstance(r, dict):
-                                art = r.get("article-title")
-                                doi = r.get("DOI", "").lower()
-                                if doi:
-                                    title = art or doi2title.get(doi, "Unknown")
-                                    safe_title = safe_fn(title)
-                                    fp.write(f"- DOI: {doi}\n  - [[{safe_title}]]\n")
+                        # タグ用とハッシュタグ用でキーワードを分ける
+                        tags = all_keywords[:15]  # ファイル名用は最初の15個まで
+                        hashtag_keywords = all_keywords  # ハッシュタグは全て使用
+                        md_p = resolve(mdir, safe_fn(ttl) + ".md", create=True)
+                        # タイトル行（ファイル名用の基本タグ）
+                        parts = ["#" + " #".join(tags)]
+
+                        # キーワードセクション（ハッシュタグ形式）
+                        hashtag_content = create_hashtag_content(hashtag_keywords)
+                        if hashtag_content:
+                            parts.append("\n\n## Keywords\n\n" + hashtag_content)
+
+                        # Abstract セクション
+                        parts.append("\n\n## Abstract\n\n" + data.get("abstract", ""))
+
+                        refs = data.get("references", [])
+                        if refs:
+                            parts.append("\n\n## 参考文献\n\n")
+                            for r in refs:
+                                if isinstance(r, dict):
+                                    art = r.get("article-title")
+                                    doi = r.get("DOI", "").lower()
+                                    if doi:
+                                        title = art or doi2title.get(doi, "Unknown")
+                                        safe_title = safe_fn(title)
+                                        parts.append(f"- DOI: {doi}\n  - [[{safe_title}]]\n")
+                                    else:
+                                        safe_title = safe_fn(art or "Unknown")
+                                        parts.append(f"- [[{safe_title}]]\n")
                                 else:
-                                    safe_title = safe_fn(art or "Unknown")
-                                    fp.write(f"- [[{safe_title}]]\n")
-                            else:
-                                safe_title = safe_fn(r)
-                                fp.write(f"- [[{safe_title}]]\n")
-                bar.update(1)
-            except Exception as e:
-                logging.error(f"MD_ERR\t{jf}\t{e}")
-                bar.update(1)
+                                    safe_title = safe_fn(r)
+                                    parts.append(f"- [[{safe_title}]]\n")
+                        # 書き込みは別スレッドで（次のチャンクの品詞タグ付けと重ねる）
+                        writer.write_text(md_p, "".join(parts), completes=jf)
+                        bar.update(1)
+                    except Exception as e:
+                        logging.error(f"MD_ERR\t{jf}\t{e}")
+                        bar.update(1)
 
         bar.close()
+        if pos_cache:
+            print(f"🏷️ 品詞タグ: キャッシュ {pos_cache.hits}件 / 新規タグ付け {pos_cache.tagged}件")
+            metrics.count("pos_cache_hits", pos_cache.hits)
+            pos_cache.close()
         
         # 最終統計
         print("\n" + "=" * 60)
@@ -341,7 +362,7 @@ def main():
         print(f"📁 出力ディレクトリ: {mdir}")
         
         # 生成されたMarkdownファイル数確認
-        md_count = len([f for f in os.listdir(mdir) if f.endswith('.md')])
+        md_count = count(mdir, '.md')
         print(f"📝 生成Markdownファイル: {md_count}件")
         print("✅ Markdown生成完了")
         
@@ -350,4 +371,5 @@ def main():
         print(f"❌ 致命的エラーが発生しました。error_log.txt を確認してください。")
 
 if __name__ == "__main__":
+    profile_option()
     main()
\ No newline at end of file
@@ -10,11 +10,17 @@ main.py  ―  Scopus パイプライン一括実行ドライバ（改良版）
     4. add_abst_scopus.py      : DOI / Abstract を Markdown 追記
 
 実行後、成果物は md_folder/ に出力されます。
+--profile[=cpu|mem|all] を付けると各段を cProfile / tracemalloc の下で実行し、
+profiles/ に結果を書きます。
 """
 
 import os
 import subprocess
 import sys
+import time
+
+from utils.run_report import (RUN_REPORT, finish_run, profile_lines, profile_option, record_stage,
+                               start_run, summarize)
 
 SCRIPTS = [
     "combine_scopus_csv.py",
@@ -24,6 +30,7 @@ SCRIPTS = [
 ]
 
 BASE = os.path.dirname(os.path.abspath(__file__))
+profile_option()  # --profile は環境変数で各段に引き継ぐ
 
 print("\n=== Setting up virtual environment and installing required packages ===")
 try:
@@ -41,12 +48,20 @@ except subprocess.CalledProcessError as e:
     print(f"Command: {e.cmd}")
     sys.exit(1)
 
+# 各段の計測は run_report.json にまとめる（utils/run_report.py）
+start_run(BASE)
+run_start = time.time()
 for script in SCRIPTS:
     path = os.path.join(BASE, script)
     print(f"\n=== running {script} ===")
+    stage_start = time.time()
     try:
         subprocess.run([os.path.join(BASE, ".venv", "bin", "python"), path], check=True)
+        record_stage(BASE, os.path.splitext(script)[0],
+                     {"wall_seconds": round(time.time() - stage_start, 3), "returncode": 0})
     except subprocess.CalledProcessError as e:
+        record_stage(BASE, os.path.splitext(script)[0],
+                     {"wall_seconds": round(time.time() - stage_start, 3), "returncode": e.returncode})
         print(f"❌ {script} failed with exit code {e.returncode}")
         print(f"Command: {e.cmd}")
         break
@@ -56,4 +71,11 @@ for script in SCRIPTS:
     else:
         print(f"✅ {script} completed successfully.")
 
+report = finish_run(BASE, time.time() - run_start)
+print(f"\n=== stage timings ({RUN_REPORT}) ===")
+for line in summarize(report):
+    print(f"   {line}")
+for line in profile_lines(report):
+    print(f"   {line}")
+
 print("\n✔️  Pipeline finished. Check the md_folder for results (if no error occurred).")
\ No newline at end of file
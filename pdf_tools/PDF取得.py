@@ -10,7 +10,7 @@ import sys
 import time
 
 def pdf取得実行(スクリプト名: str, 説明: str) -> bool:
-    """PDF取得スクリプトを実行"""
+    """PDF取得スクリプトを実行（スクリプト名の後ろに空白区切りで引数を付けられる）"""
     print(f"\n🚀 {説明}を開始...")
     print(f"📄 実行ファイル: {スクリプト名}")
     
@@ -18,8 +18,9 @@ def pdf取得実行(スクリプト名: str, 説明: str) -> bool:
         開始時間 = time.time()
         基準ディレクトリ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         
-        スクリプトパス = os.path.join(基準ディレクトリ, "pdf_tools", スクリプト名)
-        結果 = subprocess.run([sys.executable, スクリプトパス], 
+        ファイル名, *引数 = スクリプト名.split()
+        スクリプトパス = os.path.join(基準ディレクトリ, "pdf_tools", ファイル名)
+        結果 = subprocess.run([sys.executable, スクリプトパス, *引数], 
                               capture_output=True, 
                               text=True, 
                               cwd=基準ディレクトリ)
@@ -70,6 +71,8 @@ def main():
         ("download_open_access_pdfs_fast_stdlib.py", "オープンアクセス論文（高速版）"),
         ("download_researchgate_pdfs.py", "ResearchGate検索取得"),
         ("download_open_access_pdfs.py", "オープンアクセス論文（標準版）"),
+        ("download_open_access_pdfs_async.py", "オープンアクセス論文（非同期版・aiohttp必須）"),
+        ("download_researchgate_pdfs.py --async", "ResearchGate検索取得（非同期版・aiohttp必須）"),
     ]
     
     print("\n📋 利用可能なPDF取得方法:")
@@ -80,7 +83,7 @@ def main():
     print("   q. 終了")
     
     while True:
-        選択 = input("\n選択してください (0-3, q): ").strip().lower()
+        選択 = input(f"\n選択してください (0-{len(pdf取得方法)}, q): ").strip().lower()
         
         if 選択 == 'q':
             print("👋 終了します。")
@@ -123,7 +126,7 @@ def main():
             break
         
         else:
-            print("❌ 無効な選択です。0-3またはqを入力してください。")
+            print(f"❌ 無効な選択です。0-{len(pdf取得方法)}またはqを入力してください。")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
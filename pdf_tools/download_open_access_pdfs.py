@@ -5,6 +5,7 @@ download_open_access_pdfs.py - オープンアクセス論文のPDF自動取得
 """
 
 import os
+import sys
 import json
 import re
 import unicodedata
@@ -12,6 +13,26 @@ import requests
 import time
 from urllib.parse import urljoin, urlparse
 from pathlib import Path
+from typing import Optional
+
+# ルートディレクトリをパスに追加（utils パッケージ用）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.oa_cache import (
+    OALocationCache, OA_CACHE_DB, Candidate, SOURCE_CROSSREF, OUTCOME_TRANSIENT, UNPAYWALL_ANSWERS,
+    discovery_candidates, is_transient_status
+)
+from utils.circuit_breaker import HostCircuitBreaker
+from utils.pdf_candidates import CandidateRanker, SharedDownloads, MAX_CANDIDATES
+from utils.pdf_download import PDFStreamValidator, NotPDFError, is_valid_pdf
+from utils.pdf_store import PDFStore
+from utils import endpoints
+from utils.run_report import metrics, profile_option, stage_report
+from utils.status_index import changes
+from utils.output_writer import write_atomic
+from utils.shard_layout import list_names, resolve
+
+# ホスト単位のサーキットブレーカー（高速版・非同期版と同じく、拒否し始めたホストはしばらく飛ばす）
+host_breaker = HostCircuitBreaker()
 
 def safe_filename(title: str, maxlen: int = 120) -> str:
     """安全なファイル名生成"""
@@ -58,68 +79,84 @@ def check_open_access_status(crossref_data: dict) -> dict:
     
     return oa_info
 
-def find_pdf_urls_from_doi(doi: str) -> list:
-    """DOIから複数のソースでPDF URLを探索"""
-    pdf_urls = []
-    
-    # 1. Unpaywall API (オープンアクセス情報)
-    try:
-        unpaywall_url = f"https://api.unpaywall.org/v2/{doi}?email=research@example.com"
-        response = requests.get(unpaywall_url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            if data.get('is_oa', False):
-                # ベストOA locationを取得
-                best_oa = data.get('best_oa_location')
-                if best_oa and best_oa.get('url_for_pdf'):
-                    pdf_urls.append(best_oa['url_for_pdf'])
-                
-                # その他のOA locationsも取得
-                oa_locations = data.get('oa_locations', [])
-                for location in oa_locations:
-                    if location.get('url_for_pdf'):
-                        pdf_urls.append(location['url_for_pdf'])
-        time.sleep(0.1)  # API制限対応
-    except Exception as e:
-        print(f"Unpaywall API error for {doi}: {e}")
-    
-    # 2. DOI直接アクセスでPDFリダイレクトをチェック
-    try:
-        doi_url = f"https://doi.org/{doi}"
-        response = requests.head(doi_url, allow_redirects=True, timeout=10)
-        final_url = response.url
+def find_pdf_urls_from_doi(doi: str, oa_cache: OALocationCache = None) -> list:
+    """DOIから複数のソースでPDF URLを探索（出所付きの候補を返す・oa_cache があれば既知の論文は再照会しない）"""
+    cached = oa_cache.get_discovery(doi) if oa_cache else None
+    if cached is not None:
+        unpaywall, final_url = cached
+    else:
+        unpaywall, final_url = None, None
+        unpaywall_url = endpoints.unpaywall_url(doi)
+        doi_url = endpoints.doi_url(doi)
+        # ブレーカーで問い合わせを省いた・通信障害で答えが無かった場合は結果をキャッシュしない
+        skipped = failed = False
         
-        # IEEE, arXiv, PLoS ONE等のオープンアクセスパターン
-        if any(pattern in final_url.lower() for pattern in 
-               ['arxiv.org', 'plos', 'biomedcentral', 'frontiersin', 'mdpi.com', 'ieee']):
-            # PDF URLパターンを試行
-            pdf_patterns = [
-                final_url.replace('/abs/', '/pdf/') + '.pdf',  # arXiv
-                final_url + '.pdf',  # 一般的なパターン
-                final_url.replace('/article/', '/pdf/'),  # 学術誌パターン
-            ]
-            pdf_urls.extend(pdf_patterns)
-        time.sleep(0.1)
-    except Exception as e:
-        print(f"DOI redirect check error for {doi}: {e}")
+        # 1. Unpaywall API (オープンアクセス情報)
+        if host_breaker.allow(unpaywall_url):
+            try:
+                metrics.count("requests")
+                with metrics.timer("http_unpaywall"):
+                    response = requests.get(unpaywall_url, timeout=10)
+                host_breaker.record_status(unpaywall_url, response.status_code)
+                failed = response.status_code not in UNPAYWALL_ANSWERS  # 429 / 5xx は答えではない
+                if response.status_code == 200:
+                    unpaywall = response.json()
+                time.sleep(0.1)  # API制限対応
+            except Exception as e:
+                failed = True
+                host_breaker.record_failure(unpaywall_url)
+                print(f"Unpaywall API error for {doi}: {e}")
+        else:
+            skipped = True
+        
+        # 2. DOI直接アクセスでPDFリダイレクトをチェック
+        if host_breaker.allow(doi_url):
+            try:
+                metrics.count("requests")
+                with metrics.timer("http_doi"):
+                    response = requests.head(doi_url, allow_redirects=True, timeout=10)
+                final_url = response.url
+                # リダイレクト先（出版社）の応答はそのホストに記録する
+                host_breaker.record_status(final_url, response.status_code)
+                time.sleep(0.1)
+            except Exception as e:
+                failed = True
+                host_breaker.record_failure(doi_url)
+                print(f"DOI redirect check error for {doi}: {e}")
+        else:
+            skipped = True
+        
+        # Unpaywall が答え（200 / 404）を返し、doi.org にも届いた場合だけ保存（通信障害の結果は残さない）
+        if oa_cache and not skipped and not failed:
+            oa_cache.put_discovery(doi, unpaywall, final_url)
     
-    return list(set(pdf_urls))  # 重複削除
+    return discovery_candidates(unpaywall, final_url)
 
-def download_pdf(url: str, filepath: str) -> bool:
-    """PDF ファイルをダウンロード"""
+def download_pdf(url: str, filepath: str, oa_cache: OALocationCache = None,
+                 doi: str = '', source: str = '') -> Optional[str]:
+    """PDF ファイルをダウンロード（受信しながら %PDF- / %%EOF を検査・成功時は SHA-256 を返す）"""
+    if not host_breaker.allow(url):
+        print(f"Host paused by circuit breaker: {url[:80]}")
+        return None
+    validator = PDFStreamValidator()
+    outcome = 'failed'
     try:
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
         
         response = requests.get(url, headers=headers, timeout=30, stream=True)
+        host_breaker.record_status(response.url, response.status_code)
+        if is_transient_status(response.status_code):
+            outcome = OUTCOME_TRANSIENT  # 429 / 5xx は失敗として残さず次回もう一度試す
         response.raise_for_status()
         
         # Content-Type をチェック
         content_type = response.headers.get('content-type', '').lower()
         if 'pdf' not in content_type and 'application/octet-stream' not in content_type:
             print(f"Not a PDF file: {content_type}")
-            return False
+            outcome = 'not_pdf'
+            return None
         
         # ファイルサイズチェック（最小100KB、最大50MB）
         content_length = response.headers.get('content-length')
@@ -127,31 +164,43 @@ def download_pdf(url: str, filepath: str) -> bool:
             size_mb = int(content_length) / (1024 * 1024)
             if size_mb < 0.1 or size_mb > 50:
                 print(f"File size out of range: {size_mb:.1f}MB")
-                return False
+                outcome = 'size_out_of_range'
+                return None
         
-        # ダウンロード実行
+        # ダウンロード実行（PDFでない本文はその場で打ち切る）
         with open(filepath, 'wb') as f:
             for chunk in response.iter_content(chunk_size=8192):
+                validator.feed(chunk)
                 f.write(chunk)
+        validator.finish()
         
         # ダウンロード後のファイルサイズチェック
         file_size = os.path.getsize(filepath)
         if file_size < 100 * 1024:  # 100KB未満
             os.remove(filepath)
             print(f"Downloaded file too small: {file_size} bytes")
-            return False
+            outcome = 'too_small'
+            return None
         
         print(f"Successfully downloaded: {os.path.basename(filepath)} ({file_size/1024:.0f}KB)")
-        return True
+        outcome = 'ok'
+        return validator.hexdigest()
         
     except Exception as e:
         print(f"Download failed from {url}: {e}")
+        if isinstance(e, NotPDFError):
+            outcome = e.reason
+        elif isinstance(e, (requests.ConnectionError, requests.Timeout)):
+            host_breaker.record_failure(url)
         if os.path.exists(filepath):
             os.remove(filepath)
-        return False
+        return None
+    finally:
+        if oa_cache:
+            oa_cache.record_outcome(doi, url, outcome, source=source)
 
-def add_pdf_embed_to_markdown(md_path: str, pdf_filename: str) -> None:
-    """MarkdownファイルにPDF埋め込みを追加"""
+def add_pdf_embed_to_markdown(md_path: str, pdf_filename: str, label: str = None) -> None:
+    """MarkdownファイルにPDF埋め込みを追加（label はリンクの表示名）"""
     try:
         with open(md_path, 'r', encoding='utf-8') as f:
             content = f.read()
@@ -165,7 +214,7 @@ def add_pdf_embed_to_markdown(md_path: str, pdf_filename: str) -> None:
 
 ## PDF
 
-**フルテキストPDF**: [📄 {pdf_filename}](PDF/{pdf_filename})
+**フルテキストPDF**: [📄 {label or pdf_filename}](PDF/{pdf_filename})
 
 <embed src="PDF/{pdf_filename}" type="application/pdf" width="100%" height="600px" />
 
@@ -177,17 +226,19 @@ def add_pdf_embed_to_markdown(md_path: str, pdf_filename: str) -> None:
         else:
             content += pdf_section
         
-        # ファイル保存
-        with open(md_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        # ファイル保存（一時ファイル経由で置き換える）
+        write_atomic(md_path, content)
+        changes.written(md_path)
         
         print(f"Added PDF embed to: {os.path.basename(md_path)}")
         
     except Exception as e:
         print(f"Error adding PDF embed to {md_path}: {e}")
 
-def process_json_for_pdf(json_path: str, pdf_dir: str, md_dir: str) -> None:
-    """JSONファイルを処理してPDFダウンロードを試行"""
+def process_json_for_pdf(json_path: str, pdf_dir: str, md_dir: str,
+                         oa_cache: OALocationCache = None, store: PDFStore = None,
+                         ranker: CandidateRanker = None, shared: SharedDownloads = None) -> bool:
+    """JSONファイルを処理してPDFダウンロードを試行（新規取得できたら True）"""
     try:
         with open(json_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
@@ -197,18 +248,29 @@ def process_json_for_pdf(json_path: str, pdf_dir: str, md_dir: str) -> None:
         
         if not doi:
             print(f"No DOI found for: {title}")
-            return
+            return False
         
         # 安全なファイル名生成
         safe_title = safe_filename(title)
         pdf_filename = f"{safe_title}.pdf"
-        pdf_path = os.path.join(pdf_dir, pdf_filename)
-        md_path = os.path.join(md_dir, f"{safe_title}.md")
+        legacy_path = os.path.join(pdf_dir, pdf_filename)
+        md_path = resolve(md_dir, f"{safe_title}.md")
         
-        # 既にPDFが存在する場合はスキップ
-        if os.path.exists(pdf_path):
-            print(f"PDF already exists: {pdf_filename}")
-            return
+        # 既にPDFが存在する場合はスキップ（DOIで manifest を引く）
+        store = store or PDFStore(pdf_dir)
+        stored = store.lookup(doi)
+        if stored:
+            print(f"PDF already exists: {stored}")
+            changes.completed(json_path)
+            return False
+        # 旧形式（タイトル名）のPDF。以前に保存された偽PDFは削除して再取得
+        if os.path.exists(legacy_path):
+            if is_valid_pdf(legacy_path):
+                print(f"PDF already exists: {pdf_filename}")
+                changes.completed(json_path)
+                return False
+            os.remove(legacy_path)
+            changes.removed(legacy_path)
         
         print(f"Processing: {title}")
         print(f"DOI: {doi}")
@@ -217,35 +279,54 @@ def process_json_for_pdf(json_path: str, pdf_dir: str, md_dir: str) -> None:
         crossref_data = data.get('_crossref_full', {})
         oa_info = check_open_access_status(crossref_data)
         
-        # PDF URL を探索
-        pdf_urls = find_pdf_urls_from_doi(doi)
-        pdf_urls.extend(oa_info['pdf_urls'])
+        # PDF URL を探索し、出所・ホスト別の成功率で順位付け（最近失敗したURLは除外）
+        ranker = ranker or CandidateRanker(oa_cache)
+        shared = shared or SharedDownloads()
+        candidates = find_pdf_urls_from_doi(doi, oa_cache)
+        candidates += [Candidate(u, SOURCE_CROSSREF) for u in oa_info['pdf_urls']]
+        failed = oa_cache.known_failures(doi) if oa_cache else set()
+        candidates = ranker.rank(candidates, exclude=failed)[:MAX_CANDIDATES]
         
-        if not pdf_urls:
+        if not candidates:
             print(f"No PDF URLs found for: {title}")
-            return
+            return False
         
-        # PDF ダウンロードを試行
-        download_success = False
-        for url in pdf_urls[:3]:  # 最大3つのURLを試行
-            print(f"Trying to download from: {url}")
-            if download_pdf(url, pdf_path):
-                download_success = True
+        # PDF ダウンロードを試行（前の論文で試したURLは結果を再利用）
+        stored = None
+        for candidate in candidates:
+            print(f"Trying to download from ({candidate.source}): {candidate.url}")
+            pdf_path = store.staging_path(candidate.url)
+            
+            def fetch(candidate=candidate, pdf_path=pdf_path):
+                digest = download_pdf(candidate.url, pdf_path, oa_cache, doi, candidate.source)
+                ranker.record(candidate, digest is not None)
+                return digest
+            
+            digest = shared.run(candidate.url, fetch)
+            if digest:
+                stored = store.add(doi, title, pdf_path, digest, candidate.url)
+                changes.completed(json_path)
                 break
             time.sleep(1)  # 試行間隔
         
         # ダウンロード成功時、MarkdownにPDF埋め込みを追加
-        if download_success and os.path.exists(md_path):
-            add_pdf_embed_to_markdown(md_path, pdf_filename)
+        if stored and os.path.exists(md_path):
+            add_pdf_embed_to_markdown(md_path, stored, label=pdf_filename)
+        return stored is not None
         
     except Exception as e:
         print(f"Error processing {json_path}: {e}")
+        return False
 
 def main():
     """メイン処理"""
+    base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with stage_report("download_open_access_pdfs", base):
+        run(base)
+
+def run(base: str) -> None:
     print("オープンアクセスPDF自動取得開始...")
     
-    base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     json_dir = os.path.join(base, "JSON_folder")
     md_dir = os.path.join(base, "md_folder")
     pdf_dir = os.path.join(base, "PDF")
@@ -254,28 +335,38 @@ def main():
     os.makedirs(pdf_dir, exist_ok=True)
     
     # 全JSONファイルを処理
-    json_files = [f for f in os.listdir(json_dir) if f.endswith('.json')]
+    json_files = list_names(json_dir, '.json')
+    metrics.count("papers", len(json_files))
+    
+    # OA所在情報キャッシュ（既知の論文は Unpaywall / doi.org を再照会しない）
+    oa_cache = OALocationCache(os.path.join(base, OA_CACHE_DB))
+    store = PDFStore(pdf_dir)
+    ranker = CandidateRanker(oa_cache)
+    shared = SharedDownloads()
     
     success_count = 0
     for json_file in json_files:
-        json_path = os.path.join(json_dir, json_file)
+        json_path = resolve(json_dir, json_file)
         try:
-            initial_pdf_count = len([f for f in os.listdir(pdf_dir) if f.endswith('.pdf')])
-            process_json_for_pdf(json_path, pdf_dir, md_dir)
-            final_pdf_count = len([f for f in os.listdir(pdf_dir) if f.endswith('.pdf')])
-            
-            if final_pdf_count > initial_pdf_count:
+            if process_json_for_pdf(json_path, pdf_dir, md_dir, oa_cache, store, ranker, shared):
                 success_count += 1
                 
         except Exception as e:
             print(f"Error with {json_file}: {e}")
         
         time.sleep(2)  # API制限とサーバー負荷軽減
+    oa_cache.close()
+    store.close()
+    metrics.count("pdfs_downloaded", success_count)
     
     total_pdfs = len([f for f in os.listdir(pdf_dir) if f.endswith('.pdf')])
     print(f"\nPDF取得完了: {success_count}件の新規PDF取得")
     print(f"総PDF数: {total_pdfs}件")
     print(f"PDFフォルダ: {pdf_dir}")
+    paused_hosts = host_breaker.summary()
+    if paused_hosts:
+        print(f"サーキットブレーカー作動ホスト: {', '.join(paused_hosts)}")
 
 if __name__ == "__main__":
+    profile_option()
     main()
\ No newline at end of file
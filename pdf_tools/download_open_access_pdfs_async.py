@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+download_open_access_pdfs_async.py - オープンアクセス論文PDF非同期取得（aiohttp版）
+
+スレッド＋sleep の代わりに asyncio で全論文を同時に進める。
+- 全体の同時接続数は GLOBAL_CONNECTIONS で制限
+- ホストごとにセマフォと最小リクエスト間隔を持ち、Unpaywall・arXiv・MDPI
+  などの各サイトに個別の上限を設定（特定の出版社に負荷を集中させない）
+- PDF本文はチャンク単位で .part へストリーミング保存し、途中で切れた
+  場合は次回 Range リクエストで続きから取得
+- 候補URLは成功率順に上位2件を同時に試し、先に成功した時点で残りを打ち切る
+  （同じURLはバッチ内の論文間で1回だけ取得）
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import aiohttp
+    ASYNC_AVAILABLE = True
+except ImportError:
+    ASYNC_AVAILABLE = False
+
+from download_open_access_pdfs_fast_stdlib import (
+    safe_filename, check_open_access_status, add_pdf_embed_to_markdown, tqdm, TQDM_AVAILABLE
+)
+from utils.pdf_download import PartialDownload, PDFStreamValidator, NotPDFError, is_valid_pdf
+from utils.oa_cache import (
+    OALocationCache, OA_CACHE_DB, Candidate, SOURCE_CROSSREF, OUTCOME_TRANSIENT, UNPAYWALL_ANSWERS,
+    discovery_candidates, is_transient_status
+)
+from utils.pdf_candidates import CandidateRanker, MAX_CANDIDATES, PARALLEL_CANDIDATES
+from utils.circuit_breaker import HostCircuitBreaker
+from utils.pdf_store import PDFStore
+from utils import endpoints
+from utils.run_report import metrics, profile_option, stage_report
+from utils.status_index import changes
+from utils.shard_layout import list_names, resolve
+
+# ---------- パラメータ ----------
+GLOBAL_CONNECTIONS = 32      # 全ホスト合計の同時接続数
+PAPER_WORKERS = 64           # 同時に処理する論文数
+DEFAULT_HOST_LIMIT = 2       # 個別設定のないホストの同時接続数
+# ホスト別の (同時接続数, 最小リクエスト間隔[秒])
+# （Unpaywall・doi.org は接続先を差し替えた場合もそのホストに同じ上限を掛ける）
+HOST_LIMITS: Dict[str, Tuple[int, float]] = {
+    urlparse(endpoints.UNPAYWALL_API).hostname or "api.unpaywall.org": (8, 0.0),
+    urlparse(endpoints.DOI_RESOLVER).hostname or "doi.org": (8, 0.0),
+    "arxiv.org": (1, 1.0),
+    "export.arxiv.org": (1, 3.0),
+    "mdpi.com": (2, 0.5),
+    "mdpi-res.com": (2, 0.5),
+    "ieeexplore.ieee.org": (2, 0.5),
+}
+CHUNK_SIZE = 64 * 1024
+MIN_PDF_BYTES = 100 * 1024
+MAX_PDF_BYTES = 50 * 1024 * 1024
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# 全タスクで共有するホスト単位のサーキットブレーカー
+host_breaker = HostCircuitBreaker()
+
+def record_host_error(url: str, exc: BaseException) -> None:
+    """aiohttp の接続エラー（OSError 以外も含む）をブレーカーに記録"""
+    if isinstance(exc, aiohttp.ClientConnectionError):
+        host_breaker.record_failure(url)
+    else:
+        host_breaker.record_exception(url, exc)
+
+class HostLimiter:
+    """ホストごとの同時接続数と最小リクエスト間隔を管理"""
+
+    def __init__(self, limits: Dict[str, Tuple[int, float]], default_limit: int):
+        self.limits = limits
+        self.default_limit = default_limit
+        self._sems: Dict[str, asyncio.Semaphore] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._last: Dict[str, float] = {}
+
+    @staticmethod
+    def host_key(url: str) -> str:
+        host = (urlparse(url).hostname or "").lower()
+        return host[4:] if host.startswith("www.") else host
+
+    def _limit(self, host: str) -> Tuple[int, float]:
+        if host in self.limits:
+            return self.limits[host]
+        # サブドメイン（例: res.mdpi.com）は親ドメインの設定を使う
+        for name, limit in self.limits.items():
+            if host.endswith("." + name):
+                return limit
+        return self.default_limit, 0.0
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        host = self.host_key(url)
+        concurrency, interval = self._limit(host)
+        sem = self._sems.setdefault(host, asyncio.Semaphore(concurrency))
+        wait_start = time.perf_counter()
+        async with sem:
+            if interval:
+                lock = self._locks.setdefault(host, asyncio.Lock())
+                async with lock:
+                    wait = self._last.get(host, 0.0) + interval - time.monotonic()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    self._last[host] = time.monotonic()
+            # 接続数・間隔の上限による待ち時間（並列数調整の目安）
+            metrics.add_time("host_wait", time.perf_counter() - wait_start)
+            yield
+
+async def find_pdf_urls_async(session, limiter: HostLimiter, doi: str,
+                              oa_cache: OALocationCache = None) -> List[Candidate]:
+    """DOIから複数のソースでPDF URLを探索（非同期版・出所付きの候補を返す・oa_cache があれば再照会しない）"""
+    cached = oa_cache.get_discovery(doi) if oa_cache else None
+    if cached is not None:
+        metrics.count("oa_cache_hits")
+        unpaywall, redirected_url = cached
+    else:
+        unpaywall, redirected_url = None, None
+        unpaywall_url = endpoints.unpaywall_url(doi)
+        doi_url = endpoints.doi_url(doi)
+        # ブレーカーで問い合わせを省いた・通信障害で答えが無かった場合は結果をキャッシュしない
+        skipped = failed = False
+
+        # 1. Unpaywall API (オープンアクセス情報)
+        if host_breaker.allow(unpaywall_url):
+            try:
+                async with limiter.slot(unpaywall_url):
+                    metrics.count("requests")
+                    with metrics.timer("http_unpaywall"):
+                        async with session.get(unpaywall_url, timeout=aiohttp.ClientTimeout(total=10)) as r:
+                            host_breaker.record_status(unpaywall_url, r.status)
+                            failed = r.status not in UNPAYWALL_ANSWERS  # 429 / 5xx は答えではない
+                            if r.status == 200:
+                                unpaywall = await r.json(content_type=None)
+            except Exception as e:
+                failed = True
+                record_host_error(unpaywall_url, e)
+                if not TQDM_AVAILABLE:
+                    print(f"Unpaywall API error for {doi}: {e}")
+        else:
+            skipped = True
+
+        # 2. DOI直接アクセスでPDFリダイレクトをチェック
+        if host_breaker.allow(doi_url):
+            try:
+                async with limiter.slot(doi_url):
+                    metrics.count("requests")
+                    with metrics.timer("http_doi"):
+                        async with session.head(doi_url, allow_redirects=True,
+                                                timeout=aiohttp.ClientTimeout(total=10)) as r:
+                            redirected_url = str(r.url)
+                            # リダイレクト先（出版社）の応答はそのホストに記録する
+                            host_breaker.record_status(redirected_url, r.status)
+            except Exception as e:
+                failed = True
+                record_host_error(doi_url, e)
+                if not TQDM_AVAILABLE:
+                    print(f"DOI redirect check error for {doi}: {e}")
+        else:
+            skipped = True
+
+        # Unpaywall が答え（200 / 404）を返し、doi.org にも届いた場合だけ保存（通信障害の結果は残さない）
+        if oa_cache and not skipped and not failed:
+            oa_cache.put_discovery(doi, unpaywall, redirected_url)
+
+    return discovery_candidates(unpaywall, redirected_url)
+
+async def download_pdf_async(session, limiter: HostLimiter, url: str, filepath: str,
+                             oa_cache: OALocationCache = None, doi: str = '',
+                             source: str = '') -> Optional[str]:
+    """PDFをストリーミングでダウンロード（.part 経由・Range による中断再開対応）
+
+    受信しながら %PDF- / %%EOF を検査し、PDFでない本文はその場で打ち切る。
+    oa_cache があれば結果をURLごとに記録する。成功時は SHA-256（16進）を返す。
+    """
+    if not host_breaker.allow(url):
+        if not TQDM_AVAILABLE:
+            print(f"⏸️  Host paused by circuit breaker: {url[:80]}")
+        return None
+    part = PartialDownload(filepath, url)
+    validator = PDFStreamValidator()
+    outcome = 'failed'
+    download_start = None
+    try:
+        async with limiter.slot(url):
+            metrics.count("requests")
+            download_start = time.perf_counter()
+            async with session.get(url, headers=part.request_headers(),
+                                   timeout=aiohttp.ClientTimeout(total=None, sock_read=30)) as r:
+                host_breaker.record_status(str(r.url), r.status)
+                if r.status == 416:
+                    part.discard()
+                    return None
+                if r.status not in (200, 206):
+                    if is_transient_status(r.status):
+                        outcome = OUTCOME_TRANSIENT  # 次回もう一度試す
+                    return None
+                content_type = r.headers.get('content-type', '').lower()
+                if 'pdf' not in content_type and 'application/octet-stream' not in content_type:
+                    outcome = 'not_pdf'
+                    return None
+                mode = part.begin(r.status, r.headers)
+                if mode == 'ab':
+                    validator.resume_from(part.part_path)
+                if part.total is not None and not (MIN_PDF_BYTES <= part.total <= MAX_PDF_BYTES):
+                    part.discard()
+                    outcome = 'size_out_of_range'
+                    return None
+
+                size = part.offset
+                with open(part.part_path, mode) as f:
+                    async for chunk in r.content.iter_chunked(CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > MAX_PDF_BYTES:
+                            part.meta['accept_ranges'] = False  # 上限超過は再開しない
+                            outcome = 'size_out_of_range'
+                            raise ValueError(f"file exceeds {MAX_PDF_BYTES} bytes")
+                        validator.feed(chunk)
+                        f.write(chunk)
+                        metrics.count("bytes_downloaded", len(chunk))
+
+        if part.total and size != part.total:
+            raise IOError(f"incomplete download: {size}/{part.total} bytes")
+        validator.finish()
+        if size < MIN_PDF_BYTES:
+            part.discard()
+            outcome = 'too_small'
+            return None
+        part.finalize()
+        outcome = 'ok'
+        if not TQDM_AVAILABLE:
+            print(f"✅ Successfully downloaded: {os.path.basename(filepath)} ({size/1024:.0f}KB)")
+        return validator.hexdigest()
+
+    except asyncio.CancelledError:
+        # 他の候補が先に成功して打ち切られた（失敗としては記録しない）
+        outcome = None
+        if not part.resumable:
+            part.discard()
+        raise
+    except NotPDFError as e:
+        if not TQDM_AVAILABLE:
+            print(f"❌ Rejected {url}: {e}")
+        part.discard()
+        outcome = e.reason
+        return None
+    except Exception as e:
+        record_host_error(url, e)
+        if not TQDM_AVAILABLE:
+            print(f"❌ Download failed from {url}: {e}")
+        if not part.resumable:
+            part.discard()
+        elif outcome == 'failed':
+            outcome = 'partial'  # 次回 Range で続きから取得
+        return None
+    finally:
+        if download_start is not None:
+            metrics.add_time("http_pdf", time.perf_counter() - download_start)
+        if outcome:
+            metrics.count(f"pdf_{outcome}")
+        if oa_cache and outcome:
+            oa_cache.record_outcome(doi, url, outcome, source=source)
+
+class CandidateScheduler:
+    """候補URLを成功率順に並行試行し、バッチ全体で同じURLの取得を共有する
+
+    1論文につき上位 PARALLEL_CANDIDATES 件を同時に試し、どれかが成功した
+    時点で残りを打ち切る。同じURLを複数の論文が待っている間は打ち切らない。
+    """
+
+    def __init__(self, session, limiter: HostLimiter, store: PDFStore,
+                 ranker: CandidateRanker, oa_cache: OALocationCache = None):
+        self.session = session
+        self.limiter = limiter
+        self.store = store
+        self.ranker = ranker
+        self.oa_cache = oa_cache
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._interest: Dict[str, int] = {}
+
+    async def _download(self, doi: str, candidate: Candidate) -> Optional[str]:
+        digest = await download_pdf_async(self.session, self.limiter, candidate.url,
+                                          self.store.staging_path(candidate.url),
+                                          self.oa_cache, doi, candidate.source)
+        self.ranker.record(candidate, digest is not None)
+        return digest
+
+    def _acquire(self, doi: str, candidate: Candidate) -> asyncio.Task:
+        """URLの取得タスクを取得（無ければ開始）し、待ち手を1つ増やす"""
+        task = self._tasks.get(candidate.url)
+        if task is None:
+            task = self._tasks[candidate.url] = asyncio.ensure_future(self._download(doi, candidate))
+        self._interest[candidate.url] = self._interest.get(candidate.url, 0) + 1
+        return task
+
+    def _release(self, url: str, task: asyncio.Task) -> None:
+        """待ち手を1つ減らし、誰も待っていない未完了タスクは打ち切る"""
+        self._interest[url] -= 1
+        if self._interest[url] == 0 and not task.done():
+            task.cancel()
+            del self._tasks[url]  # 打ち切ったURLは後の論文が改めて試せるようにする
+
+    async def fetch(self, doi: str, candidates: List[Candidate]) -> Optional[Tuple[str, Candidate]]:
+        """候補を順に並行試行し、最初に成功した (SHA-256, 候補) を返す"""
+        queue = list(candidates)
+        pending: Dict[asyncio.Task, Candidate] = {}
+        try:
+            while queue or pending:
+                while queue and len(pending) < PARALLEL_CANDIDATES:
+                    candidate = queue.pop(0)
+                    pending[self._acquire(doi, candidate)] = candidate
+                done, _ = await asyncio.wait(list(pending), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    candidate = pending.pop(task)
+                    self._release(candidate.url, task)
+                    digest = None if task.cancelled() else task.result()
+                    if digest:
+                        return digest, candidate
+            return None
+        finally:
+            for task, candidate in pending.items():
+                self._release(candidate.url, task)
+
+async def process_json_for_pdf_async(scheduler: CandidateScheduler, json_path: str,
+                                     pdf_dir: str, md_dir: str) -> Tuple[bool, str]:
+    """JSONファイルを処理してPDFダウンロードを試行（非同期版・保存先は PDFStore）"""
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        title = data.get('title', 'untitled')
+        doi = data.get('doi', '')
+        if not doi:
+            return False, f"No DOI found for: {title}"
+
+        safe_title = safe_filename(title)
+        pdf_filename = f"{safe_title}.pdf"
+        legacy_path = os.path.join(pdf_dir, pdf_filename)
+        md_path = resolve(md_dir, f"{safe_title}.md")
+
+        store, oa_cache = scheduler.store, scheduler.oa_cache
+        stored = store.lookup(doi)
+        if stored:
+            changes.completed(json_path)
+            return False, f"PDF already exists: {stored}"
+        # 旧形式（タイトル名）のPDF。以前に保存された偽PDF（HTML等）は削除して再取得
+        if os.path.exists(legacy_path):
+            if is_valid_pdf(legacy_path):
+                changes.completed(json_path)
+                return False, f"PDF already exists: {pdf_filename}"
+            os.remove(legacy_path)
+            changes.removed(legacy_path)
+
+        # 候補URLを出所・ホスト別の成功率で順位付け（最近失敗したURLは除外）
+        oa_info = check_open_access_status(data.get('_crossref_full', {}))
+        candidates = await find_pdf_urls_async(scheduler.session, scheduler.limiter, doi, oa_cache)
+        candidates += [Candidate(u, SOURCE_CROSSREF) for u in oa_info['pdf_urls']]
+        failed = oa_cache.known_failures(doi) if oa_cache else set()
+        candidates = scheduler.ranker.rank(candidates, exclude=failed)[:MAX_CANDIDATES]
+
+        if not candidates:
+            return False, f"No PDF URLs found for: {title}"
+
+        result = await scheduler.fetch(doi, candidates)
+        if result:
+            digest, candidate = result
+            stored = store.add(doi, title, store.staging_path(candidate.url), digest, candidate.url)
+            changes.completed(json_path)
+            if os.path.exists(md_path):
+                add_pdf_embed_to_markdown(md_path, stored, label=pdf_filename)
+            return True, f"Successfully downloaded: {pdf_filename} -> {stored}"
+
+        return False, f"All download attempts failed for: {title}"
+
+    except Exception as e:
+        return False, f"Error processing {json_path}: {e}"
+
+async def run_downloads(json_paths: List[str], pdf_dir: str, md_dir: str,
+                        oa_cache: OALocationCache = None, store: PDFStore = None) -> int:
+    """キューと固定数のワーカーで全論文を処理し、成功件数を返す"""
+    limiter = HostLimiter(HOST_LIMITS, DEFAULT_HOST_LIMIT)
+    store = store or PDFStore(pdf_dir)
+    ranker = CandidateRanker(oa_cache)
+    connector = aiohttp.TCPConnector(limit=GLOBAL_CONNECTIONS, ttl_dns_cache=300)
+    queue: asyncio.Queue = asyncio.Queue()
+    for path in json_paths:
+        queue.put_nowait(path)
+
+    success_count = 0
+    progress_bar = tqdm(total=len(json_paths), desc="📥 PDF取得中", unit="件") if TQDM_AVAILABLE else None
+
+    async with aiohttp.ClientSession(connector=connector, headers={'User-Agent': USER_AGENT}) as session:
+        scheduler = CandidateScheduler(session, limiter, store, ranker, oa_cache)
+
+        async def worker():
+            nonlocal success_count
+            while True:
+                try:
+                    path = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                success, message = await process_json_for_pdf_async(scheduler, path, pdf_dir, md_dir)
+                if success:
+                    success_count += 1
+                if progress_bar is not None:
+                    progress_bar.set_postfix({"成功": f"{success_count}件"})
+                    progress_bar.update(1)
+                else:
+                    print(f"{'✅' if success else 'ℹ️ '} {message}")
+
+        await asyncio.gather(*(worker() for _ in range(min(PAPER_WORKERS, len(json_paths)) or 1)))
+
+    if progress_bar is not None:
+        progress_bar.close()
+    return success_count
+
+def main():
+    """メイン処理（asyncio版）"""
+    if not ASYNC_AVAILABLE:
+        print("❌ aiohttp がインストールされていません: pip install aiohttp")
+        print("💡 標準ライブラリ版: python3 pdf_tools/download_open_access_pdfs_fast_stdlib.py")
+        sys.exit(1)
+
+    base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with stage_report("download_open_access_pdfs_async", base):
+        run(base)
+
+def run(base: str) -> None:
+    print("🚀 オープンアクセスPDF非同期取得開始（aiohttp版）...")
+    start_time = time.time()
+
+    json_dir = os.path.join(base, "JSON_folder")
+    md_dir = os.path.join(base, "md_folder")
+    pdf_dir = os.path.join(base, "PDF")
+    os.makedirs(pdf_dir, exist_ok=True)
+
+    json_files = list_names(json_dir, '.json')
+    json_paths = [resolve(json_dir, f) for f in json_files]
+    metrics.count("papers", len(json_files))
+    print(f"📊 Processing {len(json_files)} files "
+          f"(同時接続 {GLOBAL_CONNECTIONS} / ホスト別上限 既定{DEFAULT_HOST_LIMIT})")
+
+    # OA所在情報キャッシュ（既知の論文は Unpaywall / doi.org を再照会しない）
+    oa_cache = OALocationCache(os.path.join(base, OA_CACHE_DB))
+    store = PDFStore(pdf_dir)
+    try:
+        success_count = asyncio.run(run_downloads(json_paths, pdf_dir, md_dir, oa_cache, store))
+    finally:
+        oa_cache.close()
+        store.close()
+    metrics.count("pdfs_downloaded", success_count)
+
+    total_pdfs = len([f for f in os.listdir(pdf_dir) if f.endswith('.pdf')])
+    elapsed = time.time() - start_time
+
+    print("\n🎉 PDF取得完了!")
+    print(f"📈 処理時間: {elapsed:.1f}秒")
+    print(f"📊 新規PDF取得: {success_count}件")
+    print(f"📁 総PDF数: {total_pdfs}件")
+    print(f"📂 PDFフォルダ: {pdf_dir}")
+    if elapsed > 0:
+        print(f"⚡ 処理速度: {len(json_files)/elapsed:.1f} files/sec")
+    paused_hosts = host_breaker.summary()
+    if paused_hosts:
+        print(f"⏸️  サーキットブレーカー作動ホスト: {', '.join(paused_hosts)}")
+
+if __name__ == "__main__":
+    profile_option()
+    main()
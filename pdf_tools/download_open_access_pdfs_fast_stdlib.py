@@ -5,6 +5,7 @@ download_open_access_pdfs_fast_stdlib.py - オープンアクセス論文PDF高
 """
 
 import os
+import sys
 import json
 import re
 import unicodedata
@@ -16,7 +17,23 @@ from urllib.parse import urljoin, urlparse
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
+
+# ルートディレクトリをパスに追加（utils パッケージ用）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.pdf_download import PartialDownload, PDFStreamValidator, NotPDFError, is_valid_pdf
+from utils.oa_cache import (
+    OALocationCache, OA_CACHE_DB, Candidate, SOURCE_CROSSREF, OUTCOME_TRANSIENT, UNPAYWALL_ANSWERS,
+    discovery_candidates, is_transient_status
+)
+from utils.pdf_candidates import CandidateRanker, SharedDownloads, MAX_CANDIDATES
+from utils.pdf_store import PDFStore
+from utils import endpoints
+from utils.run_report import metrics, profile_option, stage_report
+from utils.status_index import changes
+from utils.output_writer import write_atomic
+from utils.shard_layout import list_names, resolve
+from utils.circuit_breaker import HostCircuitBreaker
 try:
     from tqdm import tqdm
     TQDM_AVAILABLE = True
@@ -25,6 +42,9 @@ except ImportError:
     def tqdm(iterable, **kwargs):
         return iterable
 
+# 全ワーカースレッドで共有するホスト単位のサーキットブレーカー
+host_breaker = HostCircuitBreaker()
+
 def safe_filename(title: str, maxlen: int = 120) -> str:
     """安全なファイル名生成"""
     SAFE_CHARS = "-_.() " + "".join(chr(c) for c in range(0x30, 0x7B) if chr(c).isalnum())
@@ -34,8 +54,11 @@ def safe_filename(title: str, maxlen: int = 120) -> str:
     s = re.sub(r"_+", "_", s)[:maxlen]
     return s or "untitled"
 
-def make_request(url: str, method: str = 'GET', timeout: int = 10) -> Tuple[bool, Dict, bytes]:
-    """HTTP リクエスト実行"""
+def make_request(url: str, method: str = 'GET', timeout: int = 10) -> Tuple[int, Dict, bytes]:
+    """HTTP リクエスト実行（ブレーカーの allow() は呼び出し側で済ませておく）
+
+    (ステータス, ヘッダー, 本文) を返す。接続できなかった場合のステータスは 0。
+    """
     try:
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
@@ -46,14 +69,17 @@ def make_request(url: str, method: str = 'GET', timeout: int = 10) -> Tuple[bool
             req.get_method = lambda: 'HEAD'
         
         with urllib.request.urlopen(req, timeout=timeout) as response:
+            host_breaker.record_status(url, response.status)
             response_headers = dict(response.headers)
             content = response.read() if method == 'GET' else b''
-            return True, response_headers, content
+            return response.status, response_headers, content
             
     except Exception as e:
+        host_breaker.record_exception(url, e)
         if not TQDM_AVAILABLE:  # tqdmがない場合のみエラーログ
             print(f"❌ Request failed for {url}: {e}")
-        return False, {}, b''
+        status = getattr(e, 'code', None)
+        return (status if isinstance(status, int) else 0), {}, b''
 
 def check_open_access_status(crossref_data: dict) -> dict:
     """Crossrefデータからオープンアクセス情報を確認"""
@@ -91,114 +117,178 @@ def check_open_access_status(crossref_data: dict) -> dict:
     
     return oa_info
 
-def find_pdf_urls_from_doi(doi: str) -> List[str]:
-    """DOIから複数のソースでPDF URLを探索"""
-    pdf_urls = []
-    
-    # 1. Unpaywall API (オープンアクセス情報)
-    try:
-        unpaywall_url = f"https://api.unpaywall.org/v2/{doi}?email=research@example.com"
-        success, headers, content = make_request(unpaywall_url, timeout=5)
-        if success and content:
-            data = json.loads(content.decode('utf-8'))
-            if data.get('is_oa', False):
-                # ベストOA locationを取得
-                best_oa = data.get('best_oa_location')
-                if best_oa and best_oa.get('url_for_pdf'):
-                    pdf_urls.append(best_oa['url_for_pdf'])
-                
-                # その他のOA locationsも取得
-                oa_locations = data.get('oa_locations', [])
-                for location in oa_locations:
-                    if location.get('url_for_pdf'):
-                        pdf_urls.append(location['url_for_pdf'])
-        time.sleep(0.1)  # API制限対応
-    except Exception as e:
-        print(f"Unpaywall API error for {doi}: {e}")
-    
-    # 2. DOI直接アクセスでPDFリダイレクトをチェック
-    try:
-        doi_url = f"https://doi.org/{doi}"
-        
-        # urllib でリダイレクトを追跡
-        redirected_url = doi_url
-        try:
-            req = urllib.request.Request(doi_url, headers={
-                'User-Agent': 'Mozilla/5.0 (Academic Research Bot 1.0)'
-            })
-            with urllib.request.urlopen(req, timeout=5) as response:
-                redirected_url = response.url
-        except:
-            pass
-        
-        # IEEE, arXiv, PLoS ONE等のオープンアクセスパターン
-        if any(pattern in redirected_url.lower() for pattern in 
-               ['arxiv.org', 'plos', 'biomedcentral', 'frontiersin', 'mdpi.com', 'ieee']):
-            # PDF URLパターンを試行
-            pdf_patterns = [
-                redirected_url.replace('/abs/', '/pdf/') + '.pdf',  # arXiv
-                redirected_url + '.pdf',  # 一般的なパターン
-                redirected_url.replace('/article/', '/pdf/'),  # 学術誌パターン
-            ]
-            pdf_urls.extend(pdf_patterns)
-        time.sleep(0.1)
-    except Exception as e:
-        print(f"DOI redirect check error for {doi}: {e}")
+def find_pdf_urls_from_doi(doi: str, oa_cache: OALocationCache = None) -> List[Candidate]:
+    """DOIから複数のソースでPDF URLを探索（出所付きの候補を返す）
+
+    oa_cache があれば既知の論文は Unpaywall / doi.org に問い合わせない。
+    """
+    cached = oa_cache.get_discovery(doi) if oa_cache else None
+    if cached is not None:
+        metrics.count("oa_cache_hits")
+        unpaywall, redirected_url = cached
+    else:
+        unpaywall, redirected_url = None, None
+        unpaywall_url = endpoints.unpaywall_url(doi)
+        doi_url = endpoints.doi_url(doi)
+        # ブレーカーで問い合わせを省いた・通信障害で答えが無かった場合は結果をキャッシュしない
+        skipped = failed = False
+        
+        # 1. Unpaywall API (オープンアクセス情報)
+        if host_breaker.allow(unpaywall_url):
+            try:
+                metrics.count("requests")
+                with metrics.timer("http_unpaywall"):
+                    status, headers, content = make_request(unpaywall_url, timeout=5)
+                failed = status not in UNPAYWALL_ANSWERS  # 0（接続失敗）・429・5xx は答えではない
+                if status == 200 and content:
+                    unpaywall = json.loads(content.decode('utf-8'))
+                time.sleep(0.1)  # API制限対応
+            except Exception as e:
+                failed = True
+                print(f"Unpaywall API error for {doi}: {e}")
+        else:
+            skipped = True
+        
+        # 2. DOI直接アクセスでPDFリダイレクトをチェック
+        if host_breaker.allow(doi_url):
+            try:
+                # urllib でリダイレクトを追跡
+                req = urllib.request.Request(doi_url, headers={
+                    'User-Agent': 'Mozilla/5.0 (Academic Research Bot 1.0)'
+                })
+                metrics.count("requests")
+                with metrics.timer("http_doi"), urllib.request.urlopen(req, timeout=5) as response:
+                    redirected_url = response.url
+                host_breaker.record_success(doi_url)
+                time.sleep(0.1)
+            except urllib.error.HTTPError as e:
+                # 出版社がエラーを返してもリダイレクト先は分かる（他の版と同じく到達とみなす）
+                host_breaker.record_exception(doi_url, e)
+                redirected_url = e.url
+            except Exception as e:
+                failed = True
+                host_breaker.record_exception(doi_url, e)
+                if not TQDM_AVAILABLE:
+                    print(f"DOI redirect check error for {doi}: {e}")
+        else:
+            skipped = True
+        
+        # Unpaywall が答え（200 / 404）を返し、doi.org にも届いた場合だけ保存（通信障害の結果は残さない）
+        if oa_cache and not skipped and not failed:
+            oa_cache.put_discovery(doi, unpaywall, redirected_url)
     
-    return list(set(pdf_urls))  # 重複削除
+    return discovery_candidates(unpaywall, redirected_url)
 
-def download_pdf_fast(url: str, filepath: str) -> bool:
-    """PDF ファイルをダウンロード（高速版）"""
+def download_pdf_fast(url: str, filepath: str, oa_cache: OALocationCache = None,
+                      doi: str = '', source: str = '') -> Optional[str]:
+    """PDF ファイルをダウンロード（高速版・中断再開対応）
+
+    途中データは .part に保存し、サーバーが Range に対応していれば
+    失敗しても残しておき、次回は続きから取得する。本文は受信しながら
+    %PDF- / %%EOF を検査し、PDFでなければその場で打ち切る。
+    oa_cache があれば結果（'ok' / 'not_pdf' など）をURLごとに記録する。
+    成功時は本文の SHA-256（16進）を返す。
+    """
+    if not host_breaker.allow(url):
+        if not TQDM_AVAILABLE:
+            print(f"⏸️  Host paused by circuit breaker: {url[:80]}")
+        return None
+    part = PartialDownload(filepath, url)
+    validator = PDFStreamValidator()
+    outcome = 'failed'
+    download_start = None
     try:
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
+        headers.update(part.request_headers())
         
         req = urllib.request.Request(url, headers=headers)
         
+        metrics.count("requests")
+        download_start = time.perf_counter()
         with urllib.request.urlopen(req, timeout=30) as response:
+            host_breaker.record_status(url, response.status)
             # Content-Type をチェック
             content_type = response.headers.get('content-type', '').lower()
             if 'pdf' not in content_type and 'application/octet-stream' not in content_type:
                 print(f"❌ Not a PDF file: {content_type}")
-                return False
+                outcome = 'not_pdf'
+                return None
+            
+            mode = part.begin(response.status, response.headers)
+            if mode == 'ab':
+                validator.resume_from(part.part_path)
+                if not TQDM_AVAILABLE:
+                    print(f"⏯️  Resuming from {part.offset/1024:.0f}KB: {os.path.basename(filepath)}")
             
             # ファイルサイズチェック（最小100KB、最大50MB）
-            content_length = response.headers.get('content-length')
-            if content_length:
-                size_mb = int(content_length) / (1024 * 1024)
+            if part.total:
+                size_mb = part.total / (1024 * 1024)
                 if size_mb < 0.1 or size_mb > 50:
                     print(f"❌ File size out of range: {size_mb:.1f}MB")
-                    return False
+                    part.discard()
+                    outcome = 'size_out_of_range'
+                    return None
             
-            # 高速ダウンロード
-            with open(filepath, 'wb') as f:
+            # 高速ダウンロード（受信しながらPDFかどうかを検査）
+            with open(part.part_path, mode) as f:
                 while True:
                     chunk = response.read(64*1024)  # 64KB chunks
                     if not chunk:
                         break
+                    validator.feed(chunk)
                     f.write(chunk)
+                    metrics.count("bytes_downloaded", len(chunk))
         
         # ダウンロード後のファイルサイズチェック
-        file_size = os.path.getsize(filepath)
+        file_size = part.downloaded_size()
+        if part.total and file_size != part.total:
+            raise IOError(f"incomplete download: {file_size}/{part.total} bytes")
+        validator.finish()
         if file_size < 100 * 1024:  # 100KB未満
-            os.remove(filepath)
+            part.discard()
             print(f"❌ Downloaded file too small: {file_size} bytes")
-            return False
+            outcome = 'too_small'
+            return None
+        
+        # 検証済みのデータだけを .pdf として確定
+        part.finalize()
+        outcome = 'ok'
         
         if not TQDM_AVAILABLE:  # tqdmがない場合のみ成功ログ
             print(f"✅ Successfully downloaded: {os.path.basename(filepath)} ({file_size/1024:.0f}KB)")
-        return True
+        return validator.hexdigest()
         
+    except NotPDFError as e:
+        # PDFでない本文は再開しても無駄なので破棄
+        if not TQDM_AVAILABLE:
+            print(f"❌ Rejected {url}: {e}")
+        part.discard()
+        outcome = e.reason
+        return None
     except Exception as e:
+        host_breaker.record_exception(url, e)
         if not TQDM_AVAILABLE:  # tqdmがない場合のみエラーログ
             print(f"❌ Download failed from {url}: {e}")
-        if os.path.exists(filepath):
-            os.remove(filepath)
-        return False
+        # Range 再開できるなら途中データを残す（416 は範囲不整合なので破棄）
+        status = getattr(e, 'code', None)
+        if not part.resumable or status == 416:
+            part.discard()
+        else:
+            outcome = 'partial'  # 次回 Range で続きから取得
+        if outcome == 'failed' and isinstance(status, int) and is_transient_status(status):
+            outcome = OUTCOME_TRANSIENT  # 次回もう一度試す
+        return None
+    finally:
+        if download_start is not None:
+            metrics.add_time("http_pdf", time.perf_counter() - download_start)
+        metrics.count(f"pdf_{outcome}")
+        if oa_cache:
+            oa_cache.record_outcome(doi, url, outcome, source=source)
 
-def add_pdf_embed_to_markdown(md_path: str, pdf_filename: str) -> None:
-    """MarkdownファイルにPDF埋め込みを追加"""
+def add_pdf_embed_to_markdown(md_path: str, pdf_filename: str, label: str = None) -> None:
+    """MarkdownファイルにPDF埋め込みを追加（label はリンクの表示名）"""
     try:
         with open(md_path, 'r', encoding='utf-8') as f:
             content = f.read()
@@ -212,7 +302,7 @@ def add_pdf_embed_to_markdown(md_path: str, pdf_filename: str) -> None:
 
 ## PDF
 
-**フルテキストPDF**: [📄 {pdf_filename}](PDF/{pdf_filename})
+**フルテキストPDF**: [📄 {label or pdf_filename}](PDF/{pdf_filename})
 
 <embed src="PDF/{pdf_filename}" type="application/pdf" width="100%" height="600px" />
 
@@ -224,17 +314,23 @@ def add_pdf_embed_to_markdown(md_path: str, pdf_filename: str) -> None:
         else:
             content += pdf_section
         
-        # ファイル保存
-        with open(md_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        # ファイル保存（一時ファイル経由で置き換える）
+        write_atomic(md_path, content)
+        changes.written(md_path)
         
         print(f"📝 Added PDF embed to: {os.path.basename(md_path)}")
         
     except Exception as e:
         print(f"❌ Error adding PDF embed to {md_path}: {e}")
 
-def process_json_for_pdf(json_path: str, pdf_dir: str, md_dir: str) -> Tuple[bool, str]:
-    """JSONファイルを処理してPDFダウンロードを試行"""
+def process_json_for_pdf(json_path: str, pdf_dir: str, md_dir: str,
+                         oa_cache: OALocationCache = None, store: PDFStore = None,
+                         ranker: CandidateRanker = None, shared: SharedDownloads = None) -> Tuple[bool, str]:
+    """JSONファイルを処理してPDFダウンロードを試行
+
+    候補URLは ranker で成功率順に並べ、同じURLは shared で論文間に共有する。
+    保存先は PDFStore。
+    """
     try:
         with open(json_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
@@ -248,12 +344,22 @@ def process_json_for_pdf(json_path: str, pdf_dir: str, md_dir: str) -> Tuple[boo
         # 安全なファイル名生成
         safe_title = safe_filename(title)
         pdf_filename = f"{safe_title}.pdf"
-        pdf_path = os.path.join(pdf_dir, pdf_filename)
-        md_path = os.path.join(md_dir, f"{safe_title}.md")
+        legacy_path = os.path.join(pdf_dir, pdf_filename)
+        md_path = resolve(md_dir, f"{safe_title}.md")
         
-        # 既にPDFが存在する場合はスキップ
-        if os.path.exists(pdf_path):
-            return False, f"PDF already exists: {pdf_filename}"
+        # 既にPDFが存在する場合はスキップ（DOIで manifest を引く）
+        store = store or PDFStore(pdf_dir)
+        stored = store.lookup(doi)
+        if stored:
+            changes.completed(json_path)
+            return False, f"PDF already exists: {stored}"
+        # 旧形式（タイトル名）のPDF。以前に保存された偽PDFは削除して再取得
+        if os.path.exists(legacy_path):
+            if is_valid_pdf(legacy_path):
+                changes.completed(json_path)
+                return False, f"PDF already exists: {pdf_filename}"
+            os.remove(legacy_path)
+            changes.removed(legacy_path)
         
         thread_id = threading.current_thread().name
         if not TQDM_AVAILABLE:  # tqdmがない場合のみ詳細ログ
@@ -264,22 +370,36 @@ def process_json_for_pdf(json_path: str, pdf_dir: str, md_dir: str) -> Tuple[boo
         crossref_data = data.get('_crossref_full', {})
         oa_info = check_open_access_status(crossref_data)
         
-        # PDF URL を探索
-        pdf_urls = find_pdf_urls_from_doi(doi)
-        pdf_urls.extend(oa_info['pdf_urls'])
+        # PDF URL を探索し、出所・ホスト別の成功率で順位付け（最近失敗したURLは除外）
+        ranker = ranker or CandidateRanker(oa_cache)
+        shared = shared or SharedDownloads()
+        candidates = find_pdf_urls_from_doi(doi, oa_cache)
+        candidates += [Candidate(u, SOURCE_CROSSREF) for u in oa_info['pdf_urls']]
+        failed = oa_cache.known_failures(doi) if oa_cache else set()
+        candidates = ranker.rank(candidates, exclude=failed)[:MAX_CANDIDATES]
         
-        if not pdf_urls:
+        if not candidates:
             return False, f"No PDF URLs found for: {title}"
         
-        # PDF ダウンロードを試行
-        for i, url in enumerate(pdf_urls[:3]):  # 最大3つのURLを試行
+        # PDF ダウンロードを試行（他の論文が取得中・取得済みのURLは結果を共有）
+        for i, candidate in enumerate(candidates):
             if not TQDM_AVAILABLE:  # tqdmがない場合のみ詳細ログ
-                print(f"🔄 [{thread_id}] Trying URL {i+1}/{min(3, len(pdf_urls))}: {url[:80]}...")
-            if download_pdf_fast(url, pdf_path):
+                print(f"🔄 [{thread_id}] Trying URL {i+1}/{len(candidates)} ({candidate.source}): {candidate.url[:80]}...")
+            pdf_path = store.staging_path(candidate.url)
+            
+            def fetch(candidate=candidate, pdf_path=pdf_path):
+                digest = download_pdf_fast(candidate.url, pdf_path, oa_cache, doi, candidate.source)
+                ranker.record(candidate, digest is not None)
+                return digest
+            
+            digest = shared.run(candidate.url, fetch)
+            if digest:
+                stored = store.add(doi, title, pdf_path, digest, candidate.url)
+                changes.completed(json_path)
                 # ダウンロード成功時、MarkdownにPDF埋め込みを追加
                 if os.path.exists(md_path):
-                    add_pdf_embed_to_markdown(md_path, pdf_filename)
-                return True, f"Successfully downloaded: {pdf_filename}"
+                    add_pdf_embed_to_markdown(md_path, stored, label=pdf_filename)
+                return True, f"Successfully downloaded: {pdf_filename} -> {stored}"
             time.sleep(0.5)  # 試行間隔
         
         return False, f"All download attempts failed for: {title}"
@@ -289,10 +409,14 @@ def process_json_for_pdf(json_path: str, pdf_dir: str, md_dir: str) -> Tuple[boo
 
 def main():
     """メイン処理（threading版）"""
+    base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with stage_report("download_open_access_pdfs_fast_stdlib", base):
+        run(base)
+
+def run(base: str) -> None:
     print("🚀 オープンアクセスPDF高速並列取得開始（標準ライブラリ版）...")
     start_time = time.time()
     
-    base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     json_dir = os.path.join(base, "JSON_folder")
     md_dir = os.path.join(base, "md_folder")
     pdf_dir = os.path.join(base, "PDF")
@@ -301,7 +425,8 @@ def main():
     os.makedirs(pdf_dir, exist_ok=True)
     
     # 全JSONファイルを取得
-    json_files = [f for f in os.listdir(json_dir) if f.endswith('.json')]
+    json_files = list_names(json_dir, '.json')
+    metrics.count("papers", len(json_files))
     
     print(f"📊 Processing {len(json_files)} files with parallel threads...")
     if TQDM_AVAILABLE:
@@ -310,15 +435,22 @@ def main():
         print(f"📋 標準並列処理モード (詳細ログ表示)")
     
     # 並列処理実行（最大同時スレッド数）
-    max_workers = min(8, len(json_files))  # CPU数に応じて調整
+    max_workers = min(8, len(json_files)) or 1  # CPU数に応じて調整
     success_count = 0
     
+    # OA所在情報キャッシュ（既知の論文は Unpaywall / doi.org を再照会しない）
+    oa_cache = OALocationCache(os.path.join(base, OA_CACHE_DB))
+    store = PDFStore(pdf_dir)
+    ranker = CandidateRanker(oa_cache)
+    shared = SharedDownloads()
+    
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         # 全ファイルをタスクとして提出
         future_to_file = {}
         for json_file in json_files:
-            json_path = os.path.join(json_dir, json_file)
-            future = executor.submit(process_json_for_pdf, json_path, pdf_dir, md_dir)
+            json_path = resolve(json_dir, json_file)
+            future = executor.submit(process_json_for_pdf, json_path, pdf_dir, md_dir,
+                                     oa_cache, store, ranker, shared)
             future_to_file[future] = json_file
         
         # 完了したタスクから結果を取得
@@ -382,6 +514,9 @@ def main():
         
         if TQDM_AVAILABLE:
             progress_bar.close()
+    oa_cache.close()
+    store.close()
+    metrics.count("pdfs_downloaded", success_count)
     
     # 結果集計
     total_pdfs = len([f for f in os.listdir(pdf_dir) if f.endswith('.pdf')])
@@ -395,6 +530,9 @@ def main():
     print(f"📂 PDFフォルダ: {pdf_dir}")
     print(f"⚡ 処理速度: {len(json_files)/elapsed:.1f} files/sec")
     print(f"🧵 並列度: {max_workers} threads")
+    paused_hosts = host_breaker.summary()
+    if paused_hosts:
+        print(f"⏸️  サーキットブレーカー作動ホスト: {', '.join(paused_hosts)}")
     
     if success_count == 0:
         print(f"\n💡 PDF取得のヒント:")
@@ -402,4 +540,5 @@ def main():
         print(f"   - より多くのPDFを取得するには: python3 pdf_tools/PDF取得.py")
 
 if __name__ == "__main__":
+    profile_option()
     main()
\ No newline at end of file
@@ -2,9 +2,16 @@
 # -*- coding: utf-8 -*-
 """
 download_researchgate_pdfs.py - ResearchGateからの積極的PDF取得
+
+検索クエリ → 論文ページURL、論文ページURL → PDF候補URL の抽出結果は
+researchgate_cache.sqlite に保存し、再実行時はページを取り直さない。
+--async を付けると aiohttp で全論文を同時に進める（ResearchGate への
+同時接続数と間隔は RG_HOST_LIMIT で制限）。接続先は環境変数
+RESEARCHGATE_BASE_URL で差し替えられる（ローカルのHTMLフィクスチャで確認する場合など）。
 """
 
 import os
+import sys
 import json
 import re
 import unicodedata
@@ -13,11 +20,65 @@ import urllib.parse
 import urllib.error
 import time
 import random
+import asyncio
 from urllib.parse import urljoin, urlparse, quote
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
+
+try:
+    import aiohttp
+    ASYNC_AVAILABLE = True
+except ImportError:
+    ASYNC_AVAILABLE = False
+
+# ルートディレクトリをパスに追加（utils パッケージ用）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.pdf_download import PDFStreamValidator, is_valid_pdf
+from utils.pdf_store import PDFStore
+from utils.circuit_breaker import HostCircuitBreaker, breaker_host
+from utils.page_cache import PageLinkCache, PAGE_CACHE_DB, KIND_SEARCH, KIND_PAGE
+from utils.output_writer import write_atomic
+from utils.run_report import metrics, profile_option, stage_report
+from utils.status_index import changes
+from utils.shard_layout import list_names, resolve
+from download_open_access_pdfs_async import HostLimiter
+
+# 全ワーカースレッドで共有するホスト単位のサーキットブレーカー
+# （ResearchGate が 403 / 429 を返し始めたら全スレッドでしばらく止める）
+host_breaker = HostCircuitBreaker()
+
+RESEARCHGATE_BASE = os.environ.get("RESEARCHGATE_BASE_URL", "https://www.researchgate.net").rstrip('/')
+MAX_SEARCH_RESULTS = 5    # 検索結果から取る論文ページ数
+MAX_PAGES = 3             # 1論文あたりに調べる論文ページ数
+MAX_PDF_LINKS = 3         # 1ページあたりに試すPDF候補数
+MIN_PDF_BYTES = 100 * 1024
+MAX_PDF_BYTES = 100 * 1024 * 1024  # ResearchGateは大きなファイルもある
+
+# 非同期版のパラメータ
+PAPER_WORKERS = 16            # 同時に処理する論文数
+RG_HOST_LIMIT = (2, 1.0)      # ResearchGate の (同時接続数, 最小リクエスト間隔[秒])
+DEFAULT_HOST_LIMIT = 2        # PDF配信元など他ホストの同時接続数
+
+# ---------- 抽出パターン（モジュール読み込み時に1回だけコンパイル） ----------
+TITLE_WORD_RE = re.compile(r'\b\w{4,}\b')
+PUBLICATION_RE = re.compile(r'href="(/publication/\d+[^"]*)"')
+PDF_LINK_PATTERNS = [re.compile(p, re.IGNORECASE) for p in (
+    r'href="([^"]*\.pdf[^"]*)"',  # 直接PDF リンク
+    r'data-url="([^"]*\.pdf[^"]*)"',  # data-url属性のPDF
+    r'src="([^"]*\.pdf[^"]*)"',  # src属性のPDF
+    r'"pdf_url":"([^"]*)"',  # JSON内のPDF URL
+    r'"fullTextUrl":"([^"]*)"',  # フルテキストURL
+    r'href="(/publication/\d+[^"]*\.pdf[^"]*)"',  # 相対パスのPDF
+)]
+DOWNLOAD_LINK_PATTERNS = [re.compile(p, re.IGNORECASE) for p in (
+    r'"downloadUrl":"([^"]*)"',
+    r'data-download-url="([^"]*)"',
+    r'href="([^"]*download[^"]*)"',
+)]
+HTML_PDF_LINK_RE = re.compile(r'href="([^"]*\.pdf[^"]*)"')
+SKIP_WORDS = ('thumbnail', 'preview', 'icon')
 
 def safe_filename(title: str, maxlen: int = 120) -> str:
     """安全なファイル名生成"""
@@ -46,166 +107,166 @@ def get_random_headers() -> Dict[str, str]:
         'Upgrade-Insecure-Requests': '1',
     }
 
-def search_researchgate_for_paper(title: str, doi: str = "", authors: List[str] = None) -> List[str]:
-    """ResearchGateで論文を検索してPDF URLを取得"""
-    potential_urls = []
+def build_search_query(title: str, doi: str = "", authors: List[str] = None) -> str:
+    """タイトルの重要語・DOI・著者の姓から検索クエリを作る"""
+    search_terms = []
+    if title:
+        # タイトルから重要なキーワードを抽出
+        search_terms.extend(TITLE_WORD_RE.findall(title.lower())[:5])  # 最初の5つの重要な単語
     
-    try:
-        # 検索クエリ作成
-        search_terms = []
-        if title:
-            # タイトルから重要なキーワードを抽出
-            title_words = re.findall(r'\b\w{4,}\b', title.lower())
-            search_terms.extend(title_words[:5])  # 最初の5つの重要な単語
-        
-        if doi:
-            search_terms.append(doi)
-        
-        if authors:
-            # 著者の姓を追加
-            for author in authors[:2]:  # 最初の2人の著者
-                if isinstance(author, str):
-                    name_parts = author.split()
-                    if name_parts:
-                        search_terms.append(name_parts[-1])  # 姓
-        
-        # 検索URL構築
-        query = " ".join(search_terms[:8])  # 最大8つのキーワード
-        encoded_query = quote(query)
-        search_url = f"https://www.researchgate.net/search?q={encoded_query}"
-        
-        headers = get_random_headers()
-        req = urllib.request.Request(search_url, headers=headers)
-        
-        with urllib.request.urlopen(req, timeout=15) as response:
-            content = response.read().decode('utf-8', errors='ignore')
-            
-            # ResearchGateの論文ページURLを抽出
-            publication_urls = re.findall(r'href="(/publication/\d+[^"]*)"', content)
-            
-            for url_path in publication_urls[:5]:  # 最初の5つの結果
-                full_url = f"https://www.researchgate.net{url_path}"
-                potential_urls.append(full_url)
-        
-        time.sleep(random.uniform(1, 3))  # ランダムな待機時間
-        
-    except Exception as e:
-        print(f"❌ ResearchGate search error: {e}")
+    if doi:
+        search_terms.append(doi)
     
-    return potential_urls
+    if authors:
+        # 著者の姓を追加
+        for author in authors[:2]:  # 最初の2人の著者
+            if isinstance(author, str):
+                name_parts = author.split()
+                if name_parts:
+                    search_terms.append(name_parts[-1])  # 姓
+    
+    return " ".join(search_terms[:8])  # 最大8つのキーワード
+
+def search_url_for(query: str) -> str:
+    return f"{RESEARCHGATE_BASE}/search?q={quote(query)}"
+
+def absolute_url(link: str) -> str:
+    """サイト内の相対パスを絶対URLにする"""
+    return f"{RESEARCHGATE_BASE}{link}" if link.startswith('/') else link
+
+def parse_search_results(content: str) -> List[str]:
+    """検索結果ページから論文ページURLを抽出（先頭 MAX_SEARCH_RESULTS 件）"""
+    return [absolute_url(path) for path in PUBLICATION_RE.findall(content)[:MAX_SEARCH_RESULTS]]
 
-def extract_pdf_from_researchgate_page(page_url: str) -> List[str]:
-    """ResearchGateの論文ページからPDF URLを抽出"""
+def parse_pdf_links(content: str) -> List[str]:
+    """論文ページからPDF候補URLを抽出（出現順・重複なし）"""
     pdf_urls = []
-    
+    for pattern in PDF_LINK_PATTERNS:
+        for match in pattern.findall(content):
+            pdf_url = absolute_url(match)
+            # 不適切なURLを除外
+            if not any(skip in pdf_url.lower() for skip in SKIP_WORDS):
+                pdf_urls.append(pdf_url)
+    # ResearchGateの直接ダウンロードリンクも探す
+    for pattern in DOWNLOAD_LINK_PATTERNS:
+        pdf_urls.extend(absolute_url(match) for match in pattern.findall(content))
+    seen = set()
+    return [u for u in pdf_urls if not (u in seen or seen.add(u))]
+
+def fetch_html(url: str) -> Optional[str]:
+    """ページを取得して本文を返す（ブレーカーで停止中・通信エラーは None）"""
+    if not host_breaker.allow(url):
+        print("⏸️  ResearchGate paused by circuit breaker")
+        return None
     try:
-        headers = get_random_headers()
-        req = urllib.request.Request(page_url, headers=headers)
-        
-        with urllib.request.urlopen(req, timeout=15) as response:
-            content = response.read().decode('utf-8', errors='ignore')
-            
-            # ResearchGateのPDF URLパターンを検索
-            pdf_patterns = [
-                r'href="([^"]*\.pdf[^"]*)"',  # 直接PDF リンク
-                r'data-url="([^"]*\.pdf[^"]*)"',  # data-url属性のPDF
-                r'src="([^"]*\.pdf[^"]*)"',  # src属性のPDF
-                r'"pdf_url":"([^"]*)"',  # JSON内のPDF URL
-                r'"fullTextUrl":"([^"]*)"',  # フルテキストURL
-                r'href="(/publication/\d+[^"]*\.pdf[^"]*)"',  # 相対パスのPDF
-            ]
-            
-            for pattern in pdf_patterns:
-                matches = re.findall(pattern, content, re.IGNORECASE)
-                for match in matches:
-                    if match.startswith('/'):
-                        pdf_url = f"https://www.researchgate.net{match}"
-                    else:
-                        pdf_url = match
-                    
-                    # 不適切なURLを除外
-                    if not any(skip in pdf_url.lower() for skip in ['thumbnail', 'preview', 'icon']):
-                        pdf_urls.append(pdf_url)
-            
-            # ResearchGateの直接ダウンロードリンクも探す
-            download_patterns = [
-                r'"downloadUrl":"([^"]*)"',
-                r'data-download-url="([^"]*)"',
-                r'href="([^"]*download[^"]*)"'
-            ]
-            
-            for pattern in download_patterns:
-                matches = re.findall(pattern, content, re.IGNORECASE)
-                for match in matches:
-                    if match.startswith('/'):
-                        download_url = f"https://www.researchgate.net{match}"
-                    else:
-                        download_url = match
-                    pdf_urls.append(download_url)
-        
-        time.sleep(random.uniform(0.5, 2))  # ランダムな待機時間
-        
+        req = urllib.request.Request(url, headers=get_random_headers())
+        metrics.count("requests")
+        with metrics.timer("http_researchgate"), urllib.request.urlopen(req, timeout=15) as response:
+            host_breaker.record_status(url, response.status)
+            return response.read().decode('utf-8', errors='ignore')
     except Exception as e:
-        print(f"❌ Error extracting PDF from {page_url}: {e}")
+        host_breaker.record_exception(url, e)
+        print(f"❌ ResearchGate request error ({url[:80]}): {e}")
+        return None
+
+def search_researchgate_for_paper(title: str, doi: str = "", authors: List[str] = None,
+                                  page_cache: PageLinkCache = None) -> List[str]:
+    """ResearchGateで論文を検索して論文ページURLを取得（page_cache があれば再検索しない）"""
+    query = build_search_query(title, doi, authors)
+    cached = page_cache.get(KIND_SEARCH, query) if page_cache else None
+    if cached is not None:
+        return cached
+    
+    content = fetch_html(search_url_for(query))
+    if content is None:
+        return []
+    potential_urls = parse_search_results(content)
+    if page_cache:
+        page_cache.put(KIND_SEARCH, query, potential_urls)
+    time.sleep(random.uniform(1, 3))  # ランダムな待機時間
+    return potential_urls
+
+def extract_pdf_from_researchgate_page(page_url: str, page_cache: PageLinkCache = None) -> List[str]:
+    """ResearchGateの論文ページからPDF URLを抽出（page_cache があれば再取得しない）"""
+    cached = page_cache.get(KIND_PAGE, page_url) if page_cache else None
+    if cached is not None:
+        return cached
     
-    return list(set(pdf_urls))  # 重複削除
+    content = fetch_html(page_url)
+    if content is None:
+        return []
+    pdf_urls = parse_pdf_links(content)
+    if page_cache:
+        page_cache.put(KIND_PAGE, page_url, pdf_urls)
+    time.sleep(random.uniform(0.5, 2))  # ランダムな待機時間
+    return pdf_urls
 
-def download_pdf_from_researchgate(url: str, filepath: str) -> bool:
-    """ResearchGateからPDFをダウンロード"""
+def download_pdf_from_researchgate(url: str, filepath: str) -> Optional[str]:
+    """ResearchGateからPDFをダウンロード（成功時は SHA-256 を返す）"""
+    if not host_breaker.allow(url):
+        print(f"⏸️  Host paused by circuit breaker: {url[:80]}")
+        return None
     try:
         headers = get_random_headers()
-        headers['Referer'] = 'https://www.researchgate.net/'
+        headers['Referer'] = f"{RESEARCHGATE_BASE}/"
         
         req = urllib.request.Request(url, headers=headers)
+        metrics.count("requests")
         
         with urllib.request.urlopen(req, timeout=30) as response:
+            host_breaker.record_status(url, response.status)
             # Content-Type チェック
             content_type = response.headers.get('content-type', '').lower()
             if 'pdf' not in content_type and 'application/octet-stream' not in content_type:
                 # HTMLページの場合、さらにPDFリンクを探す
                 if 'text/html' in content_type:
                     content = response.read().decode('utf-8', errors='ignore')
-                    pdf_links = re.findall(r'href="([^"]*\.pdf[^"]*)"', content)
+                    pdf_links = HTML_PDF_LINK_RE.findall(content)
                     if pdf_links:
                         # 最初のPDFリンクを試行
                         return download_pdf_from_researchgate(pdf_links[0], filepath)
                 print(f"❌ Not a PDF file: {content_type}")
-                return False
+                return None
             
             # ファイルサイズチェック
             content_length = response.headers.get('content-length')
             if content_length:
                 size_mb = int(content_length) / (1024 * 1024)
-                if size_mb < 0.1 or size_mb > 100:  # ResearchGateは大きなファイルもある
+                if not MIN_PDF_BYTES <= int(content_length) <= MAX_PDF_BYTES:
                     print(f"❌ File size out of range: {size_mb:.1f}MB")
-                    return False
+                    return None
             
-            # ダウンロード実行
-            with open(filepath, 'wb') as f:
+            # ダウンロード実行（PDFでない本文はその場で打ち切る）
+            validator = PDFStreamValidator()
+            with metrics.timer("http_pdf"), open(filepath, 'wb') as f:
                 while True:
                     chunk = response.read(64*1024)  # 64KB chunks
                     if not chunk:
                         break
+                    validator.feed(chunk)
                     f.write(chunk)
+                    metrics.count("bytes_downloaded", len(chunk))
+            validator.finish()
         
         # ファイルサイズ最終チェック
         file_size = os.path.getsize(filepath)
-        if file_size < 100 * 1024:  # 100KB未満
+        if file_size < MIN_PDF_BYTES:  # 100KB未満
             os.remove(filepath)
             print(f"❌ Downloaded file too small: {file_size} bytes")
-            return False
+            return None
         
         print(f"✅ Successfully downloaded from ResearchGate: {os.path.basename(filepath)} ({file_size/1024:.0f}KB)")
-        return True
+        return validator.hexdigest()
         
     except Exception as e:
+        host_breaker.record_exception(url, e)
         print(f"❌ Download failed from {url}: {e}")
         if os.path.exists(filepath):
             os.remove(filepath)
-        return False
+        return None
 
-def add_pdf_embed_to_markdown(md_path: str, pdf_filename: str) -> None:
-    """MarkdownファイルにPDF埋め込みを追加"""
+def add_pdf_embed_to_markdown(md_path: str, pdf_filename: str, label: str = None) -> None:
+    """MarkdownファイルにPDF埋め込みを追加（label はリンクの表示名）"""
     try:
         with open(md_path, 'r', encoding='utf-8') as f:
             content = f.read()
@@ -219,7 +280,7 @@ def add_pdf_embed_to_markdown(md_path: str, pdf_filename: str) -> None:
 
 ## PDF
 
-**フルテキストPDF**: [📄 {pdf_filename}](PDF/{pdf_filename})
+**フルテキストPDF**: [📄 {label or pdf_filename}](PDF/{pdf_filename})
 
 <embed src="PDF/{pdf_filename}" type="application/pdf" width="100%" height="600px" />
 
@@ -231,43 +292,80 @@ def add_pdf_embed_to_markdown(md_path: str, pdf_filename: str) -> None:
         else:
             content += pdf_section
         
-        # ファイル保存
-        with open(md_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        # ファイル保存（一時ファイル経由で置き換える）
+        write_atomic(md_path, content)
+        changes.written(md_path)
         
         print(f"📝 Added PDF embed to: {os.path.basename(md_path)}")
         
     except Exception as e:
         print(f"❌ Error adding PDF embed to {md_path}: {e}")
 
-def process_json_for_researchgate_pdf(json_path: str, pdf_dir: str, md_dir: str) -> Tuple[bool, str]:
-    """JSONファイルを処理してResearchGateからPDFダウンロードを試行"""
+def load_paper(json_path: str, pdf_dir: str, md_dir: str, store: PDFStore) -> Tuple[Optional[Dict], str]:
+    """JSONを読み、取得が必要な論文なら情報の辞書を、不要なら (None, 理由) を返す"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    
+    title = data.get('title', 'untitled')
+    doi = data.get('doi', '')
+    
+    if not title or title == 'untitled':
+        return None, f"No valid title found"
+    
+    # 安全なファイル名生成
+    safe_title = safe_filename(title)
+    pdf_filename = f"{safe_title}.pdf"
+    legacy_path = os.path.join(pdf_dir, pdf_filename)
+    
+    # 既にPDFが存在する場合はスキップ（DOIが無い論文はタイトルをキーにする）
+    store_key = doi or f"title:{safe_title}"
+    stored = store.lookup(store_key)
+    if stored:
+        changes.completed(json_path)
+        return None, f"PDF already exists: {stored}"
+    # 旧形式（タイトル名）のPDF。以前に保存された偽PDFは削除して再取得
+    if os.path.exists(legacy_path):
+        if is_valid_pdf(legacy_path):
+            changes.completed(json_path)
+            return None, f"PDF already exists: {pdf_filename}"
+        os.remove(legacy_path)
+        changes.removed(legacy_path)
+    
+    return {
+        'json_path': json_path,
+        'title': title,
+        'doi': doi,
+        'authors': data.get('authors', []),
+        'pdf_filename': pdf_filename,
+        'md_path': resolve(md_dir, f"{safe_title}.md"),
+        'store_key': store_key,
+        'pdf_path': store.staging_path(store_key),
+    }, ""
+
+def save_downloaded_pdf(store: PDFStore, paper: Dict, digest: str, pdf_url: str) -> Tuple[bool, str]:
+    """取得したPDFをストアに登録し、MarkdownにPDF埋め込みを追加"""
+    stored = store.add(paper['store_key'], paper['title'], paper['pdf_path'], digest, pdf_url)
+    changes.completed(paper['json_path'])
+    if os.path.exists(paper['md_path']):
+        add_pdf_embed_to_markdown(paper['md_path'], stored, label=paper['pdf_filename'])
+    return True, f"Successfully downloaded from ResearchGate: {paper['pdf_filename']} -> {stored}"
+
+def process_json_for_researchgate_pdf(json_path: str, pdf_dir: str, md_dir: str,
+                                      store: PDFStore = None,
+                                      page_cache: PageLinkCache = None) -> Tuple[bool, str]:
+    """JSONファイルを処理してResearchGateからPDFダウンロードを試行（保存先は PDFStore）"""
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        title = data.get('title', 'untitled')
-        doi = data.get('doi', '')
-        authors = data.get('authors', [])
-        
-        if not title or title == 'untitled':
-            return False, f"No valid title found"
-        
-        # 安全なファイル名生成
-        safe_title = safe_filename(title)
-        pdf_filename = f"{safe_title}.pdf"
-        pdf_path = os.path.join(pdf_dir, pdf_filename)
-        md_path = os.path.join(md_dir, f"{safe_title}.md")
-        
-        # 既にPDFが存在する場合はスキップ
-        if os.path.exists(pdf_path):
-            return False, f"PDF already exists: {pdf_filename}"
+        store = store or PDFStore(pdf_dir)
+        paper, message = load_paper(json_path, pdf_dir, md_dir, store)
+        if paper is None:
+            return False, message
+        title = paper['title']
         
         thread_id = threading.current_thread().name
         print(f"🔍 [{thread_id}] Searching ResearchGate for: {title[:50]}...")
         
         # ResearchGateで検索
-        researchgate_pages = search_researchgate_for_paper(title, doi, authors)
+        researchgate_pages = search_researchgate_for_paper(title, paper['doi'], paper['authors'], page_cache)
         
         if not researchgate_pages:
             return False, f"No ResearchGate pages found for: {title}"
@@ -275,19 +373,17 @@ def process_json_for_researchgate_pdf(json_path: str, pdf_dir: str, md_dir: str)
         print(f"📋 [{thread_id}] Found {len(researchgate_pages)} ResearchGate pages")
         
         # 各ページからPDF URLを抽出してダウンロード試行
-        for i, page_url in enumerate(researchgate_pages[:3]):  # 最大3ページを試行
+        for i, page_url in enumerate(researchgate_pages[:MAX_PAGES]):
             print(f"🔄 [{thread_id}] Checking page {i+1}: {page_url}")
             
-            pdf_urls = extract_pdf_from_researchgate_page(page_url)
+            pdf_urls = extract_pdf_from_researchgate_page(page_url, page_cache)
             
-            for j, pdf_url in enumerate(pdf_urls[:3]):  # 各ページから最大3つのPDF URL
+            for j, pdf_url in enumerate(pdf_urls[:MAX_PDF_LINKS]):
                 print(f"📥 [{thread_id}] Trying PDF {j+1}: {pdf_url[:80]}...")
                 
-                if download_pdf_from_researchgate(pdf_url, pdf_path):
-                    # ダウンロード成功時、MarkdownにPDF埋め込みを追加
-                    if os.path.exists(md_path):
-                        add_pdf_embed_to_markdown(md_path, pdf_filename)
-                    return True, f"Successfully downloaded from ResearchGate: {pdf_filename}"
+                digest = download_pdf_from_researchgate(pdf_url, paper['pdf_path'])
+                if digest:
+                    return save_downloaded_pdf(store, paper, digest, pdf_url)
                 
                 time.sleep(random.uniform(1, 3))  # 試行間隔
         
@@ -296,34 +392,195 @@ def process_json_for_researchgate_pdf(json_path: str, pdf_dir: str, md_dir: str)
     except Exception as e:
         return False, f"Error processing {json_path}: {e}"
 
-def main():
-    """メイン処理"""
-    print("🚀 ResearchGate積極的PDF取得開始...")
-    start_time = time.time()
-    
-    base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    json_dir = os.path.join(base, "JSON_folder")
-    md_dir = os.path.join(base, "md_folder")
-    pdf_dir = os.path.join(base, "PDF")
-    
-    # PDF ディレクトリ作成
-    os.makedirs(pdf_dir, exist_ok=True)
-    
-    # 全JSONファイルを取得
-    json_files = [f for f in os.listdir(json_dir) if f.endswith('.json')]
-    
-    print(f"📊 Processing {len(json_files)} files with ResearchGate search...")
-    
-    # 並列処理実行（ResearchGateの負荷を考慮して制限）
-    max_workers = min(3, len(json_files))  # 最大3スレッド（サーバー負荷考慮）
+# ---------- 非同期版（--async） ----------
+def record_host_error(url: str, exc: BaseException) -> None:
+    """aiohttp の接続エラー（OSError 以外も含む）をブレーカーに記録"""
+    if ASYNC_AVAILABLE and isinstance(exc, aiohttp.ClientConnectionError):
+        host_breaker.record_failure(url)
+    else:
+        host_breaker.record_exception(url, exc)
+
+async def fetch_html_async(session, limiter, url: str) -> Optional[str]:
+    """ページを取得して本文を返す（非同期版・停止中・通信エラーは None）"""
+    if not host_breaker.allow(url):
+        return None
+    try:
+        async with limiter.slot(url):
+            metrics.count("requests")
+            with metrics.timer("http_researchgate"):
+                async with session.get(url, headers=get_random_headers(),
+                                       timeout=aiohttp.ClientTimeout(total=15)) as r:
+                    host_breaker.record_status(str(r.url), r.status)
+                    if r.status != 200:
+                        return None
+                    return await r.text(errors='ignore')
+    except Exception as e:
+        record_host_error(url, e)
+        print(f"❌ ResearchGate request error ({url[:80]}): {e}")
+        return None
+
+async def search_researchgate_async(session, limiter, title: str, doi: str = "",
+                                    authors: List[str] = None,
+                                    page_cache: PageLinkCache = None) -> List[str]:
+    """ResearchGateで論文を検索して論文ページURLを取得（非同期版）"""
+    query = build_search_query(title, doi, authors)
+    cached = page_cache.get(KIND_SEARCH, query) if page_cache else None
+    if cached is not None:
+        return cached
+    content = await fetch_html_async(session, limiter, search_url_for(query))
+    if content is None:
+        return []
+    potential_urls = parse_search_results(content)
+    if page_cache:
+        page_cache.put(KIND_SEARCH, query, potential_urls)
+    return potential_urls
+
+async def extract_pdf_links_async(session, limiter, page_url: str,
+                                  page_cache: PageLinkCache = None) -> List[str]:
+    """論文ページからPDF候補URLを抽出（非同期版）"""
+    cached = page_cache.get(KIND_PAGE, page_url) if page_cache else None
+    if cached is not None:
+        return cached
+    content = await fetch_html_async(session, limiter, page_url)
+    if content is None:
+        return []
+    pdf_urls = parse_pdf_links(content)
+    if page_cache:
+        page_cache.put(KIND_PAGE, page_url, pdf_urls)
+    return pdf_urls
+
+async def download_pdf_from_researchgate_async(session, limiter, url: str, filepath: str,
+                                               follow_html: bool = True) -> Optional[str]:
+    """ResearchGateからPDFをダウンロード（非同期版・成功時は SHA-256 を返す）
+
+    HTMLページが返った場合は最初のPDFリンクを1段だけたどる。
+    """
+    if not host_breaker.allow(url):
+        return None
+    validator = PDFStreamValidator()
+    try:
+        headers = get_random_headers()
+        headers['Referer'] = f"{RESEARCHGATE_BASE}/"
+        async with limiter.slot(url):
+            metrics.count("requests")
+            async with session.get(url, headers=headers,
+                                   timeout=aiohttp.ClientTimeout(total=None, sock_read=30)) as r:
+                host_breaker.record_status(str(r.url), r.status)
+                if r.status != 200:
+                    return None
+                content_type = r.headers.get('content-type', '').lower()
+                if 'pdf' not in content_type and 'application/octet-stream' not in content_type:
+                    pdf_links = []
+                    if follow_html and 'text/html' in content_type:
+                        pdf_links = HTML_PDF_LINK_RE.findall(await r.text(errors='ignore'))
+                    if not pdf_links:
+                        print(f"❌ Not a PDF file: {content_type}")
+                        return None
+                    next_url = urljoin(str(r.url), pdf_links[0])
+                else:
+                    next_url = None
+                    content_length = r.headers.get('content-length')
+                    if content_length and not MIN_PDF_BYTES <= int(content_length) <= MAX_PDF_BYTES:
+                        print(f"❌ File size out of range: {int(content_length) / (1024 * 1024):.1f}MB")
+                        return None
+                    size = 0
+                    with metrics.timer("http_pdf"), open(filepath, 'wb') as f:
+                        async for chunk in r.content.iter_chunked(64 * 1024):
+                            size += len(chunk)
+                            if size > MAX_PDF_BYTES:
+                                raise ValueError(f"file exceeds {MAX_PDF_BYTES} bytes")
+                            validator.feed(chunk)
+                            f.write(chunk)
+                            metrics.count("bytes_downloaded", len(chunk))
+        # スロットを返してから次のURLへ（同じホストのスロットを二重に取らない）
+        if next_url:
+            return await download_pdf_from_researchgate_async(session, limiter, next_url, filepath,
+                                                              follow_html=False)
+        validator.finish()
+        if size < MIN_PDF_BYTES:
+            os.remove(filepath)
+            print(f"❌ Downloaded file too small: {size} bytes")
+            return None
+        print(f"✅ Successfully downloaded from ResearchGate: {os.path.basename(filepath)} ({size/1024:.0f}KB)")
+        return validator.hexdigest()
+
+    except Exception as e:
+        record_host_error(url, e)
+        print(f"❌ Download failed from {url}: {e}")
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        return None
+
+async def process_json_for_researchgate_pdf_async(session, limiter, json_path: str, pdf_dir: str,
+                                                  md_dir: str, store: PDFStore,
+                                                  page_cache: PageLinkCache = None) -> Tuple[bool, str]:
+    """JSONファイルを処理してResearchGateからPDFダウンロードを試行（非同期版）"""
+    try:
+        paper, message = load_paper(json_path, pdf_dir, md_dir, store)
+        if paper is None:
+            return False, message
+        title = paper['title']
+
+        researchgate_pages = await search_researchgate_async(
+            session, limiter, title, paper['doi'], paper['authors'], page_cache)
+        if not researchgate_pages:
+            return False, f"No ResearchGate pages found for: {title}"
+
+        for page_url in researchgate_pages[:MAX_PAGES]:
+            pdf_urls = await extract_pdf_links_async(session, limiter, page_url, page_cache)
+            for pdf_url in pdf_urls[:MAX_PDF_LINKS]:
+                digest = await download_pdf_from_researchgate_async(session, limiter, pdf_url,
+                                                                    paper['pdf_path'])
+                if digest:
+                    return save_downloaded_pdf(store, paper, digest, pdf_url)
+
+        return False, f"All ResearchGate download attempts failed for: {title}"
+
+    except Exception as e:
+        return False, f"Error processing {json_path}: {e}"
+
+async def run_downloads_async(json_paths: List[str], pdf_dir: str, md_dir: str, store: PDFStore,
+                              page_cache: PageLinkCache = None) -> int:
+    """固定数のワーカーで全論文を処理し、成功件数を返す
+
+    待機はランダムな sleep ではなく HostLimiter のホスト別間隔で行う。
+    """
+    limiter = HostLimiter({breaker_host(RESEARCHGATE_BASE): RG_HOST_LIMIT}, DEFAULT_HOST_LIMIT)
+    queue: asyncio.Queue = asyncio.Queue()
+    for path in json_paths:
+        queue.put_nowait(path)
+    success_count = 0
+    completed = 0
+
+    async with aiohttp.ClientSession() as session:
+        async def worker():
+            nonlocal success_count, completed
+            while True:
+                try:
+                    path = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                success, message = await process_json_for_researchgate_pdf_async(
+                    session, limiter, path, pdf_dir, md_dir, store, page_cache)
+                completed += 1
+                if success:
+                    success_count += 1
+                print(f"{'✅' if success else 'ℹ️ '} [{completed}/{len(json_paths)}] {message}")
+
+        await asyncio.gather(*(worker() for _ in range(min(PAPER_WORKERS, len(json_paths)) or 1)))
+    return success_count
+
+def run_threaded(json_files: List[str], json_dir: str, pdf_dir: str, md_dir: str, store: PDFStore,
+                 page_cache: PageLinkCache, max_workers: int, start_time: float) -> int:
+    """スレッドプールで全論文を処理し、成功件数を返す"""
     success_count = 0
-    
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         # 全ファイルをタスクとして提出
         future_to_file = {}
         for json_file in json_files:
-            json_path = os.path.join(json_dir, json_file)
-            future = executor.submit(process_json_for_researchgate_pdf, json_path, pdf_dir, md_dir)
+            json_path = resolve(json_dir, json_file)
+            future = executor.submit(process_json_for_researchgate_pdf, json_path, pdf_dir, md_dir,
+                                     store, page_cache)
             future_to_file[future] = json_file
         
         # 完了したタスクから結果を取得
@@ -347,6 +604,55 @@ def main():
                 elapsed = time.time() - start_time
                 rate = completed / elapsed if elapsed > 0 else 0
                 print(f"⏳ Progress: {completed}/{len(json_files)} files | {elapsed:.1f}s | {rate:.2f} files/sec")
+    return success_count
+
+def main():
+    """メイン処理（--async で aiohttp 版）"""
+    use_async = '--async' in sys.argv[1:]
+    if use_async and not ASYNC_AVAILABLE:
+        print("❌ aiohttp がインストールされていません: pip install aiohttp")
+        sys.exit(1)
+
+    base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with stage_report("download_researchgate_pdfs", base):
+        run(base, use_async)
+
+def run(base: str, use_async: bool = False) -> None:
+    print(f"🚀 ResearchGate積極的PDF取得開始{'（非同期版）' if use_async else ''}...")
+    start_time = time.time()
+    
+    json_dir = os.path.join(base, "JSON_folder")
+    md_dir = os.path.join(base, "md_folder")
+    pdf_dir = os.path.join(base, "PDF")
+    
+    # PDF ディレクトリ作成
+    os.makedirs(pdf_dir, exist_ok=True)
+    
+    # 全JSONファイルを取得
+    json_files = list_names(json_dir, '.json')
+    metrics.count("papers", len(json_files))
+    
+    print(f"📊 Processing {len(json_files)} files with ResearchGate search...")
+    
+    # 並列処理実行（ResearchGateの負荷を考慮して制限）
+    max_workers = min(3, len(json_files))  # 最大3スレッド（サーバー負荷考慮）
+    success_count = 0
+    store = PDFStore(pdf_dir)
+    # 検索結果・論文ページの抽出結果キャッシュ（再実行時はページを取り直さない）
+    page_cache = PageLinkCache(os.path.join(base, PAGE_CACHE_DB))
+    
+    try:
+        if use_async:
+            json_paths = [resolve(json_dir, f) for f in json_files]
+            success_count = asyncio.run(run_downloads_async(json_paths, pdf_dir, md_dir, store, page_cache))
+        else:
+            success_count = run_threaded(json_files, json_dir, pdf_dir, md_dir, store, page_cache,
+                                         max_workers, start_time)
+    finally:
+        page_cache.close()
+        store.close()
+    metrics.count("pdfs_downloaded", success_count)
+    metrics.count("page_cache_hits", page_cache.hits)
     
     # 結果集計
     total_pdfs = len([f for f in os.listdir(pdf_dir) if f.endswith('.pdf')])
@@ -359,7 +665,15 @@ def main():
     print(f"📁 総PDF数: {total_pdfs}件")
     print(f"📂 PDFフォルダ: {pdf_dir}")
     print(f"⚡ 処理速度: {len(json_files)/elapsed:.2f} files/sec")
-    print(f"🧵 並列度: {max_workers} threads")
+    if use_async:
+        print(f"🧵 並列度: {PAPER_WORKERS} tasks（ResearchGate 同時接続 {RG_HOST_LIMIT[0]}）")
+    else:
+        print(f"🧵 並列度: {max_workers} threads")
+    print(f"🗂️  ページキャッシュ: ヒット {page_cache.hits}件 / ミス {page_cache.misses}件")
+    paused_hosts = host_breaker.summary()
+    if paused_hosts:
+        print(f"⏸️  サーキットブレーカー作動ホスト: {', '.join(paused_hosts)}")
 
 if __name__ == "__main__":
+    profile_option()
     main()
\ No newline at end of file
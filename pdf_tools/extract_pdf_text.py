@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+extract_pdf_text.py - PDF本文のテキスト抽出（キーワード分析・全文検索用）
+
+PDF/ の未抽出PDFを utils/pdf_text.py でプロセス並列に抽出し、
+pdf_text_cache.sqlite に保存する。抽出済みのPDF（内容のハッシュが同じもの）は
+読み飛ばすので、何度実行しても新しいPDFだけを処理する。
+抽出後に enhance_keywords.py を実行すると、本文からキーワードを抽出し
+検索索引にも本文が入る。
+
+使い方:
+    python3 pdf_tools/extract_pdf_text.py [並列数]
+"""
+
+import os
+import sys
+import time
+
+# ルートディレクトリをパスに追加（utils パッケージ用）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.pdf_text import PDF_TEXT_CACHE_DB, EXTRACT_WORKERS, PYPDF_AVAILABLE, extract_pdf_texts
+from utils.run_report import metrics, profile_option, stage_report
+
+def main():
+    if not PYPDF_AVAILABLE:
+        print("❌ pypdf がインストールされていません: pip install pypdf")
+        sys.exit(1)
+
+    base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    pdf_dir = os.path.join(base, "PDF")
+    if not os.path.isdir(pdf_dir):
+        print("ℹ️  PDF フォルダがありません。先にPDFを取得してください")
+        return
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else EXTRACT_WORKERS
+    with stage_report("extract_pdf_text", base):
+        run(base, pdf_dir, workers)
+
+def run(base: str, pdf_dir: str, workers: int) -> None:
+    print(f"📖 PDFテキスト抽出開始（{workers}プロセス）...")
+    start_time = time.time()
+
+    def progress(done: int, total: int, name: str, status: str) -> None:
+        mark = "✅" if status == "ok" else "⚠️"
+        print(f"  {mark} [{done}/{total}] {name}")
+
+    stats = extract_pdf_texts(pdf_dir, os.path.join(base, PDF_TEXT_CACHE_DB), workers, progress)
+    elapsed = time.time() - start_time
+    metrics.count("papers", stats['pdfs'])
+    for name in ("extracted", "cached", "errors", "pages"):
+        metrics.count(name, stats[name])
+
+    print(f"\n✅ PDFテキスト抽出完了 ({elapsed:.1f}秒)")
+    print(f"📊 PDF {stats['pdfs']}件: 新規抽出 {stats['extracted']}件（{stats['pages']}ページ） / "
+          f"抽出済み {stats['cached']}件 / 失敗 {stats['errors']}件")
+    if stats['extracted']:
+        print("💡 python3 enhance_keywords.py を実行すると本文からキーワードを抽出し、検索索引も更新します")
+
+if __name__ == "__main__":
+    profile_option()
+    main()
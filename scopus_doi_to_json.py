@@ -4,18 +4,42 @@
 scopus_combined.csv を読み込み、DOI から Crossref を取得して
 JSON_folder/*.json を生成（ファイル名 = 論文タイトル）。
 安定並列化対応版。
+
+Crossref レスポンスは crossref_cache.sqlite に圧縮保存する。
+ワーカーはキャッシュを読むだけで、新規取得分は親プロセスが
+まとめて書き込む（SQLite のロック競合を避けるため）。
+
+HTTP待ち・JSON解析・書き込みの時間と件数は utils/run_report.py で計測し、
+ワーカーの計測値は結果と一緒に親へ返して run_report.json にまとめる。
 """
 import os, json, time, random, re, unicodedata
-from urllib.parse import quote_plus
-import pandas as pd, requests, requests_cache
+from typing import Optional, Tuple
+import pandas as pd, requests
 from tqdm import tqdm
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
+from utils.http_cache import ResponseCache
+from utils.endpoints import crossref_work_url
+from utils.citation_graph import GRAPH_DIR, update_citation_graph
+from utils.run_report import metrics, profile_option, stage_report
+from utils.output_writer import OutputWriter
+from utils.shard_layout import resolve
+
 CSV_IN = "scopus_combined.csv"
 JSON_DIR = "JSON_folder"
 MAX_WORKERS = 10  # 並列数の上限（必要に応じて調整可）
+CACHE_DB = "crossref_cache.sqlite"
+CACHE_EXPIRE = 60*60*24*7
 
-requests_cache.install_cache("crossref_cache", expire_after=60*60*24*7)
+_worker_cache = None  # ワーカープロセスごとの読み取り専用キャッシュ
+
+def get_worker_cache(base: str) -> ResponseCache:
+    """ワーカー用の読み取り専用キャッシュ（プロセス内で使い回す）"""
+    global _worker_cache
+    if _worker_cache is None:
+        _worker_cache = ResponseCache(os.path.join(base, CACHE_DB),
+                                      expire_after=CACHE_EXPIRE, readonly=True)
+    return _worker_cache
 
 SAFE_CHARS = "-_.() " + ''.join(chr(c) for c in range(0x30,0x3A)) + ''.join(chr(c) for c in range(0x41,0x5B)) + ''.join(chr(c) for c in range(0x61,0x7B))
 
@@ -25,20 +49,47 @@ def safe_filename(title: str, maxlen: int = 120) -> str:
     cleaned = re.sub(r'_+', '_', cleaned).strip('_')
     return cleaned[:maxlen] or "untitled"
 
-def fetch_crossref(doi: str, retry: int = 3) -> dict:
+def fetch_crossref(doi: str, retry: int = 3,
+                   cache: Optional[ResponseCache] = None) -> Tuple[dict, Optional[bytes]]:
+    """Crossref からメタデータを取得
+
+    戻り値は (message, 新規取得したレスポンス本文)。
+    キャッシュヒット時・失敗時の本文は None。
+    """
+    url = crossref_work_url(doi)
+    if cache is not None:
+        with metrics.timer("cache_read"):
+            body = cache.get(url)
+        if body is not None:
+            with metrics.timer("json_parse"):
+                try:
+                    payload = json.loads(body)
+                except ValueError:
+                    payload = None
+            if isinstance(payload, dict) and isinstance(payload.get("message", {}), dict):
+                return payload.get("message", {}), None
+            # 壊れたエントリはミス扱いで取り直す（ワーカーの読み取り専用キャッシュでは
+            # 消せないので、親が再取得した本文で上書きする）
+            metrics.count("cache_corrupt")
+            cache.delete(url)
     session = requests.Session()
-    url = f"https://api.crossref.org/works/{quote_plus(doi)}"
     back = 0.5
     for _ in range(retry):
         try:
-            r = session.get(url, timeout=15)
+            metrics.count("requests")
+            with metrics.timer("http"):
+                r = session.get(url, timeout=15)
             r.raise_for_status()
+            metrics.count("bytes_downloaded", len(r.content))
             # 完全なレスポンスを返す（messageフィールドのみでなく全体）
-            return r.json().get("message", {})
+            with metrics.timer("json_parse"):
+                return json.loads(r.content).get("message", {}), r.content
         except Exception:
-            time.sleep(back + random.random() * 0.3)
+            metrics.count("request_errors")
+            with metrics.timer("backoff"):
+                time.sleep(back + random.random() * 0.3)
             back *= 2
-    return {}
+    return {}, None
 
 def extract_authors(author_list):
     """著者情報を抽出"""
@@ -62,10 +113,19 @@ def extract_authors(author_list):
         authors.append(author_info)
     return authors
 
-def process_row(row: dict, base: str) -> str:
+def process_row(row: dict, base: str) -> Tuple[str, str, Optional[Tuple[str, Optional[bytes]]], dict]:
+    """1行分の JSON を生成し (ファイル名, JSON 本文, キャッシュ操作, 計測値) を返す
+
+    書き込みは親の OutputWriter がまとめて行う（ワーカーは整形まで）。
+    キャッシュ操作は (URL, 新規本文) で、本文が None ならキャッシュヒット。
+    計測値はこのワーカーで前回から増えた分（親が metrics.merge() で足し込む）。
+    """
     doi = row.get("DOI", "").strip()
     title_csv = row.get("Title", row.get("タイトル", "")).strip()
-    meta = fetch_crossref(doi) if doi else {}
+    meta, fresh = fetch_crossref(doi, cache=get_worker_cache(base)) if doi else ({}, None)
+    cache_op = None
+    if doi and meta:
+        cache_op = (crossref_work_url(doi), fresh)
     
     # 基本情報
     title = meta.get("title", [title_csv])[0] if meta and meta.get("title") else title_csv or "untitled"
@@ -120,29 +180,65 @@ def process_row(row: dict, base: str) -> str:
     }
     
     fname = safe_filename(title) + ".json"
-    out_path = os.path.join(base, JSON_DIR, fname)
-    with open(out_path, "w", encoding="utf-8") as fp:
-        json.dump(data, fp, ensure_ascii=False, indent=2)
-    return fname
+    with metrics.timer("json_encode"):
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+    return fname, text, cache_op, metrics.drain()
 
 def main():
     base = os.path.dirname(os.path.abspath(__file__))
-    df = pd.read_csv(os.path.join(base, CSV_IN), dtype=str).fillna("")
+    with stage_report("scopus_doi_to_json", base):
+        run(base)
+
+def run(base: str) -> None:
+    with metrics.timer("csv_read"):
+        df = pd.read_csv(os.path.join(base, CSV_IN), dtype=str).fillna("")
     out_dir = os.path.join(base, JSON_DIR)
     os.makedirs(out_dir, exist_ok=True)
 
     rows = df.to_dict(orient="records")
+    metrics.count("papers", len(rows))
 
-    with ProcessPoolExecutor(max_workers=MAX_WORKERS) as executor:
+    # キャッシュへの書き込みは親プロセスだけが行う（単一ライター）
+    cache = ResponseCache(os.path.join(base, CACHE_DB), expire_after=CACHE_EXPIRE)
+    expired = cache.sweep_expired()
+    if expired:
+        print(f"期限切れキャッシュ削除: {expired} 件")
+    hits = 0
+    # JSON の書き込みは親の別スレッドで（一時ファイル経由・fsync はまとめて）
+    with cache, OutputWriter(background=True) as writer, \
+            ProcessPoolExecutor(max_workers=MAX_WORKERS) as executor:
         futures = {executor.submit(process_row, row, base): row for row in rows}
         for f in tqdm(as_completed(futures), total=len(futures), desc="DOI→JSON 並列処理"):
             try:
-                result = f.result()
+                result, text, cache_op, worker_metrics = f.result()
+                metrics.merge(worker_metrics)
+                writer.write_text(resolve(out_dir, result, create=True), text, completes=result)
                 # print(f"生成: {result}")  # 必要に応じて出力
+                if cache_op:
+                    url, body = cache_op
+                    with metrics.timer("cache_write"):
+                        if body is None:
+                            hits += 1
+                            cache.touch([url])
+                        else:
+                            cache.put(url, body)
             except Exception as e:
+                metrics.count("errors")
                 print(f"エラー発生: {e}")
 
+    metrics.count("cache_hits", hits)
+    print(f"キャッシュヒット: {hits}/{len(rows)} 件")
+
     print("JSON 生成完了")
 
+    # 引用グラフ索引を増分更新（変わったJSONだけ読み直す）
+    try:
+        with metrics.timer("citation_graph"):
+            stats = update_citation_graph(out_dir, os.path.join(base, GRAPH_DIR))
+        print(f"引用グラフ更新: 論文 {stats['papers']} 件 / ノード {stats['nodes']} / 引用 {stats['edges']}")
+    except Exception as e:
+        print(f"引用グラフ更新エラー: {e}")
+
 if __name__ == "__main__":
+    profile_option()
     main()
\ No newline at end of file
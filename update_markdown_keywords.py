@@ -9,6 +9,11 @@ import json
 import re
 import unicodedata
 
+from utils.output_writer import OutputWriter
+from utils.shard_layout import list_names, resolve
+from utils.run_report import metrics, profile_option, stage_report
+from utils.status_index import changes, completed_papers, paper_key
+
 def safe_filename(title: str, maxlen: int = 120) -> str:
     """安全なファイル名生成"""
     SAFE_CHARS = "-_.() " + "".join(chr(c) for c in range(0x30, 0x7B) if chr(c).isalnum())
@@ -49,10 +54,10 @@ def format_keywords_section(keywords_data: dict) -> str:
     
     return "\n".join(sections)
 
-def update_markdown_with_keywords(json_path: str, md_dir: str) -> None:
-    """JSONのキーワード情報をMarkdownファイルに反映"""
+def update_markdown_with_keywords(json_path: str, md_dir: str, writer: OutputWriter) -> None:
+    """JSONのキーワード情報をMarkdownファイルに反映（保存は writer に任せる）"""
     # JSONデータ読み込み
-    with open(json_path, 'r', encoding='utf-8') as f:
+    with metrics.timer("json_read"), open(json_path, 'r', encoding='utf-8') as f:
         data = json.load(f)
     
     title = data.get('title', 'untitled')
@@ -63,17 +68,24 @@ def update_markdown_with_keywords(json_path: str, md_dir: str) -> None:
     
     # 対応するMarkdownファイルパス
     md_filename = safe_filename(title) + ".md"
-    md_path = os.path.join(md_dir, md_filename)
+    md_path = resolve(md_dir, md_filename)
     
     if not os.path.exists(md_path):
         return
+    if writer.submitted(md_path):
+        # 同じタイトルの論文がこの実行で追加済み
+        metrics.count("already_done")
+        changes.completed(json_path)
+        return
     
     # 既存のMarkdownファイル読み込み
-    with open(md_path, 'r', encoding='utf-8') as f:
+    with metrics.timer("md_read"), open(md_path, 'r', encoding='utf-8') as f:
         content = f.read()
     
     # キーワードセクションが既に存在するかチェック
     if "## キーワード分析" in content:
+        metrics.count("already_done")
+        changes.completed(json_path)
         return  # 既に追加済み
     
     # キーワードセクションを生成
@@ -96,34 +108,50 @@ def update_markdown_with_keywords(json_path: str, md_dir: str) -> None:
         # ファイル末尾に追加
         content += f"\n\n## キーワード分析\n\n{keywords_section}"
     
-    # ファイル保存
-    with open(md_path, 'w', encoding='utf-8') as f:
-        f.write(content)
+    # ファイル保存（一時ファイル経由で置き換える）
+    writer.write_text(md_path, content, completes=json_path)
+    metrics.count("md_updated")
     
     combined_count = len(keywords_data.get('combined_keywords', []))
     print(f"Updated: {md_filename} - {combined_count} keywords added")
 
 def main():
     """メイン処理"""
+    base = os.path.dirname(os.path.abspath(__file__))
+    with stage_report("update_markdown_keywords", base):
+        run(base)
+
+def run(base: str) -> None:
     print("Markdownキーワード更新開始...")
     
-    base = os.path.dirname(os.path.abspath(__file__))
     json_dir = os.path.join(base, "JSON_folder")
     md_dir = os.path.join(base, "md_folder")
     
     # 全JSONファイルを処理
-    json_files = [f for f in os.listdir(json_dir) if f.endswith('.json')]
+    json_files = list_names(json_dir, '.json')
     updated_count = 0
-    
-    for json_file in json_files:
-        json_path = os.path.join(json_dir, json_file)
-        try:
-            update_markdown_with_keywords(json_path, md_dir)
-            updated_count += 1
-        except Exception as e:
-            print(f"Error processing {json_file}: {e}")
+    metrics.count("papers", len(json_files))
+    
+    # 状況索引で済んでいる論文は Markdown を開かずに飛ばす
+    done = completed_papers(base, "update_markdown_keywords")
+    if done:
+        remaining = [f for f in json_files if paper_key(f) not in done]
+        metrics.count("already_done", len(json_files) - len(remaining))
+        print(f"追加済み: {len(json_files) - len(remaining)} ファイル（状況索引）")
+        json_files = remaining
+    
+    with OutputWriter() as writer:
+        for json_file in json_files:
+            json_path = resolve(json_dir, json_file)
+            try:
+                update_markdown_with_keywords(json_path, md_dir, writer)
+                updated_count += 1
+            except Exception as e:
+                metrics.count("errors")
+                print(f"Error processing {json_file}: {e}")
     
     print(f"Markdown更新完了: {updated_count} ファイル処理")
 
 if __name__ == "__main__":
+    profile_option()
     main()
\ No newline at end of file
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+circuit_breaker.py - ホスト単位のサーキットブレーカー
+
+出版社サイトが 403 / 429 / 5xx やタイムアウトを返し始めると、全ワーカーが
+同じホストに接続し続けて毎回 15〜30 秒のタイムアウトを使い切ってしまう。
+連続 FAILURE_THRESHOLD 回失敗したホストはクールダウンの間スキップし（open）、
+クールダウン後は1リクエストだけ試して（half-open）、成功すれば復帰、
+失敗すればクールダウンを倍にして再び止める。ワーカー間（スレッド・
+asyncio タスク）で1つのインスタンスを共有する。
+"""
+
+import time
+import asyncio
+import threading
+from typing import Dict, List
+from urllib.parse import urlparse
+
+FAILURE_THRESHOLD = 5     # 連続失敗でブレーカーを開く回数
+COOLDOWN = 120.0          # 最初のクールダウン（秒）
+MAX_COOLDOWN = 1800.0     # クールダウンの上限（秒）
+TRIP_STATUSES = {403, 429}  # ホスト側の拒否とみなすステータス（5xx も含む）
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+def breaker_host(url: str) -> str:
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+def is_host_failure_status(status: int) -> bool:
+    return status in TRIP_STATUSES or status >= 500
+
+class _HostState:
+    __slots__ = ('state', 'failures', 'open_until', 'cooldown', 'skipped')
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.open_until = 0.0
+        self.cooldown = COOLDOWN
+        self.skipped = 0
+
+class HostCircuitBreaker:
+    """ホストごとの closed / open / half-open を管理（スレッドセーフ）"""
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD,
+                 cooldown: float = COOLDOWN, max_cooldown: float = MAX_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, _HostState] = {}
+
+    def _state(self, url: str) -> _HostState:
+        host = breaker_host(url)
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState()
+            state.cooldown = self.cooldown
+        return state
+
+    def allow(self, url: str) -> bool:
+        """リクエストしてよいか（open 中は False、クールダウン明けは1件だけ True）"""
+        with self._lock:
+            state = self._state(url)
+            if state.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if now >= state.open_until:
+                # クールダウン明け（または試行の結果が返らないまま期限切れ）:
+                # この呼び出しを試行役にする
+                state.state = HALF_OPEN
+                state.open_until = now + state.cooldown
+                return True
+            state.skipped += 1
+            return False
+
+    def is_open(self, url: str) -> bool:
+        """状態を変えずに、いまスキップ対象かどうかを返す"""
+        with self._lock:
+            state = self._hosts.get(breaker_host(url))
+            if state is None or state.state == CLOSED:
+                return False
+            return time.monotonic() < state.open_until
+
+    def record_success(self, url: str) -> None:
+        with self._lock:
+            state = self._state(url)
+            state.state = CLOSED
+            state.failures = 0
+            state.cooldown = self.cooldown
+
+    def record_failure(self, url: str) -> None:
+        with self._lock:
+            state = self._state(url)
+            state.failures += 1
+            if state.state == HALF_OPEN:
+                # 試行も失敗: クールダウンを延ばして再び止める
+                state.cooldown = min(state.cooldown * 2, self.max_cooldown)
+            elif state.failures < self.failure_threshold:
+                return
+            state.state = OPEN
+            state.open_until = time.monotonic() + state.cooldown
+
+    def record_status(self, url: str, status: int) -> None:
+        """HTTPステータスで成否を記録（404 などはホストが生きているので成功扱い）"""
+        if is_host_failure_status(status):
+            self.record_failure(url)
+        else:
+            self.record_success(url)
+
+    def record_exception(self, url: str, exc: BaseException) -> None:
+        """例外で成否を記録（HTTPエラーはステータス、タイムアウト・接続エラーは失敗）
+
+        urllib の HTTPError はリダイレクト後のURLを持つので、そのホストに記録する
+        （doi.org 経由で出版社に 403 を返されても doi.org は止めない）。
+        """
+        failed_url = getattr(exc, 'url', None)
+        if isinstance(failed_url, str) and failed_url:
+            url = failed_url
+        status = getattr(exc, 'code', None) or getattr(exc, 'status', None)
+        if isinstance(status, int):
+            self.record_status(url, status)
+        elif isinstance(exc, (OSError, TimeoutError, asyncio.TimeoutError)):
+            self.record_failure(url)
+
+    def summary(self) -> List[str]:
+        """ブレーカーが作動したホストの一覧（実行結果の表示用）"""
+        with self._lock:
+            return [f"{host}: {state.state}（スキップ {state.skipped}件）"
+                    for host, state in sorted(self._hosts.items())
+                    if state.state != CLOSED or state.skipped]
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+citation_graph.py - コーパス全体の引用グラフ索引（CSR・メモリマップ）
+
+JSON_folder/*.json の references から「論文 → 引用先」の辺を集め、
+DOIに整数のノードIDを振って CSR 形式（NumPy配列）で保存する。
+- cites     : ノード i が引用している論文 = cites_indices[cites_indptr[i]:cites_indptr[i+1]]
+- cited_by  : ノード i を引用している論文（cites の転置）
+入次数・出次数・コーパス内被引用数は indptr の差分だけで求まる。
+
+保存先は citation_graph/ で、配列は .npy なので np.load(mmap_mode='r') で
+開くだけで使える（100万辺でも読み込みはほぼ一瞬）。
+sources.json に各JSONの更新時刻とサイズを記録しておき、再構築時は
+追加・変更・削除されたJSONだけを読み直す。ノードIDは追記のみで変わらない。
+"""
+
+import os
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.output_writer import write_atomic
+from utils.shard_layout import resolve, scan
+
+GRAPH_DIR = "citation_graph"
+FORMAT_VERSION = 1
+
+NODES_FILE = "nodes.txt"          # 1行1ノード（行番号 = ノードID）
+SOURCES_FILE = "sources.json"     # JSONファイル名 → {mtime_ns, size, node}
+META_FILE = "meta.json"
+EDGES_FILE = "edges.npy"          # (辺数, 2) の int32 [引用元, 引用先]（増分更新用）
+CORPUS_FILE = "corpus.npy"        # ノードがコーパス内の論文（JSONがある）か
+ARRAY_FILES = ("cites_indptr", "cites_indices", "cited_by_indptr", "cited_by_indices")
+
+def node_key(doi: str, json_name: str = "") -> str:
+    """ノードのキー（DOIは小文字化、DOIの無い論文はJSONファイル名）"""
+    doi = doi.strip().lower() if isinstance(doi, str) else ""
+    return doi if doi else f"json:{json_name}"
+
+def reference_dois(data: dict) -> List[str]:
+    """JSONの references からDOIのある参考文献だけを取り出す"""
+    dois = []
+    for ref in data.get("references", []) or []:
+        if isinstance(ref, dict) and isinstance(ref.get("DOI"), str) and ref["DOI"].strip():
+            dois.append(ref["DOI"].strip().lower())
+    return dois
+
+def build_csr(src: np.ndarray, dst: np.ndarray, num_nodes: int) -> Tuple[np.ndarray, np.ndarray]:
+    """辺リストから CSR（indptr, indices）を作る（src 順・同一行内は dst 昇順）"""
+    order = np.lexsort((dst, src))
+    indices = dst[order].astype(np.int32, copy=False)
+    counts = np.bincount(src, minlength=num_nodes)
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    return indptr, indices
+
+def _save_array(path: str, array: np.ndarray) -> None:
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+def _save_json(path: str, obj) -> None:
+    write_atomic(path, json.dumps(obj, ensure_ascii=False))
+
+class CitationGraph:
+    """読み込み済みの引用グラフ（配列はメモリマップ可・読み取り専用）"""
+
+    def __init__(self, nodes: List[str], corpus: np.ndarray,
+                 cites_indptr: np.ndarray, cites_indices: np.ndarray,
+                 cited_by_indptr: np.ndarray, cited_by_indices: np.ndarray):
+        self.nodes = nodes
+        self.corpus = corpus
+        self.cites_indptr = cites_indptr
+        self.cites_indices = cites_indices
+        self.cited_by_indptr = cited_by_indptr
+        self.cited_by_indices = cited_by_indices
+        self._ids: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def load(cls, graph_dir: str, mmap: bool = True) -> "CitationGraph":
+        """citation_graph/ から読み込む（mmap=True なら配列はメモリマップ）"""
+        mode = 'r' if mmap else None
+        with open(os.path.join(graph_dir, NODES_FILE), 'r', encoding='utf-8') as f:
+            nodes = f.read().split('\n')[:-1]
+        arrays = [np.load(os.path.join(graph_dir, f"{name}.npy"), mmap_mode=mode)
+                  for name in ARRAY_FILES]
+        corpus = np.load(os.path.join(graph_dir, CORPUS_FILE), mmap_mode=mode)
+        return cls(nodes, corpus, *arrays)
+
+    # ---------- ノード ----------
+    @property
+    def num_nodes(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.cites_indices)
+
+    def node_id(self, doi: str) -> Optional[int]:
+        """DOI（またはノードキー）→ ノードID（未登録は None）"""
+        if self._ids is None:
+            self._ids = {key: i for i, key in enumerate(self.nodes)}
+        return self._ids.get(doi if doi.startswith("json:") else node_key(doi))
+
+    def doi_of(self, node: int) -> str:
+        return self.nodes[node]
+
+    def corpus_nodes(self) -> np.ndarray:
+        """コーパス内の論文（JSONがある）のノードID"""
+        return np.flatnonzero(self.corpus)
+
+    # ---------- 隣接 ----------
+    def cites(self, node: int) -> np.ndarray:
+        """node が引用している論文のノードID"""
+        return self.cites_indices[self.cites_indptr[node]:self.cites_indptr[node + 1]]
+
+    def cited_by(self, node: int) -> np.ndarray:
+        """node を引用しているコーパス内論文のノードID"""
+        return self.cited_by_indices[self.cited_by_indptr[node]:self.cited_by_indptr[node + 1]]
+
+    # ---------- 次数 ----------
+    def out_degree(self) -> np.ndarray:
+        """各ノードの参考文献数（DOIのあるもの）"""
+        return np.diff(self.cites_indptr)
+
+    def in_degree(self) -> np.ndarray:
+        """各ノードのコーパス内被引用数（引用元は常にコーパス内の論文）"""
+        return np.diff(self.cited_by_indptr)
+
+    def local_citation_counts(self) -> Dict[str, int]:
+        """コーパス内の論文ごとの、コーパス内の他論文からの被引用数"""
+        in_degree = self.in_degree()
+        return {self.nodes[i]: int(in_degree[i]) for i in self.corpus_nodes()}
+
+    def top_cited(self, k: int = 10, corpus_only: bool = False) -> List[Tuple[str, int]]:
+        """コーパス内被引用数の多い順に (DOI, 件数) を返す"""
+        in_degree = self.in_degree()
+        candidates = self.corpus_nodes() if corpus_only else np.arange(self.num_nodes)
+        if len(candidates) == 0:
+            return []
+        k = min(k, len(candidates))
+        counts = in_degree[candidates]
+        top = candidates[np.argpartition(-counts, k - 1)[:k]]
+        top = top[np.argsort(-in_degree[top], kind='stable')]
+        return [(self.nodes[i], int(in_degree[i])) for i in top]
+
+def update_citation_graph(json_dir: str, graph_dir: str) -> Dict[str, int]:
+    """JSON_folder から引用グラフを増分更新して保存し、処理件数を返す
+
+    前回から変わっていないJSONは読み直さない。変更・削除されたJSONの辺は
+    取り除き、新しい内容で入れ直す。
+    """
+    os.makedirs(graph_dir, exist_ok=True)
+    nodes_path = os.path.join(graph_dir, NODES_FILE)
+    sources_path = os.path.join(graph_dir, SOURCES_FILE)
+    edges_path = os.path.join(graph_dir, EDGES_FILE)
+
+    nodes: List[str] = []
+    sources: Dict[str, Dict] = {}
+    edges = np.empty((0, 2), dtype=np.int32)
+    if os.path.exists(os.path.join(graph_dir, META_FILE)):
+        with open(nodes_path, 'r', encoding='utf-8') as f:
+            nodes = f.read().split('\n')[:-1]
+        with open(sources_path, 'r', encoding='utf-8') as f:
+            sources = json.load(f)
+        edges = np.load(edges_path)
+    ids = {key: i for i, key in enumerate(nodes)}
+    known_nodes = len(nodes)
+
+    def intern(key: str) -> int:
+        node = ids.get(key)
+        if node is None:
+            node = ids[key] = len(nodes)
+            nodes.append(key)
+        return node
+
+    # 追加・変更・削除されたJSONを判定
+    current = {}
+    for entry in scan(json_dir, '.json'):
+        st = entry.stat()
+        current[entry.name] = (st.st_mtime_ns, st.st_size)
+    stale = [name for name, info in sources.items()
+             if name not in current or (info['mtime_ns'], info['size']) != current[name]]
+    # 古い辺を削除（引用元ノード単位）。同じDOIの別JSONがあればそれも読み直す
+    dropped = {sources[name]['node'] for name in stale}
+    stale += [name for name, info in sources.items() if info['node'] in dropped and name not in stale]
+    stale_set = set(stale)
+    fresh = [name for name in current if name not in sources or name in stale_set]
+    if not fresh and not stale:
+        return {'parsed': 0, 'removed': 0, 'errors': 0, 'papers': len(sources),
+                'nodes': len(nodes), 'edges': int(len(edges))}
+    for name in stale:
+        del sources[name]
+    if dropped and len(edges):
+        edges = edges[~np.isin(edges[:, 0], np.fromiter(dropped, dtype=np.int32))]
+
+    # 新しい・変更されたJSONを読む
+    new_edges: List[Tuple[int, int]] = []
+    errors = 0
+    for name in sorted(fresh):
+        try:
+            with open(resolve(json_dir, name), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            errors += 1
+            continue
+        if not isinstance(data, dict):  # 論文以外（配列など）は数えるだけで飛ばす
+            errors += 1
+            continue
+        src = intern(node_key(data.get('doi', ''), name))
+        new_edges.extend((src, intern(doi)) for doi in reference_dois(data))
+        mtime_ns, size = current[name]
+        sources[name] = {'mtime_ns': mtime_ns, 'size': size, 'node': src}
+    if new_edges:
+        # 重複辺（同じ文献の二重記載）を除く。今回読んだ論文を引用元とする既存の辺も
+        # 合わせて重複を除くので、前回 edges.npy だけ書いて sources.json を書く前に
+        # 落ちていても同じ辺が二重に入らない（同じDOIの別JSONの辺もまとめられる）
+        new_array = np.asarray(new_edges, dtype=np.int64)
+        touched = np.isin(edges[:, 0], np.unique(new_array[:, 0]))
+        combined = np.concatenate([edges[touched].astype(np.int64), new_array])
+        packed = np.unique(combined @ np.array([1 << 32, 1], dtype=np.int64))
+        added = np.stack([packed >> 32, packed & 0xFFFFFFFF], axis=1).astype(np.int32)
+        edges = np.concatenate([edges[~touched], added])
+
+    # CSR を作り直して保存（配列を先に書き、sources.json・meta.json を最後に置き換える）
+    num_nodes = len(nodes)
+    corpus = np.zeros(num_nodes, dtype=bool)
+    corpus[[info['node'] for info in sources.values()]] = True
+    src, dst = edges[:, 0], edges[:, 1]
+    cites_indptr, cites_indices = build_csr(src, dst, num_nodes)
+    cited_by_indptr, cited_by_indices = build_csr(dst, src, num_nodes)
+
+    if num_nodes > known_nodes:
+        with open(nodes_path, 'a' if known_nodes else 'w', encoding='utf-8') as f:
+            f.write(''.join(key + '\n' for key in nodes[known_nodes:]))
+    _save_array(edges_path, edges)
+    _save_array(os.path.join(graph_dir, CORPUS_FILE), corpus)
+    for name, array in zip(ARRAY_FILES, (cites_indptr, cites_indices, cited_by_indptr, cited_by_indices)):
+        _save_array(os.path.join(graph_dir, f"{name}.npy"), array)
+    _save_json(sources_path, sources)
+    _save_json(os.path.join(graph_dir, META_FILE), {
+        'version': FORMAT_VERSION,
+        'nodes': num_nodes,
+        'edges': int(len(edges)),
+        'papers': len(sources),
+        'updated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    })
+    return {
+        'parsed': len(fresh) - errors,
+        'removed': len([name for name in stale if name not in current]),
+        'errors': errors,
+        'papers': len(sources),
+        'nodes': num_nodes,
+        'edges': int(len(edges)),
+    }
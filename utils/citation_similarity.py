@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+citation_similarity.py - 共引用・書誌結合の疎行列計算
+
+引用グラフ（utils/citation_graph.py）から 論文×参考文献 の接続行列 A を
+scipy.sparse で作り、
+- 書誌結合（bibliographic coupling）: A·Aᵀ … 2つの論文が共有する参考文献の数
+- 共引用（co-citation）            : Aᵀ·A … 2つの文献を同時に引用している論文の数
+を行ブロックごとに計算する。閾値未満の組は捨て、各行の上位 k 件だけ残す。
+ブロックの大きさは積和回数で決めるので、よく引用される文献があってもメモリは一定。
+
+件数 w の組は両方の次数が w 以上なので、次数が閾値未満の行・列は
+計算前に除いても結果は変わらない（共引用の列数を大きく減らせる）。
+"""
+
+import csv
+import json
+import os
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+try:
+    import scipy.sparse as sp
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+from utils.citation_graph import CitationGraph, SOURCES_FILE
+
+DEFAULT_MIN_WEIGHT = 2     # これ未満の共有数の組は捨てる
+DEFAULT_TOP_K = 20         # 各論文（文献）について残す相手の数
+BLOCK_ROWS = 4096          # 1回の行列積で扱う最大行数
+BLOCK_PRODUCTS = 20_000_000  # 1回の行列積の積和回数の目安（中間結果のメモリ上限）
+
+COUPLING_FILE = "coupling.csv"      # 書誌結合の辺（citation_graph/ 内）
+COCITATION_FILE = "cocitation.csv"  # 共引用の辺
+
+def incidence_matrix(graph: CitationGraph) -> Tuple["sp.csr_matrix", np.ndarray]:
+    """コーパス内論文 × 全ノード の接続行列と、行に対応するノードIDを返す"""
+    papers = graph.corpus_nodes()
+    indptr = np.asarray(graph.cites_indptr)
+    indices = np.asarray(graph.cites_indices)
+    full = sp.csr_matrix((np.ones(len(indices), dtype=np.float32), indices, indptr),
+                         shape=(graph.num_nodes, graph.num_nodes))
+    return full[papers], papers
+
+class WeightedEdges(NamedTuple):
+    """重み付き辺の配列（source[i] — target[i] の重み weight[i]。ノードID）"""
+    source: np.ndarray
+    target: np.ndarray
+    weight: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.weight)
+
+def _top_k_per_row(rows: np.ndarray, cols: np.ndarray, data: np.ndarray,
+                   top_k: Optional[int]) -> np.ndarray:
+    """各行の重みの大きい順に top_k 件を選ぶ添字（同点は列番号の小さい順）"""
+    order = np.lexsort((cols, -data, rows))
+    if top_k is None:
+        return order
+    sorted_rows = rows[order]
+    rank = np.arange(len(order)) - np.searchsorted(sorted_rows, sorted_rows, side='left')
+    return order[rank < top_k]
+
+def _row_blocks(M: "sp.csr_matrix"):
+    """M·Mᵀ を計算する行範囲を、積和回数が BLOCK_PRODUCTS 程度になるよう区切る
+
+    行 i の積和回数は、行 i の各列を持つ行数の合計（= 中間結果の非零要素数の上限）。
+    よく引用される文献を持つ行ほど重いので、行数固定だとブロックによっては
+    ほぼ密な結果になりメモリが足りなくなる。
+    """
+    column_count = np.bincount(M.indices, minlength=M.shape[1]).astype(np.float64)
+    cost = np.cumsum(M @ column_count)
+    start = 0
+    while start < M.shape[0]:
+        base = cost[start - 1] if start else 0.0
+        end = int(np.searchsorted(cost, base + BLOCK_PRODUCTS, side='right'))
+        end = min(max(end, start + 1), start + BLOCK_ROWS)
+        yield start, end
+        start = end
+
+def similarity_edges(M: "sp.csr_matrix", min_weight: int = DEFAULT_MIN_WEIGHT,
+                     top_k: Optional[int] = DEFAULT_TOP_K,
+                     normalize: bool = False,
+                     upper_only: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """M·Mᵀ を行ブロックごとに計算し、対角以外で閾値以上の (行, 列, 重み) を返す
+
+    normalize=True なら重みを コサイン（w / √(次数i·次数j)）にする
+    （閾値は正規化前の件数に適用）。upper_only=True なら 行 < 列 の組だけ返す
+    （M·Mᵀ は対称なので各組1回ずつになる）。
+    """
+    Mt = M.T.tocsc()
+    degree = np.diff(M.indptr).astype(np.float64)
+    rows, cols, weights = [], [], []
+    for start, end in _row_blocks(M):
+        block = (M[start:end] @ Mt).tocoo()
+        r = block.row.astype(np.int64) + start
+        c = block.col.astype(np.int64)
+        w = block.data
+        keep = (w >= min_weight) & ((r < c) if upper_only else (r != c))  # 閾値未満と自分自身との組を除く
+        r, c, w = r[keep], c[keep], w[keep]
+        if normalize:
+            w = (w / np.sqrt(degree[r] * degree[c])).astype(np.float32)
+        top = _top_k_per_row(r, c, w, top_k)
+        rows.append(r[top])
+        cols.append(c[top])
+        weights.append(w[top])
+    if not rows:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float32)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(weights)
+
+def bibliographic_coupling(graph: CitationGraph, min_weight: int = DEFAULT_MIN_WEIGHT,
+                           top_k: Optional[int] = DEFAULT_TOP_K,
+                           normalize: bool = False) -> WeightedEdges:
+    """参考文献を min_weight 件以上共有するコーパス内論文の組（A·Aᵀ）"""
+    A, papers = incidence_matrix(graph)
+    active = np.flatnonzero(np.diff(A.indptr) >= min_weight)  # 参考文献が閾値未満の論文は組にならない
+    r, c, w = similarity_edges(A[active], min_weight, top_k, normalize)
+    ids = papers[active]
+    return WeightedEdges(ids[r], ids[c], w)
+
+def co_citation(graph: CitationGraph, min_weight: int = DEFAULT_MIN_WEIGHT,
+                top_k: Optional[int] = DEFAULT_TOP_K,
+                normalize: bool = False) -> WeightedEdges:
+    """min_weight 本以上のコーパス内論文から同時に引用された文献の組（Aᵀ·A）"""
+    A, _ = incidence_matrix(graph)
+    At = A.T.tocsr()
+    active = np.flatnonzero(np.diff(At.indptr) >= min_weight)  # 被引用が閾値未満の文献は組にならない
+    r, c, w = similarity_edges(At[active], min_weight, top_k, normalize)
+    return WeightedEdges(active[r], active[c], w)
+
+def undirected(edges: WeightedEdges) -> WeightedEdges:
+    """(i, j) と (j, i) を1本にまとめる（top-k で片方だけ残った組も含める）"""
+    lo = np.minimum(edges.source, edges.target)
+    hi = np.maximum(edges.source, edges.target)
+    order = np.lexsort((-edges.weight, hi, lo))
+    lo, hi, weight = lo[order], hi[order], edges.weight[order]
+    first = np.ones(len(lo), dtype=bool)
+    first[1:] = (lo[1:] != lo[:-1]) | (hi[1:] != hi[:-1])
+    return WeightedEdges(lo[first], hi[first], weight[first])
+
+def note_names(graph_dir: str) -> Dict[int, str]:
+    """コーパス内論文のノードID → ノート名（JSONファイル名から拡張子を除いたもの）"""
+    with open(os.path.join(graph_dir, SOURCES_FILE), 'r', encoding='utf-8') as f:
+        sources = json.load(f)
+    names: Dict[int, str] = {}
+    for name, info in sorted(sources.items()):
+        names.setdefault(info['node'], os.path.splitext(name)[0])
+    return names
+
+def export_edges(graph: CitationGraph, edges: WeightedEdges, path: str,
+                 notes: Optional[Dict[int, str]] = None) -> int:
+    """重み付き辺を CSV（source, target, weight, source_note, target_note）に書き出す
+
+    source / target はDOI（DOIの無い論文はノードキー）、*_note は Obsidian の
+    ノート名（コーパス外の文献は空）。書き出した行数を返す。
+    """
+    notes = notes or {}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["source", "target", "weight", "source_note", "target_note"])
+        for s, t, w in zip(edges.source.tolist(), edges.target.tolist(), edges.weight.tolist()):
+            writer.writerow([graph.nodes[s], graph.nodes[t], f"{w:g}",
+                             notes.get(s, ""), notes.get(t, "")])
+    os.replace(tmp_path, path)
+    return len(edges)
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+endpoints.py - 外部API（Crossref・doi.org・Unpaywall）の接続先
+
+既定は本番のURL。環境変数で差し替えられるので、ローカルの模擬サーバー
+（dev_tools/模擬APIサーバー.py）に向けて並列数・バックオフの変更を
+ネットワークなしで再現性のある条件で測れる。
+    CROSSREF_API_URL   （既定 https://api.crossref.org）
+    DOI_RESOLVER_URL   （既定 https://doi.org）
+    UNPAYWALL_API_URL  （既定 https://api.unpaywall.org）
+Crossref キャッシュのキーはURLなので、接続先を変えると本番の応答とは別に保存される。
+"""
+
+import os
+from urllib.parse import quote_plus
+
+CROSSREF_API = os.environ.get("CROSSREF_API_URL", "https://api.crossref.org").rstrip('/')
+DOI_RESOLVER = os.environ.get("DOI_RESOLVER_URL", "https://doi.org").rstrip('/')
+UNPAYWALL_API = os.environ.get("UNPAYWALL_API_URL", "https://api.unpaywall.org").rstrip('/')
+UNPAYWALL_EMAIL = "research@example.com"
+
+def crossref_work_url(doi: str) -> str:
+    return f"{CROSSREF_API}/works/{quote_plus(doi)}"
+
+def doi_url(doi: str, quote: bool = False) -> str:
+    """doi.org のURL（quote=True は DOI を URL エンコードする。コンテントネゴシエーション用）"""
+    return f"{DOI_RESOLVER}/{quote_plus(doi) if quote else doi}"
+
+def unpaywall_url(doi: str, email: str = UNPAYWALL_EMAIL) -> str:
+    return f"{UNPAYWALL_API}/v2/{doi}?email={email}"
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+http_cache.py - 並列ワーカー対応のHTTPレスポンスキャッシュ
+
+SQLite（WALモード）にレスポンス本文を圧縮して保存する。
+ワーカープロセスは読み取り専用接続で参照するだけにし、書き込みは
+親プロセスの単一ライターがまとめてコミットする（ロック競合の回避）。
+サイズ上限を超えた分は最終アクセスの古い順（LRU）に削除する。
+
+圧縮は zstandard がインストールされていれば zstd、なければ gzip。
+ヒット数・ミス数・キャッシュから返したバイト数も記録しており、
+utils/キャッシュ管理.py から統計表示・期限切れ掃除・容量削減ができる。
+"""
+
+import gzip
+import os
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+DEFAULT_EXPIRE = 60 * 60 * 24 * 7        # 7日
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024    # 圧縮後の合計サイズ上限（512MB）
+BATCH_SIZE = 200                         # 1トランザクションでまとめて書き込む件数
+EVICT_RATIO = 0.9                        # 上限超過時はこの割合まで削減
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS http_cache (
+    key TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    codec TEXT NOT NULL,
+    raw_size INTEGER NOT NULL,
+    stored_size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_http_cache_accessed ON http_cache(accessed_at);
+CREATE INDEX IF NOT EXISTS idx_http_cache_created ON http_cache(created_at);
+CREATE TABLE IF NOT EXISTS http_cache_stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+LEGACY_TABLES = ("responses", "redirects")  # 旧 requests_cache のテーブル
+
+def open_sqlite(path: str, readonly: bool = False, threaded: bool = False) -> sqlite3.Connection:
+    """WALモードのSQLite接続を開く
+
+    readonly=True はワーカー用。threaded=True は呼び出し側がロックで
+    直列化したうえで複数スレッドから同じ接続を使う場合に指定する。
+    """
+    if readonly:
+        uri = Path(path).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=30, check_same_thread=not threaded)
+    else:
+        conn = sqlite3.connect(path, timeout=30, check_same_thread=not threaded)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+def compress(body: bytes) -> Tuple[bytes, str]:
+    """本文を圧縮して (圧縮データ, コーデック名) を返す"""
+    if ZSTD_AVAILABLE:
+        return zstandard.ZstdCompressor(level=10).compress(body), "zstd"
+    return gzip.compress(body, 6), "gzip"
+
+def decompress(data: bytes, codec: str) -> bytes:
+    """コーデック名に応じて本文を復元"""
+    if codec == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise ValueError("zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "identity":
+        return data
+    raise ValueError(f"unknown codec: {codec}")
+
+class ResponseCache:
+    """圧縮・サイズ上限付きのレスポンスキャッシュ
+
+    get() は読み取り専用接続でも使える。put() / touch() はバッファに
+    溜めておき、BATCH_SIZE 件ごと（または flush() / close() 時）に
+    1トランザクションでコミットする。
+    """
+
+    def __init__(self, path: str, expire_after: Optional[float] = DEFAULT_EXPIRE,
+                 max_bytes: Optional[int] = DEFAULT_MAX_BYTES, readonly: bool = False):
+        self.path = path
+        self.expire_after = expire_after
+        self.max_bytes = max_bytes
+        self.readonly = readonly
+        self._pending: List[Tuple] = []
+        self._touched: List[Tuple[float, str]] = []
+        self.conn = open_sqlite(path, readonly=readonly)
+        if not readonly:
+            self.conn.executescript(SCHEMA)
+            self.conn.commit()
+
+    # ---------- 読み取り ----------
+    def get(self, key: str) -> Optional[bytes]:
+        """キャッシュ済み本文を返す（未登録・期限切れは None）"""
+        row = self.conn.execute(
+            "SELECT body, codec, created_at FROM http_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        body, codec, created_at = row
+        if self.expire_after and time.time() - created_at > self.expire_after:
+            return None
+        try:
+            return decompress(body, codec)
+        except (ValueError, OSError, zlib.error):
+            return None  # 復元できないエントリはミス扱い（再取得で上書き）
+
+    # ---------- 書き込み（単一ライター） ----------
+    def put(self, key: str, body: bytes) -> None:
+        """本文を圧縮して書き込みバッファに追加"""
+        data, codec = compress(body)
+        now = time.time()
+        self._pending.append((key, data, codec, len(body), len(data), now, now))
+        if len(self._pending) + len(self._touched) >= BATCH_SIZE:
+            self.flush()
+
+    def touch(self, keys: Iterable[str]) -> None:
+        """キャッシュヒットしたキーの最終アクセス時刻を更新（LRU用）"""
+        now = time.time()
+        self._touched.extend((now, k) for k in keys)
+        if len(self._pending) + len(self._touched) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        """バッファをまとめてコミットし、必要ならLRU削除"""
+        if self.readonly or not (self._pending or self._touched):
+            return
+        with self.conn:
+            if self._pending:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO http_cache "
+                    "(key, body, codec, raw_size, stored_size, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", self._pending)
+                self._bump("misses", len(self._pending))
+            if self._touched:
+                self.conn.executemany(
+                    "UPDATE http_cache SET accessed_at = ? WHERE key = ?", self._touched)
+                served = 0
+                for _, key in self._touched:
+                    row = self.conn.execute(
+                        "SELECT raw_size FROM http_cache WHERE key = ?", (key,)).fetchone()
+                    served += row[0] if row else 0
+                self._bump("hits", len(self._touched))
+                self._bump("bytes_served", served)
+        self._pending.clear()
+        self._touched.clear()
+        self.evict()
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """合計サイズが上限を超えていれば古い順に削除し、削除件数を返す"""
+        budget = max_bytes if max_bytes is not None else self.max_bytes
+        if self.readonly or not budget:
+            return 0
+        total = self.conn.execute(
+            "SELECT COALESCE(SUM(stored_size), 0) FROM http_cache").fetchone()[0]
+        if total <= budget:
+            return 0
+        excess = total - int(budget * EVICT_RATIO)
+        victims = []
+        freed = 0
+        for key, size in self.conn.execute(
+                "SELECT key, stored_size FROM http_cache ORDER BY accessed_at"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        with self.conn:
+            self.conn.executemany("DELETE FROM http_cache WHERE key = ?", victims)
+        return len(victims)
+
+    def delete(self, key: str) -> None:
+        """壊れたエントリなどを1件削除（読み取り専用では何もしない）"""
+        if self.readonly:
+            return
+        with self.conn:
+            self.conn.execute("DELETE FROM http_cache WHERE key = ?", (key,))
+
+    # ---------- メンテナンス ----------
+    def _bump(self, name: str, amount: int) -> None:
+        self.conn.execute(
+            "INSERT OR IGNORE INTO http_cache_stats (name, value) VALUES (?, 0)", (name,))
+        self.conn.execute(
+            "UPDATE http_cache_stats SET value = value + ? WHERE name = ?", (amount, name))
+
+    def sweep_expired(self) -> int:
+        """有効期限切れのエントリを削除し、削除件数を返す"""
+        if self.readonly or not self.expire_after:
+            return 0
+        with self.conn:
+            cur = self.conn.execute(
+                "DELETE FROM http_cache WHERE created_at < ?",
+                (time.time() - self.expire_after,))
+        return cur.rowcount
+
+    def drop_legacy_tables(self) -> List[str]:
+        """旧 requests_cache が残したテーブルを削除"""
+        dropped = []
+        with self.conn:
+            for table in LEGACY_TABLES:
+                exists = self.conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                    (table,)).fetchone()
+                if exists:
+                    self.conn.execute(f"DROP TABLE {table}")
+                    dropped.append(table)
+        return dropped
+
+    def compact(self) -> None:
+        """WALをチェックポイントしてファイルを縮小（VACUUM）"""
+        self.flush()
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.conn.execute("VACUUM")
+
+    def stats(self) -> Dict[str, object]:
+        """件数・サイズ・ヒット率などの統計を返す"""
+        entries, raw, stored = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(raw_size), 0), COALESCE(SUM(stored_size), 0) "
+            "FROM http_cache").fetchone()
+        counters = dict(self.conn.execute("SELECT name, value FROM http_cache_stats"))
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        expired = 0
+        if self.expire_after:
+            expired = self.conn.execute(
+                "SELECT COUNT(*) FROM http_cache WHERE created_at < ?",
+                (time.time() - self.expire_after,)).fetchone()[0]
+        file_size = sum(os.path.getsize(self.path + suffix)
+                        for suffix in ("", "-wal", "-shm")
+                        if os.path.exists(self.path + suffix))
+        return {
+            "entries": entries,
+            "expired": expired,
+            "raw_bytes": raw,
+            "stored_bytes": stored,
+            "compression_saved": raw - stored,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "bytes_served": counters.get("bytes_served", 0),
+            "file_bytes": file_size,
+            "codecs": dict(self.conn.execute(
+                "SELECT codec, COUNT(*) FROM http_cache GROUP BY codec")),
+        }
+
+    def close(self) -> None:
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
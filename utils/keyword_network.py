@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+keyword_network.py - キーワード共起ネットワーク（疎行列・PMI / NPMI）
+
+enhance_keywords.py が各JSONに付けた keywords.combined_keywords を
+コーパス全体で集計する。キーワードに整数IDを振って 論文×キーワード の
+0/1 疎行列 X を作り、Xᵀ·X（utils/citation_similarity.py の行ブロック積）で
+キーワード対の共起論文数をまとめて求める。組ごとのループは使わない。
+
+重み（N = 論文数、n_i = キーワード i を持つ論文数、n_ij = 共起論文数）:
+- PMI  = log( n_ij · N / (n_i · n_j) )
+- NPMI = PMI / -log( n_ij / N )   … -1〜1 に正規化したもの
+共起数が min_count 未満の組は PMI が不安定なので捨てる。
+"""
+
+import csv
+import json
+import os
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import scipy.sparse as sp
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+from utils.citation_similarity import similarity_edges
+from utils.shard_layout import list_names, resolve
+
+NETWORK_DIR = "keyword_network"
+NODES_FILE = "nodes.csv"     # keyword, df（キーワードを持つ論文数）
+EDGES_FILE = "edges.csv"     # source, target, count, pmi, npmi
+DEFAULT_MIN_COUNT = 3        # これ未満の共起数の組は捨てる
+DEFAULT_TOP_EDGES = 5000     # 書き出す辺の数（NPMI の高い順）
+
+class KeywordEdges(NamedTuple):
+    """キーワード対の配列（source < target。キーワードID）"""
+    source: np.ndarray
+    target: np.ndarray
+    count: np.ndarray
+    pmi: np.ndarray
+    npmi: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.count)
+
+def normalize_keyword(keyword: str) -> str:
+    """表記ゆれの小さい差（大文字小文字・前後と連続の空白）を揃える"""
+    return " ".join(keyword.lower().split())
+
+def load_keyword_sets(json_dir: str) -> List[Tuple[str, List[str]]]:
+    """JSON_folder から (JSONファイル名, combined_keywords) を集める（キーワードの無い論文は除く）"""
+    docs = []
+    for name in sorted(list_names(json_dir, '.json')):
+        try:
+            with open(resolve(json_dir, name), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        keywords = (data.get('keywords') or {}).get('combined_keywords') or []
+        keywords = [k for k in keywords if isinstance(k, str) and k.strip()]
+        if keywords:
+            docs.append((name, keywords))
+    return docs
+
+def doc_keyword_matrix(keyword_sets: Iterable[Sequence[str]]) -> Tuple["sp.csr_matrix", List[str]]:
+    """論文×キーワード の 0/1 行列（CSR）と、列番号 → キーワード の一覧を返す"""
+    vocabulary: Dict[str, int] = {}
+    indices: List[int] = []
+    indptr = [0]
+    for keywords in keyword_sets:
+        # 同じ論文内の重複（正規化後に同じになるものも）は1回だけ数える
+        ids = {vocabulary.setdefault(normalize_keyword(k), len(vocabulary)) for k in keywords}
+        indices.extend(ids)
+        indptr.append(len(indices))
+    X = sp.csr_matrix((np.ones(len(indices), dtype=np.float32),
+                       np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+                      shape=(len(indptr) - 1, len(vocabulary)))
+    X.sort_indices()
+    return X, list(vocabulary)
+
+def cooccurrence_edges(X: "sp.csr_matrix", min_count: int = DEFAULT_MIN_COUNT) -> KeywordEdges:
+    """Xᵀ·X から共起数 min_count 以上のキーワード対と PMI / NPMI を求める"""
+    num_docs = X.shape[0]
+    df = np.diff(X.tocsc().indptr)
+    # 共起数 n_ij ≤ min(n_i, n_j) なので、出現論文数が min_count 未満のキーワードは除いてよい
+    active = np.flatnonzero(df >= min_count)
+    Xt = X.T.tocsr()[active]
+    r, c, count = similarity_edges(Xt, min_count, top_k=None, upper_only=True)
+    source, target = active[r], active[c]
+    n_ij = count.astype(np.float64)
+    pmi = np.log(n_ij * num_docs / (df[source].astype(np.float64) * df[target]))
+    p_ij = n_ij / num_docs
+    # 全論文で共起する組（p_ij = 1）は -log(p_ij) = 0 になるので NPMI = 1 とする
+    with np.errstate(divide='ignore', invalid='ignore'):
+        npmi = np.where(p_ij < 1.0, pmi / -np.log(p_ij), 1.0)
+    return KeywordEdges(source, target, count.astype(np.int64),
+                        pmi.astype(np.float32), npmi.astype(np.float32))
+
+def top_edges(edges: KeywordEdges, k: Optional[int] = DEFAULT_TOP_EDGES,
+              by: str = 'npmi') -> KeywordEdges:
+    """重み（'npmi' / 'pmi' / 'count'）の大きい順に上位 k 本（同点は共起数の多い順）"""
+    weight = getattr(edges, by)
+    order = np.lexsort((-edges.count, -weight.astype(np.float64)))
+    if k is not None:
+        order = order[:k]
+    return KeywordEdges(*(field[order] for field in edges))
+
+def export_network(out_dir: str, edges: KeywordEdges, vocabulary: List[str],
+                   X: "sp.csr_matrix") -> Tuple[int, int]:
+    """辺に現れるキーワードを nodes.csv、辺を edges.csv に書き出し (ノード数, 辺数) を返す"""
+    os.makedirs(out_dir, exist_ok=True)
+    df = np.diff(X.tocsc().indptr)
+    used = np.unique(np.concatenate([edges.source, edges.target]))
+
+    def write_csv(name: str, header: List[str], rows) -> None:
+        path = os.path.join(out_dir, name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        os.replace(tmp_path, path)
+
+    write_csv(NODES_FILE, ["keyword", "df"],
+              ((vocabulary[i], int(df[i])) for i in used.tolist()))
+    write_csv(EDGES_FILE, ["source", "target", "count", "pmi", "npmi"],
+              ((vocabulary[s], vocabulary[t], n, f"{p:.4f}", f"{q:.4f}")
+               for s, t, n, p, q in zip(edges.source.tolist(), edges.target.tolist(),
+                                        edges.count.tolist(), edges.pmi.tolist(), edges.npmi.tolist())))
+    return len(used), len(edges)
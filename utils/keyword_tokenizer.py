@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+keyword_tokenizer.py - タイトルからのキーワード抽出（1パス版）
+
+以前は json2tag_ref_scopus_async.py と add_yaml_metadata.py がそれぞれ
+4種類の正規表現（英単語・複合語・数字入り専門用語・略語）で
+タイトルを4回走査していた。ここでは1つのコンパイル済みパターンで
+単語（\\w の連なり）ごとに1回だけマッチさせ、4種類を同時に取り出す。
+- 英単語: 3文字以上のASCII英字だけの単語（小文字化・ストップワード除外）
+- 複合語: ハイフン / アンダースコアで繋がった英字の語（例: deep-learning）
+- 専門用語: 数字を含む単語（例: 5G, CO2, IEEE802。2文字以上）
+- 略語: 2文字以上の大文字だけの単語（例: AI, ML）
+結果は出現順で重複なし。
+"""
+
+import re
+from typing import FrozenSet, Iterable, List
+
+# 各単語の先頭で1回だけマッチする（findall は単語ごとに1つのタプルを返す）:
+#   compound … 先読みで複合語を取る（単語自体は消費しない）
+#   alpha    … 英字だけの単語 / tech … 英字*数字+英字* の単語 / それ以外は \w+ で読み飛ばす
+TOKEN_RE = re.compile(
+    r'\b(?=([a-zA-Z]+[_-][a-zA-Z]+(?:[_-][a-zA-Z]+)*\b)?)'
+    r'(?:([a-zA-Z]+)\b|([a-zA-Z]*\d+[a-zA-Z]*)\b|\w+)'
+)
+
+def extract_title_keywords(title: str, stop_words: Iterable[str] = frozenset()) -> List[str]:
+    """タイトルから4種類のキーワードを1パスで抽出（stop_words は英単語にだけ適用）"""
+    if not title:
+        return []
+    stop = stop_words if isinstance(stop_words, (set, frozenset)) else frozenset(stop_words)
+    keywords = {}  # dict を順序付き集合として使う
+    skip = 0
+    for compound, alpha, tech in TOKEN_RE.findall(title):
+        # 複合語の途中の単語からは複合語を取らない（旧実装の findall と同じく重ならない）。
+        # ハイフンは単語の区切りなので、複合語に含まれるハイフンの数だけ読み飛ばす
+        if skip:
+            skip -= 1
+        elif compound:
+            keywords[compound.lower()] = None
+            skip = compound.count('-')
+        if alpha:
+            if len(alpha) >= 3:
+                word = alpha.lower()
+                if word not in stop:
+                    keywords[word] = None
+            if len(alpha) >= 2 and alpha.isupper():
+                keywords[alpha.lower()] = None
+        elif tech and len(tech) >= 2:
+            keywords[tech.lower()] = None
+    return list(keywords)
+
+def extract_title_keywords_batch(titles: Iterable[str],
+                                 stop_words: Iterable[str] = frozenset()) -> List[List[str]]:
+    """複数タイトルをまとめて処理（ストップワード集合の変換は1回だけ）"""
+    stop: FrozenSet[str] = frozenset(stop_words)
+    return [extract_title_keywords(title, stop) for title in titles]
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+mock_api.py - 負荷試験用のローカル模擬サーバー（Crossref・doi.org・Unpaywall・ResearchGate・PDF）
+
+utils/synthetic_corpus.py の合成コーパスを、各取得処理が使うのと同じ形の
+エンドポイントで返す（標準ライブラリの ThreadingHTTPServer、1ポートでパスで振り分け）。
+    /crossref/works/{doi}     Crossref /works（fetch_crossref・DOI→タイトル解決）
+    /doi/{doi}                doi.org（CSL JSON のコンテントネゴシエーション、それ以外は
+                              /landing/{doi} へのリダイレクト。HEAD も可）
+    /unpaywall/v2/{doi}       Unpaywall（一部の論文だけ OA で /pdf/{番号}.pdf を返す）
+    /researchgate/search?q=   ResearchGate の検索結果HTML（クエリ中のDOIの論文ページへのリンク）
+    /researchgate/publication/{番号}_{タイトル}
+                              ResearchGate の論文ページHTML（一部の論文だけ /pdf/{番号}.pdf へのリンク）
+    /pdf/{番号}.pdf           PDF本文（Range 対応・帯域制限・途中切断あり）
+    /__stats                  サービス・ステータス別のリクエスト数
+取得側は utils/endpoints.py の環境変数（CROSSREF_API_URL など）と RESEARCHGATE_BASE_URL を
+このサーバーに向ける。
+
+遅延・エラー率・レート制限（超えると 429 と X-Rate-Limit-* / Retry-After）・
+PDFの転送速度は MockSettings で指定する。エラー・切断を起こすかどうかは
+(seed, パス, そのパスへの何回目のリクエストか) だけで決まるので、スレッドの
+順序が変わっても同じリクエスト列には同じ障害が起きる。
+全サービスが同じホストなので、ホスト単位のサーキットブレーカー・接続数制限からは
+1つのホストに見える点に注意。
+"""
+
+import html
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, quote, unquote, unquote_plus, urlsplit
+
+from utils.synthetic_corpus import SyntheticCorpus
+
+DEFAULT_PORT = 8765
+MIN_PDF_SIZE = 150 * 1024      # PDF取得ツールは 100KB 未満を捨てる
+SEND_CHUNK = 16 * 1024
+SERVICES = ("crossref", "doi", "unpaywall", "researchgate", "pdf")
+SLUG_RE = re.compile(r"[^A-Za-z0-9]+")
+
+class MockSettings(NamedTuple):
+    latency: float = 0.0          # 応答までの遅延（秒）
+    jitter: float = 0.0           # 遅延のばらつき（± 秒）
+    error_rate: float = 0.0       # 500 / 503 を返す割合
+    rate_limit: int = 0           # サービスごとの毎秒の上限（0 は無制限）
+    pdf_rate: int = 0             # PDF本文の転送速度（バイト/秒、0 は無制限）
+    truncate_rate: float = 0.0    # PDF本文を途中で切る割合
+    oa_rate: float = 0.3          # Unpaywall で OA とする論文の割合
+    rg_rate: float = 0.5          # ResearchGate の論文ページに PDF リンクがある論文の割合
+    seed: int = 0
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 負荷試験ではクライアント側の切断（中断・タイムアウト）は普通に起きる
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+class MockAPIServer:
+    """合成コーパスを返す模擬サーバー（start() で別スレッドで動かす）"""
+
+    def __init__(self, corpus: SyntheticCorpus, settings: MockSettings = MockSettings(),
+                 host: str = "127.0.0.1", port: int = DEFAULT_PORT):
+        self.corpus = corpus
+        self.settings = settings
+        self._lock = threading.Lock()
+        self._hits: Dict[str, int] = defaultdict(int)
+        self._windows: Dict[str, Tuple[int, int]] = {}
+        self.counts: Dict[str, Dict[int, int]] = {service: defaultdict(int) for service in SERVICES}
+        self.bytes_sent = 0
+        self.httpd = _QuietHTTPServer((host, port), self._handler_class())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def environment(self) -> Dict[str, str]:
+        """取得側をこのサーバーに向ける環境変数（utils/endpoints.py）"""
+        return {"CROSSREF_API_URL": f"{self.base_url}/crossref",
+                "DOI_RESOLVER_URL": f"{self.base_url}/doi",
+                "UNPAYWALL_API_URL": f"{self.base_url}/unpaywall",
+                "RESEARCHGATE_BASE_URL": f"{self.base_url}/researchgate"}
+
+    def start(self) -> "MockAPIServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": {service: {str(status): n for status, n in sorted(counts.items())}
+                                 for service, counts in self.counts.items()},
+                    "bytes_sent": self.bytes_sent}
+
+    # ---------- 障害の決定 ----------
+    def _draw(self, path: str) -> random.Random:
+        """このパスへの n 回目のリクエスト用の乱数（スレッド順に依存しない）"""
+        with self._lock:
+            self._hits[path] += 1
+            n = self._hits[path]
+        return random.Random(f"{self.settings.seed}:{path}:{n}")
+
+    def _rate_limited(self, service: str) -> bool:
+        """サービスごとの1秒窓のリクエスト数が上限を超えたか"""
+        if not self.settings.rate_limit:
+            return False
+        second = int(time.time())
+        with self._lock:
+            window, count = self._windows.get(service, (second, 0))
+            count = count + 1 if window == second else 1
+            self._windows[service] = (second, count)
+        return count > self.settings.rate_limit
+
+    def _record(self, service: str, status: int, sent: int = 0) -> None:
+        with self._lock:
+            self.counts[service][status] += 1
+            self.bytes_sent += sent
+
+    # ---------- 応答の中身 ----------
+    def crossref(self, doi: str) -> Optional[dict]:
+        i = self.corpus.index_of(doi)
+        if i is not None:
+            return json.loads(self.corpus.crossref_response(i))
+        j = self.corpus.external_index_of(doi)
+        if j is None:
+            return None
+        return {"status": "ok", "message-type": "work", "message-version": "1.0.0",
+                "message": {"DOI": doi, "type": "journal-article", "title": [self.corpus.external_title(j)]}}
+
+    def csl(self, doi: str) -> Optional[dict]:
+        response = self.crossref(doi)
+        if response is None:
+            return None
+        message = response["message"]
+        return {"DOI": doi, "type": "article-journal", "title": message["title"][0]}
+
+    def unpaywall(self, doi: str, base_url: str) -> Optional[dict]:
+        i = self.corpus.index_of(doi)
+        if i is None:
+            return None
+        is_oa = random.Random(f"oa:{self.settings.seed}:{i}").random() < self.settings.oa_rate
+        location = {"url_for_pdf": f"{base_url}/pdf/{i}.pdf", "url": f"{base_url}/landing/{doi}",
+                    "host_type": "repository", "version": "publishedVersion"}
+        return {"doi": doi.lower(), "is_oa": is_oa, "title": self.corpus.title(i),
+                "best_oa_location": location if is_oa else None,
+                "oa_locations": [location] if is_oa else []}
+
+    def researchgate_search(self, query: str) -> str:
+        """検索結果ページ（download_researchgate_pdfs.PUBLICATION_RE が拾う相対リンク）"""
+        links = []
+        for term in query.split():
+            i = self.corpus.index_of(term)
+            if i is not None:
+                slug = SLUG_RE.sub("_", self.corpus.title(i)).strip("_")
+                links.append(f'<a class="result-item" href="/publication/{i}_{quote(slug)}">'
+                             f'{html.escape(self.corpus.title(i))}</a>')
+        return '<html><body><div class="search-results">' + "".join(links) + "</div></body></html>"
+
+    def researchgate_publication(self, i: int, base_url: str) -> str:
+        """論文ページ（rg_rate の割合の論文だけ全文PDFへのリンクを載せる）"""
+        has_pdf = random.Random(f"rg:{self.settings.seed}:{i}").random() < self.settings.rg_rate
+        link = f'<a class="fulltext" href="{base_url}/pdf/{i}.pdf">Download full-text PDF</a>' if has_pdf else ""
+        return (f"<html><head><title>{html.escape(self.corpus.title(i))}</title></head><body>"
+                f"<h1>{html.escape(self.corpus.title(i))}</h1><p>DOI: {self.corpus.doi(i)}</p>{link}</body></html>")
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):  # 標準エラーへのアクセスログは出さない
+                pass
+
+            def do_HEAD(self):
+                self._dispatch(head=True)
+
+            def do_GET(self):
+                self._dispatch(head=False)
+
+            # ---------- 共通 ----------
+            def _send(self, service: Optional[str], status: int, body: bytes = b"", content_type: str = "application/json",
+                      headers: Optional[Dict[str, str]] = None, head: bool = False) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if not head:
+                    self.wfile.write(body)
+                if service:
+                    server._record(service, status, 0 if head else len(body))
+
+            def _send_json(self, service: Optional[str], data, head: bool, status: int = 200,
+                           headers: Optional[Dict[str, str]] = None) -> None:
+                self._send(service, status, json.dumps(data, ensure_ascii=False).encode("utf-8"),
+                           headers=headers, head=head)
+
+            def _dispatch(self, head: bool) -> None:
+                path = urlsplit(self.path).path
+                service = path.strip("/").split("/", 1)[0]
+                if path == "/__stats":
+                    self._send_json(None, server.stats(), head)
+                    return
+                if service == "landing":
+                    self._send("doi", 200, b"<html><body>landing page</body></html>", "text/html", head=head)
+                    return
+                if service not in SERVICES:
+                    self._send(None, 404, b"Not Found", "text/plain", head=head)
+                    return
+
+                settings = server.settings
+                # ResearchGate の検索はクエリごとに別のリクエスト列として障害を決める
+                rng = server._draw(self.path if service == "researchgate" else path)
+                delay = settings.latency + (rng.uniform(-settings.jitter, settings.jitter) if settings.jitter else 0.0)
+                if delay > 0:
+                    time.sleep(delay)
+                if server._rate_limited(service):
+                    limit_headers = {"Retry-After": "1", "X-Rate-Limit-Limit": str(settings.rate_limit),
+                                     "X-Rate-Limit-Interval": "1s"}
+                    self._send(service, 429, b"Too Many Requests", "text/plain", limit_headers, head)
+                    return
+                if settings.error_rate and rng.random() < settings.error_rate:
+                    self._send(service, rng.choice((500, 503)), b"Internal Server Error", "text/plain", head=head)
+                    return
+                getattr(self, f"_{service}")(path, rng, head)
+
+            # ---------- サービス別 ----------
+            def _crossref(self, path: str, rng: random.Random, head: bool) -> None:
+                prefix = "/crossref/works/"
+                doi = unquote_plus(path[len(prefix):]) if path.startswith(prefix) else ""
+                data = server.crossref(doi) if doi else None
+                headers = {"X-Rate-Limit-Limit": str(server.settings.rate_limit or 50),
+                           "X-Rate-Limit-Interval": "1s"}
+                if data is None:
+                    self._send("crossref", 404, b"Resource not found.", "text/plain", headers, head)
+                else:
+                    self._send_json("crossref", data, head, headers=headers)
+
+            def _doi(self, path: str, rng: random.Random, head: bool) -> None:
+                doi = unquote_plus(path[len("/doi/"):])
+                if "citationstyles.csl+json" in self.headers.get("Accept", ""):
+                    data = server.csl(doi)
+                    if data is None:
+                        self._send("doi", 404, b"DOI Not Found", "text/plain", head=head)
+                    else:
+                        self._send_json("doi", data, head)
+                    return
+                if server.crossref(doi) is None:
+                    self._send("doi", 404, b"DOI Not Found", "text/plain", head=head)
+                    return
+                self._send("doi", 302, b"", "text/plain", {"Location": f"/landing/{doi}"}, head)
+
+            def _unpaywall(self, path: str, rng: random.Random, head: bool) -> None:
+                doi = unquote(path[len("/unpaywall/v2/"):])
+                data = server.unpaywall(doi, f"http://{self.headers.get('Host', '')}")
+                if data is None:
+                    self._send_json("unpaywall", {"HTTP_status_code": 404, "error": True,
+                                                  "message": f"'{doi}' is an invalid doi."}, head, status=404)
+                else:
+                    self._send_json("unpaywall", data, head)
+
+            def _researchgate(self, path: str, rng: random.Random, head: bool) -> None:
+                if path == "/researchgate/search":
+                    query = parse_qs(urlsplit(self.path).query).get("q", [""])[0]
+                    body = server.researchgate_search(query)
+                    self._send("researchgate", 200, body.encode("utf-8"), "text/html; charset=utf-8", head=head)
+                    return
+                prefix = "/researchgate/publication/"
+                number = path[len(prefix):].split("_", 1)[0] if path.startswith(prefix) else ""
+                if not number.isdigit() or int(number) >= server.corpus.size:
+                    self._send("researchgate", 404, b"Not Found", "text/plain", head=head)
+                    return
+                body = server.researchgate_publication(int(number), f"http://{self.headers.get('Host', '')}")
+                self._send("researchgate", 200, body.encode("utf-8"), "text/html; charset=utf-8", head=head)
+
+            def _pdf(self, path: str, rng: random.Random, head: bool) -> None:
+                name = path[len("/pdf/"):]
+                number = name[:-4] if name.endswith(".pdf") else ""
+                if not number.isdigit() or int(number) >= server.corpus.size:
+                    self._send("pdf", 404, b"Not Found", "text/plain", head=head)
+                    return
+                body = server.corpus.pdf(int(number), MIN_PDF_SIZE)
+                start, status = 0, 200
+                headers = {"Accept-Ranges": "bytes"}
+                requested = self.headers.get("Range", "")
+                if requested.startswith("bytes=") and requested[6:].split("-")[0].isdigit():
+                    start = int(requested[6:].split("-")[0])
+                    if start >= len(body):
+                        self._send("pdf", 416, b"", "text/plain", {"Content-Range": f"bytes */{len(body)}"}, head)
+                        return
+                    status = 206
+                    headers["Content-Range"] = f"bytes {start}-{len(body) - 1}/{len(body)}"
+                payload = body[start:]
+                self.send_response(status)
+                self.send_header("Content-Type", "application/pdf")
+                self.send_header("Content-Length", str(len(payload)))
+                for header, value in headers.items():
+                    self.send_header(header, value)
+                self.end_headers()
+                if head:
+                    server._record("pdf", status)
+                    return
+                # 途中で切る応答は Content-Length より短く送って接続を閉じる
+                cut = len(payload)
+                if server.settings.truncate_rate and rng.random() < server.settings.truncate_rate:
+                    cut = rng.randint(1, max(1, len(payload) - 1))
+                    self.close_connection = True
+                sent = 0
+                while sent < cut:
+                    chunk = payload[sent:min(cut, sent + SEND_CHUNK)]
+                    try:
+                        self.wfile.write(chunk)
+                    except ConnectionError:
+                        break  # クライアントが切断した
+                    sent += len(chunk)
+                    if server.settings.pdf_rate:
+                        time.sleep(len(chunk) / server.settings.pdf_rate)
+                server._record("pdf", status, sent)
+
+        return Handler
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+oa_cache.py - オープンアクセス所在情報（OA location）の永続キャッシュ
+
+DOIごとに Unpaywall のレスポンスと doi.org のリダイレクト先（ランディング
+ページURL）を保存し、各候補PDF URLの試行結果も記録する。PDF取得ツール
+（標準版・高速版・非同期版）が共通で使い、再実行時は既知の論文について
+Unpaywall / doi.org への問い合わせを丸ごと省略する。
+"""
+
+import json
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from utils.http_cache import open_sqlite
+
+OA_CACHE_DB = "oa_cache.sqlite"
+DISCOVERY_TTL = 60 * 60 * 24 * 30    # OA情報が得られた論文: 30日
+NEGATIVE_TTL = 60 * 60 * 24 * 7      # OAでない・見つからなかった論文: 7日
+SUCCESS_TTL = 60 * 60 * 24 * 90      # 取得に成功したURL: 90日
+FAILURE_TTL = 60 * 60 * 24 * 7       # 取得に失敗したURL: 7日
+# 失敗扱いにしない試行結果（'partial' は .part が残っていて次回再開できる）
+RETRYABLE_OUTCOMES = ('ok', 'partial')
+# 429 / 5xx（サーバー側の一時的な拒否）の試行結果。記録せず次回もう一度試す
+OUTCOME_TRANSIENT = 'transient'
+# Unpaywall の答えとして保存してよいステータス（404 は「Unpaywall に無い」という答え）
+UNPAYWALL_ANSWERS = (200, 404)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS oa_discovery (
+    doi TEXT PRIMARY KEY,
+    unpaywall TEXT,
+    landing_url TEXT,
+    is_oa INTEGER NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS oa_candidates (
+    doi TEXT NOT NULL,
+    url TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    detail TEXT,
+    checked_at REAL NOT NULL,
+    source TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (doi, url)
+);
+"""
+
+# 候補URLの出所（pdf_candidates.CandidateRanker が出所ごとの成功率を使う）
+SOURCE_UNPAYWALL_BEST = 'unpaywall_best'
+SOURCE_UNPAYWALL = 'unpaywall'
+SOURCE_CROSSREF = 'crossref_link'
+SOURCE_PATTERN = 'pattern'
+
+class Candidate(NamedTuple):
+    """候補PDF URLとその出所"""
+    url: str
+    source: str
+
+# オープンアクセス論文が多いサイト（リダイレクト先からPDF URLを推測する対象）
+OA_HOST_PATTERNS = ['arxiv.org', 'plos', 'biomedcentral', 'frontiersin', 'mdpi.com', 'ieee']
+
+def discovery_candidates(unpaywall: Optional[dict], landing_url: Optional[str]) -> List[Candidate]:
+    """Unpaywall レスポンスとランディングページURLから候補PDF URLを作る"""
+    candidates = []
+    if unpaywall and unpaywall.get('is_oa', False):
+        # ベストOA locationを取得
+        best_oa = unpaywall.get('best_oa_location')
+        if best_oa and best_oa.get('url_for_pdf'):
+            candidates.append(Candidate(best_oa['url_for_pdf'], SOURCE_UNPAYWALL_BEST))
+
+        # その他のOA locationsも取得
+        for location in unpaywall.get('oa_locations', []) or []:
+            if location.get('url_for_pdf'):
+                candidates.append(Candidate(location['url_for_pdf'], SOURCE_UNPAYWALL))
+
+    # IEEE, arXiv, PLoS ONE等のオープンアクセスパターン（推測URL）
+    if landing_url and any(pattern in landing_url.lower() for pattern in OA_HOST_PATTERNS):
+        for url in (landing_url.replace('/abs/', '/pdf/') + '.pdf',  # arXiv
+                    landing_url + '.pdf',  # 一般的なパターン
+                    landing_url.replace('/article/', '/pdf/')):  # 学術誌パターン
+            candidates.append(Candidate(url, SOURCE_PATTERN))
+
+    # 順序を保って重複削除（同じURLは先に出た出所を採用）
+    seen = set()
+    return [c for c in candidates if not (c.url in seen or seen.add(c.url))]
+
+def is_transient_status(status: int) -> bool:
+    """時間をおけば通るかもしれないステータス（キャッシュに失敗として残さない）"""
+    return status == 429 or status >= 500
+
+class OALocationCache:
+    """DOI → OA所在情報・候補URLの試行結果 の永続キャッシュ（スレッドセーフ）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = open_sqlite(path, threaded=True)  # 操作は self._lock で直列化
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(oa_candidates)")}
+        if 'source' not in columns:  # 旧スキーマからの移行
+            self.conn.execute("ALTER TABLE oa_candidates ADD COLUMN source TEXT NOT NULL DEFAULT ''")
+        self.conn.commit()
+
+    # ---------- 所在情報 ----------
+    def get_discovery(self, doi: str) -> Optional[Tuple[Optional[dict], Optional[str]]]:
+        """有効期限内なら (Unpaywallレスポンス, ランディングURL) を返す"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT unpaywall, landing_url, is_oa, fetched_at FROM oa_discovery WHERE doi = ?",
+                (doi.lower(),)).fetchone()
+        if row is None:
+            return None
+        unpaywall, landing_url, is_oa, fetched_at = row
+        ttl = DISCOVERY_TTL if is_oa else NEGATIVE_TTL
+        if time.time() - fetched_at > ttl:
+            return None
+        return (json.loads(unpaywall) if unpaywall else None), landing_url
+
+    def put_discovery(self, doi: str, unpaywall: Optional[dict], landing_url: Optional[str]) -> None:
+        """問い合わせ結果を保存（Unpaywall が UNPAYWALL_ANSWERS のどれかで答えたときだけ呼ぶ）"""
+        is_oa = bool(discovery_candidates(unpaywall, landing_url))
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO oa_discovery (doi, unpaywall, landing_url, is_oa, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (doi.lower(), json.dumps(unpaywall) if unpaywall is not None else None,
+                 landing_url, int(is_oa), time.time()))
+
+    # ---------- 候補URLの試行結果 ----------
+    def record_outcome(self, doi: str, url: str, outcome: str, detail: str = "", source: str = "") -> None:
+        """候補URLの試行結果（'ok' / 'partial' / 'not_pdf' / 'failed' など）を記録
+
+        OUTCOME_TRANSIENT は記録しない（前回の結果が残っていればそのまま）。
+        """
+        if outcome == OUTCOME_TRANSIENT:
+            return
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO oa_candidates (doi, url, outcome, detail, checked_at, source) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (doi.lower(), url, outcome, detail, time.time(), source))
+
+    def outcomes(self, doi: str) -> Dict[str, str]:
+        """有効期限内の試行結果を URL → outcome で返す"""
+        now = time.time()
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT url, outcome, checked_at FROM oa_candidates WHERE doi = ?",
+                (doi.lower(),)).fetchall()
+        result = {}
+        for url, outcome, checked_at in rows:
+            ttl = SUCCESS_TTL if outcome in RETRYABLE_OUTCOMES else FAILURE_TTL
+            if now - checked_at <= ttl:
+                result[url] = outcome
+        return result
+
+    def outcome_history(self) -> List[Tuple[str, str, str]]:
+        """全試行結果の (url, source, outcome)（成功率の集計用・期限切れも含む）"""
+        with self._lock:
+            return self.conn.execute("SELECT url, source, outcome FROM oa_candidates").fetchall()
+
+    def known_failures(self, doi: str) -> Set[str]:
+        """最近失敗したURL（再試行しない）"""
+        return {url for url, outcome in self.outcomes(doi).items() if outcome not in RETRYABLE_OUTCOMES}
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+output_writer.py - JSON_folder / md_folder への原子的な書き込み（fsync はまとめて）
+
+どのファイルも同じフォルダの一時ファイル（.<名前>.<pid>.<連番>.tmp）に書いてから
+os.replace で置き換えるので、途中で落ちても書きかけの JSON や Markdown は残らない
+（古い内容か新しい内容のどちらか）。
+
+fsync の方針は環境変数 SCOPUS_FSYNC で選ぶ:
+    batch（既定）  一時ファイルを BATCH_SIZE 件ためてから fsync → まとめて置き換え →
+                  フォルダを1回だけ fsync。置き換えるのはディスクに書けてからなので、
+                  見えているファイルは常に完全。書いたファイルが見えるのはバッチ確定後
+                  （flush() か close() で確定させる）
+    always        1件ごとに fsync して置き換え、フォルダも fsync（遅いが即時に永続化）
+    none          fsync しない（置き換えの原子性だけ。tmpfs やベンチマーク用）
+
+段が途中で落ちると一時ファイルが残るので、OutputWriter はフォルダに初めて書くときに
+そのフォルダの古い一時ファイル（書いたプロセスがもう無いか、STALE_TMP_SECONDS より前の
+もの）を消す。
+
+OutputWriter(background=True) は書き込みを別スレッドで行い、NLTK などCPUを使う段が
+ディスク待ちで止まらないようにする（待ち行列は BATCH_SIZE * 4 件まで）。
+書き込みに成功したファイルは状況索引（utils/status_index.py の changes）に記録し、
+completes に論文を渡していればその論文の完了も記録する。失敗は errors に残す。
+"""
+
+import os
+import re
+import json
+import itertools
+import queue
+import threading
+import time
+from typing import IO, List, Optional, Tuple, Union
+
+from utils.run_report import metrics
+from utils.status_index import changes
+
+FSYNC_ENV = "SCOPUS_FSYNC"
+FSYNC_MODES = ("batch", "always", "none")
+BATCH_SIZE = 64
+STALE_TMP_SECONDS = 3600  # プロセスの生死が分からないとき（Windows・pid の再利用）の目安
+TMP_PATTERN = re.compile(r"^\..+\.(\d+)\.\d+\.tmp$")  # _tmp_path() の名前
+
+def fsync_mode() -> str:
+    mode = os.environ.get(FSYNC_ENV, "batch")
+    return mode if mode in FSYNC_MODES else "batch"
+
+_tmp_seq = itertools.count()
+
+def _tmp_path(path: str) -> str:
+    # 先頭の "." で状況索引・フォルダの一覧から外れる。連番は同じバッチに同じ名前が
+    # 2回来ても（タイトルの衝突など）一時ファイルが重ならないように
+    folder, name = os.path.split(path)
+    return os.path.join(folder, f".{name}.{os.getpid()}.{next(_tmp_seq)}.tmp")
+
+def _fsync_dir(folder: str) -> None:
+    """置き換え（rename）自体を永続化する。Windows はフォルダを開けないので省く"""
+    if os.name == "nt":
+        return
+    fd = os.open(folder or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        return True  # 確かめられないので経過時間だけで判断する
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # 別ユーザーのプロセス
+    return True
+
+def remove_stale_tmp(folder: str) -> int:
+    """落ちた段が残した一時ファイルを消す（消した数を返す）
+
+    書いたプロセスが残っていて新しいもの（並行して動いている段の書きかけ）は残す。
+    """
+    removed = 0
+    now = time.time()
+    try:
+        with os.scandir(folder) as entries:
+            for e in entries:
+                m = TMP_PATTERN.match(e.name)
+                if not m or not e.is_file(follow_symlinks=False):
+                    continue
+                try:
+                    if _pid_alive(int(m.group(1))) and \
+                            now - e.stat().st_mtime < STALE_TMP_SECONDS:
+                        continue
+                    os.remove(e.path)
+                    removed += 1
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return removed
+
+def write_atomic(path: str, data: Union[str, bytes], fsync: Optional[str] = None) -> None:
+    """1ファイルを一時ファイル経由で置き換える（まとめる相手のない単発の書き込み用）
+
+    fsync は SCOPUS_FSYNC に従い、none 以外ならすぐに fsync する。
+    """
+    mode = fsync or fsync_mode()
+    data = data.encode("utf-8") if isinstance(data, str) else data
+    tmp = _tmp_path(path)
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+            if mode != "none":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        _remove_quietly(tmp)
+        raise
+    if mode != "none":
+        _fsync_dir(os.path.dirname(path))
+
+class OutputWriter:
+    """原子的な書き込みを fsync の方針に沿ってまとめる（with で使い、抜けるときに確定）"""
+
+    def __init__(self, batch_size: int = BATCH_SIZE, background: bool = False,
+                 fsync: Optional[str] = None):
+        self.mode = fsync or fsync_mode()
+        self.batch_size = max(1, batch_size)
+        self.errors: List[Tuple[str, Exception]] = []
+        self.written = 0
+        self._submitted = set()
+        self._cleaned = set()  # 古い一時ファイルを片付けたフォルダ
+        self._lock = threading.Lock()
+        # batch: 書き終えて fsync 待ちの (一時ファイル, 置き換え先, 完了する論文)
+        self._pending: List[Tuple[IO[bytes], str, str, Optional[str]]] = []
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        if background:
+            self._queue = queue.Queue(maxsize=self.batch_size * 4)
+            self._thread = threading.Thread(target=self._run, name="output-writer", daemon=True)
+            self._thread.start()
+
+    # ---------- 書き込み ----------
+    def write_text(self, path: str, text: str, completes: Optional[str] = None) -> None:
+        """path を text で置き換える（completes: 書けたら完了とする論文の JSON 名）"""
+        self._submit(path, text.encode("utf-8"), completes)
+
+    def write_json(self, path: str, data: object, completes: Optional[str] = None) -> None:
+        self.write_text(path, json.dumps(data, ensure_ascii=False, indent=2), completes)
+
+    def submitted(self, path: str) -> bool:
+        """この writer で path をもう書いたか（確定前の内容はディスクから読めないので、
+        読んで書き換える段は同じファイルの2回目を書き込み済みとして扱う）"""
+        return path in self._submitted
+
+    def _submit(self, path: str, data: bytes, completes: Optional[str]) -> None:
+        self._submitted.add(path)
+        folder = os.path.dirname(path)
+        if folder not in self._cleaned:
+            self._cleaned.add(folder)
+            removed = remove_stale_tmp(folder or ".")
+            if removed:
+                metrics.count("stale_tmp_removed", removed)
+        if self._queue is None:
+            self._write(path, data, completes)
+            return
+        if not self._thread.is_alive():
+            raise RuntimeError("OutputWriter は閉じられています")
+        self._queue.put((path, data, completes))
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, path: str, data: bytes, completes: Optional[str]) -> None:
+        start = time.perf_counter()
+        tmp = _tmp_path(path)
+        f = None
+        full = False
+        try:
+            f = open(tmp, "wb")
+            f.write(data)
+            if self.mode == "batch":
+                f.flush()
+                with self._lock:
+                    self._pending.append((f, tmp, path, completes))
+                    full = len(self._pending) >= self.batch_size
+                f = None  # 閉じるのは _commit
+            else:
+                if self.mode == "always":
+                    f.flush()
+                    os.fsync(f.fileno())
+                f.close()
+                f = None
+                os.replace(tmp, path)
+                if self.mode == "always":
+                    _fsync_dir(os.path.dirname(path))
+                self._done(path, completes)
+            metrics.count("bytes_written", len(data))
+        except OSError as e:
+            if f is not None:
+                f.close()
+            _remove_quietly(tmp)
+            self._failed(path, e)
+        finally:
+            metrics.add_time("file_write", time.perf_counter() - start)
+        if full:
+            self._commit()
+
+    def _commit(self) -> None:
+        """ためた一時ファイルを fsync してから置き換え、フォルダを1回ずつ fsync する"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        folders = set()
+        with metrics.timer("fsync"):
+            for f, tmp, path, completes in pending:
+                try:
+                    try:
+                        os.fsync(f.fileno())
+                    finally:
+                        f.close()
+                    os.replace(tmp, path)
+                except OSError as e:
+                    _remove_quietly(tmp)
+                    self._failed(path, e)
+                    continue
+                folders.add(os.path.dirname(path))
+                self._done(path, completes)
+            for folder in folders:
+                try:
+                    _fsync_dir(folder)
+                except OSError as e:
+                    self._failed(folder, e)
+
+    def _done(self, path: str, completes: Optional[str]) -> None:
+        with self._lock:
+            self.written += 1
+        changes.written(path)
+        if completes:
+            changes.completed(completes)
+
+    def _failed(self, path: str, error: Exception) -> None:
+        metrics.count("write_errors")
+        with self._lock:
+            self.errors.append((path, error))
+
+    # ---------- 確定 ----------
+    def flush(self) -> None:
+        """ここまでの書き込みをすべてディスクに確定させる（同じ段で読み直す前に呼ぶ）"""
+        if self._queue is not None:
+            self._queue.join()
+        self._commit()
+
+    def close(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._commit()
+
+    def report_errors(self) -> None:
+        """書き込みに失敗したファイルを表示する"""
+        for path, error in self.errors:
+            print(f"書き込み失敗: {os.path.basename(path)}: {error}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        self.report_errors()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+page_cache.py - 検索結果・論文ページから抽出したリンクの永続キャッシュ
+
+ResearchGate 取得ツールは「検索 → 結果ページ → PDFリンク抽出」の順に
+ページを取得するが、必要なのは抽出後のURL一覧だけなので、HTML本文では
+なく抽出結果を保存する。
+- 検索クエリ → 論文ページURL
+- 論文ページURL → PDF候補URL
+再実行やリトライ時は有効期限内のエントリを使い、ページを取り直さない。
+"""
+
+import json
+import threading
+import time
+from typing import List, Optional
+
+from utils.http_cache import open_sqlite
+
+PAGE_CACHE_DB = "researchgate_cache.sqlite"
+LINKS_TTL = 60 * 60 * 24 * 30        # リンクが見つかったページ: 30日
+EMPTY_TTL = 60 * 60 * 24 * 7         # リンクが無かったページ: 7日
+
+KIND_SEARCH = 'search'
+KIND_PAGE = 'page'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS page_links (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    urls TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+"""
+
+class PageLinkCache:
+    """(種別, クエリまたはページURL) → 抽出URL一覧 の永続キャッシュ（スレッドセーフ）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = open_sqlite(path, threaded=True)  # 操作は self._lock で直列化
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind: str, key: str) -> Optional[List[str]]:
+        """有効期限内なら抽出済みURL一覧を返す（未登録・期限切れは None）"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT urls, fetched_at FROM page_links WHERE kind = ? AND key = ?",
+                (kind, key)).fetchone()
+            urls = json.loads(row[0]) if row else None
+            ttl = LINKS_TTL if urls else EMPTY_TTL
+            if urls is None or time.time() - row[1] > ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return urls
+
+    def put(self, kind: str, key: str, urls: List[str]) -> None:
+        """正常に取得できたページの抽出結果を保存（通信エラー時は呼ばない）"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO page_links (kind, key, urls, fetched_at) VALUES (?, ?, ?, ?)",
+                (kind, key, json.dumps(urls), time.time()))
+
+    def close(self) -> None:
+        self.conn.close()
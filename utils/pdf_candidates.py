@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pdf_candidates.py - 候補PDF URLの順位付けとバッチ内の重複排除
+
+候補URLは出所（Unpaywall / Crossref link / 推測パターン）とホストごとの
+過去の成功率で並べ替える。成功率は oa_cache.sqlite の試行結果から集計し、
+試行が少ないうちは出所ごとの事前値に寄せる（ベイズ平滑化）。
+同じURLはバッチ全体で1回だけ取得し、結果を他の論文と共有する。
+"""
+
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from utils.oa_cache import (
+    Candidate, OALocationCache,
+    SOURCE_UNPAYWALL_BEST, SOURCE_UNPAYWALL, SOURCE_CROSSREF, SOURCE_PATTERN,
+)
+
+# 出所ごとの成功率の事前値（実績が PRIOR_WEIGHT 件ほど溜まると実績が優勢になる）
+SOURCE_PRIORS = {
+    SOURCE_UNPAYWALL_BEST: 0.7,
+    SOURCE_UNPAYWALL: 0.5,
+    SOURCE_CROSSREF: 0.3,
+    SOURCE_PATTERN: 0.1,
+}
+DEFAULT_PRIOR = 0.2
+PRIOR_WEIGHT = 5.0
+MAX_CANDIDATES = 3        # 1論文あたりの最大試行URL数
+PARALLEL_CANDIDATES = 2   # 非同期版で同時に試す候補数
+
+def host_of(url: str) -> str:
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+class CandidateRanker:
+    """出所・ホスト別の成功率で候補URLを並べ替える（スレッドセーフ）"""
+
+    def __init__(self, oa_cache: OALocationCache = None):
+        self._lock = threading.Lock()
+        self.by_source: Dict[str, List[int]] = {}  # source → [成功数, 試行数]
+        self.by_host: Dict[str, List[int]] = {}
+        if oa_cache:
+            for url, source, outcome in oa_cache.outcome_history():
+                if outcome == 'partial':
+                    continue  # 再開待ちは成否未定
+                self._count(source, host_of(url), outcome == 'ok')
+
+    def _count(self, source: str, host: str, ok: bool) -> None:
+        for table, key in ((self.by_source, source), (self.by_host, host)):
+            stats = table.setdefault(key, [0, 0])
+            stats[0] += int(ok)
+            stats[1] += 1
+
+    def record(self, candidate: Candidate, ok: bool) -> None:
+        """今回のバッチでの試行結果を反映"""
+        with self._lock:
+            self._count(candidate.source, host_of(candidate.url), ok)
+
+    def score(self, candidate: Candidate) -> float:
+        """推定成功率（ホストの実績を出所の成功率に寄せて平滑化）"""
+        with self._lock:
+            src_ok, src_n = self.by_source.get(candidate.source, (0, 0))
+            host_ok, host_n = self.by_host.get(host_of(candidate.url), (0, 0))
+        prior = SOURCE_PRIORS.get(candidate.source, DEFAULT_PRIOR)
+        source_rate = (src_ok + prior * PRIOR_WEIGHT) / (src_n + PRIOR_WEIGHT)
+        return (host_ok + source_rate * PRIOR_WEIGHT) / (host_n + PRIOR_WEIGHT)
+
+    def rank(self, candidates: Iterable[Candidate], exclude: Iterable[str] = ()) -> List[Candidate]:
+        """重複と除外URLを除き、推定成功率の高い順に並べる"""
+        excluded = set(exclude)
+        unique: Dict[str, Candidate] = {}
+        for candidate in candidates:
+            if candidate.url not in excluded and candidate.url not in unique:
+                unique[candidate.url] = candidate
+        # sorted は安定なので同点なら元の順序（Unpaywall のベスト → その他）を保つ
+        return sorted(unique.values(), key=self.score, reverse=True)
+
+class SharedDownloads:
+    """バッチ内で同じURLを1回だけ取得し、結果を共有する（スレッド用）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events: Dict[str, threading.Event] = {}
+        self._results: Dict[str, Optional[str]] = {}
+
+    def run(self, url: str, fetch: Callable[[], Optional[str]]) -> Optional[str]:
+        """初回は fetch() を実行し、2回目以降（取得中を含む）はその結果を返す"""
+        with self._lock:
+            event = self._events.get(url)
+            owner = event is None
+            if owner:
+                event = self._events[url] = threading.Event()
+        if not owner:
+            event.wait()
+            return self._results.get(url)
+        result = None
+        try:
+            result = fetch()
+        finally:
+            self._results[url] = result
+            event.set()
+        return result
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pdf_download.py - PDFダウンロードの共通処理（中断再開）
+
+ダウンロード中のデータは <PDF名>.part に書き込み、ETag / Last-Modified /
+Accept-Ranges を <PDF名>.part.json に記録する。次回の試行では Range
+リクエスト（If-Range 付き）で続きから取得し、検証が済んでから
+os.replace で本来のファイル名に確定させる。
+
+本文は PDFStreamValidator でストリーミング中に検査する。先頭の %PDF-
+が無ければ（有料ページのHTMLなど）その時点で転送を打ち切り、末尾に
+%%EOF が無ければ途中で切れたものとして保存しない。同時に SHA-256 を
+計算し、PDFStore（utils/pdf_store.py）の保存名に使う。
+"""
+
+import os
+import re
+import json
+import hashlib
+from typing import Dict, Optional
+
+CONTENT_RANGE_RE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+PDF_MAGIC = b"%PDF-"
+PDF_EOF = b"%%EOF"
+HEADER_WINDOW = 1024   # %PDF- は先頭1024バイト以内にある
+TRAILER_WINDOW = 1024  # %%EOF は末尾1024バイト以内にある
+
+class NotPDFError(ValueError):
+    """本文がPDFとして不正（reason: 'not_pdf' / 'truncated'）"""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+class PDFStreamValidator:
+    """受信チャンクを順に受け取り、PDFの先頭・末尾マーカー検査と SHA-256 計算を行う"""
+
+    def __init__(self):
+        self.head = b""
+        self.tail = b""
+        self.header_ok = False
+        self.sha256 = hashlib.sha256()
+
+    def resume_from(self, path: str) -> None:
+        """再開時は .part に書き込み済みの内容から検査とハッシュ計算を引き継ぐ"""
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b""):
+                self.feed(chunk)
+
+    def feed(self, chunk: bytes) -> None:
+        """チャンクを検査（PDFでないと分かった時点で NotPDFError）"""
+        if not self.header_ok:
+            self.head = (self.head + chunk)[:HEADER_WINDOW]
+            if PDF_MAGIC in self.head:
+                self.header_ok = True
+            elif self.head.lstrip()[:1] == b"<" or len(self.head) >= HEADER_WINDOW:
+                # HTML/XML 本文、または先頭1024バイトに %PDF- が無い
+                raise NotPDFError('not_pdf', f"not a PDF body: {self.head[:40]!r}")
+        self.tail = (self.tail + chunk)[-TRAILER_WINDOW:]
+        self.sha256.update(chunk)
+
+    def hexdigest(self) -> str:
+        return self.sha256.hexdigest()
+
+    def finish(self) -> None:
+        """転送完了後の検査"""
+        if not self.header_ok:
+            raise NotPDFError('not_pdf', f"not a PDF body: {self.head[:40]!r}")
+        if PDF_EOF not in self.tail:
+            raise NotPDFError('truncated', "PDF trailer (%%EOF) not found")
+
+def is_valid_pdf(path: str) -> bool:
+    """保存済みファイルが %PDF- で始まり %%EOF で終わるか（先頭・末尾だけ読む）"""
+    validator = PDFStreamValidator()
+    try:
+        with open(path, 'rb') as f:
+            validator.feed(f.read(HEADER_WINDOW))
+            f.seek(max(0, os.path.getsize(path) - TRAILER_WINDOW))
+            validator.tail = f.read(TRAILER_WINDOW)
+        validator.finish()
+    except (OSError, NotPDFError):
+        return False
+    return True
+
+class PartialDownload:
+    """1つのPDFダウンロードの .part ファイルと再開情報を管理"""
+
+    def __init__(self, filepath: str, url: str):
+        self.filepath = filepath
+        self.url = url
+        self.part_path = filepath + ".part"
+        self.meta_path = self.part_path + ".json"
+        self.offset = 0
+        self.total: Optional[int] = None
+        self.meta: Dict = {}
+        self._load()
+
+    def _load(self) -> None:
+        """前回の .part が同じURLかつ再開可能なら続きから取得する"""
+        if not (os.path.exists(self.part_path) and os.path.exists(self.meta_path)):
+            return
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            self.discard()
+            return
+        if meta.get('url') != self.url or not self._resumable(meta):
+            # 別URLの途中データは使えない（次の書き込みで上書き）
+            return
+        self.meta = meta
+        self.offset = os.path.getsize(self.part_path)
+
+    @staticmethod
+    def _resumable(meta: Dict) -> bool:
+        return bool(meta.get('accept_ranges') and (meta.get('etag') or meta.get('last_modified')))
+
+    @property
+    def resumable(self) -> bool:
+        """失敗時に .part を残して次回再開できるか"""
+        return self._resumable(self.meta)
+
+    def request_headers(self) -> Dict[str, str]:
+        """再開時に付ける Range / If-Range ヘッダー"""
+        if self.offset <= 0:
+            return {}
+        validator = self.meta.get('etag') or self.meta.get('last_modified')
+        return {'Range': f"bytes={self.offset}-", 'If-Range': validator}
+
+    def begin(self, status: int, headers) -> str:
+        """レスポンスを受けて書き込みモード（'ab' か 'wb'）を決める
+
+        206 で Content-Range の開始位置が一致したときだけ追記し、
+        それ以外（200 や検証子の不一致）は最初から書き直す。
+        """
+        content_range = CONTENT_RANGE_RE.match(headers.get('Content-Range', '') or '')
+        length = headers.get('Content-Length')
+        if status == 206 and self.offset > 0 and content_range and int(content_range.group(1)) == self.offset:
+            mode = 'ab'
+            total = content_range.group(3)
+            self.total = int(total) if total != '*' else None
+        else:
+            mode = 'wb'
+            self.offset = 0
+            self.total = int(length) if length else None
+
+        accept_ranges = (headers.get('Accept-Ranges') or '').lower()
+        self.meta = {
+            'url': self.url,
+            'etag': headers.get('ETag') or self.meta.get('etag'),
+            'last_modified': headers.get('Last-Modified') or self.meta.get('last_modified'),
+            'accept_ranges': 'bytes' in accept_ranges or mode == 'ab',
+            'total': self.total,
+        }
+        with open(self.meta_path, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f)
+        return mode
+
+    def downloaded_size(self) -> int:
+        return os.path.getsize(self.part_path) if os.path.exists(self.part_path) else 0
+
+    def finalize(self) -> None:
+        """検証済みの .part を本来のファイル名に確定"""
+        os.replace(self.part_path, self.filepath)
+        if os.path.exists(self.meta_path):
+            os.remove(self.meta_path)
+
+    def discard(self) -> None:
+        """途中データと再開情報を削除"""
+        for path in (self.part_path, self.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pdf_store.py - 内容アドレス型のPDF保存（SHA-256による重複排除）
+
+PDFは本文の SHA-256 をファイル名にして PDF/<sha256>.pdf に保存し、
+DOI → ハッシュの対応を PDF/manifest.json に記録する。
+- プレプリントと出版版のように別DOIから同じPDFを得ても実体は1つ
+- タイトルが同じ（120文字で切り詰めて一致する）別論文が上書きし合わない
+- 「取得済みか」の判定は manifest の辞書引き1回で済む
+
+ダウンロード中のファイルは PDF/.staging/ にURLごとの名前で置き、検証と
+ハッシュ計算が済んでから本来の場所に移す。
+
+登録のたびに manifest.json 全体を書き直すと件数に比例して遅くなり、ダウンロードの
+スレッドもその間待たされるので、登録は PDF/.manifest.journal.jsonl に1行追記するだけに
+して、close() で manifest.json にまとめる（close 前に落ちた分は次に開いたときにまとめる。
+他のモジュールは load_manifest() で追記分も含めて読む）。
+"""
+
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+from typing import IO, Dict, Optional
+
+from utils.status_index import changes
+
+MANIFEST_NAME = "manifest.json"
+JOURNAL_NAME = ".manifest.journal.jsonl"  # 隠しファイル（状況索引は数えない）
+STAGING_DIR = ".staging"
+
+def load_manifest(pdf_dir: str) -> Dict[str, Dict]:
+    """DOI → 登録内容。manifest.json にまだまとめていない追記分も重ねる"""
+    papers: Dict[str, Dict] = {}
+    manifest_path = os.path.join(pdf_dir, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            papers = json.load(f).get('papers', {})
+    journal_path = os.path.join(pdf_dir, JOURNAL_NAME)
+    if os.path.exists(journal_path):
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    papers[entry.pop('doi')] = entry
+                except (ValueError, KeyError, AttributeError):
+                    continue  # 書き込み途中で落ちた最後の行
+    return papers
+
+class PDFStore:
+    """PDF/ フォルダの内容アドレス型ストア（スレッドセーフ）"""
+
+    def __init__(self, pdf_dir: str):
+        self.pdf_dir = pdf_dir
+        self.manifest_path = os.path.join(pdf_dir, MANIFEST_NAME)
+        self.journal_path = os.path.join(pdf_dir, JOURNAL_NAME)
+        self._lock = threading.Lock()
+        self._journal: Optional[IO[str]] = None
+        os.makedirs(os.path.join(pdf_dir, STAGING_DIR), exist_ok=True)
+        self.papers: Dict[str, Dict] = load_manifest(pdf_dir)
+        if os.path.exists(self.journal_path):
+            # 前回 close() せずに終わった分をまとめておく
+            self._compact()
+
+    @staticmethod
+    def filename_for_hash(sha256: str) -> str:
+        return f"{sha256}.pdf"
+
+    def path_for_hash(self, sha256: str) -> str:
+        return os.path.join(self.pdf_dir, self.filename_for_hash(sha256))
+
+    def staging_path(self, url: str) -> str:
+        """ダウンロード途中のファイルの置き場所（URLごとに固定・再開用）"""
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()[:20]
+        return os.path.join(self.pdf_dir, STAGING_DIR, f"{key}.pdf")
+
+    def lookup(self, doi: str) -> Optional[str]:
+        """取得済みならPDFのファイル名（PDF/ からの相対）を返す"""
+        entry = self.papers.get(doi.lower())
+        if entry and os.path.exists(self.path_for_hash(entry['sha256'])):
+            return self.filename_for_hash(entry['sha256'])
+        return None
+
+    def add(self, doi: str, title: str, src_path: str, sha256: str, url: str = '') -> str:
+        """検証済みファイルをストアに登録し、ファイル名を返す
+
+        同じ内容のPDFが既にあれば src_path は削除して実体を共有する。
+        別の論文と共有した取得結果で src_path が移動済みなら登録だけ行う。
+        """
+        dest = self.path_for_hash(sha256)
+        with self._lock:
+            if os.path.exists(dest):
+                if os.path.exists(src_path):
+                    os.remove(src_path)
+            else:
+                os.replace(src_path, dest)
+                changes.written(dest)
+            entry = {
+                'sha256': sha256,
+                'title': title,
+                'url': url,
+                'added_at': datetime.now().isoformat(timespec='seconds'),
+            }
+            self.papers[doi.lower()] = entry
+            if self._journal is None:
+                self._journal = open(self.journal_path, 'a', encoding='utf-8')
+            self._journal.write(json.dumps({'doi': doi.lower(), **entry}, ensure_ascii=False) + "\n")
+            self._journal.flush()
+        return self.filename_for_hash(sha256)
+
+    def _compact(self) -> None:
+        """manifest を一時ファイル経由で書き換え、追記ログを消す"""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'papers': self.papers}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+        changes.written(self.manifest_path)
+        os.remove(self.journal_path)
+
+    def close(self) -> None:
+        """追記した登録を manifest.json にまとめる"""
+        with self._lock:
+            if self._journal is not None:
+                self._compact()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pdf_text.py - PDF本文のテキスト抽出（プロセス並列・内容ハッシュでキャッシュ）
+
+PDF/ のPDFから pypdf（純Python・オフライン）でページごとにテキストを取り出し、
+PDFの SHA-256 をキーに pdf_text_cache.sqlite へ保存する。
+- 抽出はプロセスプールで並列に行い、ワーカーがページを数十枚ずつ直接書き込む
+  （大きなPDFでも本文全体をメモリに持たず、親プロセスに送り返しもしない）
+- 1つのPDFの抽出は PDF_TIMEOUT 秒で打ち切って失敗として記録する（壊れたPDFで pypdf が
+  止まってもプールが詰まらない。POSIX ではページの途中でも SIGALRM で止める）
+- 抽出済み（失敗を含む）のハッシュは読み飛ばす。pypdf のバージョンが変わったら抽出し直す
+- 利用側（enhance_keywords.py・検索索引）は FullTextSource でDOIから本文を引き、
+  ページ単位で逐次読み出す
+
+DOI → PDF は PDF/manifest.json（utils/pdf_store.py）で、manifest 導入前の
+<タイトル>.pdf はJSONファイル名と同じ名前のPDFとして対応付ける。
+"""
+
+import os
+import re
+import time
+import signal
+import hashlib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from utils.http_cache import open_sqlite
+from utils.pdf_store import load_manifest
+from utils.run_report import metrics
+
+try:
+    import pypdf
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+
+PDF_TEXT_CACHE_DB = "pdf_text_cache.sqlite"
+EXTRACT_WORKERS = max(1, min(8, (os.cpu_count() or 2) - 1))
+TASKS_PER_WORKER = 20          # ワーカー1つあたりこの件数ごとにプールを作り直す（pypdf のメモリを返す）
+PAGE_BATCH = 20                # 1回のコミットで書くページ数
+MAX_PAGES = 300                # これを超えるページは読まない（書籍・論文集など）
+MAX_PAGE_CHARS = 20_000        # 1ページから保存する最大文字数
+MAX_PDF_BYTES = 100 * 1024 * 1024
+PDF_TIMEOUT = 120              # 1つのPDFの抽出にかける最大秒数
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+SHA256_NAME_RE = re.compile(r'^[0-9a-f]{64}\.pdf$')
+HYPHEN_BREAK_RE = re.compile(r'(\w)-\n(\w)')
+WHITESPACE_RE = re.compile(r'\s+')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pdf_texts (
+    sha256 TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    pages INTEGER NOT NULL,
+    chars INTEGER NOT NULL,
+    extractor TEXT NOT NULL,
+    error TEXT NOT NULL DEFAULT '',
+    extracted_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pdf_pages (
+    sha256 TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (sha256, page)
+);
+CREATE TABLE IF NOT EXISTS pdf_files (
+    name TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+"""
+
+def extractor_version() -> str:
+    return f"pypdf-{pypdf.__version__}" if PYPDF_AVAILABLE else ""
+
+def clean_page_text(text: str) -> str:
+    """行末ハイフンの単語をつなぎ、空白を1つにまとめる"""
+    text = HYPHEN_BREAK_RE.sub(r'\1\2', text or "")
+    return WHITESPACE_RE.sub(' ', text).strip()[:MAX_PAGE_CHARS]
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ExtractTimeout(Exception):
+    pass
+
+def _raise_timeout(signum, frame):
+    raise ExtractTimeout(f"抽出が{PDF_TIMEOUT}秒を超えました")
+
+@contextmanager
+def _time_limit(seconds: float):
+    """ブロック内を seconds 秒で打ち切る（SIGALRM が使えるのは POSIX のメインスレッドだけ）"""
+    if not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def extract_pdf_to_cache(path: str, sha256: str, cache_path: str) -> Tuple[str, str, int, int, str]:
+    """1つのPDFを抽出してキャッシュに書き込む（プロセスプールのワーカーで実行）
+
+    戻り値は (sha256, 状態, ページ数, 文字数, エラー内容)。
+    """
+    conn = open_sqlite(cache_path)
+    pages = chars = 0
+    status, error = STATUS_OK, ""
+    try:
+        with conn:
+            conn.execute("DELETE FROM pdf_pages WHERE sha256 = ?", (sha256,))
+        if os.path.getsize(path) > MAX_PDF_BYTES:
+            raise ValueError(f"PDFが大きすぎます（{MAX_PDF_BYTES // 1024 // 1024}MB超）")
+        deadline = time.monotonic() + PDF_TIMEOUT
+        with _time_limit(PDF_TIMEOUT):
+            reader = pypdf.PdfReader(path)
+            batch: List[Tuple[str, int, str]] = []
+            for number, page in enumerate(reader.pages):
+                if number >= MAX_PAGES:
+                    break
+                # SIGALRM の無い環境でもページの区切りで打ち切る
+                if time.monotonic() > deadline:
+                    raise ExtractTimeout(f"抽出が{PDF_TIMEOUT}秒を超えました")
+                try:
+                    text = clean_page_text(page.extract_text())
+                except ExtractTimeout:
+                    raise
+                except Exception:
+                    text = ""  # 壊れたページは空にして続ける
+                pages += 1
+                if text:
+                    chars += len(text)
+                    batch.append((sha256, number, text))
+                if len(batch) >= PAGE_BATCH:
+                    with conn:
+                        conn.executemany("INSERT OR REPLACE INTO pdf_pages (sha256, page, text) VALUES (?, ?, ?)", batch)
+                    batch = []
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO pdf_pages (sha256, page, text) VALUES (?, ?, ?)", batch)
+    except Exception as e:
+        status, error = STATUS_ERROR, f"{type(e).__name__}: {e}"[:500]
+        with conn:
+            conn.execute("DELETE FROM pdf_pages WHERE sha256 = ?", (sha256,))
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO pdf_texts (sha256, status, pages, chars, extractor, error, extracted_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (sha256, status, pages, chars, extractor_version(), error, time.time()))
+    conn.close()
+    return sha256, status, pages, chars, error
+
+class PDFTextCache:
+    """pdf_text_cache.sqlite の読み書き（抽出はワーカーが直接書き込む）"""
+
+    def __init__(self, path: str, readonly: bool = False):
+        self.path = path
+        self.conn = open_sqlite(path, readonly=readonly)
+        if not readonly:
+            self.conn.executescript(SCHEMA)
+            self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def done(self) -> Dict[str, str]:
+        """現在の抽出器で処理済み（成功・失敗）のハッシュ → 状態"""
+        return dict(self.conn.execute(
+            "SELECT sha256, status FROM pdf_texts WHERE extractor = ?", (extractor_version(),)))
+
+    def ready(self) -> set:
+        """本文を取り出せたPDFのハッシュ"""
+        return {sha for (sha,) in self.conn.execute(
+            "SELECT sha256 FROM pdf_texts WHERE status = ? AND chars > 0", (STATUS_OK,))}
+
+    def pages(self, sha256: str) -> Iterator[str]:
+        """ページのテキストを順に返す（カーソルから1ページずつ読む）"""
+        for (text,) in self.conn.execute(
+                "SELECT text FROM pdf_pages WHERE sha256 = ? ORDER BY page", (sha256,)):
+            yield text
+
+    def hash_files(self, pdf_dir: str) -> Dict[str, str]:
+        """PDF/ のファイル名 → SHA-256（<sha256>.pdf は名前のまま、それ以外は更新時のみ計算）"""
+        known = {name: (mtime_ns, size, sha) for name, mtime_ns, size, sha in
+                 self.conn.execute("SELECT name, mtime_ns, size, sha256 FROM pdf_files")}
+        hashes, updates = {}, []
+        for entry in os.scandir(pdf_dir):
+            if not entry.name.lower().endswith('.pdf') or not entry.is_file():
+                continue
+            if SHA256_NAME_RE.match(entry.name):
+                hashes[entry.name] = entry.name[:-4]
+                continue
+            st = entry.stat()
+            cached = known.get(entry.name)
+            if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+                hashes[entry.name] = cached[2]
+            else:
+                hashes[entry.name] = file_sha256(entry.path)
+                updates.append((entry.name, st.st_mtime_ns, st.st_size, hashes[entry.name]))
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO pdf_files (name, mtime_ns, size, sha256) "
+                                  "VALUES (?, ?, ?, ?)", updates)
+            self.conn.executemany("DELETE FROM pdf_files WHERE name = ?",
+                                  [(name,) for name in known if name not in hashes])
+        return hashes
+
+    def file_hashes(self) -> Dict[str, str]:
+        """前回 hash_files で記録した（<sha256>.pdf 以外の）ファイル名 → SHA-256"""
+        return dict(self.conn.execute("SELECT name, sha256 FROM pdf_files"))
+
+def extract_pdf_texts(pdf_dir: str, cache_path: str, workers: int = EXTRACT_WORKERS,
+                      progress=None) -> Dict[str, int]:
+    """PDF/ の未抽出PDFをプロセスプールで抽出し、件数を返す
+
+    progress は (完了数, 対象数, ファイル名, 状態) を受け取る関数（省略可）。
+    """
+    with PDFTextCache(cache_path) as cache, metrics.timer("pdf_hash"):
+        hashes = cache.hash_files(pdf_dir)
+        done = cache.done()
+    # 同じ内容のPDFが複数あっても1回だけ抽出する
+    targets: Dict[str, str] = {}
+    for name, sha in sorted(hashes.items()):
+        if sha not in done:
+            targets.setdefault(sha, name)
+    stats = {'pdfs': len(hashes), 'cached': len(set(hashes.values())) - len(targets),
+             'extracted': 0, 'errors': 0, 'pages': 0}
+    if not targets:
+        return stats
+    # workers × TASKS_PER_WORKER 件ごとにプールを作り直してワーカーのメモリを返す
+    # （max_tasks_per_child は Python 3.11 でワーカー入れ替え時に止まることがあるので使わない）
+    items = list(targets.items())
+    batch_size = workers * TASKS_PER_WORKER
+    completed = 0
+    extract_start = time.perf_counter()
+    for start in range(0, len(items), batch_size):
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(extract_pdf_to_cache, os.path.join(pdf_dir, name), sha, cache_path): name
+                       for sha, name in items[start:start + batch_size]}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    _, status, pages, chars, _ = future.result()
+                except Exception:
+                    status, pages, chars = STATUS_ERROR, 0, 0  # ワーカー自体が落ちた（次回やり直す）
+                if status == STATUS_OK:
+                    stats['extracted'] += 1
+                    stats['pages'] += pages
+                    metrics.count("chars", chars)
+                else:
+                    stats['errors'] += 1
+                completed += 1
+                if progress:
+                    progress(completed, len(targets), name, status)
+    metrics.add_time("pdf_extract", time.perf_counter() - extract_start, len(items))
+    return stats
+
+class FullTextSource:
+    """DOI（またはJSONファイル名）→ 抽出済みPDF本文"""
+
+    def __init__(self, pdf_dir: str, cache_path: str):
+        self.cache: Optional[PDFTextCache] = None
+        self.by_doi: Dict[str, str] = {}
+        self.by_name: Dict[str, str] = {}
+        self.ready: set = set()
+        if not os.path.exists(cache_path):
+            return
+        self.cache = PDFTextCache(cache_path, readonly=True)
+        self.ready = self.cache.ready()
+        self.by_doi = {doi: entry['sha256'] for doi, entry in load_manifest(pdf_dir).items()}
+        # 前回の抽出後に消されたPDFは対応付けない
+        self.by_name = {os.path.splitext(name)[0]: sha for name, sha in self.cache.file_hashes().items()
+                        if os.path.exists(os.path.join(pdf_dir, name))}
+
+    def key(self, doi: str = "", json_name: str = "") -> str:
+        """本文のあるPDFのハッシュ（無ければ空文字）"""
+        sha = self.by_doi.get((doi or "").lower()) or self.by_name.get(os.path.splitext(json_name)[0])
+        return sha if sha in self.ready else ""
+
+    def pages(self, key: str) -> Iterator[str]:
+        if self.cache and key:
+            yield from self.cache.pages(key)
+
+    def close(self) -> None:
+        if self.cache:
+            self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
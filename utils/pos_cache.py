@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pos_cache.py - タイトルの品詞タグ付け（一括処理＋永続メモ化）
+
+nltk.pos_tag を1タイトルずつ呼ぶと、パーセプトロンタガーの呼び出し
+オーバーヘッドが件数分かかる。未処理のタイトルだけを集めて
+pos_tag_sents でまとめてタグ付けし、結果をタイトルのハッシュをキーに
+pos_tag_cache.sqlite へ保存する。Markdown を再生成しても、タイトルが
+変わっていなければタグ付けし直さない。
+
+キャッシュキーには NLTK のバージョンも含めるので、タガーが更新されたら
+自動的にタグ付けし直す。
+"""
+
+import json
+import hashlib
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from utils.http_cache import open_sqlite
+
+try:
+    import nltk
+    from nltk.tokenize import word_tokenize
+    NLTK_AVAILABLE = True
+except ImportError:
+    NLTK_AVAILABLE = False
+
+POS_CACHE_DB = "pos_tag_cache.sqlite"
+TAG_BATCH = 1000     # pos_tag_sents に一度に渡すタイトル数
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pos_tags (
+    key TEXT PRIMARY KEY,
+    tags TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+Tagged = List[Tuple[str, str]]
+
+def title_key(title: str) -> str:
+    """タイトルとNLTKバージョンから作るキャッシュキー"""
+    version = nltk.__version__ if NLTK_AVAILABLE else ""
+    return hashlib.sha1(f"{version}\0{title}".encode('utf-8')).hexdigest()
+
+def tag_titles(titles: List[str]) -> List[Tagged]:
+    """タイトルをまとめてトークン化・品詞タグ付け（失敗したタイトルは空リスト）"""
+    try:
+        return [list(tags) for tags in nltk.pos_tag_sents([word_tokenize(t) for t in titles])]
+    except Exception:
+        # まとめて失敗した場合は1件ずつやり直し、失敗したタイトルだけ空にする
+        results = []
+        for title in titles:
+            try:
+                results.append(nltk.pos_tag(word_tokenize(title)))
+            except Exception:
+                results.append([])
+        return results
+
+class POSTagCache:
+    """タイトル → 品詞タグ列 の永続キャッシュ（スレッドセーフ）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = open_sqlite(path, threaded=True)  # 操作は self._lock で直列化
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self.hits = 0
+        self.tagged = 0
+
+    def get_many(self, titles: Iterable[str]) -> Dict[str, Tagged]:
+        """キャッシュ済みのタイトルだけ タイトル → タグ列 で返す"""
+        keys = {title_key(t): t for t in titles}
+        found: Dict[str, Tagged] = {}
+        items = list(keys.items())
+        with self._lock:
+            # SQLite の変数上限を超えないよう分割して問い合わせ
+            for i in range(0, len(items), 500):
+                chunk = items[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, tags FROM pos_tags WHERE key IN ({','.join('?' * len(chunk))})",
+                    [k for k, _ in chunk]).fetchall()
+                for key, tags in rows:
+                    found[keys[key]] = [tuple(pair) for pair in json.loads(tags)]
+        return found
+
+    def put_many(self, tagged: Dict[str, Tagged]) -> None:
+        """タグ付け結果を1トランザクションで保存"""
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO pos_tags (key, tags, created_at) VALUES (?, ?, ?)",
+                [(title_key(t), json.dumps(tags, ensure_ascii=False), now) for t, tags in tagged.items()])
+
+    def tag(self, titles: Iterable[str]) -> Dict[str, Tagged]:
+        """タイトル群の品詞タグを返す（未処理分だけ TAG_BATCH 件ずつ一括タグ付け）"""
+        unique = list(dict.fromkeys(t for t in titles if t and isinstance(t, str)))
+        result = self.get_many(unique)
+        self.hits += len(result)
+        missing = [t for t in unique if t not in result]
+        for i in range(0, len(missing), TAG_BATCH):
+            batch = missing[i:i + TAG_BATCH]
+            tagged = dict(zip(batch, tag_titles(batch)))
+            # 失敗（空）の結果は保存しない（次回やり直す）
+            self.put_many({t: tags for t, tags in tagged.items() if tags})
+            result.update(tagged)
+            self.tagged += len(batch)
+        return result
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
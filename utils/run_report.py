@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+run_report.py - パイプライン各段の計測と実行レポート（run_report.json）
+
+各段のスクリプトは main を stage_report() で囲み、重い区間（HTTP待ち・JSON解析・
+NLTK・ファイル書き込みなど）を metrics.timer() で計り、件数・キャッシュヒット・
+バイト数を metrics.count() で数える。段の終了時に run_report.json の "stages" へ
+所要時間・区間ごとの累積秒と回数・カウンター・ピークRSSを書き込む。
+
+全自動実行.py などの実行ドライバは start_run() で新しいレポートを作り、実行IDを
+環境変数 SCOPUS_RUN_ID で子プロセスの段に渡すので、1回の実行の全段が1つの
+レポートにまとまる。単独で実行した段はその段だけのレポートを作り直す。
+段の終了時には、段の中で書いた・消したファイル・済んだ論文（utils/status_index.py の
+changes）と段の完了を status_index.sqlite にも反映する（進行状況確認.py が読む）。
+
+区間の秒は壁時計ではなく累積（並列のスレッド・非同期タスクの区間は重なって足される）。
+プロセスプールのワーカーは metrics.drain() で差分を結果と一緒に返し、親が
+metrics.merge() で足し込む。
+
+--profile[=cpu|mem|all] を付けて実行すると（profile_option()）、環境変数
+SCOPUS_PROFILE で子プロセスの段にも引き継がれ、各段を cProfile / tracemalloc の
+下で動かして profiles/ に <段>.pstats と <段>.alloc.txt を書き、関数ごとの時間と
+確保量の上位を run_report.json の段の "profile" に入れる。cProfile が見るのは段の
+メインスレッド（asyncio のタスクを含む）だけで、スレッド・プロセスプールの
+ワーカーの中は入らない。
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import cProfile
+import platform
+import pstats
+import sqlite3
+import tempfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set
+
+from utils.status_index import StatusIndex, changes
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:  # Windows
+    RESOURCE_AVAILABLE = False
+
+RUN_REPORT = "run_report.json"
+RUN_ID_ENV = "SCOPUS_RUN_ID"
+PROFILE_ENV = "SCOPUS_PROFILE"
+PROFILE_DIR = "profiles"
+PROFILE_MODES = ("cpu", "mem", "all")
+PROFILE_TOP = 10          # run_report.json に入れる上位の件数（ファイルにはもっと多く書く）
+
+class Metrics:
+    """プロセス内の区間タイマーとカウンター（スレッドセーフ）"""
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self) -> None:
+        self._lock = threading.Lock()
+        self.timers: Dict[str, List[float]] = {}     # 名前 → [累積秒, 回数]
+        self.counters: Dict[str, float] = {}
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name: str, seconds: float, count: int = 1) -> None:
+        with self._lock:
+            entry = self.timers.setdefault(name, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += count
+
+    def count(self, name: str, n: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"timers": {name: list(entry) for name, entry in self.timers.items()},
+                    "counters": dict(self.counters)}
+
+    def drain(self) -> dict:
+        """今までの計測値を返して空にする（ワーカープロセスから親に渡す用）"""
+        with self._lock:
+            delta = {"timers": self.timers, "counters": self.counters}
+            self.timers, self.counters = {}, {}
+        return delta
+
+    def merge(self, delta: Optional[dict]) -> None:
+        if not delta:
+            return
+        for name, (seconds, count) in delta.get("timers", {}).items():
+            self.add_time(name, seconds, count)
+        for name, n in delta.get("counters", {}).items():
+            self.count(name, n)
+
+# 段のスクリプトが使うプロセス全体の計測値
+metrics = Metrics()
+if hasattr(os, "register_at_fork"):
+    # fork したワーカーが親の計測値を引き継いで drain() で二重に返さないように
+    os.register_at_fork(after_in_child=metrics._reset)
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """このプロセス（children=True は待ち終えた子プロセスの最大）のピークRSS（MB）"""
+    if not RESOURCE_AVAILABLE:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss は Linux では KB、macOS ではバイト
+    return usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+def _new_report(run_id: str) -> dict:
+    return {"run_id": run_id, "started_at": _now(), "python": platform.python_version(),
+            "platform": platform.platform(), "cpu_count": os.cpu_count(), "stages": {}}
+
+def load_report(base_dir: str) -> dict:
+    path = os.path.join(base_dir, RUN_REPORT)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_report(base_dir: str, report: dict) -> None:
+    # 途中で落ちても壊れたレポートを残さないよう一時ファイルから置き換える
+    fd, tmp = tempfile.mkstemp(prefix=".run_report.", suffix=".tmp", dir=base_dir)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, os.path.join(base_dir, RUN_REPORT))
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def start_run(base_dir: str) -> str:
+    """新しい実行を始める（レポートを作り直し、実行IDを子プロセスに引き継ぐ）"""
+    run_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+    os.environ[RUN_ID_ENV] = run_id
+    _save_report(base_dir, _new_report(run_id))
+    return run_id
+
+def finish_run(base_dir: str, seconds: float) -> dict:
+    report = load_report(base_dir)
+    if report.get("run_id") == os.environ.get(RUN_ID_ENV):
+        report.update(finished_at=_now(), seconds=round(seconds, 3))
+        _save_report(base_dir, report)
+    return report
+
+def record_stage(base_dir: str, stage: str, result: dict) -> None:
+    """段の結果をレポートに書き足す（同じ段の既存の項目は上書き、他の項目は残す）"""
+    run_id = os.environ.get(RUN_ID_ENV)
+    report = load_report(base_dir)
+    if not run_id or report.get("run_id") != run_id:
+        # 実行ドライバ経由でない単独実行（または別の実行のレポート）は作り直す
+        report = _new_report(run_id or f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}")
+    report.setdefault("stages", {}).setdefault(stage, {}).update(result)
+    _save_report(base_dir, report)
+
+def profile_option(argv: Optional[List[str]] = None) -> Optional[str]:
+    """--profile[=cpu|mem|all] を argv（既定は sys.argv）から取り除いて有効にする
+
+    環境変数 SCOPUS_PROFILE に入れるので、この後 subprocess で起動する段にも引き継がれる。
+    値を省いた --profile は all（cProfile と tracemalloc の両方）。
+    """
+    argv = sys.argv if argv is None else argv
+    for i, arg in enumerate(argv[1:], 1):
+        if arg == "--profile" or arg.startswith("--profile="):
+            mode = arg.partition("=")[2] or "all"
+            if mode not in PROFILE_MODES:
+                print(f"❌ --profile の値は {' / '.join(PROFILE_MODES)} のいずれか: {mode}")
+                sys.exit(2)
+            del argv[i]
+            os.environ[PROFILE_ENV] = mode
+            break
+    return profile_mode()
+
+def profile_mode() -> Optional[str]:
+    """有効なプロファイルの種類（cpu / mem / all）。無効なら None"""
+    mode = os.environ.get(PROFILE_ENV)
+    return mode if mode in PROFILE_MODES else None
+
+def _location(filename: str, lineno: int, base_dir: str) -> str:
+    if filename.startswith(base_dir + os.sep):
+        filename = os.path.relpath(filename, base_dir)
+    elif os.sep in filename:
+        # 標準ライブラリ・site-packages はパッケージ名/ファイル名だけ
+        filename = os.path.join(*filename.split(os.sep)[-2:])
+    return f"{filename}:{lineno}"
+
+class StageProfiler:
+    """段の処理を cProfile / tracemalloc の下で動かし、結果をファイルと要約に書き出す"""
+
+    def __init__(self, mode: str):
+        self.cpu = cProfile.Profile() if mode in ("cpu", "all") else None
+        self.mem = mode in ("mem", "all") and not tracemalloc.is_tracing()
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+        self.traced_peak = 0
+
+    def start(self) -> "StageProfiler":
+        if self.mem:
+            tracemalloc.start()
+        if self.cpu:
+            self.cpu.enable()
+        return self
+
+    def stop(self) -> None:
+        if self.cpu:
+            self.cpu.disable()
+        if self.mem:
+            self.snapshot = tracemalloc.take_snapshot()
+            self.traced_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    def write(self, base_dir: str, stage: str) -> dict:
+        """profiles/<段>.pstats・<段>.alloc.txt を書き、run_report.json 用の要約を返す"""
+        out_dir = os.path.join(base_dir, PROFILE_DIR)
+        os.makedirs(out_dir, exist_ok=True)
+        summary = {}
+        if self.cpu:
+            path = os.path.join(out_dir, f"{stage}.pstats")
+            self.cpu.dump_stats(path)
+            stats = pstats.Stats(self.cpu)
+            # 自分自身の時間（tottime）順。cumtime は main や run が常に上位になるので補助に
+            rows = sorted(stats.stats.items(), key=lambda item: -item[1][2])[:PROFILE_TOP]
+            summary["pstats"] = os.path.relpath(path, base_dir)
+            summary["top_functions"] = [
+                # 組み込み関数は pstats では ("~", 0, "<built-in method ...>")
+                {"function": name if filename == "~" else f"{_location(filename, lineno, base_dir)}({name})",
+                 "calls": ncalls, "tottime": round(tottime, 3), "cumtime": round(cumtime, 3)}
+                for (filename, lineno, name), (_, ncalls, tottime, cumtime, _) in rows]
+        if self.snapshot is not None:
+            path = os.path.join(out_dir, f"{stage}.alloc.txt")
+            top = self.snapshot.filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            )).statistics("lineno")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(f"# {stage}: tracemalloc ピーク {self.traced_peak / 2**20:.1f}MB"
+                        f"（段の終了時に残っていた確保の上位）\n")
+                for stat in top[:100]:
+                    frame = stat.traceback[0]
+                    f.write(f"{stat.size / 1024:10.1f} KiB {stat.count:8d} 個  "
+                            f"{_location(frame.filename, frame.lineno, base_dir)}\n")
+            summary["alloc_report"] = os.path.relpath(path, base_dir)
+            summary["traced_peak_mb"] = round(self.traced_peak / 2**20, 1)
+            summary["top_allocations"] = [
+                {"where": _location(stat.traceback[0].filename, stat.traceback[0].lineno, base_dir),
+                 "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+                for stat in top[:PROFILE_TOP]]
+        return summary
+
+@contextmanager
+def stage_report(stage: str, base_dir: str) -> Iterator[Metrics]:
+    """段の処理を囲んで計測し、終了時（例外でも）に run_report.json へ記録する"""
+    metrics.drain()
+    fresh = _status_start(base_dir)
+    mode = profile_mode()
+    profiler = StageProfiler(mode).start() if mode else None
+    started_at = _now()
+    start = time.perf_counter()
+    status, error = "ok", None
+    try:
+        yield metrics
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            status, error = "error", f"exit {e.code}"
+        raise
+    except BaseException as e:
+        status, error = "error", f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if profiler:
+            profiler.stop()
+        seconds = time.perf_counter() - start
+        measured = metrics.snapshot()
+        papers = measured["counters"].get("papers")
+        result = {
+            "started_at": started_at, "seconds": round(seconds, 3), "status": status,
+            "timers": {name: {"seconds": round(total, 3), "count": count}
+                       for name, (total, count) in sorted(measured["timers"].items(),
+                                                          key=lambda item: -item[1][0])},
+            "counters": measured["counters"],
+            "papers_per_sec": round(papers / seconds, 1) if papers and seconds else None,
+            "peak_rss_mb": _round(peak_rss_mb()),
+            "children_peak_rss_mb": _round(peak_rss_mb(children=True)),
+        }
+        if error:
+            result["error"] = error
+        try:
+            if profiler:
+                result["profile"] = profiler.write(base_dir, stage)
+            record_stage(base_dir, stage, result)
+        except OSError as e:
+            print(f"⚠️ 実行レポートを書けませんでした: {e}")
+        try:
+            with StatusIndex(base_dir) as index:
+                written, removed, completed = changes.drain()
+                index.apply(written, removed, restamp=fresh)
+                index.record_papers(stage, completed)
+                index.record_stage(stage, status, result["seconds"], papers, os.environ.get(RUN_ID_ENV))
+        except (OSError, sqlite3.Error) as e:
+            print(f"⚠️ 状況索引を更新できませんでした: {e}")
+
+def _status_start(base_dir: str) -> Set[str]:
+    """段の開始時に索引と一致しているフォルダを調べ、ファイルの変更の記録を始める"""
+    changes.start()
+    try:
+        with StatusIndex(base_dir) as index:
+            return index.fresh_folders()
+    except (OSError, sqlite3.Error):
+        return set()
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+def summarize(report: dict, top: int = 3) -> List[str]:
+    """レポートの段ごとの要約行（所要時間・件/秒・ピークRSS・時間のかかった区間）"""
+    lines = []
+    for stage, result in report.get("stages", {}).items():
+        seconds = result.get("seconds", result.get("wall_seconds"))
+        rss = result.get("peak_rss_mb")
+        parts = [f"{seconds:.1f}秒" if seconds is not None else "-"]
+        if result.get("papers_per_sec"):
+            parts.append(f"{result['papers_per_sec']}件/秒")
+        if rss is not None:
+            parts.append(f"{max(rss, result.get('children_peak_rss_mb') or 0):.0f}MB")
+        timers = list(result.get("timers", {}).items())[:top]
+        if timers:
+            parts.append(" / ".join(f"{name} {value['seconds']:.1f}秒" for name, value in timers))
+        mark = "❌" if result.get("status") == "error" or result.get("returncode") else "✅"
+        lines.append(f"{mark} {stage}: " + "  ".join(parts))
+    return lines
+
+def profile_lines(report: dict, top: int = 5) -> List[str]:
+    """--profile で実行した段の、自分自身の時間が長い関数の表"""
+    lines = []
+    for stage, result in report.get("stages", {}).items():
+        profile = result.get("profile")
+        if not profile:
+            continue
+        files = " / ".join(profile[key] for key in ("pstats", "alloc_report") if key in profile)
+        lines.append(f"{stage}  ({files})")
+        if profile.get("top_functions"):
+            lines.append(f"   {'tottime':>8} {'cumtime':>8} {'calls':>9}  関数")
+            for row in profile["top_functions"][:top]:
+                lines.append(f"   {row['tottime']:8.3f} {row['cumtime']:8.3f} {row['calls']:9d}  {row['function']}")
+        if profile.get("top_allocations"):
+            lines.append(f"   tracemalloc ピーク {profile['traced_peak_mb']}MB / 残った確保の上位: " +
+                         ", ".join(f"{row['where']} {row['size_kb']:.0f}KiB"
+                                   for row in profile["top_allocations"][:3]))
+    return lines
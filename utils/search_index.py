@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+search_index.py - 全文検索用の転置索引（位置情報付き・BM25）
+
+JSON_folder/*.json の タイトル・抄録・キーワード（enhance_keywords.py の
+combined_keywords）・参考文献タイトル を単語に分け、単語ごとに
+「文書ID・出現数・重み付き出現数」と「出現位置」の配列（posting）を
+search_index.sqlite に保存する。
+- 位置は フィールド番号 << 24 | フィールド内の単語位置 で、フレーズは同じフィールド内でだけ一致する
+- 出現数はフィールドの重み（タイトル > キーワード > 抄録 > 参考文献）を掛けて BM25 に使う
+- 位置は別の列に置き、フレーズ検索のときだけ読む（よく出る単語でも採点は文書数分の配列だけ）
+- 文書長・発行年は1つの配列（BLOB）で持ち、検索時は必要な単語の posting と合わせて数回読むだけ
+- 抽出済みのPDF本文（utils/pdf_text.py）は位置を持たない出現数だけを索引し、
+  メタデータとは別の文書長で BM25 を計算して FULLTEXT_WEIGHT 倍で足す
+  （本文の長さでタイトル一致の論文が不利にならない。フレーズはメタデータ内だけで一致）
+各JSONの更新時刻とサイズを記録しておき、再構築時は追加・変更・削除された
+JSONの単語の posting だけを書き直す。変更された文書は新しいIDで入れ直すので、
+空いたIDが文書数の RENUMBER_RATIO 倍を超えたら文書IDを詰め直す（文書長などの配列と
+検索時の採点用の配列は最大の文書IDの大きさになるため）。
+"""
+
+import re
+import json
+import math
+import sqlite3
+import time
+import unicodedata
+from collections import Counter
+from typing import TYPE_CHECKING, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from utils.http_cache import open_sqlite
+from utils.shard_layout import resolve, scan
+
+if TYPE_CHECKING:
+    from utils.pdf_text import FullTextSource
+
+SEARCH_INDEX_DB = "search_index.sqlite"
+FORMAT_VERSION = 2
+
+# フィールド（番号は位置の上位ビットに入る）と BM25 での重み
+FIELDS = ("title", "keywords", "abstract", "references")
+FIELD_WEIGHTS = np.array([3.0, 2.0, 1.0, 0.5], dtype=np.float32)
+FIELD_SHIFT = 24                       # フィールド内の位置は 2^24 語まで
+POSITION_MASK = (1 << FIELD_SHIFT) - 1
+FULLTEXT_WEIGHT = 0.3                  # 本文の BM25 に掛ける重み
+BM25_K1 = 1.2
+BM25_B = 0.75
+INSERT_BATCH = 2000                    # 1トランザクションで書く posting の数
+RENUMBER_RATIO = 2                     # 最大の文書ID がこの倍を超えたら詰め直す
+
+TOKEN_RE = re.compile(r'\w+')
+PHRASE_RE = re.compile(r'"([^"]*)"')
+YEAR_RE = re.compile(r'^year:(\d{4})?(?:(-)(\d{4})?)?$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    doc_id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    title TEXT NOT NULL,
+    doi TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    length REAL NOT NULL,
+    fulltext TEXT NOT NULL,
+    fulltext_length REAL NOT NULL,
+    terms BLOB NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS terms (
+    term_id INTEGER PRIMARY KEY,
+    term TEXT UNIQUE NOT NULL,
+    docs BLOB NOT NULL,
+    positions BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL
+);
+"""
+
+def tokenize(text: str) -> List[str]:
+    """NFKC正規化・小文字化して \\w+ の単語に分ける（インデックスとクエリで共通）"""
+    return TOKEN_RE.findall(unicodedata.normalize("NFKC", text).lower()) if text else []
+
+def parse_year(value) -> int:
+    """JSONの year（数値 / 文字列 / 空）を整数に（不明は 0）"""
+    match = re.match(r'\d{4}', str(value or ""))
+    return int(match.group()) if match else 0
+
+def document_fields(data: dict) -> List[List[str]]:
+    """JSONから FIELDS 順に各フィールドの単語列を作る"""
+    keywords = (data.get('keywords') or {}).get('combined_keywords') or []
+    ref_titles = []
+    for ref in data.get('references', []) or []:
+        if isinstance(ref, dict):
+            ref_titles.append(ref.get('article-title') or ref.get('unstructured') or "")
+    # キーワード・参考文献は項目の間に空の単語を挟んで位置を1つ空け、
+    # 別項目をまたいだフレーズ一致を防ぐ
+    def join_items(items: Iterable[str]) -> List[str]:
+        tokens: List[str] = []
+        for item in items:
+            if isinstance(item, str) and item:
+                if tokens:
+                    tokens.append("")
+                tokens.extend(tokenize(item))
+        return tokens
+    return [tokenize(data.get('title', '') or ""), join_items(keywords),
+            tokenize(data.get('abstract', '') or ""), join_items(ref_titles)]
+
+# ---------- posting の符号化 ----------
+# docs 列 = (文書ID int32, 出現数 int32, 重み付き出現数 float32, 本文での出現数 float32) の
+#           16バイトの記録を文書ID順に並べたもの（出現数は位置の数。本文だけに出る単語は 0）
+# positions 列 = int32 の位置×出現数の合計（文書ID順・文書内は位置の昇順）
+# 新しい文書のIDは既存のどれよりも大きいので、文書の追加は両方の列の末尾に足すだけで済む
+
+DOC_RECORD = np.dtype([('doc_id', '<i4'), ('count', '<i4'), ('weight', '<f4'), ('fulltext', '<f4')])
+
+class Postings(NamedTuple):
+    doc_ids: np.ndarray
+    counts: np.ndarray
+    weights: np.ndarray                   # フィールドの重みを掛けた出現数（BM25 の tf）
+    fulltext: np.ndarray                  # PDF本文での出現数
+    positions: Optional[np.ndarray] = None
+
+def encode_postings(doc_ids: np.ndarray, positions: np.ndarray,
+                    fulltext_doc_ids: Optional[np.ndarray] = None,
+                    fulltext_counts: Optional[np.ndarray] = None) -> Tuple[bytes, bytes]:
+    """文書ID・位置順に並んだ (文書ID, 位置) の組と、文書ID順の本文での出現数から
+    docs 列・positions 列を作る"""
+    if len(doc_ids):
+        starts = np.flatnonzero(np.concatenate([[True], doc_ids[1:] != doc_ids[:-1]]))
+        docs = doc_ids[starts]
+        counts = np.diff(np.append(starts, len(doc_ids)))
+        weights = np.add.reduceat(FIELD_WEIGHTS[positions >> FIELD_SHIFT], starts)
+    else:
+        docs = counts = weights = np.empty(0, dtype=np.int32)
+    if fulltext_doc_ids is None or len(fulltext_doc_ids) == 0:
+        records = np.zeros(len(docs), dtype=DOC_RECORD)
+        records['doc_id'], records['count'], records['weight'] = docs, counts, weights
+    else:
+        all_docs = np.union1d(docs, fulltext_doc_ids)
+        records = np.zeros(len(all_docs), dtype=DOC_RECORD)
+        records['doc_id'] = all_docs
+        at = np.searchsorted(all_docs, docs)
+        records['count'][at], records['weight'][at] = counts, weights
+        records['fulltext'][np.searchsorted(all_docs, fulltext_doc_ids)] = fulltext_counts
+    return records.tobytes(), positions.astype(np.int32, copy=False).tobytes()
+
+def decode_postings(docs: bytes, positions: Optional[bytes] = None) -> Postings:
+    records = np.frombuffer(docs, dtype=DOC_RECORD)
+    return Postings(records['doc_id'], records['count'], records['weight'], records['fulltext'],
+                    None if positions is None else np.frombuffer(positions, dtype=np.int32))
+
+def remove_documents(docs: bytes, positions: bytes, removed: np.ndarray) -> Tuple[bytes, bytes]:
+    """posting から removed の文書を除く"""
+    records = np.frombuffer(docs, dtype=DOC_RECORD)
+    keep = ~np.isin(records['doc_id'], removed)
+    if keep.all():
+        return docs, positions
+    kept_positions = np.frombuffer(positions, dtype=np.int32)[np.repeat(keep, records['count'])]
+    return records[keep].tobytes(), kept_positions.tobytes()
+
+class SearchHit(NamedTuple):
+    score: float
+    name: str      # JSONファイル名（拡張子を除くとノート名）
+    title: str
+    year: int
+    doi: str
+
+class SearchIndex:
+    """search_index.sqlite の読み書き"""
+
+    def __init__(self, path: str, readonly: bool = False):
+        self.path = path
+        self.conn = open_sqlite(path, readonly=readonly)
+        if not readonly:
+            if self._version() not in (None, str(FORMAT_VERSION)):
+                # 形式が変わった索引は作り直す
+                self.conn.executescript("DROP TABLE IF EXISTS docs; DROP TABLE IF EXISTS terms; "
+                                        "DROP TABLE IF EXISTS meta;")
+            self.conn.executescript(SCHEMA)
+            self.conn.commit()
+        self._stats: Optional[Tuple[np.ndarray, ...]] = None
+
+    def _version(self) -> Optional[str]:
+        """索引の形式（未作成なら None）"""
+        try:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0].decode() if row else None
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- 更新 ----------
+    def update(self, json_dir: str, fulltext: Optional["FullTextSource"] = None) -> Dict[str, int]:
+        """JSON_folder から増分更新し、処理件数を返す
+
+        fulltext（utils.pdf_text.FullTextSource）を渡すと抽出済みのPDF本文も索引し、
+        JSONが変わっていなくても本文が増えた・変わった論文は読み直す。
+        """
+        current = {}
+        for entry in scan(json_dir, '.json'):
+            st = entry.stat()
+            current[entry.name] = (st.st_mtime_ns, st.st_size)
+        indexed = {name: (doc_id, mtime_ns, size, doi, key) for doc_id, name, mtime_ns, size, doi, key
+                   in self.conn.execute("SELECT doc_id, name, mtime_ns, size, doi, fulltext FROM docs")}
+        stale = [name for name, (_, mtime_ns, size, doi, key) in indexed.items()
+                 if current.get(name) != (mtime_ns, size)
+                 or (fulltext is not None and fulltext.key(doi, name) != key)]
+        stale_set = set(stale)
+        fresh = sorted(name for name in current if name not in indexed or name in stale_set)
+        if not stale and not fresh:
+            return {'parsed': 0, 'removed': 0, 'errors': 0, 'docs': len(indexed)}
+
+        term_ids = {term: term_id for term_id, term in self.conn.execute("SELECT term_id, term FROM terms")}
+        next_term_id = max(term_ids.values(), default=-1) + 1
+        next_doc_id = self.conn.execute("SELECT COALESCE(MAX(doc_id), -1) + 1 FROM docs").fetchone()[0]
+        new_terms: Dict[int, str] = {}
+
+        def intern(token: str) -> int:
+            nonlocal next_term_id
+            term_id = term_ids.get(token)
+            if term_id is None:
+                term_id = term_ids[token] = next_term_id
+                new_terms[term_id] = token
+                next_term_id += 1
+            return term_id
+
+        # 古い文書の単語（posting から消す必要があるもの）
+        removed_docs = {indexed[name][0] for name in stale}
+        affected_terms = set()
+        for name in stale:
+            blob = self.conn.execute("SELECT terms FROM docs WHERE name = ?", (name,)).fetchone()[0]
+            affected_terms.update(np.frombuffer(blob, dtype=np.int32).tolist())
+
+        # 新しい・変更された文書を単語に分ける
+        new_docs = []
+        new_term_parts: List[np.ndarray] = []
+        new_doc_parts: List[np.ndarray] = []
+        new_pos_parts: List[np.ndarray] = []
+        ft_term_parts: List[np.ndarray] = []
+        ft_doc_parts: List[np.ndarray] = []
+        ft_count_parts: List[np.ndarray] = []
+        errors = 0
+        for name in fresh:
+            try:
+                with open(resolve(json_dir, name), 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                errors += 1
+                continue
+            doc_id = next_doc_id
+            next_doc_id += 1
+            ids, positions = [], []
+            length = 0.0
+            for field, tokens in enumerate(document_fields(data)):
+                base = field << FIELD_SHIFT
+                for offset, token in enumerate(tokens[:POSITION_MASK]):
+                    if token:  # 空の単語は項目の区切り
+                        ids.append(intern(token))
+                        positions.append(base | offset)
+                length += FIELD_WEIGHTS[field] * sum(1 for t in tokens if t)
+            ids_array = np.asarray(ids, dtype=np.int32)
+            new_term_parts.append(ids_array)
+            new_doc_parts.append(np.full(len(ids), doc_id, dtype=np.int32))
+            new_pos_parts.append(np.asarray(positions, dtype=np.int32))
+
+            # PDF本文はページごとに読んで単語を数えるだけ（本文全体は持たない）
+            doi = data.get('doi', '') or ""
+            fulltext_key = fulltext.key(doi, name) if fulltext is not None else ""
+            counts: Counter = Counter()
+            for page in fulltext.pages(fulltext_key) if fulltext_key else ():
+                counts.update(tokenize(page))
+            ft_ids = np.fromiter((intern(t) for t in counts), dtype=np.int32, count=len(counts))
+            ft_order = np.argsort(ft_ids)
+            ft_term_parts.append(ft_ids[ft_order])
+            ft_doc_parts.append(np.full(len(counts), doc_id, dtype=np.int32))
+            ft_count_parts.append(np.fromiter(counts.values(), dtype=np.float32, count=len(counts))[ft_order])
+
+            mtime_ns, size = current[name]
+            new_docs.append((doc_id, name, data.get('title', '') or "", doi,
+                             parse_year(data.get('year')), float(length),
+                             fulltext_key, float(sum(counts.values())),
+                             np.union1d(ids_array, ft_ids).astype(np.int32).tobytes(), mtime_ns, size))
+
+        # 新しい posting を単語ごとに切り分ける
+        # （安定ソートなので、各単語の中では文書ID順・文書内は位置順のまま）
+        all_terms, all_docs, all_pos = (np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
+                                        for parts in (new_term_parts, new_doc_parts, new_pos_parts))
+        order = np.argsort(all_terms, kind='stable')
+        all_terms, all_docs, all_pos = all_terms[order], all_docs[order], all_pos[order]
+        ft_terms, ft_docs, ft_counts = (np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
+                                        for parts in (ft_term_parts, ft_doc_parts, ft_count_parts))
+        order = np.argsort(ft_terms, kind='stable')
+        ft_terms, ft_docs, ft_counts = ft_terms[order], ft_docs[order], ft_counts[order]
+
+        def term_ranges(terms: np.ndarray) -> Dict[int, Tuple[int, int]]:
+            values, starts = np.unique(terms, return_index=True)
+            ends = np.append(starts[1:], len(terms))
+            return {int(t): (s, e) for t, s, e in zip(values, starts, ends)}
+        additions = term_ranges(all_terms)
+        ft_additions = term_ranges(ft_terms)
+        affected_terms.update(additions)
+        affected_terms.update(ft_additions)
+
+        removed_array = np.fromiter(removed_docs, dtype=np.int32, count=len(removed_docs))
+        with self.conn:
+            if stale:
+                self.conn.executemany("DELETE FROM docs WHERE name = ?", [(name,) for name in stale])
+            self.conn.executemany(
+                "INSERT INTO docs (doc_id, name, title, doi, year, length, fulltext, fulltext_length, "
+                "terms, mtime_ns, size) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", new_docs)
+            self.conn.executemany("INSERT INTO terms (term_id, term, docs, positions) VALUES (?, ?, ?, ?)",
+                                  [(term_id, term, b"", b"") for term_id, term in new_terms.items()])
+            # 影響を受けた単語の posting を「古い文書を除く + 新しい文書を末尾に足す」で書き直す
+            pending = []
+            for term_id in sorted(affected_terms):
+                docs, positions = b"", b""
+                if term_id not in new_terms:
+                    row = self.conn.execute("SELECT docs, positions FROM terms WHERE term_id = ?",
+                                            (term_id,)).fetchone()
+                    if row:
+                        docs, positions = row
+                        if len(removed_array):
+                            docs, positions = remove_documents(docs, positions, removed_array)
+                if term_id in additions or term_id in ft_additions:
+                    s, e = additions.get(term_id, (0, 0))
+                    fs, fe = ft_additions.get(term_id, (0, 0))
+                    added_docs, added_positions = encode_postings(all_docs[s:e], all_pos[s:e],
+                                                                  ft_docs[fs:fe], ft_counts[fs:fe])
+                    docs, positions = docs + added_docs, positions + added_positions
+                pending.append((docs, positions, term_id))
+                if len(pending) >= INSERT_BATCH:
+                    self.conn.executemany("UPDATE terms SET docs = ?, positions = ? WHERE term_id = ?", pending)
+                    pending = []
+            self.conn.executemany("UPDATE terms SET docs = ?, positions = ? WHERE term_id = ?", pending)
+            self.conn.execute("DELETE FROM terms WHERE docs = x''")
+            self._renumber_if_sparse()
+            self._save_stats()
+        self._stats = None
+        return {
+            'parsed': len(new_docs),
+            'removed': len([name for name in stale if name not in current]),
+            'errors': errors,
+            'docs': len(indexed) - len(stale) + len(new_docs),
+        }
+
+    def _renumber_if_sparse(self) -> None:
+        """空いた文書IDが多ければ 0 から詰め直す（update のトランザクション内で呼ぶ）
+
+        順序を保ったまま番号を付け替えるので、posting は文書IDの列を置き換えるだけで
+        並び（文書ID順）も positions 列もそのまま使える。
+        """
+        doc_ids = np.fromiter((r[0] for r in self.conn.execute("SELECT doc_id FROM docs ORDER BY doc_id")),
+                              dtype=np.int64)
+        if not len(doc_ids) or doc_ids[-1] + 1 <= RENUMBER_RATIO * len(doc_ids):
+            return
+        renumbered = np.full(doc_ids[-1] + 1, -1, dtype=np.int32)
+        renumbered[doc_ids] = np.arange(len(doc_ids), dtype=np.int32)
+        # 新しい番号は元の番号以下なので、小さい順に付け替えれば主キーが重ならない
+        self.conn.executemany("UPDATE docs SET doc_id = ? WHERE doc_id = ?",
+                              [(new, old) for new, old in enumerate(doc_ids.tolist()) if new != old])
+        pending = []
+        for term_id, docs in self.conn.execute("SELECT term_id, docs FROM terms").fetchall():
+            records = np.frombuffer(docs, dtype=DOC_RECORD).copy()
+            records['doc_id'] = renumbered[records['doc_id']]
+            pending.append((records.tobytes(), term_id))
+            if len(pending) >= INSERT_BATCH:
+                self.conn.executemany("UPDATE terms SET docs = ? WHERE term_id = ?", pending)
+                pending = []
+        self.conn.executemany("UPDATE terms SET docs = ? WHERE term_id = ?", pending)
+
+    def _save_stats(self) -> None:
+        """文書ID → 文書長・発行年・本文長 の配列を meta に保存（検索時はこれだけ読む）"""
+        rows = self.conn.execute("SELECT doc_id, length, year, fulltext_length FROM docs").fetchall()
+        size = max((r[0] for r in rows), default=-1) + 1
+        lengths = np.zeros(size, dtype=np.float32)
+        years = np.zeros(size, dtype=np.int16)
+        fulltext_lengths = np.zeros(size, dtype=np.float32)
+        if rows:
+            doc_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+            lengths[doc_ids] = np.fromiter((r[1] for r in rows), dtype=np.float32, count=len(rows))
+            years[doc_ids] = np.fromiter((r[2] for r in rows), dtype=np.int16, count=len(rows))
+            fulltext_lengths[doc_ids] = np.fromiter((r[3] for r in rows), dtype=np.float32, count=len(rows))
+        self.conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+            ('version', str(FORMAT_VERSION).encode()),
+            ('lengths', lengths.tobytes()),
+            ('years', years.tobytes()),
+            ('fulltext_lengths', fulltext_lengths.tobytes()),
+            ('num_docs', str(len(rows)).encode()),
+            ('updated_at', time.strftime('%Y-%m-%dT%H:%M:%S').encode()),
+        ])
+
+    # ---------- 検索 ----------
+    def _load_stats(self) -> Tuple[np.ndarray, np.ndarray, int, float, np.ndarray, float]:
+        if self._stats is None:
+            if self._version() != str(FORMAT_VERSION):
+                raise RuntimeError("検索索引の形式が古いので update で作り直してください")
+            meta = dict(self.conn.execute("SELECT key, value FROM meta"))
+            lengths = np.frombuffer(meta.get('lengths', b""), dtype=np.float32)
+            years = np.frombuffer(meta.get('years', b""), dtype=np.int16)
+            num_docs = int(meta.get('num_docs', b"0"))
+            average = float(lengths.sum()) / num_docs if num_docs else 0.0
+            # 本文の平均長は本文のある文書だけで取る
+            fulltext_lengths = np.frombuffer(meta.get('fulltext_lengths', b""), dtype=np.float32)
+            with_fulltext = fulltext_lengths[fulltext_lengths > 0]
+            fulltext_average = float(with_fulltext.mean()) if len(with_fulltext) else 0.0
+            self._stats = (lengths, years, num_docs, average, fulltext_lengths, fulltext_average)
+        return self._stats
+
+    def _postings(self, terms: Iterable[str], with_positions: Iterable[str] = ()) -> Dict[str, Postings]:
+        """単語 → posting（with_positions の単語だけ位置も読む）"""
+        terms = list(dict.fromkeys(terms))
+        if not terms:
+            return {}
+        positional = set(with_positions)
+        rows = self.conn.execute(
+            f"SELECT term, docs, CASE WHEN term IN ({','.join('?' * len(positional))}) THEN positions END "
+            f"FROM terms WHERE term IN ({','.join('?' * len(terms))})", [*positional, *terms])
+        return {term: decode_postings(docs, positions) for term, docs, positions in rows}
+
+    def search(self, query: str, limit: int = 10, year_from: Optional[int] = None,
+               year_to: Optional[int] = None) -> List[SearchHit]:
+        """クエリ（単語・"フレーズ"・year:YYYY[-YYYY]）に全て一致する文書を BM25 順に返す"""
+        words, phrases, q_from, q_to = parse_query(query)
+        year_from = year_from if year_from is not None else q_from
+        year_to = year_to if year_to is not None else q_to
+        terms = words + [t for phrase in phrases for t in phrase]
+        if not terms:
+            return []
+        lengths, years, num_docs, average, fulltext_lengths, fulltext_average = self._load_stats()
+        postings = self._postings(terms, with_positions=[t for phrase in phrases for t in phrase])
+        if len(postings) < len(set(terms)):
+            return []  # 索引に無い単語がある（AND なので一致なし）
+
+        # 全単語を含む文書（AND）を BM25 で採点
+        scores = np.zeros(len(lengths), dtype=np.float64)
+        matched = np.zeros(len(lengths), dtype=np.int32)
+        for term in dict.fromkeys(terms):
+            p = postings[term]
+            tf, ft = p.weights, p.fulltext
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[p.doc_ids] / max(average, 1e-9))
+            ft_norm = BM25_K1 * (1 - BM25_B + BM25_B * fulltext_lengths[p.doc_ids] / max(fulltext_average, 1e-9))
+            idf = math.log(1 + (num_docs - len(p.doc_ids) + 0.5) / (len(p.doc_ids) + 0.5))
+            scores[p.doc_ids] += idf * (tf * (BM25_K1 + 1) / (tf + norm)
+                                        + FULLTEXT_WEIGHT * ft * (BM25_K1 + 1) / (ft + ft_norm))
+            matched[p.doc_ids] += 1
+        candidates = np.flatnonzero(matched == len(set(terms)))
+        if year_from is not None:
+            candidates = candidates[years[candidates] >= year_from]
+        if year_to is not None:
+            candidates = candidates[(years[candidates] <= year_to) & (years[candidates] > 0)]
+        for phrase in phrases:
+            candidates = phrase_matches(phrase, postings, candidates)
+        if len(candidates) == 0:
+            return []
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        top = candidates[np.lexsort((candidates, -scores[candidates]))]  # 同点は文書ID順
+        ids = top.tolist()
+        rows = {r[0]: r[1:] for r in self.conn.execute(
+            f"SELECT doc_id, name, title, year, doi FROM docs WHERE doc_id IN ({','.join('?' * len(ids))})", ids)}
+        return [SearchHit(float(scores[i]), *rows[i]) for i in ids if i in rows]
+
+def phrase_matches(phrase: List[str], postings: Dict[str, Postings], candidates: np.ndarray) -> np.ndarray:
+    """candidates のうち phrase の単語が連続して現れる文書
+
+    単語 k の (文書ID << 32 | 位置 - k) を作り、全単語に共通するキーを探す。
+    キーは posting の並び（文書ID順・文書内は位置順）のまま昇順なので、
+    ソートせず二分探索だけで突き合わせられる。
+    """
+    if len(phrase) <= 1 or len(candidates) == 0:
+        return candidates
+    common = None
+    for k, term in enumerate(phrase):
+        p = postings[term]
+        in_candidates = np.repeat(np.isin(p.doc_ids, candidates, assume_unique=True), p.counts)
+        doc_ids = np.repeat(p.doc_ids, p.counts)[in_candidates]
+        positions = p.positions[in_candidates]
+        # フィールドの先頭 k 語はフレーズの k 番目の単語になれない
+        usable = (positions & POSITION_MASK) >= k
+        keys = (doc_ids[usable].astype(np.int64) << 32) | (positions[usable] - k)
+        if common is None or len(keys) == 0:
+            common = keys
+        else:
+            found = np.minimum(np.searchsorted(keys, common), len(keys) - 1)
+            common = common[keys[found] == common]
+        if len(common) == 0:
+            break
+    return np.unique(common >> 32).astype(candidates.dtype)
+
+def parse_query(query: str) -> Tuple[List[str], List[List[str]], Optional[int], Optional[int]]:
+    """クエリを (単語, フレーズ, 開始年, 終了年) に分ける
+
+    "deep learning" graph year:2018-2022 → (['graph'], [['deep', 'learning']], 2018, 2022)
+    year:2020 は2020年のみ、year:2018- / year:-2015 は片側だけの範囲。
+    """
+    phrases = [tokenize(p) for p in PHRASE_RE.findall(query)]
+    phrases = [p for p in phrases if p]
+    rest = PHRASE_RE.sub(" ", query)
+    words: List[str] = []
+    year_from = year_to = None
+    for part in rest.split():
+        match = YEAR_RE.match(part)
+        if match:
+            start, dash, end = match.groups()
+            year_from = int(start) if start else None
+            year_to = int(end) if end else (None if dash else year_from)
+        else:
+            words.extend(tokenize(part))
+    # 1単語のフレーズは単語として扱う
+    words.extend(p[0] for p in phrases if len(p) == 1)
+    return words, [p for p in phrases if len(p) > 1], year_from, year_to
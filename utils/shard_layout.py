@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+shard_layout.py - JSON_folder / md_folder のシャード配置（ファイル名のハッシュで分割）
+
+20万件を超えるとフォルダ1つに全ファイルを置く（flat）配置では os.listdir や1件ごとの
+open が ext4 / NFS で遅くなり、Obsidian の索引付けも重くなる。シャード配置では
+ファイル名の SHA-1 の先頭 width 桁（16進）のサブフォルダに置く
+（width=2 で256フォルダ。100万件でも1フォルダ4千件弱）。
+
+    md_folder/3f/Deep_learning_for_X.md
+
+配置はフォルダ内の .layout.json（{"layout": "hash", "width": 2}）で決まり、無ければ
+flat。段はファイル名（ハッシュの元）だけでパスを決めるので、タイトルしか知らない段
+（add_abst_scopus.py・PDF取得）も同じ場所に行き着く。発行年での分割はこのため採らない。
+Obsidian の [[ファイル名]] リンクはフォルダによらず解決されるのでそのまま使える。
+
+段からの使い方:
+    names = list_names(json_dir, ".json")      # 全シャードのファイル名
+    path = resolve(json_dir, name)              # ファイル名 → パス
+    path = resolve(md_dir, name, create=True)   # 書く前にシャードのフォルダを作る
+
+配置の変更は utils/出力フォルダ分割.py（migrate()）で行う。
+"""
+
+import os
+import json
+import hashlib
+from typing import Dict, Iterator, List, Optional, Set
+
+LAYOUT_FILE = ".layout.json"  # 先頭の "." で一覧・状況索引から外れる
+DEFAULT_WIDTH = 2
+MAX_WIDTH = 4
+SHARDED_FOLDERS = ("JSON_folder", "md_folder")
+HEX_DIGITS = frozenset("0123456789abcdef")
+
+_widths: Dict[str, int] = {}
+_made: Set[str] = set()
+
+def shard_width(folder: str) -> int:
+    """フォルダのシャード桁数（0 = flat）。段の中では1回だけ読む"""
+    key = os.path.abspath(folder)
+    if key not in _widths:
+        width = 0
+        try:
+            with open(os.path.join(key, LAYOUT_FILE), 'r', encoding='utf-8') as f:
+                layout = json.load(f)
+            if layout.get("layout") == "hash":
+                width = int(layout.get("width", DEFAULT_WIDTH))
+        except (OSError, ValueError, AttributeError):
+            pass
+        _widths[key] = width if 0 <= width <= MAX_WIDTH else 0
+    return _widths[key]
+
+def shard_of(name: str, width: int) -> str:
+    """ファイル名 → シャードのフォルダ名（SHA-1 の先頭 width 桁）"""
+    return hashlib.sha1(name.encode('utf-8')).hexdigest()[:width]
+
+def resolve(folder: str, name: str, create: bool = False) -> str:
+    """ファイル名 → フォルダの配置に沿ったパス（create=True ならシャードのフォルダも作る）"""
+    width = shard_width(folder)
+    if not width:
+        return os.path.join(folder, name)
+    shard = os.path.join(folder, shard_of(name, width))
+    if create and shard not in _made:
+        os.makedirs(shard, exist_ok=True)
+        _made.add(shard)
+    return os.path.join(shard, name)
+
+def folder_mtime(folder: str) -> Optional[float]:
+    """フォルダとそのシャードの更新時刻の最大（無ければ None）
+
+    シャード配置ではファイルの追加・削除でシャードの更新時刻だけが変わるので、状況索引は
+    これでフォルダの変化を見分ける。シャードは一覧せずに名前を決め打ちで stat する。
+    """
+    try:
+        mtime = os.stat(folder).st_mtime
+    except OSError:
+        return None
+    width = shard_width(folder)
+    for i in range(16 ** width if width else 0):
+        try:
+            mtime = max(mtime, os.stat(os.path.join(folder, format(i, f"0{width}x"))).st_mtime)
+        except OSError:
+            continue
+    return mtime
+
+def _is_shard(name: str, width: int) -> bool:
+    return len(name) == width and set(name) <= HEX_DIGITS
+
+def scan(folder: str, suffix: str = "") -> Iterator[os.DirEntry]:
+    """配置に沿って置かれたファイルを os.scandir で列挙する（隠しファイルは除く）
+
+    シャード配置ではシャードのフォルダの中だけを見る（フォルダ直下の取り残しは
+    resolve() で見つからないので数えない。出力フォルダ分割.py で移せる）。
+    """
+    width = shard_width(folder)
+    try:
+        with os.scandir(folder) as entries:
+            top = list(entries)
+    except OSError:
+        return
+    if width:
+        dirs = [e.path for e in top if _is_shard(e.name, width) and e.is_dir(follow_symlinks=False)]
+    else:
+        dirs = []
+        yield from (e for e in top if e.name.endswith(suffix) and not e.name.startswith(".")
+                    and e.is_file())
+    for path in dirs:
+        try:
+            with os.scandir(path) as entries:
+                for e in entries:
+                    if e.name.endswith(suffix) and not e.name.startswith(".") and e.is_file():
+                        yield e
+        except OSError:
+            continue
+
+def list_names(folder: str, suffix: str) -> List[str]:
+    """全シャードの suffix で終わるファイル名"""
+    return [e.name for e in scan(folder, suffix)]
+
+def count(folder: str, suffix: str) -> int:
+    return sum(1 for _ in scan(folder, suffix))
+
+def migrate(folder: str, width: int) -> Dict[str, int]:
+    """フォルダを width 桁のシャード配置（0 なら flat）に組み替える
+
+    直下と既存のシャード（どの桁数でも）のファイルを新しい場所へ os.replace で移し、
+    最後に .layout.json を書き換える。移動は同じフォルダ内の rename なので更新時刻と
+    サイズは変わらず、引用グラフ・検索索引は読み直さない。途中で止まっても
+    もう一度実行すれば続きから揃う。移動先に同名のファイルがあれば移さずに数える。
+    落ちた段が残した一時ファイルは移さずに消す。
+    """
+    from utils.output_writer import remove_stale_tmp, write_atomic
+
+    if not 0 <= width <= MAX_WIDTH:
+        raise ValueError(f"シャード桁数は 0〜{MAX_WIDTH}: {width}")
+    os.makedirs(folder, exist_ok=True)
+    sources = []  # (ファイル名, 今のパス)
+    old_shards = []
+    stale = remove_stale_tmp(folder)
+    with os.scandir(folder) as entries:
+        for e in entries:
+            if e.name.startswith("."):
+                continue
+            if e.is_file(follow_symlinks=False):
+                sources.append((e.name, e.path))
+            elif e.is_dir(follow_symlinks=False) and _is_shard(e.name, len(e.name)) \
+                    and len(e.name) <= MAX_WIDTH:
+                old_shards.append(e.path)
+                stale += remove_stale_tmp(e.path)
+                with os.scandir(e.path) as inner:
+                    sources.extend((f.name, f.path) for f in inner
+                                   if not f.name.startswith(".") and f.is_file(follow_symlinks=False))
+
+    key = os.path.abspath(folder)
+    _widths[key] = width
+    _made.clear()
+    moved = conflicts = 0
+    for name, path in sources:
+        target = resolve(folder, name, create=True)
+        if os.path.abspath(target) == os.path.abspath(path):
+            continue
+        if os.path.exists(target):
+            conflicts += 1
+            continue
+        os.replace(path, target)
+        moved += 1
+
+    # 空になったシャードを片付け、配置を記録する（flat なら記録を消す）
+    for path in old_shards:
+        try:
+            os.rmdir(path)
+        except OSError:
+            pass
+    layout_path = os.path.join(folder, LAYOUT_FILE)
+    if width:
+        write_atomic(layout_path, json.dumps({"layout": "hash", "width": width}))
+    elif os.path.exists(layout_path):
+        os.remove(layout_path)
+    return {"files": len(sources), "moved": moved, "conflicts": conflicts, "stale_tmp": stale}
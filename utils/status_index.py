@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+status_index.py - 出力フォルダのファイル数・容量と段の完了状況の索引
+
+JSON_folder / md_folder / PDF の各ファイルのサイズと、パイプラインの各段が最後に
+完了した日時・件数、論文ごとにどの段が済んだかを status_index.sqlite に持つ。
+進行状況確認.py はこれを読むだけで済むので、ネットワークストレージ上の大きな
+保管庫でも全ファイルを stat し直したり Markdown を開いたりしない。
+
+索引を更新するのは段自身。ファイルを書いた・消した箇所で changes.written() /
+changes.removed() を、論文の処理が済んだ箇所で changes.completed() を呼んでおくと、
+stage_report()（utils/run_report.py）が段の終了時にまとめて索引へ反映し、段の完了も
+記録する。論文は JSON_folder のファイル名（拡張子なし）で識別する（paper_key）。
+ファイルを作り直す段が済んだ論文は、その後に同じファイルへ書き足す段の記録を
+消す（PAPER_RESETS。Markdown を作り直せば YAML の追加もやり直しになる）。
+
+索引の外でフォルダが変わった（別のツールで追加・削除した、段が途中で落ちた）ことは
+フォルダ自体（シャード配置ならシャードも。utils/shard_layout.py）の更新時刻で見分ける。
+記録した時刻と違うフォルダは古いとみなし、
+os.scandir で数え直す（rescan）。フォルダ内のファイルをその場で書き換えただけでは
+フォルダの更新時刻は変わらないため、索引の外でそうした変更があると容量はずれうる
+（進行状況確認.py --rescan で数え直せる）。
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from utils.http_cache import open_sqlite
+from utils.shard_layout import folder_mtime
+
+STATUS_INDEX_DB = "status_index.sqlite"
+# 索引の対象フォルダ → 件数として数える拡張子（容量はフォルダ内の全ファイル）
+TRACKED_FOLDERS = {"JSON_folder": ".json", "md_folder": ".md", "PDF": ".pdf"}
+BATCH_SIZE = 1000
+
+# 論文ごとの記録を消す段: ファイルを作り直す段 → その後に同じファイルへ書き足す段
+PAPER_RESETS = {
+    "scopus_doi_to_json": ("enhance_keywords",),
+    "json2tag_ref_scopus_async": ("add_abst_scopus", "update_markdown_keywords", "add_yaml_metadata"),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS status_files (
+    folder TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (folder, name)
+);
+CREATE TABLE IF NOT EXISTS status_folders (
+    folder TEXT PRIMARY KEY,
+    dir_mtime REAL NOT NULL,
+    scanned_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS status_stages (
+    stage TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    finished_at TEXT NOT NULL,
+    seconds REAL,
+    papers INTEGER,
+    run_id TEXT
+);
+CREATE TABLE IF NOT EXISTS status_papers (
+    stage TEXT NOT NULL,
+    paper TEXT NOT NULL,
+    done_at REAL NOT NULL,
+    PRIMARY KEY (stage, paper)
+);
+"""
+
+def paper_key(path: str) -> str:
+    """JSON（または同名の Markdown）のパス・ファイル名 → 論文の識別子"""
+    return os.path.splitext(os.path.basename(path))[0]
+
+def _hidden(name: str) -> bool:
+    # .staging/（ダウンロード途中のPDF）や一時ファイルは数えない
+    return name.startswith(".")
+
+def scan_folder(path: str) -> Iterator[Tuple[str, int]]:
+    """フォルダ以下の (相対パス, サイズ) を os.scandir で列挙する（隠しファイル・フォルダは除く）"""
+    stack = [("", path)]
+    while stack:
+        prefix, current = stack.pop()
+        try:
+            entries = os.scandir(current)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if _hidden(entry.name):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((prefix + entry.name + "/", entry.path))
+                    elif entry.is_file(follow_symlinks=False):
+                        # Windows では scandir の結果にサイズが入っているので stat しない
+                        yield prefix + entry.name, entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    continue
+
+class StatusIndex:
+    """status_index.sqlite の読み書き"""
+
+    def __init__(self, base_dir: str, path: Optional[str] = None):
+        self.base_dir = os.path.abspath(base_dir)
+        self.path = path or os.path.join(self.base_dir, STATUS_INDEX_DB)
+        self.conn = open_sqlite(self.path)
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def locate(self, path: str) -> Optional[Tuple[str, str]]:
+        """ファイルのパスを (対象フォルダ, フォルダからの相対パス) に分ける（対象外は None）"""
+        rel = os.path.relpath(os.path.abspath(path), self.base_dir)
+        parts = rel.split(os.sep)
+        if len(parts) < 2 or parts[0] not in TRACKED_FOLDERS or any(_hidden(p) for p in parts[1:]):
+            return None
+        return parts[0], "/".join(parts[1:])
+
+    # ---------- フォルダの鮮度 ----------
+    def fresh_folders(self) -> Set[str]:
+        """索引がフォルダの現状と一致している（更新時刻が記録どおりの）フォルダ"""
+        recorded = dict(self.conn.execute("SELECT folder, dir_mtime FROM status_folders"))
+        fresh = set()
+        for folder in TRACKED_FOLDERS:
+            mtime = folder_mtime(os.path.join(self.base_dir, folder))
+            # フォルダが無ければ 0件として索引と一致しているとみなす
+            if mtime is None or recorded.get(folder) == mtime:
+                fresh.add(folder)
+        return fresh
+
+    def _stamp(self, folders: Iterable[str]) -> None:
+        now = time.time()
+        for folder in folders:
+            mtime = folder_mtime(os.path.join(self.base_dir, folder))
+            if mtime is None:
+                self.conn.execute("DELETE FROM status_folders WHERE folder = ?", (folder,))
+            else:
+                self.conn.execute("INSERT OR REPLACE INTO status_folders VALUES (?, ?, ?)",
+                                  (folder, mtime, now))
+
+    # ---------- 段からの更新 ----------
+    def apply(self, written: Iterable[str], removed: Iterable[str], restamp: Iterable[str] = ()) -> int:
+        """書いた・消したファイルを索引に反映する
+
+        restamp は段の開始時に索引と一致していたフォルダ。段の変更を反映すれば
+        再び一致するので、フォルダの更新時刻を記録し直す。
+        """
+        rows, touched, gone = [], set(), [located for located in map(self.locate, removed) if located]
+        for path in written:
+            located = self.locate(path)
+            if not located:
+                continue
+            try:
+                rows.append((*located, os.stat(path).st_size))
+            except OSError:
+                gone.append(located)  # 書いた後に消えた（同じ内容のPDFに集約された等）
+            touched.add(located[0])
+        touched.update(folder for folder, _ in gone)
+        with self.conn:
+            for start in range(0, len(rows), BATCH_SIZE):
+                self.conn.executemany("INSERT OR REPLACE INTO status_files VALUES (?, ?, ?)",
+                                      rows[start:start + BATCH_SIZE])
+            self.conn.executemany("DELETE FROM status_files WHERE folder = ? AND name = ?", gone)
+            self._stamp(touched & set(restamp))
+        return len(rows) + len(gone)
+
+    def record_stage(self, stage: str, status: str, seconds: Optional[float] = None,
+                     papers: Optional[int] = None, run_id: Optional[str] = None) -> None:
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO status_stages VALUES (?, ?, ?, ?, ?, ?)",
+                              (stage, status, datetime.now().isoformat(timespec="seconds"),
+                               seconds, papers, run_id))
+
+    def record_papers(self, stage: str, papers: Iterable[str]) -> int:
+        """段が済んだ論文を記録し、PAPER_RESETS の段のその論文の記録を消す"""
+        now = time.time()
+        papers = sorted(set(papers))
+        resets = PAPER_RESETS.get(stage, ())
+        with self.conn:
+            for start in range(0, len(papers), BATCH_SIZE):
+                batch = papers[start:start + BATCH_SIZE]
+                self.conn.executemany("INSERT OR REPLACE INTO status_papers VALUES (?, ?, ?)",
+                                      [(stage, paper, now) for paper in batch])
+                for later in resets:
+                    self.conn.executemany("DELETE FROM status_papers WHERE stage = ? AND paper = ?",
+                                          [(later, paper) for paper in batch])
+        return len(papers)
+
+    def completed(self, stage: str) -> Set[str]:
+        """段が済んでいる論文（スキップ判定用）"""
+        return {paper for (paper,) in self.conn.execute(
+            "SELECT paper FROM status_papers WHERE stage = ?", (stage,))}
+
+    def completed_count(self, *stages: str) -> Optional[int]:
+        """いずれかの段が済んでいる論文の数。どの段にも記録が無ければ None（未実行・索引導入前）"""
+        marks = ",".join("?" * len(stages))
+        count, = self.conn.execute(
+            f"SELECT COUNT(DISTINCT paper) FROM status_papers WHERE stage IN ({marks})", stages).fetchone()
+        if count:
+            return count
+        ran = self.conn.execute(f"SELECT 1 FROM status_stages WHERE stage IN ({marks}) LIMIT 1",
+                                stages).fetchone()
+        return 0 if ran else None
+
+    # ---------- 全走査 ----------
+    def rescan(self, folder: str) -> int:
+        """フォルダを os.scandir で数え直して索引を置き換え、ファイル数を返す"""
+        rows = [(folder, name, size) for name, size in scan_folder(os.path.join(self.base_dir, folder))]
+        with self.conn:
+            self.conn.execute("DELETE FROM status_files WHERE folder = ?", (folder,))
+            for start in range(0, len(rows), BATCH_SIZE):
+                self.conn.executemany("INSERT INTO status_files VALUES (?, ?, ?)",
+                                      rows[start:start + BATCH_SIZE])
+            self._stamp([folder])
+        return len(rows)
+
+    # ---------- 読み出し ----------
+    def folder_stats(self, rescan: bool = False) -> Dict[str, Dict[str, object]]:
+        """フォルダごとの {files: 拡張子の一致する件数, bytes: 合計容量, source: index|rescan}
+
+        索引と一致しないフォルダ（rescan=True なら全フォルダ）は数え直してから返す。
+        """
+        fresh = set() if rescan else self.fresh_folders()
+        stats = {}
+        for folder, ext in TRACKED_FOLDERS.items():
+            source = "index"
+            if folder not in fresh:
+                self.rescan(folder)
+                source = "rescan"
+            files, total = self.conn.execute(
+                "SELECT COALESCE(SUM(name LIKE ?), 0), COALESCE(SUM(size), 0) FROM status_files "
+                "WHERE folder = ?", (f"%{ext}", folder)).fetchone()
+            stats[folder] = {"files": files, "bytes": total, "source": source}
+        return stats
+
+    def stages(self) -> Dict[str, Dict[str, object]]:
+        """段ごとの最後の実行 {status, finished_at, seconds, papers, run_id}"""
+        cursor = self.conn.execute(
+            "SELECT stage, status, finished_at, seconds, papers, run_id FROM status_stages")
+        return {stage: {"status": status, "finished_at": finished_at, "seconds": seconds,
+                        "papers": papers, "run_id": run_id}
+                for stage, status, finished_at, seconds, papers, run_id in cursor}
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class FileChanges:
+    """段の中で書いた・消したファイルと済んだ論文を集める（スレッドセーフ）
+
+    stage_report() の中でだけ記録し、段の終了時にまとめて索引へ反映する。
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self) -> None:
+        self._lock = threading.Lock()
+        self.active = False
+        self._written: Set[str] = set()
+        self._removed: Set[str] = set()
+        self._completed: Set[str] = set()
+
+    def start(self) -> None:
+        with self._lock:
+            self.active = True
+            self._written, self._removed, self._completed = set(), set(), set()
+
+    def written(self, path: str) -> None:
+        if self.active:
+            with self._lock:
+                self._removed.discard(path)
+                self._written.add(path)
+
+    def removed(self, path: str) -> None:
+        if self.active:
+            with self._lock:
+                self._written.discard(path)
+                self._removed.add(path)
+
+    def completed(self, path: str) -> None:
+        """論文の処理が済んだ（path は JSON のパスかファイル名。paper_key で識別子にする）"""
+        if self.active:
+            with self._lock:
+                self._completed.add(paper_key(path))
+
+    def drain(self) -> Tuple[List[str], List[str], List[str]]:
+        """(書いたファイル, 消したファイル, 済んだ論文) を返して記録を終える"""
+        with self._lock:
+            drained = sorted(self._written), sorted(self._removed), sorted(self._completed)
+            self.active = False
+            self._written, self._removed, self._completed = set(), set(), set()
+        return drained
+
+def completed_papers(base_dir: str, stage: str) -> Set[str]:
+    """段が済んでいる論文（索引が無い・読めなければ空集合で、従来どおり中身で判定させる）"""
+    if not os.path.exists(os.path.join(base_dir, STATUS_INDEX_DB)):
+        return set()
+    try:
+        with StatusIndex(base_dir) as index:
+            return index.completed(stage)
+    except (OSError, sqlite3.Error):
+        return set()
+
+# 段のスクリプトが使うプロセス全体の変更記録
+changes = FileChanges()
+if hasattr(os, "register_at_fork"):
+    # プロセスプールのワーカーでは記録しない（書いたファイルは親が結果から記録する）
+    os.register_at_fork(after_in_child=changes._reset)
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+synthetic_corpus.py - 性能測定用の合成コーパス（Scopus CSV・Crossref 形式のJSON・PDF）
+
+論文 i のメタデータは (seed, i) だけから決まるので、全件をメモリに持たずに
+何度でも同じ内容を作り直せる（ベンチマークの再現性・模擬サーバーからの応答用）。
+- 参考文献数は対数正規分布（重複を除いた中央値 約25件・裾が長い）で、一部の論文は参考文献なし
+- 参照先はコーパス内の論文とコーパス外の文献からべき分布（よく引用される論文ほど引かれる）で選ぶ
+- 参考文献の一部は DOI なし（unstructured のみ）・タイトルなし（DOI 解決が必要）
+- Scopus CSV は複数ファイルに分け、検索の重なりを模して一部の行を重複させる
+
+作業ディレクトリに書き出すと、Crossref キャッシュ・DOIタイトルキャッシュも埋めるので
+パイプラインをネットワークなしで実行できる（dev_tools/パイプラインベンチマーク.py）。
+"""
+
+import os
+import csv
+import json
+import math
+import random
+import hashlib
+from bisect import bisect
+from itertools import accumulate
+from typing import Dict, Iterator, List, Optional
+from utils.endpoints import DOI_RESOLVER, crossref_work_url
+from utils.http_cache import ResponseCache
+from utils.pdf_store import MANIFEST_NAME
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+DOI_PREFIX = "10.5555"
+EXTERNAL_RATIO = 2             # コーパス外の被引用文献はコーパスの何倍あるか
+POPULARITY_EXPONENT = 0.9      # 被引用のべき分布の指数
+REFERENCE_MEDIAN = 30
+REFERENCE_SIGMA = 0.7
+MAX_REFERENCES = 400
+NO_REFERENCE_RATE = 0.15       # Crossref に参考文献が登録されていない論文の割合
+REFERENCE_DOI_RATE = 0.85      # DOI 付きの参考文献の割合
+REFERENCE_TITLE_RATE = 0.45    # DOI 付き参考文献のうちタイトルも付いている割合
+ROWS_PER_CSV = 2000            # Scopus の1回のエクスポートの行数
+DUPLICATE_RATE = 0.02          # 次のCSVにも重複して出る行の割合
+VOCABULARY_SIZE = 3000
+PDF_PAGES = 8
+
+SCOPUS_COLUMNS = ["Authors", "Author full names", "Title", "Year", "Source title", "Volume", "Issue",
+                  "Page start", "Page end", "Cited by", "DOI", "Link", "Abstract", "Author Keywords",
+                  "Index Keywords", "Document Type", "Publication Stage", "Open Access", "Source", "EID"]
+SUBJECTS = ["Computer Science Applications", "Information Systems", "Library and Information Sciences",
+            "Artificial Intelligence", "Statistics and Probability", "Applied Mathematics",
+            "General Medicine", "Ecology", "Sociology and Political Science", "Education"]
+CONSONANTS = "bcdfghklmnprstvz"
+VOWELS = "aeiou"
+
+def make_vocabulary(size: int, seed: int) -> List[str]:
+    """発音できる英字の単語（3〜4音節）を size 個"""
+    rng = random.Random(f"vocabulary:{seed}")
+    words, seen = [], set()
+    while len(words) < size:
+        word = "".join(rng.choice(CONSONANTS) + rng.choice(VOWELS) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+def minimal_pdf(pages: List[str], min_size: int = 0) -> bytes:
+    """1ページ1段落のテキストだけを持つ最小限のPDF（pypdf で抽出できる）
+
+    min_size を指定すると、ヘッダーの後にコメント行を足してその大きさ以上にする
+    （PDF取得ツールは 100KB 未満のファイルを捨てるため）。
+    """
+    def escape(text: str) -> str:
+        return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+                   b" ".join(b"%d 0 R" % (4 + 2 * n) for n in range(len(pages))), len(pages)),
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    for n, text in enumerate(pages):
+        lines = [text[i:i + 90] for i in range(0, len(text), 90)]
+        stream = ("BT /F1 10 Tf 14 TL 50 750 Td " +
+                  " ".join(f"({escape(line)}) Tj T*" for line in lines) + " ET").encode("latin-1", "replace")
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+                       b"/Resources << /Font << /F1 3 0 R >> >> >>" % (5 + 2 * n))
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+    def assemble(padding: int) -> bytes:
+        out = bytearray(b"%PDF-1.4\n")
+        while padding > 0:
+            line = b"%" + b"0" * max(0, min(padding, 1024) - 2) + b"\n"
+            out += line
+            padding -= len(line)
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(len(out))
+            out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+        xref = len(out)
+        out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+        out += b"trailer << /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+        return bytes(out)
+    data = assemble(0)
+    # startxref の桁が増えても足りるように少し多めに埋める
+    return assemble(min_size - len(data) + 16) if len(data) < min_size else data
+
+class SyntheticCorpus:
+    """size 件の合成論文（論文 i の内容は seed と i だけで決まる）"""
+
+    def __init__(self, size: int, seed: int = 0):
+        self.size = size
+        self.seed = seed
+        self.vocabulary = make_vocabulary(VOCABULARY_SIZE, seed)
+        word_weights = [1.0 / (rank + 1) for rank in range(VOCABULARY_SIZE)]
+        self._word_cum = list(accumulate(word_weights))
+        # 被引用されやすさ：コーパス内外の文献をシャッフルした順位のべき分布
+        self.external_size = size * EXTERNAL_RATIO
+        pool = size + self.external_size
+        order = list(range(pool))
+        random.Random(f"popularity:{seed}").shuffle(order)
+        weights = [0.0] * pool
+        for rank, target in enumerate(order):
+            weights[target] = 1.0 / (rank + 1) ** POPULARITY_EXPONENT
+        self._target_cum = list(accumulate(weights))
+
+    # ---------- 識別子 ----------
+    def doi(self, i: int) -> str:
+        return f"{DOI_PREFIX}/synth.{i}"
+
+    def external_doi(self, j: int) -> str:
+        return f"{DOI_PREFIX}/ext.{j}"
+
+    def index_of(self, doi: str) -> Optional[int]:
+        """コーパス内の論文の DOI → 番号（それ以外は None）"""
+        prefix = f"{DOI_PREFIX}/synth."
+        doi = doi.lower()
+        if doi.startswith(prefix) and doi[len(prefix):].isdigit():
+            i = int(doi[len(prefix):])
+            return i if i < self.size else None
+        return None
+
+    def external_index_of(self, doi: str) -> Optional[int]:
+        """コーパス外の被引用文献の DOI → 番号（それ以外は None）"""
+        prefix = f"{DOI_PREFIX}/ext."
+        doi = doi.lower()
+        if doi.startswith(prefix) and doi[len(prefix):].isdigit():
+            j = int(doi[len(prefix):])
+            return j if j < self.external_size else None
+        return None
+
+    # ---------- 文章 ----------
+    def _rng(self, kind: str, i: int) -> random.Random:
+        return random.Random(f"{kind}:{self.seed}:{i}")
+
+    def _words(self, rng: random.Random, n: int) -> List[str]:
+        return rng.choices(self.vocabulary, cum_weights=self._word_cum, k=n)
+
+    def _title(self, rng: random.Random) -> str:
+        words = self._words(rng, rng.randint(6, 12))
+        return " ".join(words).capitalize()
+
+    def title(self, i: int) -> str:
+        return self._title(self._rng("title", i))
+
+    def external_title(self, j: int) -> str:
+        return self._title(self._rng("external", j))
+
+    def target_title(self, target: int) -> str:
+        """参照先（コーパス内は 0..size-1、外部は size 以降）のタイトル"""
+        return self.title(target) if target < self.size else self.external_title(target - self.size)
+
+    def abstract(self, i: int) -> str:
+        rng = self._rng("abstract", i)
+        sentences = []
+        for _ in range(rng.randint(6, 12)):
+            sentences.append(" ".join(self._words(rng, rng.randint(12, 25))).capitalize() + ".")
+        return " ".join(sentences)
+
+    def fulltext_pages(self, i: int) -> List[str]:
+        """PDF本文（抄録の後に本文の段落が続く）"""
+        rng = self._rng("fulltext", i)
+        pages = [self.title(i) + ". " + self.abstract(i)]
+        for _ in range(PDF_PAGES - 1):
+            pages.append(" ".join(self._words(rng, 300)).capitalize() + ".")
+        return pages
+
+    def pdf(self, i: int, min_size: int = 0) -> bytes:
+        return minimal_pdf(self.fulltext_pages(i), min_size)
+
+    # ---------- Crossref 形式 ----------
+    def references(self, i: int) -> List[dict]:
+        rng = self._rng("references", i)
+        if rng.random() < NO_REFERENCE_RATE:
+            return []
+        count = min(MAX_REFERENCES, int(rng.lognormvariate(math.log(REFERENCE_MEDIAN), REFERENCE_SIGMA)))
+        total = self._target_cum[-1]
+        targets = set()
+        for _ in range(count):
+            target = bisect(self._target_cum, rng.random() * total)
+            if target != i:
+                targets.add(min(target, len(self._target_cum) - 1))
+        refs = []
+        for k, target in enumerate(sorted(targets)):
+            year = 1980 + target % 44
+            ref = {"key": f"synth.{i}_ref{k}", "year": str(year), "author": rng.choice(self.vocabulary).capitalize()}
+            if rng.random() < REFERENCE_DOI_RATE:
+                ref["DOI"] = self.doi(target) if target < self.size else self.external_doi(target - self.size)
+                ref["doi-asserted-by"] = "crossref"
+                if rng.random() < REFERENCE_TITLE_RATE:
+                    ref["article-title"] = self.target_title(target)
+            else:
+                ref["unstructured"] = f"{ref['author']} ({year}). {self.target_title(target)}."
+            refs.append(ref)
+        return refs
+
+    def _bibliographic(self, i: int) -> dict:
+        """参考文献以外の書誌情報（Crossref 形式）"""
+        rng = self._rng("meta", i)
+        year = 1990 + i % 35
+        authors = [{"given": rng.choice(self.vocabulary).capitalize(),
+                    "family": rng.choice(self.vocabulary).capitalize(),
+                    "sequence": "first" if n == 0 else "additional",
+                    "affiliation": []} for n in range(rng.randint(1, 8))]
+        doi = self.doi(i)
+        first_page = rng.randint(1, 900)
+        return {
+            "DOI": doi,
+            "URL": f"{DOI_RESOLVER}/{doi}",
+            "type": "journal-article",
+            "title": [self.title(i)],
+            "abstract": f"<jats:p>{self.abstract(i)}</jats:p>",
+            "author": authors,
+            "publisher": "Synthetic Press",
+            "container-title": [f"Journal of {rng.choice(self.vocabulary).capitalize()} Studies"],
+            "volume": str(rng.randint(1, 60)),
+            "issue": str(rng.randint(1, 12)),
+            "page": f"{first_page}-{first_page + rng.randint(5, 30)}",
+            "created": {"date-parts": [[year, 1 + i % 12, 1 + i % 28]]},
+            "published": {"date-parts": [[year, 1 + i % 12]]},
+            "deposited": {"date-parts": [[year + 1, 1, 1]]},
+            "ISSN": [f"{1000 + i % 9000:04d}-{i % 10000:04d}"],
+            "subject": rng.sample(SUBJECTS, rng.randint(0, 3)),
+            "language": "en",
+            "is-referenced-by-count": rng.randint(0, 500),
+            "license": [],
+            "link": [],
+        }
+
+    def crossref_message(self, i: int) -> dict:
+        """Crossref /works/{doi} の message 部分"""
+        message = self._bibliographic(i)
+        references = self.references(i)
+        message.update({"reference": references, "reference-count": len(references),
+                        "references-count": len(references)})
+        return message
+
+    def crossref_response(self, i: int) -> bytes:
+        return json.dumps({"status": "ok", "message-type": "work", "message-version": "1.0.0",
+                           "message": self.crossref_message(i)}, ensure_ascii=False).encode("utf-8")
+
+    def scopus_row(self, i: int) -> Dict[str, str]:
+        rng = self._rng("scopus", i)
+        message = self._bibliographic(i)
+        authors = message["author"]
+        year = str(message["published"]["date-parts"][0][0])
+        return {
+            "Authors": ", ".join(f"{a['family']} {a['given'][0]}." for a in authors),
+            "Author full names": "; ".join(f"{a['family']}, {a['given']}" for a in authors),
+            "Title": message["title"][0],
+            "Year": year,
+            "Source title": message["container-title"][0],
+            "Volume": message["volume"],
+            "Issue": message["issue"],
+            "Page start": message["page"].split("-")[0],
+            "Page end": message["page"].split("-")[1],
+            "Cited by": str(message["is-referenced-by-count"]),
+            "DOI": message["DOI"],
+            "Link": f"https://www.scopus.com/inward/record.uri?eid=2-s2.0-{i}",
+            "Abstract": self.abstract(i),
+            "Author Keywords": "; ".join(self._words(rng, rng.randint(3, 6))),
+            "Index Keywords": "; ".join(self._words(rng, rng.randint(0, 8))),
+            "Document Type": "Article",
+            "Publication Stage": "Final",
+            "Open Access": rng.choice(["", "All Open Access; Gold Open Access"]),
+            "Source": "Scopus",
+            "EID": f"2-s2.0-{i}",
+        }
+
+    # ---------- 書き出し ----------
+    def write_scopus_csv(self, out_dir: str, rows_per_file: int = ROWS_PER_CSV) -> List[str]:
+        """Scopus エクスポート形式のCSVを複数ファイルに書き出し、パスを返す"""
+        paths = []
+        dup_rng = random.Random(f"duplicates:{self.seed}")
+        carry: List[Dict[str, str]] = []
+        for number, start in enumerate(range(0, self.size, rows_per_file), 1):
+            path = os.path.join(out_dir, f"scopus_export_{number:03d}.csv")
+            rows = [self.scopus_row(i) for i in range(start, min(start + rows_per_file, self.size))]
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=SCOPUS_COLUMNS)
+                writer.writeheader()
+                writer.writerows(carry + rows)
+            carry = [row for row in rows if dup_rng.random() < DUPLICATE_RATE]
+            paths.append(path)
+        return paths
+
+    def seed_crossref_cache(self, cache_path: str) -> int:
+        """Crossref キャッシュに全論文の応答を入れる（DOI→JSON をネットワークなしで実行できる）"""
+        with ResponseCache(cache_path, max_bytes=0) as cache:
+            for i in range(self.size):
+                cache.put(crossref_work_url(self.doi(i)), self.crossref_response(i))
+        return self.size
+
+    def referenced_dois(self) -> Iterator[str]:
+        """参考文献に出てくる DOI（重複あり）"""
+        for i in range(self.size):
+            for ref in self.references(i):
+                if "DOI" in ref:
+                    yield ref["DOI"]
+
+    def write_doi_title_cache(self, path: str) -> int:
+        """json2tag_ref_scopus_async.py の DOI→タイトルキャッシュを埋める"""
+        titles = {}
+        for doi in self.referenced_dois():
+            doi = doi.lower()
+            if doi not in titles:
+                i = self.index_of(doi)
+                titles[doi] = self.title(i) if i is not None else self.external_title(int(doi.rsplit(".", 1)[1]))
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(titles, f, ensure_ascii=False, indent=0)
+        return len(titles)
+
+    def write_pdfs(self, pdf_dir: str, rate: float = 0.1) -> int:
+        """rate の割合の論文について本文入りのPDFと manifest.json を書き出す"""
+        os.makedirs(pdf_dir, exist_ok=True)
+        rng = random.Random(f"pdfs:{self.seed}")
+        papers = {}
+        for i in range(self.size):
+            if rng.random() >= rate:
+                continue
+            data = self.pdf(i)
+            sha256 = hashlib.sha256(data).hexdigest()
+            with open(os.path.join(pdf_dir, f"{sha256}.pdf"), "wb") as f:
+                f.write(data)
+            papers[self.doi(i)] = {"sha256": sha256, "title": self.title(i),
+                                   "url": f"https://example.org/pdf/{i}.pdf", "added_at": ""}
+        with open(os.path.join(pdf_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "papers": papers}, f, ensure_ascii=False, indent=2)
+        return len(papers)
+
+def parse_size(text: str) -> int:
+    """'1k' / '10k' / '100k' / 数値 → 件数"""
+    return SIZES.get(text.lower()) or int(text.replace(",", "").replace("_", ""))
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+キャッシュ管理.py - Crossref APIキャッシュ（crossref_cache.sqlite）の保守
+
+キャッシュを丸ごと削除せずに、統計確認・期限切れ掃除・容量削減を行う。
+
+使用方法:
+    python3 utils/キャッシュ管理.py            # メニュー表示
+    python3 utils/キャッシュ管理.py stats      # 統計表示
+    python3 utils/キャッシュ管理.py sweep      # 期限切れエントリ削除
+    python3 utils/キャッシュ管理.py evict 256  # 256MB 以下になるまでLRU削除
+    python3 utils/キャッシュ管理.py compact    # 旧テーブル削除＋VACUUM
+"""
+
+import os
+import sys
+
+# ルートディレクトリをパスに追加（utils パッケージ用）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.http_cache import ResponseCache, DEFAULT_EXPIRE, ZSTD_AVAILABLE
+
+CACHE_DB = "crossref_cache.sqlite"
+
+def サイズ表記(バイト数: float) -> str:
+    """バイト数を読みやすい単位に変換"""
+    for 単位 in ["B", "KB", "MB"]:
+        if abs(バイト数) < 1024:
+            return f"{バイト数:.1f}{単位}"
+        バイト数 /= 1024
+    return f"{バイト数:.1f}GB"
+
+def 統計表示(キャッシュ: ResponseCache) -> None:
+    """キャッシュ統計を表示"""
+    統計 = キャッシュ.stats()
+    print("\n📊 キャッシュ統計")
+    print("=" * 35)
+    print(f"   📦 エントリ数: {統計['entries']:,}件（期限切れ {統計['expired']:,}件）")
+    print(f"   🎯 ヒット率: {統計['hit_rate']*100:.1f}% "
+          f"(ヒット {統計['hits']:,} / ミス {統計['misses']:,})")
+    print(f"   📥 キャッシュから返したデータ: {サイズ表記(統計['bytes_served'])}")
+    print(f"   🗜️  圧縮前: {サイズ表記(統計['raw_bytes'])} → 圧縮後: {サイズ表記(統計['stored_bytes'])}"
+          f"（節約 {サイズ表記(統計['compression_saved'])}）")
+    print(f"   💾 ファイルサイズ: {サイズ表記(統計['file_bytes'])}")
+    if 統計['codecs']:
+        内訳 = ", ".join(f"{k}: {v:,}件" for k, v in 統計['codecs'].items())
+        print(f"   🔧 圧縮形式: {内訳}")
+    if not ZSTD_AVAILABLE:
+        print("   💡 pip install zstandard で zstd 圧縮が有効になります（現在は gzip）")
+
+def 期限切れ削除(キャッシュ: ResponseCache) -> None:
+    """有効期限切れエントリを削除"""
+    削除数 = キャッシュ.sweep_expired()
+    print(f"✅ 期限切れエントリ削除: {削除数:,}件")
+
+def 容量削減(キャッシュ: ResponseCache, 上限MB: float) -> None:
+    """指定容量以下になるまで古い順に削除"""
+    # ResponseCache.evict は 0 を「上限なし」と扱うので、0 以下は受け付けない
+    if 上限MB <= 0:
+        print("❌ 上限サイズは 0 より大きい値で指定してください（全削除はキャッシュファイルを削除）")
+        return
+    削除数 = キャッシュ.evict(int(上限MB * 1024 * 1024))
+    print(f"✅ LRU削除: {削除数:,}件（上限 {上限MB:g}MB）")
+
+def 最適化(キャッシュ: ResponseCache) -> None:
+    """旧テーブル削除とファイル縮小"""
+    削除テーブル = キャッシュ.drop_legacy_tables()
+    if 削除テーブル:
+        print(f"🗑️ 旧 requests_cache テーブル削除: {', '.join(削除テーブル)}")
+    キャッシュ.compact()
+    print("✅ VACUUM 完了")
+
+def main():
+    """キャッシュ管理メイン処理"""
+    基準ディレクトリ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    キャッシュパス = os.path.join(基準ディレクトリ, CACHE_DB)
+
+    if not os.path.exists(キャッシュパス):
+        print(f"ℹ️  キャッシュファイルがありません: {CACHE_DB}")
+        return
+
+    with ResponseCache(キャッシュパス, expire_after=DEFAULT_EXPIRE) as キャッシュ:
+        引数 = sys.argv[1:]
+        if 引数:
+            コマンド = 引数[0]
+            if コマンド == "stats":
+                統計表示(キャッシュ)
+            elif コマンド == "sweep":
+                期限切れ削除(キャッシュ)
+            elif コマンド == "evict" and len(引数) > 1:
+                try:
+                    容量削減(キャッシュ, float(引数[1]))
+                except ValueError:
+                    print("❌ 数値を入力してください")
+            elif コマンド == "compact":
+                最適化(キャッシュ)
+            else:
+                print("❌ 使用方法: キャッシュ管理.py [stats | sweep | evict <MB> | compact]")
+            return
+
+        print("🗄️ Crossref キャッシュ管理ツール")
+        print("=" * 35)
+        統計表示(キャッシュ)
+        print("\n📋 操作:")
+        print("   1. 期限切れエントリ削除")
+        print("   2. 容量上限を指定してLRU削除")
+        print("   3. 最適化（旧テーブル削除＋VACUUM）")
+        print("   0. 終了")
+
+        選択 = input("\n選択してください (0-3): ").strip()
+        if 選択 == '1':
+            期限切れ削除(キャッシュ)
+        elif 選択 == '2':
+            上限 = input("上限サイズ(MB): ").strip()
+            try:
+                容量削減(キャッシュ, float(上限))
+            except ValueError:
+                print("❌ 数値を入力してください")
+        elif 選択 == '3':
+            最適化(キャッシュ)
+        else:
+            print("👋 終了します。")
+            return
+        統計表示(キャッシュ)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+キーワードネットワーク.py - キーワード共起ネットワークの作成（要 scipy）
+
+enhance_keywords.py 実行後の JSON_folder から combined_keywords を集計し、
+共起数・PMI・NPMI で重み付けしたキーワード対の上位を
+keyword_network/nodes.csv・edges.csv に書き出す（Gephi 等で可視化用）。
+
+使い方:
+    python3 utils/キーワードネットワーク.py [上位辺数] [最小共起数]
+"""
+
+import os
+import sys
+import time
+
+# ルートディレクトリをパスに追加（utils パッケージ用）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import keyword_network as network
+
+def main():
+    基準ディレクトリ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    json_dir = os.path.join(基準ディレクトリ, "JSON_folder")
+    出力先 = os.path.join(基準ディレクトリ, network.NETWORK_DIR)
+    引数 = sys.argv[1:]
+    try:
+        上位辺数 = int(引数[0]) if len(引数) > 0 else network.DEFAULT_TOP_EDGES
+        最小共起数 = int(引数[1]) if len(引数) > 1 else network.DEFAULT_MIN_COUNT
+    except ValueError:
+        print("❌ 使用方法: キーワードネットワーク.py [上位辺数] [最小共起数]")
+        return
+
+    if not network.SCIPY_AVAILABLE:
+        print("❌ scipy がインストールされていません（pip install scipy）")
+        return
+    if not os.path.isdir(json_dir):
+        print("❌ JSON_folder が見つかりません")
+        return
+
+    開始 = time.time()
+    論文 = network.load_keyword_sets(json_dir)
+    if not 論文:
+        print("ℹ️  combined_keywords のあるJSONがありません。先に enhance_keywords.py を実行してください")
+        return
+    X, 語彙 = network.doc_keyword_matrix(keywords for _, keywords in 論文)
+    print(f"📄 論文 {X.shape[0]:,}件 / キーワード {len(語彙):,}種類 / 出現 {X.nnz:,}件 "
+          f"({time.time() - 開始:.1f}秒)")
+
+    開始 = time.time()
+    辺 = network.cooccurrence_edges(X, 最小共起数)
+    上位 = network.top_edges(辺, 上位辺数)
+    print(f"🔗 共起数{最小共起数}以上のキーワード対: {len(辺):,}組 ({time.time() - 開始:.1f}秒)")
+
+    ノード数, 辺数 = network.export_network(出力先, 上位, 語彙, X)
+    print(f"✅ {ノード数:,}ノード / {辺数:,}辺を書き出しました: {出力先}")
+    for s, t, n, q in list(zip(上位.source, 上位.target, 上位.count, 上位.npmi))[:10]:
+        print(f"   NPMI {q:.3f}  共起 {n:4d}  {語彙[s]} — {語彙[t]}")
+
+if __name__ == "__main__":
+    main()
@@ -18,7 +18,8 @@ def ファイル削除確認(ファイルパス: str) -> bool:
 def フォルダ削除確認(フォルダパス: str) -> int:
     """フォルダ内ファイル数確認"""
     if os.path.exists(フォルダパス):
-        ファイル数 = len([f for f in os.listdir(フォルダパス) if os.path.isfile(os.path.join(フォルダパス, f))])
+        # シャード配置（utils/shard_layout.py）のサブフォルダの中も数える
+        ファイル数 = sum(len(ファイル) for _, _, ファイル in os.walk(フォルダパス))
         if ファイル数 > 0:
             print(f"  📁 {os.path.basename(フォルダパス)}/ ({ファイル数}件)")
         return ファイル数
@@ -36,6 +37,7 @@ def main():
         "キャッシュファイル": [
             "crossref_cache.sqlite",
             "doi_title_cache.json",
+            "status_index.sqlite",  # 出力フォルダを消すと段の完了記録も意味を失う
             "error_log.txt"
         ],
         "出力フォルダ": [
@@ -48,6 +50,8 @@ def main():
         ]
     }
     
+    print("💡 Crossrefキャッシュだけを整理したい場合は utils/キャッシュ管理.py を使うと")
+    print("   再取得なしで期限切れ削除・容量削減ができます")
     print("🔍 削除対象ファイルを確認中...")
     
     削除ファイル数 = 0
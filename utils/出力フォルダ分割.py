@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+出力フォルダ分割.py - JSON_folder / md_folder のシャード配置への移行・確認
+
+大きなコーパス（20万件〜）で1フォルダに全ファイルを置くと一覧や open が遅くなるため、
+ファイル名のハッシュの先頭の桁でサブフォルダに分ける（utils/shard_layout.py）。
+移行後も各段はそのまま動き、Obsidian の [[ファイル名]] リンクも切れない。
+途中で止まった場合はもう一度実行すれば続きから揃う。段の実行中には使わないこと。
+
+使い方:
+    python3 utils/出力フォルダ分割.py              # 現在の配置と件数を表示
+    python3 utils/出力フォルダ分割.py hash [桁数]  # シャード配置へ（既定2桁 = 256フォルダ）
+    python3 utils/出力フォルダ分割.py flat         # 1フォルダの配置へ戻す
+"""
+
+import os
+import sys
+import time
+
+# ルートディレクトリをパスに追加（utils パッケージ用）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.shard_layout import DEFAULT_WIDTH, MAX_WIDTH, SHARDED_FOLDERS, count, migrate, shard_width
+
+拡張子 = {"JSON_folder": ".json", "md_folder": ".md"}
+
+def 配置表示(基準ディレクトリ: str) -> None:
+    for フォルダ in SHARDED_FOLDERS:
+        パス = os.path.join(基準ディレクトリ, フォルダ)
+        if not os.path.isdir(パス):
+            print(f"  📁 {フォルダ}/ (未作成)")
+            continue
+        桁数 = shard_width(パス)
+        配置 = f"シャード {桁数}桁（{16 ** 桁数}フォルダ）" if 桁数 else "1フォルダ"
+        print(f"  📁 {フォルダ}/: {配置} / {count(パス, 拡張子[フォルダ]):,}件")
+
+def main():
+    基準ディレクトリ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    引数 = sys.argv[1:]
+
+    if not 引数:
+        print("🗂️ 出力フォルダの配置:")
+        配置表示(基準ディレクトリ)
+        return
+    try:
+        if 引数[0] == "hash":
+            桁数 = int(引数[1]) if len(引数) > 1 else DEFAULT_WIDTH
+            if not 1 <= 桁数 <= MAX_WIDTH:
+                raise ValueError
+        elif 引数[0] == "flat" and len(引数) == 1:
+            桁数 = 0
+        else:
+            raise ValueError
+    except ValueError:
+        print(f"❌ 使用方法: 出力フォルダ分割.py [hash [桁数 1〜{MAX_WIDTH}] | flat]")
+        return
+
+    print(f"🗂️ {'シャード配置（' + str(桁数) + '桁）' if 桁数 else '1フォルダの配置'}へ移行中...")
+    for フォルダ in SHARDED_FOLDERS:
+        開始 = time.time()
+        結果 = migrate(os.path.join(基準ディレクトリ, フォルダ), 桁数)
+        print(f"  ✅ {フォルダ}/: 移動 {結果['moved']:,}件 / 全 {結果['files']:,}件 "
+              f"({time.time() - 開始:.1f}秒)")
+        if 結果["conflicts"]:
+            print(f"  ⚠️ 移動先に同名のファイルがあり移さなかった: {結果['conflicts']}件"
+                  f"（{フォルダ}/ の直下か古いシャードに残っています）")
+        if 結果["stale_tmp"]:
+            print(f"  🧹 落ちた段の一時ファイルを削除: {結果['stale_tmp']}件")
+    配置表示(基準ディレクトリ)
+
+if __name__ == "__main__":
+    main()
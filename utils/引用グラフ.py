@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+引用グラフ.py - コーパス内引用グラフの構築・統計表示
+
+JSON_folder の参考文献から citation_graph/ を増分更新し、
+コーパス内でよく引用されている論文を表示する。
+書誌結合・共引用の重み付き辺を CSV に書き出すこともできる（要 scipy）。
+
+使い方:
+    python3 utils/引用グラフ.py                  # 更新して統計表示
+    python3 utils/引用グラフ.py top 20           # 被引用数上位20件（更新なし）
+    python3 utils/引用グラフ.py coupling [閾値] [上位k]    # 書誌結合 → citation_graph/coupling.csv
+    python3 utils/引用グラフ.py cocitation [閾値] [上位k]  # 共引用 → citation_graph/cocitation.csv
+"""
+
+import os
+import sys
+import time
+
+# ルートディレクトリをパスに追加（utils パッケージ用）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.citation_graph import CitationGraph, GRAPH_DIR, META_FILE, update_citation_graph
+from utils import citation_similarity as similarity
+
+def 統計表示(グラフ: CitationGraph, 件数: int = 10) -> None:
+    """ノード数・辺数・被引用数上位を表示"""
+    出次数 = グラフ.out_degree()
+    コーパス = グラフ.corpus_nodes()
+    print(f"📊 ノード数: {グラフ.num_nodes:,}（うちコーパス内論文 {len(コーパス):,}）")
+    print(f"🔗 引用数（辺）: {グラフ.num_edges:,}")
+    if len(コーパス):
+        print(f"📚 1論文あたりの参考文献（DOIあり）: 平均 {出次数[コーパス].mean():.1f}件")
+    print(f"\n🏆 コーパス内被引用数 上位{件数}件（コーパス内の論文）:")
+    for doi, 被引用数 in グラフ.top_cited(件数, corpus_only=True):
+        print(f"   {被引用数:5d}  {doi}")
+    print(f"\n📎 コーパス外も含む被引用数 上位{件数}件:")
+    for doi, 被引用数 in グラフ.top_cited(件数):
+        print(f"   {被引用数:5d}  {doi}")
+
+def 類似度出力(グラフディレクトリ: str, 種類: str, 閾値: int, 上位k: int) -> None:
+    """書誌結合 / 共引用を計算して CSV に書き出す"""
+    if not similarity.SCIPY_AVAILABLE:
+        print("❌ scipy がインストールされていません（pip install scipy）")
+        return
+    グラフ = CitationGraph.load(グラフディレクトリ)
+    開始 = time.time()
+    if 種類 == "coupling":
+        辺 = similarity.bibliographic_coupling(グラフ, 閾値, 上位k)
+        出力先 = os.path.join(グラフディレクトリ, similarity.COUPLING_FILE)
+    else:
+        辺 = similarity.co_citation(グラフ, 閾値, 上位k)
+        出力先 = os.path.join(グラフディレクトリ, similarity.COCITATION_FILE)
+    辺 = similarity.undirected(辺)
+    計算時間 = time.time() - 開始
+    件数 = similarity.export_edges(グラフ, 辺, 出力先, similarity.note_names(グラフディレクトリ))
+    print(f"✅ {件数:,}組を書き出しました ({計算時間:.1f}秒): {出力先}")
+
+def main():
+    基準ディレクトリ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    json_dir = os.path.join(基準ディレクトリ, "JSON_folder")
+    グラフディレクトリ = os.path.join(基準ディレクトリ, GRAPH_DIR)
+    引数 = sys.argv[1:]
+
+    if 引数 and 引数[0] == "top":
+        if not os.path.exists(os.path.join(グラフディレクトリ, META_FILE)):
+            print("ℹ️  引用グラフがありません。先に引数なしで実行してください")
+            return
+        件数 = int(引数[1]) if len(引数) > 1 else 10
+        統計表示(CitationGraph.load(グラフディレクトリ), 件数)
+        return
+    if 引数 and 引数[0] in ("coupling", "cocitation"):
+        if not os.path.exists(os.path.join(グラフディレクトリ, META_FILE)):
+            print("ℹ️  引用グラフがありません。先に引数なしで実行してください")
+            return
+        閾値 = int(引数[1]) if len(引数) > 1 else similarity.DEFAULT_MIN_WEIGHT
+        上位k = int(引数[2]) if len(引数) > 2 else similarity.DEFAULT_TOP_K
+        類似度出力(グラフディレクトリ, 引数[0], 閾値, 上位k)
+        return
+    if 引数:
+        print("❌ 使用方法: 引用グラフ.py [top <件数> | coupling|cocitation [閾値] [上位k]]")
+        return
+
+    if not os.path.isdir(json_dir):
+        print("❌ JSON_folder が見つかりません")
+        return
+    print("🕸️ 引用グラフ更新中...")
+    開始 = time.time()
+    結果 = update_citation_graph(json_dir, グラフディレクトリ)
+    print(f"✅ 更新完了 ({time.time() - 開始:.1f}秒): 読み込み {結果['parsed']}件 / "
+          f"削除 {結果['removed']}件 / 読み込み失敗 {結果['errors']}件")
+    統計表示(CitationGraph.load(グラフディレクトリ))
+
+if __name__ == "__main__":
+    main()
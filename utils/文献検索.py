@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文献検索.py - コーパスの全文検索（BM25・フレーズ・発行年）
+
+タイトル・抄録・キーワード・参考文献タイトル（抽出済みならPDF本文も）から
+search_index.sqlite を使って検索する。
+索引は enhance_keywords.py の実行後に自動更新される（手動なら update）。
+
+使い方:
+    python3 utils/文献検索.py update                           # 索引を増分更新
+    python3 utils/文献検索.py graph neural network             # 全単語を含む論文（BM25順）
+    python3 utils/文献検索.py '"citation network" year:2018-2022' -n 20
+      "…" はフレーズ、year:2020 / year:2018- / year:-2015 で発行年を絞り込み、-n は表示件数
+"""
+
+import os
+import sys
+import time
+
+# ルートディレクトリをパスに追加（utils パッケージ用）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.search_index import SearchIndex, SEARCH_INDEX_DB
+from utils.pdf_text import FullTextSource, PDF_TEXT_CACHE_DB
+
+def main():
+    基準ディレクトリ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    json_dir = os.path.join(基準ディレクトリ, "JSON_folder")
+    索引パス = os.path.join(基準ディレクトリ, SEARCH_INDEX_DB)
+    引数 = sys.argv[1:]
+
+    if not 引数:
+        print("❌ 使用方法: 文献検索.py update | <検索語...> [-n 件数]")
+        return
+    if 引数 == ["update"]:
+        if not os.path.isdir(json_dir):
+            print("❌ JSON_folder が見つかりません")
+            return
+        print("🔎 検索索引を更新中...")
+        開始 = time.time()
+        本文 = FullTextSource(os.path.join(基準ディレクトリ, "PDF"), os.path.join(基準ディレクトリ, PDF_TEXT_CACHE_DB))
+        with 本文, SearchIndex(索引パス) as 索引:
+            結果 = 索引.update(json_dir, fulltext=本文)
+        print(f"✅ 更新完了 ({time.time() - 開始:.1f}秒): 読み込み {結果['parsed']}件 / "
+              f"削除 {結果['removed']}件 / 読み込み失敗 {結果['errors']}件 / 索引内 {結果['docs']}件")
+        return
+
+    件数 = 10
+    if "-n" in 引数:
+        位置 = 引数.index("-n")
+        try:
+            件数 = int(引数[位置 + 1])
+        except (IndexError, ValueError):
+            print("❌ -n の後に表示件数を指定してください")
+            return
+        del 引数[位置:位置 + 2]
+    if not os.path.exists(索引パス):
+        print("ℹ️  検索索引がありません。先に update を実行してください")
+        return
+
+    クエリ = " ".join(引数)
+    開始 = time.perf_counter()
+    try:
+        with SearchIndex(索引パス, readonly=True) as 索引:
+            結果 = 索引.search(クエリ, 件数)
+    except RuntimeError as e:
+        print(f"ℹ️  {e}")
+        return
+    経過 = (time.perf_counter() - 開始) * 1000
+    if not 結果:
+        print(f"🔍 一致なし: {クエリ} ({経過:.1f}ms)")
+        return
+    print(f"🔍 {クエリ}  上位{len(結果)}件 ({経過:.1f}ms)")
+    for 順位, hit in enumerate(結果, 1):
+        年 = hit.year or "----"
+        print(f"{順位:3d}. [{hit.score:6.2f}] {年} {hit.title}")
+        print(f"      📝 {os.path.splitext(hit.name)[0]}" + (f"  DOI: {hit.doi}" if hit.doi else ""))
+
+if __name__ == "__main__":
+    main()
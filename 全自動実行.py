@@ -12,6 +12,13 @@ import time
 import importlib.util
 import venv
 
+from utils.run_report import (RUN_REPORT, finish_run, profile_lines, profile_option, record_stage,
+                               start_run, summarize)
+from utils.shard_layout import count
+
+# 各段の計測（utils/run_report.py）の書き込み先
+基準ディレクトリ = os.path.dirname(os.path.abspath(__file__))
+
 # メール通知機能のインポート（オプション）
 try:
     from utils.email_notification import (
@@ -240,32 +247,49 @@ def スクリプト実行(スクリプト名, 説明):
     print(f"\n🔄 {説明}を実行中...")
     print(f"📄 {スクリプト名}")
     
+    開始時間 = time.time()
     try:
-        開始時間 = time.time()
         結果 = subprocess.run([sys.executable, スクリプト名], check=True)
         実行時間 = time.time() - 開始時間
+        実行記録(スクリプト名, 実行時間, 0)
         print(f"✅ {説明} 完了 ({実行時間:.1f}秒)")
         return True
     except subprocess.CalledProcessError as e:
+        実行記録(スクリプト名, time.time() - 開始時間, e.returncode)
         print(f"❌ {説明} でエラー発生 (コード: {e.returncode})")
         return False
     except Exception as e:
         print(f"❌ {説明} で予期しないエラー: {e}")
         return False
 
+def 実行記録(スクリプト名: str, 実行時間: float, 終了コード: int) -> None:
+    """段の外から測った所要時間・終了コードを実行レポートに追記（段の中の計測と同じ項目に入る）"""
+    段 = os.path.splitext(os.path.basename(スクリプト名))[0]
+    try:
+        record_stage(基準ディレクトリ, 段, {"wall_seconds": round(実行時間, 3), "returncode": 終了コード})
+    except OSError as e:
+        print(f"⚠️ 実行レポートを書けませんでした: {e}")
+
 def PDF取得実行():
     """PDF取得を実行（オプション）"""
+    # aiohttp があれば非同期版（ホスト別の同時接続制限付き）を使う
+    if importlib.util.find_spec('aiohttp') is not None:
+        スクリプト名 = "download_open_access_pdfs_async.py"
+    else:
+        スクリプト名 = "download_open_access_pdfs_fast_stdlib.py"
     print(f"\n🔄 オープンアクセスPDF取得を実行中...")
-    print(f"📄 download_open_access_pdfs_fast_stdlib.py")
+    print(f"📄 {スクリプト名}")
     
+    開始時間 = time.time()
     try:
-        開始時間 = time.time()
-        スクリプトパス = os.path.join("pdf_tools", "download_open_access_pdfs_fast_stdlib.py")
+        スクリプトパス = os.path.join("pdf_tools", スクリプト名)
         結果 = subprocess.run([sys.executable, スクリプトパス], check=True)
         実行時間 = time.time() - 開始時間
+        実行記録(スクリプト名, 実行時間, 0)
         print(f"✅ オープンアクセスPDF取得 完了 ({実行時間:.1f}秒)")
         return True
     except subprocess.CalledProcessError as e:
+        実行記録(スクリプト名, time.time() - 開始時間, e.returncode)
         print(f"❌ PDF取得でエラー発生 (コード: {e.returncode})")
         return False
     except Exception as e:
@@ -352,7 +376,8 @@ def main():
     # メール通知オプション確認
     メール通知有効 = メール通知オプション確認()
     
-    # パイプライン実行
+    # パイプライン実行（各段の計測は run_report.json にまとめる）
+    start_run(基準ディレクトリ)
     パイプライン = [
         ("combine_scopus_csv.py", "2️⃣  CSVファイル結合"),
         ("scopus_doi_to_json.py", "3️⃣  DOI完全情報取得"),
@@ -371,14 +396,21 @@ def main():
     
     # 最終結果
     全実行時間 = time.time() - 全開始時間
+    レポート = finish_run(基準ディレクトリ, 全実行時間)
     print(f"\n{'='*60}")
     print("🎉 メイン処理完了!")
     print(f"📊 成功ステップ: {成功ステップ}/{総ステップ}")
     print(f"⏱️  総実行時間: {全実行時間/60:.1f}分")
+    if レポート.get("stages"):
+        print(f"\n⏱️  段ごとの計測（詳細は {RUN_REPORT}）:")
+        for 行 in summarize(レポート):
+            print(f"   {行}")
+        for 行 in profile_lines(レポート):
+            print(f"   {行}")
     
     # 生成ファイル確認
-    json_count = len([f for f in os.listdir("JSON_folder") if f.endswith(".json")]) if os.path.exists("JSON_folder") else 0
-    md_count = len([f for f in os.listdir("md_folder") if f.endswith(".md")]) if os.path.exists("md_folder") else 0
+    json_count = count("JSON_folder", ".json")
+    md_count = count("md_folder", ".md")
     初期pdf_count = PDF数確認()
     
     print(f"\n📁 生成ファイル数:")
@@ -473,4 +505,5 @@ def main():
                 print("⚠️  メール送信に失敗しました")
 
 if __name__ == "__main__":
+    profile_option()  # --profile[=cpu|mem|all]: 各段を cProfile / tracemalloc の下で実行
     main()
\ No newline at end of file